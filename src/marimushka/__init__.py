@@ -50,9 +50,12 @@ from .dependencies import (
 )
 from .exceptions import (
     BatchExportResult,
+    ExportCancelledError,
+    ExportEnvironmentError,
     ExportError,
     ExportExecutableNotFoundError,
     ExportSubprocessError,
+    GitDiffError,
     IndexWriteError,
     MarimushkaError,
     NotebookError,
@@ -61,6 +64,7 @@ from .exceptions import (
     NotebookNotFoundError,
     OutputError,
     ProgressCallback,
+    ResultCallback,
     TemplateError,
     TemplateInvalidError,
     TemplateNotFoundError,
@@ -74,9 +78,13 @@ __all__ = [
     # Dependency injection
     "Dependencies",
     # Export exceptions
+    "ExportCancelledError",
+    "ExportEnvironmentError",
     "ExportError",
     "ExportExecutableNotFoundError",
     "ExportSubprocessError",
+    # Git exceptions
+    "GitDiffError",
     "IndexWriteError",
     # Base exceptions
     "MarimushkaError",
@@ -90,6 +98,8 @@ __all__ = [
     "OutputError",
     # Progress callback
     "ProgressCallback",
+    # Result callback
+    "ResultCallback",
     # Template exceptions
     "TemplateError",
     "TemplateInvalidError",
@@ -0,0 +1,141 @@
+"""Entry point of a persistent marimo export worker.
+
+This script is not imported by marimushka. The worker pool (see the worker
+module) runs it with the interpreter of marimo's uvx environment::
+
+    uvx --from marimo python -u _worker_main.py
+
+so marimo is imported once per worker rather than once per export. It depends
+on the standard library and marimo only, and enters marimo through the
+``marimo`` console script declared in its package metadata, the same public
+entry point the ``marimo`` command runs.
+
+Protocol: the worker reads one JSON job per line from stdin and answers each
+with one JSON line on stdout. It announces itself with ``{"ready": true}``
+once marimo is imported, or with ``{"ready": false, "error": ...}`` and exits
+if marimo's command line cannot be run in process; the pool then exports with
+subprocesses instead. A job is ``{"args": [...]}`` holding the arguments of
+the ``marimo`` command line; the answer holds ``returncode``, the captured
+``stdout`` and ``stderr`` of the export, and the worker's resident memory in
+bytes (``rss``). The worker exits when stdin is closed.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import traceback
+from importlib.metadata import entry_points
+
+
+def _resident_memory() -> int:
+    """Return the resident memory of this process in bytes, or 0 if unknown."""
+    with contextlib.suppress(OSError, ValueError), open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _load_cli():
+    """Return marimo's command-line entry point.
+
+    Raises:
+        RuntimeError: If marimo declares no ``marimo`` console script.
+        TypeError: If the console script is not a click command that can run in process.
+
+    """
+    scripts = entry_points(group="console_scripts", name="marimo")
+    if not scripts:
+        raise RuntimeError("marimo declares no 'marimo' console script")  # noqa: TRY003
+    main = next(iter(scripts)).load()
+    # click commands take standalone_mode, which lets the worker survive each export
+    if not callable(getattr(main, "main", None)):
+        raise TypeError(f"marimo's console script {main!r} is not a click command")  # noqa: TRY003
+    return main
+
+
+def _invoke(main, args: list[str]) -> int:
+    """Run marimo's command line in this process and return its exit code."""
+    # marimo re-reads sys.argv, e.g. to re-run an export in its sandbox
+    sys.argv = ["marimo", *args]
+    try:
+        rv = main(args, prog_name="marimo", standalone_mode=False)
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception as e:
+        show = getattr(e, "show", None)
+        if callable(show):
+            # click usage errors know how to report themselves
+            show()
+            return int(getattr(e, "exit_code", 1))
+        traceback.print_exc()
+        return 1
+    return rv if isinstance(rv, int) else 0
+
+
+def _run_job(main, args: list[str]) -> dict:
+    """Run one export with stdout and stderr captured at the file-descriptor level.
+
+    Capturing the descriptors rather than sys.stdout also collects the output
+    of processes marimo spawns, such as the sandbox environment.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = os.dup(1), os.dup(2)
+        os.dup2(out.fileno(), 1)
+        os.dup2(err.fileno(), 2)
+        try:
+            returncode = _invoke(main, args)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            os.close(saved[0])
+            os.close(saved[1])
+        out.seek(0)
+        err.seek(0)
+        return {
+            "returncode": returncode,
+            "stdout": out.read().decode(errors="replace"),
+            "stderr": err.read().decode(errors="replace"),
+            "rss": _resident_memory(),
+        }
+
+
+def serve() -> None:
+    """Answer export jobs read from stdin until stdin is closed."""
+    # Keep the protocol on a private copy of stdout; stray output goes to stderr
+    channel = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+
+    try:
+        main = _load_cli()
+    except Exception as e:
+        channel.write(json.dumps({"ready": False, "error": f"{type(e).__name__}: {e}"}) + "\n")
+        return
+
+    channel.write(json.dumps({"ready": True, "pid": os.getpid()}) + "\n")
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        channel.write(json.dumps(_run_job(main, list(job["args"]))) + "\n")
+
+
+# marimo starts its kernels with multiprocessing's spawn method, which imports
+# this script again in the child; only the worker process may serve jobs.
+if __name__ == "__main__":
+    serve()
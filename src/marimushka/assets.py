@@ -0,0 +1,335 @@
+"""Data files of the ``public/`` directory that notebooks reference.
+
+Notebooks load data from the ``public/`` directory next to them, e.g.
+``mo.notebook_location() / "public" / "penguins.csv"``, and apps embed files
+such as ``public/logo.png``. Exports change when these files change, but a
+notebook only depends on the files it references, not on every file of the
+directory.
+
+References are found by parsing the notebook source with ``ast``:
+
+- string literals starting with ``public/`` (or ``./public/``), including
+  the constant prefix of f-strings,
+- path expressions joining ``"public"`` with further parts, either with
+  ``/`` (``Path``, ``mo.notebook_location()``) or ``os.path.join``.
+
+A reference to a directory covers every file below it. Parts that are not
+constant end a reference at the directory before them, so
+``mo.notebook_location() / "public" / name`` covers the whole ``public/``
+directory, and a bare ``"public"`` literal does as well.
+
+The references of a source are cached by the SHA-256 digest of its contents,
+and digests of the data files by path, modification time and size. Large
+files are hashed from memory-mapped chunks (see cache.hash_file), so
+tracking them stays cheap. Builds with a cache directory persist the
+references as ``assets.json`` there.
+
+WebAssembly exports (apps and interactive notebooks) copy the whole
+``public/`` directory next to their HTML, so they depend on every file of it
+regardless of their references.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.assets import asset_references
+
+    for path in asset_references().files(Path("notebooks/penguins.py")):
+        print(path)
+"""
+
+import ast
+import hashlib
+import threading
+from pathlib import Path
+
+from loguru import logger
+
+from .cache import hash_file
+from .discovery import PUBLIC_DIRNAME
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the persisted references inside the cache directory
+ASSETS_FILENAME = "assets.json"
+
+# Format of the persisted references; a change to the scanner must change it too
+ASSETS_VERSION = 1
+
+
+def _path_parts(value: str) -> list[str]:
+    """Split a path literal into its parts, dropping empty and ``.`` parts."""
+    return [part for part in value.replace("\\", "/").split("/") if part not in ("", ".")]
+
+
+def _reference(parts: list[str | None]) -> str | None:
+    """Return the reference below ``public/`` of a sequence of path parts.
+
+    Args:
+        parts: Path parts, None for parts that are not constant.
+
+    Returns:
+        The POSIX path below ``public/``, "" for the whole directory, or None
+        if the parts do not start at ``public``.
+
+    """
+    flat: list[str | None] = []
+    for part in parts:
+        flat.extend(_path_parts(part) if part is not None else [None])
+    if not flat or flat[0] != PUBLIC_DIRNAME:
+        return None
+    static: list[str] = []
+    for part in flat[1:]:
+        if part is None:
+            break
+        static.append(part)
+    return "/".join(static)
+
+
+def _division_chain(node: ast.BinOp, seen: set[int]) -> list[ast.expr]:
+    """Flatten ``a / b / c`` into its operands, marking the visited nodes as seen."""
+    operands: list[ast.expr] = []
+    current: ast.expr = node
+    while isinstance(current, ast.BinOp) and isinstance(current.op, ast.Div):
+        seen.add(id(current))
+        operands.append(current.right)
+        current = current.left
+    operands.append(current)
+    operands.reverse()
+    return operands
+
+
+def _constant(node: ast.expr) -> str | None:
+    """Return the value of a string literal, None for anything else."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _references_in_parts(operands: list[ast.expr], seen: set[int]) -> str | None:
+    """Return the reference of the path parts of a division chain or a join call."""
+    values = [_constant(operand) for operand in operands]
+    for operand in operands:
+        if _constant(operand) is not None:
+            seen.add(id(operand))
+    # The chain may start anywhere, e.g. at mo.notebook_location() or a variable
+    for start, value in enumerate(values):
+        if value is not None and _path_parts(value)[:1] == [PUBLIC_DIRNAME]:
+            return _reference(values[start:])
+    return None
+
+
+def scan_references(source: bytes, filename: str = "<unknown>") -> tuple[str, ...]:
+    """Find the references of a notebook source to files of its ``public/`` directory.
+
+    Args:
+        source: The notebook source.
+        filename: Name of the source, used in log messages.
+
+    Returns:
+        Sorted POSIX paths below ``public/`` the source references, "" for the
+        whole directory; empty if the source does not parse.
+
+    """
+    try:
+        tree = ast.parse(source, filename=filename)
+    except (SyntaxError, ValueError) as e:
+        logger.debug(f"Not scanning {filename} for data files: {e}")
+        return ()
+
+    references: set[str] = set()
+    # Nodes already covered by an enclosing path expression
+    seen: set[int] = set()
+    for node in ast.walk(tree):
+        if id(node) in seen:
+            continue
+        reference: str | None = None
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Div):
+            reference = _references_in_parts(_division_chain(node, seen), seen)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "join":
+            reference = _references_in_parts(list(node.args), seen)
+        elif isinstance(node, ast.JoinedStr) and node.values:
+            # Only the constant prefix of an f-string is known
+            seen.update(id(value) for value in node.values)
+            prefix = _constant(node.values[0])
+            if prefix is not None:
+                reference = _reference([prefix, None] if len(node.values) > 1 else [prefix])
+        else:
+            value = _constant(node) if isinstance(node, ast.expr) else None
+            reference = _reference([value]) if value is not None else None
+        if reference is not None:
+            references.add(reference)
+    return tuple(sorted(references))
+
+
+def covers(references: tuple[str, ...], relative: str) -> bool:
+    """Check whether references cover a file.
+
+    Args:
+        references: References below ``public/``, see scan_references.
+        relative: POSIX path of the file below ``public/``.
+
+    Returns:
+        True if a reference is the file or one of its directories.
+
+    """
+    return any(not ref or relative == ref or relative.startswith(ref + "/") for ref in references)
+
+
+class AssetReferences:
+    """References of notebooks to their data files, scanned once per version of each source.
+
+    A lock guards the entries and file digests, as the threads of a parallel
+    export look up references at the same time.
+
+    Attributes:
+        entries: References of each scanned source, keyed by the SHA-256 digest of its contents.
+        scanned: Number of sources scanned since the cache was created.
+
+    """
+
+    def __init__(self, entries: dict[str, tuple[str, ...]] | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            entries: References keyed by source digest. Defaults to None (empty).
+
+        """
+        self.entries = entries or {}
+        self.scanned = 0
+        self._used: set[str] = set()
+        self._digests: dict[Path, tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def references(self, notebook: Path) -> tuple[str, ...]:
+        """Return the references of a notebook, scanning its source only if its digest is new.
+
+        Args:
+            notebook: Path to the notebook source.
+
+        Returns:
+            POSIX paths below ``public/``, "" for the whole directory.
+
+        Raises:
+            OSError: If the source cannot be read.
+
+        """
+        source = notebook.read_bytes()
+        digest = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            references = self.entries.get(digest)
+            self._used.add(digest)
+        if references is None:
+            references = scan_references(source, str(notebook))
+            with self._lock:
+                self.entries[digest] = references
+                self.scanned += 1
+        return references
+
+    def files(self, notebook: Path, whole_directory: bool = False) -> list[Path]:
+        """Return the data files a notebook references, including missing ones.
+
+        Args:
+            notebook: Path to the notebook source.
+            whole_directory: Whether the notebook depends on every file of its
+                ``public/`` directory, as WebAssembly exports do. Defaults to False.
+
+        Returns:
+            Sorted paths of the referenced files; referenced paths that do not
+            exist are included, so creating them changes the notebook's assets.
+
+        Raises:
+            OSError: If the source cannot be read.
+
+        """
+        public = notebook.parent / PUBLIC_DIRNAME
+        references = ("",) if whole_directory else self.references(notebook)
+        files: set[Path] = set()
+        for reference in references:
+            target = public / reference if reference else public
+            if target.is_dir():
+                files.update(p for p in target.rglob("*") if p.is_file())
+            elif reference:
+                files.add(target)
+        return sorted(files)
+
+    def _digest(self, path: Path) -> str:
+        """Return the digest of a data file, hashing it again only if it changed."""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return "missing"
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = hash_file(path)
+        with self._lock:
+            self._digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def assets_hash(self, notebook: Path, whole_directory: bool = False) -> str | None:
+        """Return a digest over the paths and contents of a notebook's data files.
+
+        Args:
+            notebook: Path to the notebook source.
+            whole_directory: Whether the notebook depends on every file of its
+                ``public/`` directory. Defaults to False.
+
+        Returns:
+            The hex digest, or None if the notebook references no data files.
+
+        Raises:
+            OSError: If the source or a data file cannot be read.
+
+        """
+        files = self.files(notebook, whole_directory)
+        if not files:
+            return None
+        public = notebook.parent / PUBLIC_DIRNAME
+        digest = hashlib.sha256()
+        for path in files:
+            digest.update(path.relative_to(public).as_posix().encode())
+            digest.update(b"\0")
+            digest.update(self._digest(path).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def load(self, path: Path) -> None:
+        """Add the references persisted in a file; missing or unreadable files add nothing.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/assets.json``.
+
+        """
+        try:
+            data = read_versioned_json(path, ASSETS_VERSION)
+            if data is None:
+                return
+            entries = {digest: tuple(str(ref) for ref in refs) for digest, refs in data["entries"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable asset references {path}: {e}")
+            return
+        with self._lock:
+            for digest, refs in entries.items():
+                self.entries.setdefault(digest, refs)
+
+    def save(self, path: Path) -> None:
+        """Persist the references of the sources used by this process; failures are logged.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/assets.json``.
+
+        """
+        with self._lock:
+            entries = {digest: self.entries[digest] for digest in sorted(self._used) if digest in self.entries}
+        try:
+            write_json_atomic(path, {"version": ASSETS_VERSION, "entries": entries}, compact=True)
+        except OSError as e:
+            logger.warning(f"Could not write {path}: {e}")
+
+
+_asset_references = AssetReferences()
+
+
+def asset_references() -> AssetReferences:
+    """Return the asset references shared by the builds of this process."""
+    return _asset_references
@@ -0,0 +1,240 @@
+"""Content-addressed cache for exported notebooks.
+
+This module provides a persistent on-disk cache that lets marimushka skip the
+``marimo export`` subprocess for notebooks whose inputs have not changed since
+a previous build. Cache entries are addressed by a key derived from everything
+that influences the exported HTML:
+
+    - the notebook source bytes,
+    - the export Kind,
+    - the sandbox flag,
+    - the resolved marimo version,
+    - the files of the sibling ``public/`` directory the notebook references,
+      or all of them for WebAssembly exports (see the assets module),
+    - the local modules the notebook imports (see the imports module).
+
+Example::
+
+    from pathlib import Path
+    from marimushka.cache import ExportCache
+    from marimushka.notebook import Notebook
+
+    cache = ExportCache(Path(".marimushka-cache"))
+    result = Notebook(Path("notebooks/demo.py")).export(Path("_site/notebooks"), cache=cache)
+    if result.cached:
+        print("Reused previous export")
+"""
+
+import copy
+import hashlib
+import mmap
+import os
+import shutil
+import subprocess  # nosec B404
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from .imports import import_graph
+from .storage import atomic_path
+
+if TYPE_CHECKING:
+    from .notebook import Notebook
+
+# Bump whenever the key derivation or on-disk layout changes
+CACHE_VERSION = 3
+
+# Size of the chunks used when hashing files; larger files are memory-mapped
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """Return the SHA-256 hex digest of a file's contents.
+
+    Files larger than one chunk are memory-mapped and hashed chunk by chunk,
+    so large data files are neither copied into Python buffers nor read into
+    memory at once.
+
+    Args:
+        path: Path to the file to hash.
+
+    Returns:
+        The hex digest of the file contents.
+
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size > _CHUNK_SIZE:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    for offset in range(0, len(view), _CHUNK_SIZE):
+                        digest.update(view[offset : offset + _CHUNK_SIZE])
+                return digest.hexdigest()
+            except (OSError, ValueError):
+                # Not mappable, e.g. a special file; fall back to plain reads
+                digest = hashlib.sha256()
+                f.seek(0)
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def resolve_marimo_version(executable: str = "uvx", timeout: int = 60) -> str | None:
+    """Resolve the marimo version that an executable would run.
+
+    The version is queried on every call, so an upgraded marimo is noticed;
+    builds resolve it once (see ExportCache.for_build).
+
+    Args:
+        executable: Executable used to launch marimo (e.g., 'uvx' or a full path).
+        timeout: Maximum time in seconds to wait for the version query.
+
+    Returns:
+        The marimo version string, or None if it could not be determined.
+
+    """
+    cmd = [executable, "marimo", "--version"]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=timeout)  # nosec B603  # noqa: S603
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not determine marimo version, exports are not cached: {e}")
+        return None
+
+    version = result.stdout.strip()
+    if result.returncode != 0 or not version:
+        logger.warning("Could not determine marimo version, exports are not cached")
+        return None
+    return version
+
+
+class ExportCache:
+    """Persistent, content-addressed store of exported notebook HTML.
+
+    Attributes:
+        cache_dir: Root directory of the cache.
+        marimo_version: Pinned marimo version used in cache keys. If None, the
+            version is resolved from the export executable for every key, or
+            once per build by the cache returned by for_build().
+
+    """
+
+    def __init__(self, cache_dir: Path, marimo_version: str | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            cache_dir: Root directory of the cache. Created if it does not exist.
+            marimo_version: Optional marimo version to use in cache keys instead
+                of querying the executable.
+
+        """
+        self.cache_dir = cache_dir
+        self.marimo_version = marimo_version
+        self._resolve_version = True
+        self._exports_dir = cache_dir / "exports"
+        self._exports_dir.mkdir(parents=True, exist_ok=True)
+
+    def for_build(self, marimo_version: str | None) -> "ExportCache":
+        """Return the cache with the marimo version resolved for one build.
+
+        The cache itself is left unchanged, so a long-lived session resolves
+        the version again for its next build and notices a marimo upgrade.
+
+        Args:
+            marimo_version: The version of the build, or None if it could not be
+                determined, in which case the build neither restores nor stores
+                exports.
+
+        Returns:
+            A cache sharing this cache's entries.
+
+        """
+        build_cache = copy.copy(self)
+        build_cache.marimo_version = marimo_version
+        build_cache._resolve_version = False
+        return build_cache
+
+    def key(self, notebook: "Notebook", sandbox: bool, executable: str = "uvx") -> str | None:
+        """Compute the cache key for exporting a notebook.
+
+        Args:
+            notebook: The notebook to be exported.
+            sandbox: Whether the export runs in a sandbox.
+            executable: Executable used to launch marimo, used to resolve the
+                marimo version when none is pinned.
+
+        Returns:
+            The hex digest identifying this export, or None if the marimo
+            version is unknown and the export must not be cached.
+
+        """
+        from .assets import asset_references
+        from .notebook import Kind
+
+        version = self.marimo_version
+        if version is None and self._resolve_version:
+            version = resolve_marimo_version(executable)
+        if version is None:
+            return None
+
+        digest = hashlib.sha256()
+        for part in (
+            f"v{CACHE_VERSION}",
+            hash_file(notebook.path),
+            notebook.kind.value,
+            str(sandbox),
+            version,
+            # WebAssembly exports copy the whole public/ directory
+            asset_references().assets_hash(notebook.path, whole_directory=notebook.kind != Kind.NB) or "",
+            import_graph().modules_hash(notebook.path) or "",
+        ):
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        """Return the path of the cache entry for a key."""
+        return self._exports_dir / key[:2] / f"{key}.html"
+
+    def contains(self, key: str) -> bool:
+        """Return True if an entry for the key is cached."""
+        return self._entry_path(key).is_file()
+
+    def restore(self, key: str, output_file: Path) -> bool:
+        """Copy a cached export to its output location.
+
+        Args:
+            key: The cache key of the export.
+            output_file: Where the exported HTML should be written.
+
+        Returns:
+            True if the entry was found and restored, False on a cache miss.
+
+        """
+        entry = self._entry_path(key)
+        try:
+            shutil.copyfile(entry, output_file)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning(f"Could not restore cached export for {output_file.name}: {e}")
+            return False
+        return True
+
+    def store(self, key: str, output_file: Path) -> None:
+        """Store an exported file in the cache.
+
+        The entry is written to a temporary file and atomically renamed into
+        place so that concurrent builds never observe partial entries.
+
+        Args:
+            key: The cache key of the export.
+            output_file: The freshly exported HTML file.
+
+        """
+        entry = self._entry_path(key)
+        try:
+            with atomic_path(entry) as tmp_path:
+                shutil.copyfile(output_file, tmp_path)
+        except OSError as e:
+            logger.warning(f"Could not cache export of {output_file.name}: {e}")
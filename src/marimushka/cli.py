@@ -1,11 +1,15 @@
 """Command-line interface for marimushka.
 
 This module provides the CLI commands for exporting marimo notebooks,
-watching for changes, and displaying version information.
+watching for changes, serving the site with live reload, and displaying
+version information.
 """
 
 import sys
+import threading
+from collections.abc import Callable
 from pathlib import Path
+from typing import Annotated, Any
 
 import typer
 from loguru import logger
@@ -61,6 +65,174 @@ configure_logging(debug=False)
 # Maximum number of changed files to display in watch mode
 _MAX_CHANGED_FILES_TO_DISPLAY = 5
 
+# Default template of the export, watch and serve commands
+_DEFAULT_TEMPLATE = str(Path(__file__).parent / "templates" / "tailwind.html.j2")
+
+# Options shared by the export, watch, serve, daemon and prefetch commands
+_OutputOption = Annotated[str, typer.Option("--output", "-o", help="Directory where the exported files will be saved")]
+_TemplateOption = Annotated[str, typer.Option("--template", "-t", help="Path to the template file")]
+_NotebooksOption = Annotated[str, typer.Option("--notebooks", "-n", help="Directory containing marimo notebooks")]
+_AppsOption = Annotated[str, typer.Option("--apps", "-a", help="Directory containing marimo apps")]
+_NotebooksWasmOption = Annotated[
+    str, typer.Option("--notebooks-wasm", "-nw", help="Directory containing marimo notebooks")
+]
+_SandboxOption = Annotated[
+    bool, typer.Option("--sandbox/--no-sandbox", help="Whether to run the notebook in a sandbox")
+]
+_BinPathOption = Annotated[
+    str | None, typer.Option("--bin-path", "-b", help="The directory where the executable is located")
+]
+_ParallelOption = Annotated[
+    bool, typer.Option("--parallel/--no-parallel", help="Whether to export notebooks in parallel")
+]
+_MaxWorkersOption = Annotated[
+    int,
+    typer.Option(
+        "--max-workers", "-w", help="Maximum number of parallel workers (1-16, up to 64 with --engine asyncio)"
+    ),
+]
+_TimeoutOption = Annotated[int, typer.Option("--timeout", help="Timeout in seconds for each notebook export")]
+_CacheDirOption = Annotated[
+    str | None, typer.Option("--cache-dir", help="Directory of the export cache used to skip unchanged notebooks")
+]
+_IncrementalOption = Annotated[
+    bool, typer.Option("--incremental/--no-incremental", help="Only re-export notebooks changed since the last build")
+]
+_EstimatedDurationOption = Annotated[
+    float,
+    typer.Option(
+        "--estimated-duration", help="Estimated export time in seconds for notebooks without recorded history"
+    ),
+]
+_EngineOption = Annotated[
+    str,
+    typer.Option(
+        "--engine",
+        help="Export engine: 'threads', 'asyncio' (subprocesses on an event loop, up to 64) "
+        "or 'workers' (persistent marimo worker processes, only used with --no-sandbox)",
+    ),
+]
+_WorkerMaxJobsOption = Annotated[
+    int, typer.Option("--worker-max-jobs", help="Exports after which a worker of --engine workers is replaced")
+]
+_WorkerMaxMemoryOption = Annotated[
+    int,
+    typer.Option(
+        "--worker-max-memory", help="Resident memory in MB above which a worker of --engine workers is replaced"
+    ),
+]
+_SharedEnvsOption = Annotated[
+    bool,
+    typer.Option(
+        "--shared-envs/--no-shared-envs",
+        help="Share one sandbox environment per PEP 723 dependency set, kept in --cache-dir across builds",
+    ),
+]
+_EnvCacheSizeOption = Annotated[
+    int,
+    typer.Option(
+        "--env-cache-size", help="Size limit in MB of the shared environments (least recently used are removed)"
+    ),
+]
+_PrefetchOption = Annotated[
+    bool,
+    typer.Option(
+        "--prefetch/--no-prefetch",
+        help="Create the shared environment of every dependency set before exporting (implies --shared-envs)",
+    ),
+]
+_IndexUrlOption = Annotated[
+    str | None,
+    typer.Option("--index-url", help="Package index used instead of PyPI for shared environments, e.g. a mirror"),
+]
+_FindLinksOption = Annotated[
+    str | None,
+    typer.Option("--find-links", help="Wheelhouse directory or URL searched for packages of shared environments"),
+]
+_OfflineOption = Annotated[
+    bool,
+    typer.Option("--offline/--no-offline", help="Create shared environments from uv's cache and --find-links only"),
+]
+_MarimoVersionOption = Annotated[
+    str | None,
+    typer.Option("--marimo-version", help="Exact marimo version installed once and used for every export, e.g. 0.18.4"),
+]
+_PageSizeOption = Annotated[
+    int, typer.Option("--page-size", help="Notebooks of a kind per index page; 0 lists every notebook on one page")
+]
+_SearchOption = Annotated[
+    bool, typer.Option("--search/--no-search", help="Write a search index of notebook names, docstrings and headings")
+]
+_RecursiveOption = Annotated[
+    bool, typer.Option("--recursive/--no-recursive", help="Find notebooks in subdirectories of the folders as well")
+]
+_IncludeOption = Annotated[
+    list[str] | None,
+    typer.Option("--include", help="Glob pattern of notebooks to export (repeatable); others are skipped"),
+]
+_ExcludeOption = Annotated[
+    list[str] | None, typer.Option("--exclude", help="Glob pattern of notebooks and directories to skip (repeatable)")
+]
+_SinceOption = Annotated[
+    str | None,
+    typer.Option(
+        "--since",
+        help="Only export notebooks changed since this git revision (e.g. origin/main); reuse the rest of the site",
+    ),
+]
+_DebugOption = Annotated[bool, typer.Option("--debug", "-d", help="Enable debug mode with verbose logging")]
+_DebounceOption = Annotated[
+    int, typer.Option("--debounce", help="Milliseconds a burst of changes must settle for before a rebuild starts")
+]
+
+
+# Arguments of the export, watch and serve commands passed on to export.main
+_BUILD_OPTIONS = (
+    "output",
+    "template",
+    "notebooks",
+    "apps",
+    "notebooks_wasm",
+    "sandbox",
+    "bin_path",
+    "parallel",
+    "max_workers",
+    "timeout",
+    "cache_dir",
+    "incremental",
+    "estimated_duration",
+    "engine",
+    "worker_max_jobs",
+    "worker_max_memory",
+    "shared_envs",
+    "env_cache_size",
+    "prefetch",
+    "index_url",
+    "find_links",
+    "offline",
+    "marimo_version",
+    "page_size",
+    "search",
+    "recursive",
+    "include",
+    "exclude",
+)
+
+
+def _build_options(arguments: dict[str, Any]) -> dict[str, Any]:
+    """Return the keyword arguments of ``export.main`` among a command's arguments.
+
+    Args:
+        arguments: The arguments of the export, watch or serve command, i.e.
+            its ``locals()`` before any other local variable is assigned.
+
+    Returns:
+        The options of the build.
+
+    """
+    return {name: arguments[name] for name in _BUILD_OPTIONS}
+
+
 app = typer.Typer(help=f"Marimushka - Export marimo notebooks in style. Version: {__version__}")
 
 
@@ -88,24 +260,36 @@ def callback(ctx: typer.Context) -> None:
 
 @app.command(name="export")
 def export_command(
-    output: str = typer.Option("_site", "--output", "-o", help="Directory where the exported files will be saved"),
-    template: str = typer.Option(
-        str(Path(__file__).parent / "templates" / "tailwind.html.j2"),
-        "--template",
-        "-t",
-        help="Path to the template file",
-    ),
-    notebooks: str = typer.Option("notebooks", "--notebooks", "-n", help="Directory containing marimo notebooks"),
-    apps: str = typer.Option("apps", "--apps", "-a", help="Directory containing marimo apps"),
-    notebooks_wasm: str = typer.Option(
-        "notebooks_wasm", "--notebooks-wasm", "-nw", help="Directory containing marimo notebooks"
-    ),
-    sandbox: bool = typer.Option(True, "--sandbox/--no-sandbox", help="Whether to run the notebook in a sandbox"),
-    bin_path: str | None = typer.Option(None, "--bin-path", "-b", help="The directory where the executable is located"),
-    parallel: bool = typer.Option(True, "--parallel/--no-parallel", help="Whether to export notebooks in parallel"),
-    max_workers: int = typer.Option(4, "--max-workers", "-w", help="Maximum number of parallel workers (1-16)"),
-    timeout: int = typer.Option(300, "--timeout", help="Timeout in seconds for each notebook export"),
-    debug: bool = typer.Option(False, "--debug", "-d", help="Enable debug mode with verbose logging"),
+    output: _OutputOption = "_site",
+    template: _TemplateOption = _DEFAULT_TEMPLATE,
+    notebooks: _NotebooksOption = "notebooks",
+    apps: _AppsOption = "apps",
+    notebooks_wasm: _NotebooksWasmOption = "notebooks_wasm",
+    sandbox: _SandboxOption = True,
+    bin_path: _BinPathOption = None,
+    parallel: _ParallelOption = True,
+    max_workers: _MaxWorkersOption = 4,
+    timeout: _TimeoutOption = 300,
+    cache_dir: _CacheDirOption = None,
+    incremental: _IncrementalOption = False,
+    estimated_duration: _EstimatedDurationOption = 30.0,
+    engine: _EngineOption = "threads",
+    worker_max_jobs: _WorkerMaxJobsOption = 50,
+    worker_max_memory: _WorkerMaxMemoryOption = 1024,
+    shared_envs: _SharedEnvsOption = False,
+    env_cache_size: _EnvCacheSizeOption = 5120,
+    prefetch: _PrefetchOption = False,
+    index_url: _IndexUrlOption = None,
+    find_links: _FindLinksOption = None,
+    offline: _OfflineOption = False,
+    marimo_version: _MarimoVersionOption = None,
+    page_size: _PageSizeOption = 0,
+    search: _SearchOption = False,
+    recursive: _RecursiveOption = False,
+    include: _IncludeOption = None,
+    exclude: _ExcludeOption = None,
+    since: _SinceOption = None,
+    debug: _DebugOption = False,
 ) -> None:
     """Export marimo notebooks and build an HTML index page linking to them.
 
@@ -130,70 +314,72 @@ def export_command(
         # Use custom template
         $ marimushka export -t my_template.html.j2
 
+        # Skip notebooks that have not changed since the last build
+        $ marimushka export --cache-dir .marimushka-cache
+
+        # Only re-export notebooks changed since the previous build in the output directory
+        $ marimushka export --incremental
+
+        # Schedule slow notebooks first; unseen notebooks are assumed to take 60s
+        $ marimushka export --cache-dir .marimushka-cache --estimated-duration 60
+
+        # Run exports as asyncio subprocesses instead of worker threads
+        $ marimushka export --engine asyncio --max-workers 32
+
+        # Export in persistent marimo workers, replaced after 100 exports
+        $ marimushka export --no-sandbox --engine workers --worker-max-jobs 100
+
+        # Reuse one sandbox environment per distinct set of PEP 723 dependencies
+        $ marimushka export --cache-dir .marimushka-cache --shared-envs
+
+        # Install all environments up front from a local wheelhouse, without network access
+        $ marimushka export --cache-dir .marimushka-cache --prefetch --find-links wheels --offline
+
+        # Export every notebook with one pinned marimo release instead of uvx's latest
+        $ marimushka export --cache-dir .marimushka-cache --marimo-version 0.18.4
+
+        # Split the index into pages of 100 notebooks per kind
+        $ marimushka export --page-size 100
+
+        # Add a search box backed by a prebuilt search index
+        $ marimushka export --search
+
+        # Export notebooks in subdirectories too, mirroring the source tree, except drafts
+        $ marimushka export --recursive --exclude drafts
+
+        # Preview a pull request: only export what changed since the target branch
+        $ marimushka export --since origin/main
+
         # Enable debug mode for troubleshooting
         $ marimushka export --debug
 
     """
+    options = _build_options(locals())
     # Configure logging based on debug flag
     configure_logging(debug=debug)
 
     from .export import main
 
-    main(
-        output=output,
-        template=template,
-        notebooks=notebooks,
-        apps=apps,
-        notebooks_wasm=notebooks_wasm,
-        sandbox=sandbox,
-        bin_path=bin_path,
-        parallel=parallel,
-        max_workers=max_workers,
-        timeout=timeout,
-    )
+    main(**options, since=since, return_html=False)
 
 
-@app.command(name="watch")
-def watch_command(
-    output: str = typer.Option("_site", "--output", "-o", help="Directory where the exported files will be saved"),
-    template: str = typer.Option(
-        str(Path(__file__).parent / "templates" / "tailwind.html.j2"),
-        "--template",
-        "-t",
-        help="Path to the template file",
-    ),
-    notebooks: str = typer.Option("notebooks", "--notebooks", "-n", help="Directory containing marimo notebooks"),
-    apps: str = typer.Option("apps", "--apps", "-a", help="Directory containing marimo apps"),
-    notebooks_wasm: str = typer.Option(
-        "notebooks_wasm", "--notebooks-wasm", "-nw", help="Directory containing marimo notebooks"
-    ),
-    sandbox: bool = typer.Option(True, "--sandbox/--no-sandbox", help="Whether to run the notebook in a sandbox"),
-    bin_path: str | None = typer.Option(None, "--bin-path", "-b", help="The directory where the executable is located"),
-    parallel: bool = typer.Option(True, "--parallel/--no-parallel", help="Whether to export notebooks in parallel"),
-    max_workers: int = typer.Option(4, "--max-workers", "-w", help="Maximum number of parallel workers (1-16)"),
-    timeout: int = typer.Option(300, "--timeout", help="Timeout in seconds for each notebook export"),
-    debug: bool = typer.Option(False, "--debug", "-d", help="Enable debug mode with verbose logging"),
+def _watch_and_rebuild(
+    options: dict[str, Any], debounce: int, on_initial_export: Callable[[], None] | None = None
 ) -> None:
-    """Watch for changes and automatically re-export notebooks.
-
-    This command watches the notebook directories and template file for changes,
-    automatically re-exporting when files are modified.
+    """Export the site, then rebuild what each batch of changes affects until interrupted.
 
-    Requires the 'watchfiles' package: uv add watchfiles
+    All builds run in one BuildSession, so its caches, pools and template
+    environment stay warm between rebuilds.
 
-    Example usage:
-        # Basic watch mode
-        $ marimushka watch
+    Args:
+        options: Keyword arguments of ``export.main``.
+        debounce: Milliseconds a burst of changes must settle for before a rebuild starts.
+        on_initial_export: Optional callback run once the initial export is written.
 
-        # Watch with custom directories
-        $ marimushka watch -n my_notebooks -a my_apps
+    Raises:
+        typer.Exit: If watchfiles is missing or there is nothing to watch.
 
-        # Watch with debug logging
-        $ marimushka watch --debug
     """
-    # Configure logging based on debug flag
-    configure_logging(debug=debug)
-
     try:
         from watchfiles import watch as watchfiles_watch
     except ImportError:  # pragma: no cover
@@ -201,16 +387,18 @@ def watch_command(
         rich_print("Install it with: [cyan]uv add watchfiles[/cyan]")
         raise typer.Exit(1) from None
 
-    from .export import main
+    from .export import open_session
+    from .notebook import Kind
+    from .watch import RebuildQueue, classify_changes
 
     # Build list of paths to watch
     watch_paths: list[Path] = []
 
-    template_path = Path(template)
+    template_path = Path(options["template"])
     if template_path.exists():
         watch_paths.append(template_path.parent)
 
-    for folder in [notebooks, apps, notebooks_wasm]:
+    for folder in [options["notebooks"], options["apps"], options["notebooks_wasm"]]:
         folder_path = Path(folder)
         if folder_path.exists() and folder_path.is_dir():
             watch_paths.append(folder_path)
@@ -224,48 +412,337 @@ def watch_command(
         rich_print(f"  [cyan]{p}[/cyan]")
     rich_print("\n[dim]Press Ctrl+C to stop[/dim]\n")
 
-    # Initial export
-    rich_print("[bold blue]Running initial export...[/bold blue]")
-    main(
-        output=output,
-        template=template,
+    folders = {Kind.NB: options["notebooks"], Kind.APP: options["apps"], Kind.NB_WASM: options["notebooks_wasm"]}
+
+    with open_session(**options) as session:
+        # Initial export
+        rich_print("[bold blue]Running initial export...[/bold blue]")
+        session.build(return_html=False)
+        rich_print("[bold green]Initial export complete![/bold green]\n")
+        if on_initial_export is not None:
+            on_initial_export()
+
+        # Changes are collected on a watcher thread while rebuilds run here, so a
+        # notebook saved again mid-rebuild cancels its outdated export
+        rebuilds = RebuildQueue()
+        stop = threading.Event()
+
+        def watch_changes() -> None:
+            try:
+                for changes in watchfiles_watch(*watch_paths, debounce=debounce, stop_event=stop):
+                    changed_files = [str(change[1]) for change in changes]
+                    rich_print("\n[bold yellow]Detected changes:[/bold yellow]")
+                    for f in changed_files[:_MAX_CHANGED_FILES_TO_DISPLAY]:
+                        rich_print(f"  [dim]{f}[/dim]")
+                    if len(changed_files) > _MAX_CHANGED_FILES_TO_DISPLAY:
+                        rich_print(f"  [dim]... and {len(changed_files) - _MAX_CHANGED_FILES_TO_DISPLAY} more[/dim]")
+
+                    # Only re-export the notebooks the changes affect
+                    change_set = classify_changes(changes, folders, template_path, options["output"])
+                    if change_set.empty:
+                        rich_print("[dim]No notebooks or templates affected[/dim]")
+                        continue
+                    # Only this thread submits, so the next generation number is known up front
+                    rich_print(f"[dim]Queued generation #{rebuilds.generation + 1}[/dim]")
+                    rebuilds.submit(change_set)
+            except BaseException as e:  # re-raised by the building thread
+                rebuilds.stop(e)
+            else:
+                rebuilds.stop()
+
+        watcher = threading.Thread(target=watch_changes, name="marimushka-watch", daemon=True)
+        watcher.start()
+        try:
+            while (rebuild := rebuilds.get()) is not None:
+                generations = f"#{rebuild.generation}"
+                if rebuild.first_generation < rebuild.generation:
+                    generations = f"#{rebuild.first_generation}-{rebuild.generation}"
+                if rebuild.changes.notebooks:
+                    action = f"Re-exporting {len(rebuild.changes.notebooks)} notebook(s)"
+                else:
+                    action = "Re-rendering index"
+                rich_print(f"[bold blue]Rebuild {generations}: {action}...[/bold blue]")
+                try:
+                    session.build(changes=rebuild.changes, cancellation=rebuild.cancellation, return_html=False)
+                finally:
+                    rebuilds.done(rebuild)
+                if rebuilds.generation > rebuild.generation:
+                    pending = f"[dim](#{rebuilds.generation} pending)[/dim]"
+                    rich_print(f"[bold green]Rebuild #{rebuild.generation} complete[/bold green] {pending}")
+                else:
+                    rich_print(f"[bold green]Rebuild #{rebuild.generation} complete![/bold green]")
+        except KeyboardInterrupt:
+            rich_print("\n[bold green]Watch mode stopped.[/bold green]")
+        finally:
+            stop.set()
+            rebuilds.cancel()
+
+
+@app.command(name="watch")
+def watch_command(
+    output: _OutputOption = "_site",
+    template: _TemplateOption = _DEFAULT_TEMPLATE,
+    notebooks: _NotebooksOption = "notebooks",
+    apps: _AppsOption = "apps",
+    notebooks_wasm: _NotebooksWasmOption = "notebooks_wasm",
+    sandbox: _SandboxOption = True,
+    bin_path: _BinPathOption = None,
+    parallel: _ParallelOption = True,
+    max_workers: _MaxWorkersOption = 4,
+    timeout: _TimeoutOption = 300,
+    cache_dir: _CacheDirOption = None,
+    incremental: _IncrementalOption = False,
+    estimated_duration: _EstimatedDurationOption = 30.0,
+    engine: _EngineOption = "threads",
+    worker_max_jobs: _WorkerMaxJobsOption = 50,
+    worker_max_memory: _WorkerMaxMemoryOption = 1024,
+    shared_envs: _SharedEnvsOption = False,
+    env_cache_size: _EnvCacheSizeOption = 5120,
+    prefetch: _PrefetchOption = False,
+    index_url: _IndexUrlOption = None,
+    find_links: _FindLinksOption = None,
+    offline: _OfflineOption = False,
+    marimo_version: _MarimoVersionOption = None,
+    page_size: _PageSizeOption = 0,
+    search: _SearchOption = False,
+    recursive: _RecursiveOption = False,
+    include: _IncludeOption = None,
+    exclude: _ExcludeOption = None,
+    debounce: _DebounceOption = 1600,
+    debug: _DebugOption = False,
+) -> None:
+    """Watch for changes and automatically re-export notebooks.
+
+    This command watches the notebook directories and template file for changes,
+    automatically re-exporting when files are modified. Only the notebooks that
+    changed are exported again; the index page is re-rendered when the template
+    changes or notebooks are added or removed.
+
+    Every batch of changes is a new rebuild generation. Changes arriving during a
+    rebuild are coalesced into the next one, and exports of notebooks that changed
+    again are cancelled.
+
+    Requires the 'watchfiles' package: uv add watchfiles
+
+    Example usage:
+        # Basic watch mode
+        $ marimushka watch
+
+        # Watch with custom directories
+        $ marimushka watch -n my_notebooks -a my_apps
+
+        # Watch with debug logging
+        $ marimushka watch --debug
+
+        # Wait for 3 seconds of quiet before rebuilding
+        $ marimushka watch --debounce 3000
+    """
+    options = _build_options(locals())
+    # Configure logging based on debug flag
+    configure_logging(debug=debug)
+
+    _watch_and_rebuild(options, debounce)
+
+
+@app.command(name="serve")
+def serve_command(
+    output: _OutputOption = "_site",
+    template: _TemplateOption = _DEFAULT_TEMPLATE,
+    notebooks: _NotebooksOption = "notebooks",
+    apps: _AppsOption = "apps",
+    notebooks_wasm: _NotebooksWasmOption = "notebooks_wasm",
+    sandbox: _SandboxOption = True,
+    bin_path: _BinPathOption = None,
+    parallel: _ParallelOption = True,
+    max_workers: _MaxWorkersOption = 4,
+    timeout: _TimeoutOption = 300,
+    cache_dir: _CacheDirOption = None,
+    incremental: _IncrementalOption = False,
+    estimated_duration: _EstimatedDurationOption = 30.0,
+    engine: _EngineOption = "threads",
+    worker_max_jobs: _WorkerMaxJobsOption = 50,
+    worker_max_memory: _WorkerMaxMemoryOption = 1024,
+    shared_envs: _SharedEnvsOption = False,
+    env_cache_size: _EnvCacheSizeOption = 5120,
+    prefetch: _PrefetchOption = False,
+    index_url: _IndexUrlOption = None,
+    find_links: _FindLinksOption = None,
+    offline: _OfflineOption = False,
+    marimo_version: _MarimoVersionOption = None,
+    page_size: _PageSizeOption = 0,
+    search: _SearchOption = False,
+    recursive: _RecursiveOption = False,
+    include: _IncludeOption = None,
+    exclude: _ExcludeOption = None,
+    debounce: _DebounceOption = 1600,
+    host: str = typer.Option("127.0.0.1", "--host", help="Interface the development server listens on"),
+    port: int = typer.Option(8000, "--port", "-p", help="Port the development server listens on"),
+    debug: _DebugOption = False,
+) -> None:
+    """Serve the exported site with live reload while watching for changes.
+
+    This command runs watch mode and serves the output directory over HTTP.
+    Open pages are notified over server-sent events as soon as their HTML is
+    rewritten, and only the page of a changed notebook reloads.
+
+    Requires the 'watchfiles' package: uv add watchfiles
+
+    Example usage:
+        # Serve on http://127.0.0.1:8000
+        $ marimushka serve
+
+        # Serve on all interfaces on another port
+        $ marimushka serve --host 0.0.0.0 --port 9000
+    """
+    options = _build_options(locals())
+    # Configure logging based on debug flag
+    configure_logging(debug=debug)
+
+    from .serve import ReloadBroker, create_server, watch_pages
+
+    broker = ReloadBroker()
+    stop = threading.Event()
+    servers = []
+
+    def start_server() -> None:
+        try:
+            server = create_server(Path(output), broker, host=host, port=port)
+        except OSError as e:
+            rich_print(f"[bold red]Error:[/bold red] Cannot listen on {host}:{port}: {e}")
+            raise typer.Exit(1) from None
+        servers.append(server)
+        threading.Thread(target=server.serve_forever, name="marimushka-serve", daemon=True).start()
+        threading.Thread(
+            target=watch_pages, args=(Path(output), broker, stop), name="marimushka-reload", daemon=True
+        ).start()
+        server_host, server_port = server.server_address[:2]
+        rich_print(f"[bold green]Serving {output} at[/bold green] [cyan]http://{server_host}:{server_port}/[/cyan]\n")
+
+    try:
+        _watch_and_rebuild(options, debounce, on_initial_export=start_server)
+    finally:
+        stop.set()
+        broker.close()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+@app.command(name="daemon")
+def daemon_command(
+    socket_path: str | None = typer.Option(
+        None,
+        "--socket",
+        help="Unix domain socket to listen on (default: daemon.sock in a private directory under "
+        "$XDG_RUNTIME_DIR or the temp directory)",
+    ),
+    bin_path: _BinPathOption = None,
+    index_url: _IndexUrlOption = None,
+    find_links: _FindLinksOption = None,
+    debug: _DebugOption = False,
+) -> None:
+    """Run a build daemon that accepts build requests on a Unix domain socket.
+
+    The daemon keeps one warm process, including the persistent workers of
+    engine "workers", and runs each request with the options of `export`.
+    Requests and replies are JSON lines; see marimushka.daemon for the protocol.
+    The options choosing what builds execute (--bin-path, --index-url and
+    --find-links) are set here and refused in requests.
+
+    Example usage:
+        # Start the daemon
+        $ marimushka daemon --socket /run/mm.sock
+
+        # Request a build
+        $ echo '{"command": "build", "options": {"output": "/srv/_site"}}' | socat - UNIX-CONNECT:/run/mm.sock
+    """
+    configure_logging(debug=debug)
+
+    from .daemon import DEFAULT_SOCKET, BuildDaemon
+
+    daemon = BuildDaemon(
+        Path(socket_path) if socket_path else DEFAULT_SOCKET,
+        bin_path=bin_path,
+        index_url=index_url,
+        find_links=find_links,
+    )
+    rich_print(f"[bold green]Build daemon listening on[/bold green] [cyan]{daemon.socket_path}[/cyan]")
+    rich_print("[dim]Press Ctrl+C to stop[/dim]")
+    try:
+        daemon.serve_forever()
+    except OSError as e:
+        rich_print(f"[bold red]Error:[/bold red] {e}")
+        raise typer.Exit(1) from None
+    except KeyboardInterrupt:
+        rich_print("\n[bold green]Build daemon stopped.[/bold green]")
+
+
+@app.command(name="prefetch")
+def prefetch_command(
+    cache_dir: str = typer.Option(..., "--cache-dir", help="Directory of the cache holding the shared environments"),
+    notebooks: _NotebooksOption = "notebooks",
+    apps: _AppsOption = "apps",
+    notebooks_wasm: _NotebooksWasmOption = "notebooks_wasm",
+    bin_path: _BinPathOption = None,
+    max_workers: int = typer.Option(4, "--max-workers", "-w", help="Maximum number of parallel installs (1-16)"),
+    env_cache_size: _EnvCacheSizeOption = 5120,
+    index_url: str | None = typer.Option(None, "--index-url", help="Package index used instead of PyPI, e.g. a mirror"),
+    find_links: str | None = typer.Option(
+        None, "--find-links", help="Wheelhouse directory or URL searched for packages"
+    ),
+    offline: bool = typer.Option(
+        False, "--offline/--no-offline", help="Install from uv's cache and --find-links only, without network access"
+    ),
+    marimo_version: str | None = typer.Option(
+        None, "--marimo-version", help="Exact marimo version to install into the cache as well, e.g. 0.18.4"
+    ),
+    recursive: _RecursiveOption = False,
+    include: _IncludeOption = None,
+    exclude: _ExcludeOption = None,
+    debug: _DebugOption = False,
+) -> None:
+    """Create the shared environments of all notebooks ahead of an export.
+
+    Every distinct set of PEP 723 dependencies is resolved and installed exactly
+    once, with bounded parallelism, into the cache directory. A following
+    `marimushka export --cache-dir ... --shared-envs` reuses the environments,
+    so no export waits for package resolution.
+
+    Example usage:
+        # Warm the environments, e.g. in a cached CI step
+        $ marimushka prefetch --cache-dir .marimushka-cache
+
+        # Install from a local wheelhouse without network access
+        $ marimushka prefetch --cache-dir .marimushka-cache --find-links wheels --offline
+
+    Raises:
+        typer.Exit: With exit code 1 if any environment could not be created.
+
+    """
+    configure_logging(debug=debug)
+
+    from .export import prefetch_environments
+
+    result = prefetch_environments(
+        cache_dir=cache_dir,
         notebooks=notebooks,
         apps=apps,
         notebooks_wasm=notebooks_wasm,
-        sandbox=sandbox,
         bin_path=bin_path,
-        parallel=parallel,
         max_workers=max_workers,
-        timeout=timeout,
+        env_cache_size=env_cache_size,
+        index_url=index_url,
+        find_links=find_links,
+        offline=offline,
+        marimo_version=marimo_version,
+        recursive=recursive,
+        include=include,
+        exclude=exclude,
     )
-    rich_print("[bold green]Initial export complete![/bold green]\n")
-
-    # Watch for changes (interactive loop - excluded from coverage)
-    try:
-        for changes in watchfiles_watch(*watch_paths):  # pragma: no cover
-            changed_files = [str(change[1]) for change in changes]
-            rich_print("\n[bold yellow]Detected changes:[/bold yellow]")
-            for f in changed_files[:_MAX_CHANGED_FILES_TO_DISPLAY]:
-                rich_print(f"  [dim]{f}[/dim]")
-            if len(changed_files) > _MAX_CHANGED_FILES_TO_DISPLAY:
-                rich_print(f"  [dim]... and {len(changed_files) - _MAX_CHANGED_FILES_TO_DISPLAY} more[/dim]")
-
-            rich_print("[bold blue]Re-exporting...[/bold blue]")
-            main(
-                output=output,
-                template=template,
-                notebooks=notebooks,
-                apps=apps,
-                notebooks_wasm=notebooks_wasm,
-                sandbox=sandbox,
-                bin_path=bin_path,
-                parallel=parallel,
-                max_workers=max_workers,
-                timeout=timeout,
-            )
-            rich_print("[bold green]Export complete![/bold green]")
-    except KeyboardInterrupt:
-        rich_print("\n[bold green]Watch mode stopped.[/bold green]")
+    if result.failures:
+        rich_print(f"[bold red]Error:[/bold red] {len(result.failures)}/{result.environments} environments failed")
+        raise typer.Exit(1)
+    rich_print(f"[bold green]Prepared {result.environments} environments[/bold green]")
 
 
 @app.command(name="version")
@@ -294,6 +771,9 @@ def cli() -> None:
     The CLI supports the following subcommands:
         - export: Export notebooks and generate index page
         - watch: Monitor for changes and auto-export
+        - serve: Serve the site locally, rebuilding and reloading on changes
+        - daemon: Run a warm build daemon on a Unix domain socket
+        - prefetch: Create shared notebook environments ahead of an export
         - version: Display the installed version
 
     Running without a subcommand displays help text.
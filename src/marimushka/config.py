@@ -23,6 +23,20 @@ class MarimushkaConfig:
         parallel: Whether to export notebooks in parallel.
         max_workers: Maximum number of parallel workers.
         timeout: Timeout in seconds for each export.
+        cache_dir: Optional directory of the persistent export cache.
+        estimated_duration: Estimated export time in seconds for notebooks without history.
+        shared_envs: Whether sandboxed notebooks share environments per dependency set.
+        env_cache_size: Size limit in MB of the shared environments.
+        prefetch: Whether to create all shared environments before exporting.
+        index_url: Optional package index used instead of PyPI for shared environments.
+        find_links: Optional wheelhouse directory or URL for shared environments.
+        offline: Whether shared environments are created without network access.
+        marimo_version: Optional exact marimo version used for every export.
+        page_size: Maximum number of notebooks of a kind per index page, 0 for a single page.
+        search: Whether to write a search index of the notebooks next to index.html.
+        recursive: Whether to find notebooks in subdirectories of the folders.
+        include: Optional glob patterns of which notebooks must match at least one.
+        exclude: Optional glob patterns of notebooks and directories to skip.
         audit_log: Optional path to audit log file.
         audit_enabled: Whether audit logging is enabled.
         max_file_size_mb: Maximum file size in MB for templates/notebooks.
@@ -41,6 +55,20 @@ class MarimushkaConfig:
         parallel: bool = True,
         max_workers: int = 4,
         timeout: int = 300,
+        cache_dir: str | None = None,
+        estimated_duration: float = 30.0,
+        shared_envs: bool = False,
+        env_cache_size: int = 5120,
+        prefetch: bool = False,
+        index_url: str | None = None,
+        find_links: str | None = None,
+        offline: bool = False,
+        marimo_version: str | None = None,
+        page_size: int = 0,
+        search: bool = False,
+        recursive: bool = False,
+        include: list[str] | None = None,
+        exclude: list[str] | None = None,
         audit_log: str | None = None,
         audit_enabled: bool = True,
         max_file_size_mb: int = 10,
@@ -58,6 +86,20 @@ class MarimushkaConfig:
             parallel: Use parallel export. Defaults to True.
             max_workers: Max parallel workers. Defaults to 4.
             timeout: Export timeout. Defaults to 300.
+            cache_dir: Export cache directory. Defaults to None (no cache).
+            estimated_duration: Estimate for notebooks without history. Defaults to 30.0.
+            shared_envs: Share environments per dependency set. Defaults to False.
+            env_cache_size: Shared environment size limit in MB. Defaults to 5120.
+            prefetch: Create shared environments before exporting. Defaults to False.
+            index_url: Package index for shared environments. Defaults to None (PyPI).
+            find_links: Wheelhouse for shared environments. Defaults to None.
+            offline: Create shared environments offline. Defaults to False.
+            marimo_version: Pinned marimo version. Defaults to None (latest via uvx).
+            page_size: Notebooks of a kind per index page. Defaults to 0 (no pagination).
+            search: Write a search index. Defaults to False.
+            recursive: Scan subdirectories of the folders. Defaults to False.
+            include: Glob patterns of notebooks to include. Defaults to None (all).
+            exclude: Glob patterns of notebooks and directories to skip. Defaults to None.
             audit_log: Audit log file path. Defaults to None.
             audit_enabled: Enable audit logging. Defaults to True.
             max_file_size_mb: Max file size in MB. Defaults to 10.
@@ -73,6 +115,20 @@ class MarimushkaConfig:
         self.parallel = parallel
         self.max_workers = max_workers
         self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.estimated_duration = estimated_duration
+        self.shared_envs = shared_envs
+        self.env_cache_size = env_cache_size
+        self.prefetch = prefetch
+        self.index_url = index_url
+        self.find_links = find_links
+        self.offline = offline
+        self.marimo_version = marimo_version
+        self.page_size = page_size
+        self.search = search
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
         self.audit_log = audit_log
         self.audit_enabled = audit_enabled
         self.max_file_size_mb = max_file_size_mb
@@ -118,6 +174,20 @@ class MarimushkaConfig:
             parallel=marimushka_config.get("parallel", True),
             max_workers=marimushka_config.get("max_workers", 4),
             timeout=marimushka_config.get("timeout", 300),
+            cache_dir=marimushka_config.get("cache_dir"),
+            estimated_duration=marimushka_config.get("estimated_duration", 30.0),
+            shared_envs=marimushka_config.get("shared_envs", False),
+            env_cache_size=marimushka_config.get("env_cache_size", 5120),
+            prefetch=marimushka_config.get("prefetch", False),
+            index_url=marimushka_config.get("index_url"),
+            find_links=marimushka_config.get("find_links"),
+            offline=marimushka_config.get("offline", False),
+            marimo_version=marimushka_config.get("marimo_version"),
+            page_size=marimushka_config.get("page_size", 0),
+            search=marimushka_config.get("search", False),
+            recursive=marimushka_config.get("recursive", False),
+            include=marimushka_config.get("include"),
+            exclude=marimushka_config.get("exclude"),
             audit_log=security_config.get("audit_log"),
             audit_enabled=security_config.get("audit_enabled", True),
             max_file_size_mb=security_config.get("max_file_size_mb", 10),
@@ -161,6 +231,20 @@ class MarimushkaConfig:
             "parallel": self.parallel,
             "max_workers": self.max_workers,
             "timeout": self.timeout,
+            "cache_dir": self.cache_dir,
+            "estimated_duration": self.estimated_duration,
+            "shared_envs": self.shared_envs,
+            "env_cache_size": self.env_cache_size,
+            "prefetch": self.prefetch,
+            "index_url": self.index_url,
+            "find_links": self.find_links,
+            "offline": self.offline,
+            "marimo_version": self.marimo_version,
+            "page_size": self.page_size,
+            "search": self.search,
+            "recursive": self.recursive,
+            "include": self.include,
+            "exclude": self.exclude,
             "security": {
                 "audit_log": self.audit_log,
                 "audit_enabled": self.audit_enabled,
@@ -0,0 +1,414 @@
+"""Long-running build daemon with a local socket API.
+
+Every ``marimushka export`` pays Python startup, the imports of typer, rich,
+jinja2 and loguru and the marimo version lookup before the first notebook is
+exported. ``marimushka daemon`` pays them once: it listens on a Unix domain
+socket and runs build requests in the same warm process, keeping the
+persistent marimo workers of ``engine="workers"`` alive between builds.
+
+Protocol: a client sends one JSON object per line and receives JSON lines.
+
+- ``{"command": "ping"}`` is answered with ``{"event": "pong", ...}``.
+- ``{"command": "build", "options": {...}, "cwd": "..."}`` runs a build with
+  the keyword arguments of ``export.main``; relative paths in the options are
+  resolved against ``cwd``. The daemon answers ``started`` (or ``queued`` while another
+  build runs), one ``progress`` event per notebook and finally ``result`` with
+  the BatchExportResult, or ``error``.
+- ``{"command": "shutdown"}`` stops the daemon after running builds finish.
+
+The socket is created with mode 0600, by default in a directory only the
+current user can access. Options that choose what a build executes
+(``bin_path``, ``index_url`` and ``find_links``) are only taken from the
+daemon's own configuration, never from requests.
+
+Example::
+
+    from marimushka.daemon import DEFAULT_SOCKET, send_request
+
+    for event in send_request(DEFAULT_SOCKET, {"command": "build", "options": {"output": "_site"}}):
+        print(event)
+"""
+
+import contextlib
+import getpass
+import inspect
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, cast
+
+from loguru import logger
+
+from . import __version__
+from .exceptions import BatchExportResult
+from .export import BuildSession, main, open_session
+from .security import sanitize_error_message, validate_max_workers
+from .worker import WorkerPool
+
+
+def _default_socket() -> Path:
+    """Return the default socket path, inside a directory private to the current user."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "marimushka" / "daemon.sock"
+    return Path(tempfile.gettempdir()) / f"marimushka-{getpass.getuser()}" / "daemon.sock"
+
+
+# Default socket path of the daemon
+DEFAULT_SOCKET = _default_socket()
+
+# Options of export.main that the daemon sets itself instead of the client
+_RESERVED_OPTIONS = frozenset({"on_progress", "changes", "cancellation", "worker_pool", "on_complete", "return_html"})
+
+# Options of export.main that choose the executables and packages a build runs;
+# only the daemon's own configuration sets them
+DAEMON_OPTIONS = frozenset({"bin_path", "index_url", "find_links"})
+
+# Default of every option of export.main
+_DEFAULTS = {name: parameter.default for name, parameter in inspect.signature(main).parameters.items()}
+
+# Options of export.main that a build request may set
+BUILD_OPTIONS = frozenset(_DEFAULTS) - _RESERVED_OPTIONS - DAEMON_OPTIONS
+
+# Options of export.main passed to BuildSession.build() instead of opening the session
+_PER_BUILD_OPTIONS = frozenset({"since"})
+
+# Maximum number of build sessions kept open; the least recently used one is closed beyond it
+MAX_SESSIONS = 8
+
+# Options holding paths, resolved against the request's working directory
+_PATH_OPTIONS = ("output", "template", "notebooks", "apps", "notebooks_wasm", "cache_dir")
+
+Event = dict[str, Any]
+
+
+def resolve_build_options(options: dict[str, Any], cwd: str | Path | None = None) -> dict[str, Any]:
+    """Validate the options of a build request.
+
+    Args:
+        options: Keyword arguments of ``export.main`` sent by the client.
+        cwd: Working directory of the client. Relative paths are resolved
+            against it. Defaults to None (the daemon's working directory).
+
+    Returns:
+        The options with relative paths made absolute.
+
+    Raises:
+        ValueError: If an option is not an argument of ``export.main``, or
+            is one of DAEMON_OPTIONS.
+
+    """
+    restricted = set(options) & DAEMON_OPTIONS
+    if restricted:
+        raise ValueError(f"Option(s) only accepted when starting the daemon: {', '.join(sorted(restricted))}")  # noqa: TRY003
+    unknown = set(options) - BUILD_OPTIONS
+    if unknown:
+        raise ValueError(f"Unknown build option(s): {', '.join(sorted(unknown))}")  # noqa: TRY003
+
+    resolved = dict(options)
+    if cwd is not None:
+        for name in _PATH_OPTIONS:
+            if resolved.get(name):
+                resolved[name] = str(Path(cwd) / resolved[name])
+    return resolved
+
+
+def _ensure_private_directory(directory: Path) -> None:
+    """Create the socket directory with mode 0700, or check that an existing one is private.
+
+    Raises:
+        OSError: If the directory is a symlink, belongs to another user or is
+            accessible to other users.
+
+    """
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    status = directory.lstat()
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or status.st_mode & 0o077:
+        raise OSError(f"Socket directory {directory} must be owned by the current user with mode 0700")  # noqa: TRY003
+
+
+class BuildDaemon:
+    """Runs build requests from a Unix domain socket in one warm process.
+
+    Builds run one at a time; further requests wait for the running build.
+    Each configuration, i.e. the build options apart from ``since``, gets a
+    BuildSession that later builds with the same configuration reuse, keeping
+    its caches, history and template environment warm. Worker pools of
+    ``engine="workers"`` builds are kept per pool size and limits and shared
+    between sessions, so later builds reuse their warm marimo processes.
+
+    Attributes:
+        socket_path: Path of the Unix domain socket.
+        options: The DAEMON_OPTIONS applied to every build.
+        builds: Number of builds started so far.
+
+    """
+
+    def __init__(
+        self,
+        socket_path: Path = DEFAULT_SOCKET,
+        bin_path: str | Path | None = None,
+        index_url: str | None = None,
+        find_links: str | None = None,
+    ) -> None:
+        """Initialize the daemon without listening yet.
+
+        Args:
+            socket_path: Path of the Unix domain socket. Defaults to DEFAULT_SOCKET.
+            bin_path: Directory of the uvx and uv executables. Defaults to None (search PATH).
+            index_url: Package index of shared environments. Defaults to None (PyPI).
+            find_links: Wheelhouse of shared environments. Defaults to None.
+
+        """
+        self.socket_path = Path(socket_path)
+        self.options: dict[str, Any] = {
+            "bin_path": str(bin_path) if bin_path else None,
+            "index_url": index_url,
+            "find_links": find_links,
+        }
+        self.builds = 0
+        self._build_lock = threading.Lock()
+        self._pools: dict[tuple[int, int, int], WorkerPool] = {}
+        self._sessions: OrderedDict[str, BuildSession] = OrderedDict()
+        self._server: _DaemonServer | None = None
+
+    def serve_forever(self, ready: threading.Event | None = None) -> None:
+        """Listen on the socket and handle requests until ``shutdown()``.
+
+        Args:
+            ready: Optional event set once the socket accepts connections.
+
+        Raises:
+            OSError: If another daemon is listening on the socket, or the
+                directory of the default socket is not private.
+
+        """
+        if self.socket_path.parent == DEFAULT_SOCKET.parent:
+            _ensure_private_directory(self.socket_path.parent)
+        self._remove_stale_socket()
+        # Bind under a restrictive umask so the socket never exists with wider permissions than 0600
+        umask = os.umask(0o177)
+        try:
+            server = _DaemonServer(self.socket_path, self)
+        finally:
+            os.umask(umask)
+        self._server = server
+        logger.info(f"Build daemon listening on {self.socket_path}")
+        if ready is not None:
+            ready.set()
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            self.close()
+
+    def shutdown(self) -> None:
+        """Stop ``serve_forever()`` from another thread."""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self) -> None:
+        """Close the build sessions and worker pools and remove the socket file."""
+        with self._build_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()
+
+    def handle(self, request: dict[str, Any], send: Callable[[Event], None]) -> None:
+        """Answer one request.
+
+        Args:
+            request: The decoded request line.
+            send: Callback that writes one event to the client.
+
+        """
+        command = request.get("command")
+        if command == "ping":
+            send({"event": "pong", "version": __version__, "builds": self.builds})
+        elif command == "build":
+            self.build(request.get("options") or {}, send, cwd=request.get("cwd"))
+        elif command == "shutdown":
+            send({"event": "stopping"})
+            threading.Thread(target=self.shutdown, daemon=True).start()
+        else:
+            send({"event": "error", "error": "ValueError", "message": f"Unknown command: {command!r}"})
+
+    def build(
+        self, options: dict[str, Any], send: Callable[[Event], None], cwd: str | Path | None = None
+    ) -> BatchExportResult | None:
+        """Run one build and stream its progress and result.
+
+        Args:
+            options: Keyword arguments of ``export.main``.
+            send: Callback that writes one event to the client.
+            cwd: Working directory of the client. Defaults to None.
+
+        Returns:
+            The batch result, or None if the build failed or found no notebooks.
+
+        """
+        try:
+            options = resolve_build_options(options, cwd)
+        except ValueError as e:
+            send({"event": "error", "error": "ValueError", "message": str(e)})
+            return None
+
+        if not self._build_lock.acquire(blocking=False):
+            send({"event": "queued"})
+            self._build_lock.acquire()
+        try:
+            self.builds += 1
+            build = self.builds
+            send({"event": "started", "build": build})
+
+            def on_progress(completed: int, total: int, name: str) -> None:
+                send({"event": "progress", "build": build, "completed": completed, "total": total, "notebook": name})
+
+            results: list[BatchExportResult] = []
+            try:
+                self._session(options).build(
+                    since=options.get("since"), on_complete=results.append, return_html=False, on_progress=on_progress
+                )
+            except Exception as e:
+                logger.error(f"Build {build} failed: {e}")
+                send(
+                    {
+                        "event": "error",
+                        "build": build,
+                        "error": type(e).__name__,
+                        "message": sanitize_error_message(str(e)),
+                    }
+                )
+                return None
+
+            result = results[0] if results else None
+            send({"event": "result", "build": build, "result": result.to_dict() if result else None})
+            return result
+        finally:
+            self._build_lock.release()
+
+    def _session(self, options: dict[str, Any]) -> BuildSession:
+        """Return the build session of a configuration, opening it on first use."""
+        options = {**_DEFAULTS, **options}
+        settings = {name: options[name] for name in BUILD_OPTIONS - _PER_BUILD_OPTIONS}
+        key = json.dumps(settings, sort_keys=True, default=str)
+        if key in self._sessions:
+            self._sessions.move_to_end(key)
+            return self._sessions[key]
+        session = open_session(**settings, **self.options, worker_pool=self._worker_pool(options))
+        self._sessions[key] = session
+        if len(self._sessions) > MAX_SESSIONS:
+            _, oldest = self._sessions.popitem(last=False)
+            oldest.close()
+        return session
+
+    def _worker_pool(self, options: dict[str, Any]) -> WorkerPool | None:
+        """Return the warm worker pool of a workers-engine build, creating it on first use."""
+        if options.get("engine") != "workers":
+            return None
+        options = {**_DEFAULTS, **options}
+        size = validate_max_workers(options["max_workers"]) if options["parallel"] else 1
+        max_jobs, max_memory = options["worker_max_jobs"], options["worker_max_memory"]
+        key = (size, max_jobs, max_memory)
+        if key not in self._pools:
+            self._pools[key] = WorkerPool(size, max_jobs=max_jobs, max_memory_mb=max_memory)
+        return self._pools[key]
+
+    def _remove_stale_socket(self) -> None:
+        """Remove a socket file left behind by a daemon that is no longer running."""
+        if not self.socket_path.exists():
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                self.socket_path.unlink()
+                return
+        raise OSError(f"A daemon is already listening on {self.socket_path}")  # noqa: TRY003
+
+
+class _DaemonServer(socketserver.ThreadingUnixStreamServer):
+    """Unix domain socket server that passes requests to its BuildDaemon."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, build_daemon: BuildDaemon) -> None:
+        """Bind the socket.
+
+        Args:
+            socket_path: Path of the Unix domain socket.
+            build_daemon: The daemon answering the requests.
+
+        """
+        self.build_daemon = build_daemon
+        super().__init__(str(socket_path), _RequestHandler)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads request lines from a connection and writes the daemon's events."""
+
+    def handle(self) -> None:
+        """Answer every request line until the client closes the connection."""
+        build_daemon = cast(_DaemonServer, self.server).build_daemon
+        lock = threading.Lock()
+        connected = True
+
+        def send(event: Event) -> None:
+            nonlocal connected
+            with lock:
+                if not connected:
+                    return
+                try:
+                    self.wfile.write(json.dumps(event).encode() + b"\n")
+                    self.wfile.flush()
+                except OSError:
+                    # The build goes on; its result is still recorded in the output directory
+                    logger.debug("Daemon client disconnected")
+                    connected = False
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                send({"event": "error", "error": "JSONDecodeError", "message": str(e)})
+                continue
+            if not isinstance(request, dict):
+                send({"event": "error", "error": "ValueError", "message": "Requests must be JSON objects"})
+                continue
+            build_daemon.handle(request, send)
+
+
+def send_request(socket_path: str | Path, request: dict[str, Any], timeout: float | None = None) -> Iterator[Event]:
+    """Send one request to a daemon and yield its events.
+
+    Args:
+        socket_path: Path of the daemon's Unix domain socket.
+        request: The request, e.g. ``{"command": "build", "options": {...}}``.
+        timeout: Optional socket timeout in seconds. Defaults to None (no limit).
+
+    Yields:
+        The decoded events, until the daemon has answered the request.
+
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode() + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as stream:
+            for line in stream:
+                yield json.loads(line)
@@ -0,0 +1,227 @@
+"""Notebook discovery in nested folders.
+
+A folder is walked once with ``os.scandir``. Entry types come from the
+directory listing itself, so discovering a file costs no extra ``stat`` call
+(symbolic links aside), and notebooks are created without re-checking that
+their files exist.
+
+Which ``.py`` files are notebooks is decided by, in this order:
+
+- hidden directories and ``__pycache__``, ``__marimo__`` and ``public``
+  directories are never entered,
+- ``.marimushkaignore`` files: one glob pattern per line, applying to the
+  directory of the file and everything below it (see IgnoreRule),
+- exclude patterns, which also prune directories,
+- include patterns: if given, a file must match at least one of them.
+
+Patterns without a ``/`` match the name of a file or directory at any depth;
+patterns with a ``/`` match the path relative to the folder (or to the
+directory of the ignore file). ``*`` also matches ``/``, so ``team_a/*``
+matches everything below ``team_a``.
+
+Example::
+
+    from marimushka.discovery import scan_folder
+
+    for relative in scan_folder("notebooks", recursive=True, exclude=["drafts"]):
+        print(relative)
+"""
+
+import os
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+from loguru import logger
+
+# Name of the per-directory ignore file
+IGNORE_FILENAME = ".marimushkaignore"
+
+# Directory of data files next to the notebooks of a folder
+PUBLIC_DIRNAME = "public"
+
+# Directories that never contain notebooks
+SKIPPED_DIRECTORIES = frozenset({"__pycache__", "__marimo__", PUBLIC_DIRNAME})
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """One pattern of an ignore file, or an include or exclude pattern.
+
+    Lines of ``.marimushkaignore`` follow a subset of ``.gitignore``: empty
+    lines and lines starting with ``#`` are skipped, a leading ``!``
+    re-includes what earlier patterns ignored, and a trailing ``/`` only
+    matches directories. The last matching pattern wins.
+
+    Attributes:
+        pattern: The glob pattern, without ``!`` and trailing ``/``.
+        base: Path of the ignore file's directory relative to the scanned
+            folder, "" for the folder itself.
+        negate: Whether the pattern re-includes matching paths.
+        directory_only: Whether the pattern only matches directories.
+        anchored: Whether the pattern matches the relative path rather than
+            the name; true for patterns containing a ``/``.
+
+    """
+
+    pattern: str
+    base: str = ""
+    negate: bool = False
+    directory_only: bool = False
+    anchored: bool = False
+
+    @classmethod
+    def parse(cls, line: str, base: str = "") -> "IgnoreRule | None":
+        """Parse a line of an ignore file.
+
+        Args:
+            line: The line.
+            base: Path of the ignore file's directory relative to the scanned folder.
+
+        Returns:
+            The rule, or None for empty lines and comments.
+
+        """
+        line = line.strip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        line = line.removeprefix("!")
+        directory_only = line.endswith("/")
+        anchored = "/" in line.rstrip("/")
+        pattern = line.strip("/")
+        if not pattern:
+            return None
+        return cls(pattern, base, negate, directory_only, anchored)
+
+    def matches(self, relative: str, is_dir: bool) -> bool:
+        """Check whether the rule matches a path.
+
+        Args:
+            relative: POSIX path relative to the scanned folder.
+            is_dir: Whether the path is a directory.
+
+        Returns:
+            True if the pattern matches the path.
+
+        """
+        if self.directory_only and not is_dir:
+            return False
+        if self.base:
+            if not relative.startswith(self.base + "/"):
+                return False
+            relative = relative[len(self.base) + 1 :]
+        if self.anchored:
+            return fnmatchcase(relative, self.pattern)
+        return fnmatchcase(relative.rpartition("/")[2], self.pattern)
+
+
+def parse_patterns(patterns: Iterable[str] | None, base: str = "") -> tuple[IgnoreRule, ...]:
+    """Parse glob patterns, e.g. the lines of an ignore file.
+
+    Args:
+        patterns: The patterns. Defaults to None (no patterns).
+        base: Path the patterns are relative to, see IgnoreRule.
+
+    Returns:
+        The rules of the patterns that are not empty or comments.
+
+    """
+    rules = (IgnoreRule.parse(pattern, base) for pattern in patterns or ())
+    return tuple(rule for rule in rules if rule is not None)
+
+
+def is_ignored(rules: Sequence[IgnoreRule], relative: str, is_dir: bool) -> bool:
+    """Check whether the last matching rule ignores a path.
+
+    Args:
+        rules: Rules in the order they were read.
+        relative: POSIX path relative to the scanned folder.
+        is_dir: Whether the path is a directory.
+
+    Returns:
+        True if the path is ignored.
+
+    """
+    for rule in reversed(rules):
+        if rule.matches(relative, is_dir):
+            return not rule.negate
+    return False
+
+
+def _read_ignore_file(path: str, base: str) -> tuple[IgnoreRule, ...]:
+    """Return the rules of an ignore file; unreadable files are skipped with a warning."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return parse_patterns(f, base)
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning(f"Ignoring unreadable {path}: {e}")
+        return ()
+
+
+def scan_folder(
+    folder: Path | str,
+    recursive: bool = False,
+    include: Sequence[str] | None = None,
+    exclude: Sequence[str] | None = None,
+) -> list[Path]:
+    """Find the notebook sources of a folder.
+
+    Args:
+        folder: The folder to scan. A missing folder has no notebooks.
+        recursive: Whether to scan subdirectories. Defaults to False.
+        include: Glob patterns of which files must match at least one.
+            Defaults to None (every ``.py`` file).
+        exclude: Glob patterns of files and directories to skip. Defaults to None.
+
+    Returns:
+        Paths of the ``.py`` files relative to the folder, sorted.
+
+    """
+    includes = parse_patterns(include)
+    excludes = parse_patterns(exclude)
+    found: list[Path] = []
+    # Directories still to scan: path, path relative to the folder and the ignore rules in effect
+    pending: list[tuple[str, str, tuple[IgnoreRule, ...]]] = [(os.fspath(folder), "", ())]
+    while pending:
+        directory, relative_dir, rules = pending.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            logger.warning(f"Cannot scan {directory} for notebooks: {e}")
+            continue
+
+        ignore_file = next((entry for entry in entries if entry.name == IGNORE_FILENAME), None)
+        if ignore_file is not None:
+            rules = rules + _read_ignore_file(ignore_file.path, relative_dir)
+
+        for entry in entries:
+            name = entry.name
+            relative = f"{relative_dir}/{name}" if relative_dir else name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if (
+                        recursive
+                        and not name.startswith(".")
+                        and name not in SKIPPED_DIRECTORIES
+                        and not is_ignored(rules, relative, True)
+                        and not is_ignored(excludes, relative, True)
+                    ):
+                        pending.append((entry.path, relative, rules))
+                    continue
+                if not name.endswith(".py") or not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if is_ignored(rules, relative, False) or is_ignored(excludes, relative, False):
+                continue
+            if includes and not any(rule.matches(relative, False) for rule in includes):
+                continue
+            found.append(Path(relative))
+
+    found.sort()
+    return found
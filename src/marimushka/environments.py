@@ -0,0 +1,547 @@
+"""Shared sandbox environments keyed by PEP 723 dependency sets.
+
+``marimo export --sandbox`` resolves and installs a fresh environment for every
+notebook, even when dozens of notebooks declare identical inline script
+metadata. This module parses each notebook's ``# /// script`` block, normalizes
+its dependencies into a DependencySet and lets an EnvironmentPool create one
+virtual environment per distinct set. Environments live in a directory that
+persists across builds (``<cache-dir>/envs``) and are evicted least recently
+used first once they exceed a size limit on disk.
+EnvironmentPool.prefetch creates the environments of many notebooks up front,
+each distinct dependency set once, so that no export waits for uv.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.environments import EnvironmentPool, dependency_set
+    from marimushka.notebook import Notebook
+
+    pool = EnvironmentPool(Path(".marimushka-cache/envs"))
+    notebook = Notebook(Path("notebooks/penguins.py"))
+    python = pool.ensure(dependency_set(notebook))
+    # marimo can now export the notebook with ``python -m marimo export ... --no-sandbox``
+"""
+
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess  # nosec B404
+import threading
+import time
+import tomllib
+from collections import Counter
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from .exceptions import ExportEnvironmentError
+from .process import ProcessTreeTimeoutExpired, run_process_tree
+
+if TYPE_CHECKING:
+    from .notebook import Notebook
+
+# Default size limit in megabytes of all shared environments together
+DEFAULT_MAX_ENV_CACHE_MB = 5120
+
+# Maximum time in seconds to create a single environment
+DEFAULT_ENV_TIMEOUT = 600
+
+# Name of the environment directory inside the cache directory
+ENVS_DIRNAME = "envs"
+
+# File inside each environment recording what was installed; its mtime marks the last use
+ENV_MARKER = ".marimushka-env.json"
+
+# Bump whenever the key derivation or environment layout changes
+ENV_VERSION = 1
+
+# Reference regular expression of PEP 723 for inline script metadata blocks
+_METADATA_BLOCK = re.compile(r"(?m)^# /// (?P<type>[a-zA-Z0-9-]+)$\s(?P<content>(^#(| .*)$\s)+)^# ///$")
+
+# Leading project name of a PEP 508 requirement
+_REQUIREMENT_NAME = re.compile(r"^([A-Za-z0-9][A-Za-z0-9._-]*)(.*)$")
+
+
+def parse_script_metadata(source: str) -> dict | None:
+    r"""Return the PEP 723 ``script`` metadata of a Python source file.
+
+    Args:
+        source: The source code.
+
+    Returns:
+        The parsed TOML table, or None if the source has no valid script block.
+
+    Examples:
+        >>> from marimushka.environments import parse_script_metadata
+        >>> parse_script_metadata('# /// script\n# dependencies = ["polars"]\n# ///\n')
+        {'dependencies': ['polars']}
+        >>> parse_script_metadata("import marimo\n") is None
+        True
+
+    """
+    blocks = [match for match in _METADATA_BLOCK.finditer(source) if match.group("type") == "script"]
+    if len(blocks) != 1:
+        # PEP 723 forbids more than one script block
+        return None
+    content = "".join(
+        line[2:] if line.startswith("# ") else line[1:] for line in blocks[0].group("content").splitlines(keepends=True)
+    )
+    try:
+        return tomllib.loads(content)
+    except tomllib.TOMLDecodeError as e:
+        logger.warning(f"Ignoring invalid inline script metadata: {e}")
+        return None
+
+
+def normalize_requirement(requirement: str) -> str:
+    """Normalize a PEP 508 requirement so equivalent spellings compare equal.
+
+    The project name is lowercased with runs of ``-``, ``_`` and ``.``
+    collapsed to ``-`` (PEP 503), and all whitespace is removed.
+
+    Examples:
+        >>> from marimushka.environments import normalize_requirement
+        >>> normalize_requirement("Polars >= 1.30")
+        'polars>=1.30'
+        >>> normalize_requirement("scikit_learn")
+        'scikit-learn'
+
+    """
+    compact = "".join(requirement.split())
+    match = _REQUIREMENT_NAME.match(compact)
+    if match is None:
+        return compact
+    name, rest = match.groups()
+    return re.sub(r"[-_.]+", "-", name).lower() + rest
+
+
+@dataclass(frozen=True)
+class DependencySet:
+    """Normalized dependencies of a notebook's inline script metadata.
+
+    Attributes:
+        dependencies: Sorted, de-duplicated, normalized requirements.
+        requires_python: The ``requires-python`` specifier, if any.
+
+    """
+
+    dependencies: tuple[str, ...] = ()
+    requires_python: str | None = None
+
+    @classmethod
+    def from_metadata(cls, metadata: dict | None) -> "DependencySet":
+        """Build a dependency set from parsed script metadata.
+
+        Args:
+            metadata: The parsed ``script`` table, or None.
+
+        Returns:
+            The normalized dependency set; empty without metadata.
+
+        """
+        if not metadata:
+            return cls()
+        dependencies = metadata.get("dependencies") or []
+        requires_python = metadata.get("requires-python")
+        return cls(
+            dependencies=tuple(sorted({normalize_requirement(str(dep)) for dep in dependencies})),
+            requires_python="".join(str(requires_python).split()) if requires_python else None,
+        )
+
+    @property
+    def key(self) -> str:
+        """Return the SHA-256 hash identifying this dependency set."""
+        payload = {"version": ENV_VERSION, "dependencies": self.dependencies, "requires_python": self.requires_python}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    @property
+    def pins_marimo(self) -> bool:
+        """Return True if the dependencies name marimo themselves."""
+        names = {match.group(1) for dep in self.dependencies if (match := _REQUIREMENT_NAME.match(dep))}
+        return "marimo" in names
+
+    @property
+    def requirements(self) -> list[str]:
+        """Return the requirements to install, always including marimo."""
+        return list(self.dependencies) if self.pins_marimo else ["marimo", *self.dependencies]
+
+    def with_marimo(self, version: str | None) -> "DependencySet":
+        """Return the set with marimo pinned to a version, unless the dependencies name marimo.
+
+        Args:
+            version: Exact marimo version, e.g. "0.18.4", or None for no pin.
+
+        Returns:
+            The pinned dependency set, whose key differs from the unpinned one.
+
+        Examples:
+            >>> from marimushka.environments import DependencySet
+            >>> DependencySet(("polars",)).with_marimo("0.18.4").requirements
+            ['marimo==0.18.4', 'polars']
+            >>> DependencySet(("marimo>=0.17",)).with_marimo("0.18.4").requirements
+            ['marimo>=0.17']
+
+        """
+        if version is None or self.pins_marimo:
+            return self
+        pinned = {*self.dependencies, normalize_requirement(f"marimo=={version}")}
+        return dataclasses.replace(self, dependencies=tuple(sorted(pinned)))
+
+
+def dependency_set(notebook: "Notebook") -> DependencySet:
+    """Return the dependency set declared by a notebook.
+
+    Args:
+        notebook: The notebook.
+
+    Returns:
+        Its normalized dependencies; empty if it declares none or cannot be read.
+
+    """
+    try:
+        source = notebook.path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError) as e:
+        logger.warning(f"Could not read inline script metadata of {notebook.path.name}: {e}")
+        return DependencySet()
+    return DependencySet.from_metadata(parse_script_metadata(source))
+
+
+@dataclass
+class PrefetchResult:
+    """Outcome of preparing the environments of a set of notebooks.
+
+    Attributes:
+        environments: Number of distinct dependency sets.
+        failures: Errors of the dependency sets whose environment could not be created.
+
+    """
+
+    environments: int = 0
+    failures: list[ExportEnvironmentError] = field(default_factory=list)
+
+    @property
+    def succeeded(self) -> int:
+        """Return the number of environments that are ready."""
+        return self.environments - len(self.failures)
+
+
+def resolve_uv(bin_path: Path | None = None) -> str:
+    """Return the uv executable, preferring the one next to uvx in bin_path.
+
+    Args:
+        bin_path: Optional directory holding uvx and uv. Defaults to None.
+
+    Returns:
+        The path to uv, or "uv" to look it up in PATH.
+
+    """
+    if bin_path is not None:
+        found = shutil.which("uv", path=str(bin_path))
+        if found:
+            return found
+    return "uv"
+
+
+def _python_path(env_dir: Path) -> Path:
+    """Return the interpreter of a virtual environment."""
+    if os.name == "nt":  # pragma: no cover
+        return env_dir / "Scripts" / "python.exe"
+    return env_dir / "bin" / "python"
+
+
+def _directory_size(path: Path) -> int:
+    """Return the total size in bytes of the files below a directory."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class EnvironmentPool:
+    """Virtual environments shared by notebooks with identical dependencies.
+
+    Each environment is created once with ``uv`` and reused by every notebook
+    with the same DependencySet, in this build and in later ones. Environments
+    are built in a temporary directory and moved into place atomically, so
+    concurrent builds never see a half-installed environment.
+
+    An environment is in use from ensure() until the matching release(), and
+    only environments not in use are evicted to fit max_size_mb, so a pool
+    kept open across builds, e.g. by a BuildSession, still honours the limit.
+
+    Attributes:
+        root: Directory holding one subdirectory per environment.
+        max_size_mb: Size limit in megabytes of all environments together.
+        uv: The uv executable used to create environments.
+        timeout: Maximum time in seconds to create one environment.
+        index_url: Optional package index replacing PyPI, e.g. a local mirror.
+        find_links: Optional directory or URL of a wheelhouse searched for packages.
+        offline: Whether uv may only use its cache and find_links, never the network.
+        marimo_version: Optional marimo version installed into every environment
+            whose dependencies do not name marimo themselves.
+        created: Number of environments created by this pool.
+        reused: Number of times an existing environment was reused.
+
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_size_mb: int = DEFAULT_MAX_ENV_CACHE_MB,
+        uv: str = "uv",
+        timeout: float = DEFAULT_ENV_TIMEOUT,
+        index_url: str | None = None,
+        find_links: str | None = None,
+        offline: bool = False,
+        marimo_version: str | None = None,
+    ) -> None:
+        """Initialize the pool.
+
+        Args:
+            root: Directory holding the environments.
+            max_size_mb: Size limit in megabytes of all environments together.
+                Defaults to DEFAULT_MAX_ENV_CACHE_MB.
+            uv: The uv executable. Defaults to "uv" (looked up in PATH).
+            timeout: Maximum time in seconds to create one environment.
+                Defaults to DEFAULT_ENV_TIMEOUT.
+            index_url: Package index used instead of PyPI. Defaults to None.
+            find_links: Wheelhouse directory or URL searched for packages. Defaults to None.
+            offline: Whether to install from uv's cache and find_links only.
+                Defaults to False.
+            marimo_version: Exact marimo version pinned in environments whose
+                dependencies do not name marimo, so that exports in them use the
+                same marimo as the rest of the build. Defaults to None (latest).
+
+        """
+        self.root = root
+        self.max_size_mb = max_size_mb
+        self.uv = uv
+        self.timeout = timeout
+        self.index_url = index_url
+        self.find_links = find_links
+        self.offline = offline
+        self.marimo_version = marimo_version
+        self.created = 0
+        self.reused = 0
+        self._lock = threading.Lock()
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._in_use: Counter[str] = Counter()
+
+    def path(self, dependencies: DependencySet) -> Path:
+        """Return the directory of the environment for a dependency set."""
+        return self.root / dependencies.with_marimo(self.marimo_version).key[:16]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        """Return the lock serializing the creation of one environment."""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def ensure(self, dependencies: DependencySet) -> Path:
+        """Return the interpreter of the environment for a dependency set, creating it if needed.
+
+        The environment is in use, and never evicted, until release() is
+        called with the same dependency set.
+
+        Args:
+            dependencies: The dependency set.
+
+        Returns:
+            The environment's Python interpreter, which can run ``-m marimo``.
+
+        Raises:
+            ExportEnvironmentError: If the environment cannot be created.
+
+        """
+        dependencies = dependencies.with_marimo(self.marimo_version)
+        env_dir = self.path(dependencies)
+        with self._key_lock(dependencies.key):
+            with self._lock:
+                self._in_use[env_dir.name] += 1
+            marker = env_dir / ENV_MARKER
+            if marker.is_file():
+                os.utime(marker)
+                with self._lock:
+                    self.reused += 1
+                return _python_path(env_dir)
+
+            try:
+                self._create(dependencies, env_dir)
+            except BaseException:
+                self.release(dependencies)
+                raise
+            with self._lock:
+                self.created += 1
+        self.prune()
+        return _python_path(env_dir)
+
+    def release(self, dependencies: DependencySet) -> None:
+        """Mark an environment returned by ensure() as no longer used by the caller.
+
+        Args:
+            dependencies: The dependency set passed to ensure().
+
+        """
+        name = self.path(dependencies).name
+        with self._lock:
+            self._in_use[name] -= 1
+            if self._in_use[name] <= 0:
+                del self._in_use[name]
+
+    def prefetch(self, notebooks: Iterable["Notebook"], max_workers: int = 4) -> PrefetchResult:
+        """Create the environments of all notebooks ahead of their exports.
+
+        Notebooks are deduplicated by dependency set, so every environment is
+        resolved and installed exactly once, at most max_workers at a time.
+        Later calls to ensure() for these notebooks return immediately. The
+        environments are not kept in use, so if they exceed max_size_mb the
+        least recently used ones are evicted again.
+
+        Args:
+            notebooks: The notebooks whose environments are needed.
+            max_workers: Maximum number of environments installed at once. Defaults to 4.
+
+        Returns:
+            The number of dependency sets and the errors of those that failed.
+
+        """
+        dependency_sets = list(
+            dict.fromkeys(dependency_set(notebook).with_marimo(self.marimo_version) for notebook in notebooks)
+        )
+        result = PrefetchResult(environments=len(dependency_sets))
+        if not dependency_sets:
+            return result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(dependency_sets)))) as executor:
+            futures = {executor.submit(self.ensure, dependencies): dependencies for dependencies in dependency_sets}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except ExportEnvironmentError as e:
+                    logger.error(f"Could not prepare environment for {', '.join(futures[future].requirements)}: {e}")
+                    result.failures.append(e)
+                else:
+                    self.release(futures[future])
+        return result
+
+    def _index_args(self) -> list[str]:
+        """Return the uv options selecting where packages come from."""
+        args = []
+        if self.index_url:
+            args += ["--index-url", self.index_url]
+        if self.find_links:
+            args += ["--find-links", self.find_links]
+        if self.offline:
+            args.append("--offline")
+        return args
+
+    def _uv(self, args: list[str], key: str) -> None:
+        """Run a uv command, raising ExportEnvironmentError on failure."""
+        cmd = [self.uv, *args]
+        logger.debug(f"Running command: {cmd}")
+        try:
+            result = run_process_tree(cmd, timeout=self.timeout)
+        except ProcessTreeTimeoutExpired:
+            raise ExportEnvironmentError(key, f"timed out after {self.timeout} seconds") from None
+        except (OSError, subprocess.SubprocessError) as e:
+            raise ExportEnvironmentError(key, str(e)) from e
+        if result.returncode != 0:
+            raise ExportEnvironmentError(key, result.stderr.strip())
+
+    def _create(self, dependencies: DependencySet, env_dir: Path) -> None:
+        """Create an environment in a temporary directory and move it into place."""
+        key = dependencies.key
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = self.root / f".tmp-{env_dir.name}-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Creating export environment {env_dir.name} for {', '.join(dependencies.requirements)}")
+        started = time.perf_counter()
+        try:
+            venv_args = ["venv", "--relocatable", "--quiet"]
+            if self.offline:
+                venv_args.append("--offline")
+            if dependencies.requires_python:
+                venv_args += ["--python", dependencies.requires_python]
+            self._uv([*venv_args, str(staging)], key)
+            self._uv(
+                [
+                    "pip",
+                    "install",
+                    "--quiet",
+                    *self._index_args(),
+                    "--python",
+                    str(_python_path(staging)),
+                    *dependencies.requirements,
+                ],
+                key,
+            )
+            info = {
+                "version": ENV_VERSION,
+                "dependencies": list(dependencies.dependencies),
+                "requires_python": dependencies.requires_python,
+                "size": _directory_size(staging),
+            }
+            (staging / ENV_MARKER).write_text(json.dumps(info, indent=2))
+            try:
+                staging.rename(env_dir)
+            except OSError:
+                # Another build created the same environment first
+                if not (env_dir / ENV_MARKER).is_file():
+                    raise
+        except OSError as e:
+            raise ExportEnvironmentError(key, str(e)) from e
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Created export environment {env_dir.name} in {time.perf_counter() - started:.1f}s")
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        """Return (last use, size, directory) of every complete environment."""
+        entries = []
+        if not self.root.is_dir():
+            return entries
+        for env_dir in self.root.iterdir():
+            marker = env_dir / ENV_MARKER
+            try:
+                last_used = marker.stat().st_mtime
+                size = int(json.loads(marker.read_text()).get("size", 0))
+            except (OSError, ValueError, TypeError, AttributeError):
+                continue
+            entries.append((last_used, size, env_dir))
+        return entries
+
+    def prune(self) -> list[Path]:
+        """Remove least recently used environments until the pool fits its size limit.
+
+        Environments in use, between ensure() and release(), are never removed.
+
+        Returns:
+            The removed environment directories.
+
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_size_mb * 1024 * 1024
+        removed = []
+        for _, size, env_dir in entries:
+            if total <= limit:
+                break
+            with self._lock:
+                if env_dir.name in self._in_use:
+                    continue
+            logger.info(f"Evicting export environment {env_dir.name} ({size // 2**20} MB)")
+            # Remove the marker first so a concurrent build never reuses a partial environment
+            (env_dir / ENV_MARKER).unlink(missing_ok=True)
+            shutil.rmtree(env_dir, ignore_errors=True)
+            total -= size
+            removed.append(env_dir)
+        return removed
@@ -8,11 +8,16 @@ defines result types for operations that can partially succeed.
 from collections.abc import Callable
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
 # Progress callback type for API users
 # Called with (completed: int, total: int, notebook_name: str)
 ProgressCallback = Callable[[int, int, str], None]
 
+# Result callback type for API users
+# Called once with the BatchExportResult of a build
+ResultCallback = Callable[["BatchExportResult"], None]
+
 
 class MarimushkaError(Exception):
     """Base exception for all marimushka errors.
@@ -226,6 +231,82 @@ class ExportSubprocessError(ExportError):
         super().__init__(message)
 
 
+class ExportEnvironmentError(ExportError):
+    """Raised when a shared export environment cannot be created.
+
+    Attributes:
+        key: Dependency hash of the environment.
+        stderr: Standard error of the failed uv command.
+
+    """
+
+    def __init__(self, key: str, stderr: str = "") -> None:
+        """Initialize the exception.
+
+        Args:
+            key: Dependency hash of the environment.
+            stderr: Standard error of the failed uv command.
+
+        """
+        self.key = key
+        self.stderr = stderr
+        message = f"Failed to create export environment {key[:12]}"
+        if stderr:
+            message += f": {stderr[:200]}"
+        super().__init__(message)
+
+
+class ExportCancelledError(ExportError):
+    """Raised when an export was cancelled before it finished.
+
+    Watch mode cancels the export of a notebook that changed again while it
+    was being exported.
+
+    Attributes:
+        notebook_path: Path to the notebook whose export was cancelled.
+        reaped: Number of processes of the export that were terminated.
+
+    """
+
+    def __init__(self, notebook_path: Path, reaped: int = 0) -> None:
+        """Initialize the exception.
+
+        Args:
+            notebook_path: Path to the notebook whose export was cancelled.
+            reaped: Number of processes of the export that were terminated.
+
+        """
+        self.notebook_path = notebook_path
+        self.reaped = reaped
+        super().__init__(f"Export of {notebook_path.name} was cancelled")
+
+
+class GitDiffError(MarimushkaError):
+    """Raised when the files changed since a git revision cannot be determined.
+
+    Attributes:
+        revision: The revision the changes were compared against.
+        stderr: Standard error of the failed git command.
+
+    """
+
+    def __init__(self, revision: str, reason: str, stderr: str = "") -> None:
+        """Initialize the exception.
+
+        Args:
+            revision: The revision the changes were compared against.
+            reason: Why the changes could not be determined.
+            stderr: Standard error of the failed git command.
+
+        """
+        self.revision = revision
+        self.stderr = stderr
+        message = f"Cannot find changes since {revision!r}: {reason}"
+        if stderr:
+            message += f": {stderr[:200]}"
+        super().__init__(message)
+
+
 class OutputError(MarimushkaError):
     """Base exception for output-related errors."""
 
@@ -264,30 +345,39 @@ class NotebookExportResult:
         success: Whether the export succeeded.
         output_path: Path to the exported HTML file (if successful).
         error: The error that occurred (if failed).
+        cached: Whether the output was restored from the export cache
+            instead of running the export subprocess.
+        duration: Time in seconds the export took (if measured).
+        reaped_processes: Number of processes of the export's process tree that
+            were terminated, e.g. after a timeout or left behind by the export.
 
     """
 
     notebook_path: Path
     success: bool
     output_path: Path | None = None
-    error: ExportError | None = None
+    error: ExportError | NotebookError | None = None
+    cached: bool = False
+    duration: float | None = None
+    reaped_processes: int = 0
 
     @classmethod
-    def succeeded(cls, notebook_path: Path, output_path: Path) -> "NotebookExportResult":
+    def succeeded(cls, notebook_path: Path, output_path: Path, cached: bool = False) -> "NotebookExportResult":
         """Create a successful result.
 
         Args:
             notebook_path: Path to the notebook that was exported.
             output_path: Path to the exported HTML file.
+            cached: Whether the output was restored from the export cache.
 
         Returns:
             A NotebookExportResult indicating success.
 
         """
-        return cls(notebook_path=notebook_path, success=True, output_path=output_path)
+        return cls(notebook_path=notebook_path, success=True, output_path=output_path, cached=cached)
 
     @classmethod
-    def failed(cls, notebook_path: Path, error: ExportError) -> "NotebookExportResult":
+    def failed(cls, notebook_path: Path, error: ExportError | NotebookError) -> "NotebookExportResult":
         """Create a failed result.
 
         Args:
@@ -300,6 +390,25 @@ class NotebookExportResult:
         """
         return cls(notebook_path=notebook_path, success=False, error=error)
 
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the result to a JSON-serializable dictionary.
+
+        Returns:
+            Dictionary with the result's fields; paths as strings and the error
+            as its type name and message.
+
+        """
+        return {
+            "notebook_path": str(self.notebook_path),
+            "success": self.success,
+            "output_path": str(self.output_path) if self.output_path else None,
+            "error_type": type(self.error).__name__ if self.error else None,
+            "error": str(self.error) if self.error else None,
+            "cached": self.cached,
+            "duration": self.duration,
+            "reaped_processes": self.reaped_processes,
+        }
+
 
 @dataclass
 class BatchExportResult:
@@ -310,10 +419,17 @@ class BatchExportResult:
         total: Total number of notebooks attempted.
         succeeded: Number of successful exports.
         failed: Number of failed exports.
+        cached: Number of exports restored from the cache.
+        affinity_hits: Number of sandboxed exports that followed an export with
+            the same PEP 723 dependency set on the same worker.
+        affinity_dispatches: Number of sandboxed exports that followed another
+            export on the same worker.
 
     """
 
     results: list[NotebookExportResult] = field(default_factory=list)
+    affinity_hits: int = 0
+    affinity_dispatches: int = 0
 
     @property
     def total(self) -> int:
@@ -330,6 +446,18 @@ class BatchExportResult:
         """Return number of failed exports."""
         return sum(1 for r in self.results if not r.success)
 
+    @property
+    def cached(self) -> int:
+        """Return number of exports restored from the cache."""
+        return sum(1 for r in self.results if r.cached)
+
+    @property
+    def affinity_hit_rate(self) -> float | None:
+        """Return the share of exports that reused their worker's dependency set, if any were scheduled."""
+        if not self.affinity_dispatches:
+            return None
+        return self.affinity_hits / self.affinity_dispatches
+
     @property
     def all_succeeded(self) -> bool:
         """Return True if all exports succeeded."""
@@ -353,3 +481,19 @@ class BatchExportResult:
 
         """
         self.results.append(result)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the batch to a JSON-serializable dictionary.
+
+        Returns:
+            Dictionary with the batch counters and the individual results.
+
+        """
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cached": self.cached,
+            "affinity_hit_rate": self.affinity_hit_rate,
+            "results": [result.to_dict() for result in self.results],
+        }
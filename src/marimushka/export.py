@@ -12,21 +12,597 @@ Example::
 The exported files will be placed in the specified output directory (default: _site).
 """
 
+import contextlib
+import copy
+import inspect
+import tempfile
+from collections.abc import Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any
 
 from loguru import logger
 
 from . import __version__
-from .audit import get_audit_logger
-from .exceptions import ProgressCallback
-from .notebook import Kind, folder2notebooks
-from .orchestrator import generate_index
+from .cache import ExportCache
+from .config import MarimushkaConfig
+from .dependencies import Dependencies, create_dependencies
+from .environments import DEFAULT_MAX_ENV_CACHE_MB, ENVS_DIRNAME, EnvironmentPool, PrefetchResult, resolve_uv
+from .exceptions import (
+    BatchExportResult,
+    ExportEnvironmentError,
+    ExportExecutableNotFoundError,
+    ProgressCallback,
+    ResultCallback,
+)
+from .git import changes_since
+from .history import DEFAULT_ESTIMATED_DURATION, HISTORY_FILENAME, ExportHistory
+from .notebook import Kind, Notebook, folder2notebooks, resolve_executable
+from .orchestrator import ENGINES, create_template_environment, generate_index
+from .precheck import CHECKS_FILENAME, source_checks
+from .security import validate_max_workers
+from .tool import TOOLS_DIRNAME, MarimoTool, install_marimo, validate_marimo_version
 from .validators import validate_template
+from .watch import Cancellation, ChangeSet, classify_changes
+from .worker import DEFAULT_MAX_JOBS, DEFAULT_MAX_MEMORY_MB, WorkerPool
+
+# Built-in index template
+_DEFAULT_TEMPLATE = Path(__file__).parent / "templates" / "tailwind.html.j2"
+
+
+def _environment_pool(
+    cache_dir: str | Path,
+    env_cache_size: int,
+    bin_path: Path | None,
+    index_url: str | None,
+    find_links: str | None,
+    offline: bool,
+    marimo_version: str | None = None,
+) -> EnvironmentPool:
+    """Create the pool of shared environments kept in the cache directory."""
+    return EnvironmentPool(
+        Path(cache_dir) / ENVS_DIRNAME,
+        max_size_mb=env_cache_size,
+        uv=resolve_uv(bin_path),
+        index_url=index_url,
+        find_links=find_links,
+        offline=offline,
+        marimo_version=marimo_version,
+    )
+
+
+def _prefetch(environments: EnvironmentPool, notebooks: list[Notebook], max_workers: int) -> PrefetchResult:
+    """Create the shared environments of all notebooks and log the outcome."""
+    result = environments.prefetch(notebooks, max_workers=validate_max_workers(max_workers))
+    logger.info(
+        f"Prefetched {result.succeeded}/{result.environments} environments "
+        f"({environments.created} created, {environments.reused} already present)"
+    )
+    return result
+
+
+def _install_marimo_tool(
+    marimo_version: str,
+    tools_root: Path,
+    bin_path: Path | None,
+    index_url: str | None,
+    find_links: str | None,
+    offline: bool,
+) -> MarimoTool:
+    """Install the pinned marimo version into the tool environment directory."""
+    return install_marimo(
+        marimo_version,
+        tools_root,
+        uv=resolve_uv(bin_path),
+        index_url=index_url,
+        find_links=find_links,
+        offline=offline,
+    )
+
+
+def prefetch_environments(
+    cache_dir: str | Path,
+    notebooks: str | Path = "notebooks",
+    apps: str | Path = "apps",
+    notebooks_wasm: str | Path = "notebooks",
+    bin_path: str | Path | None = None,
+    max_workers: int = 4,
+    env_cache_size: int = DEFAULT_MAX_ENV_CACHE_MB,
+    index_url: str | None = None,
+    find_links: str | None = None,
+    offline: bool = False,
+    marimo_version: str | None = None,
+    recursive: bool = False,
+    include: Sequence[str] | None = None,
+    exclude: Sequence[str] | None = None,
+) -> PrefetchResult:
+    """Create the shared environments of all notebooks without exporting them.
+
+    Notebooks are deduplicated by their PEP 723 dependency set and every set is
+    resolved and installed exactly once into ``<cache_dir>/envs``. A later
+    ``main(cache_dir=..., shared_envs=True)`` build then reuses the environments
+    and never waits for package resolution.
+
+    Args:
+        cache_dir: Directory of the persistent cache holding the environments.
+        notebooks: Directory containing static notebooks. Defaults to "notebooks".
+        apps: Directory containing app notebooks. Defaults to "apps".
+        notebooks_wasm: Directory containing interactive notebooks. Defaults to "notebooks".
+        bin_path: Directory of the uv executable. Defaults to None (uv from PATH).
+        max_workers: Maximum number of environments installed at once. Defaults to 4.
+        env_cache_size: Size limit in megabytes of the shared environments. Defaults to 5120.
+        index_url: Package index used instead of PyPI, e.g. a local mirror. Defaults to None.
+        find_links: Wheelhouse directory or URL searched for packages. Defaults to None.
+        offline: Whether to install from uv's cache and find_links only, without
+                network access. Defaults to False.
+        marimo_version: Exact marimo version to install into ``<cache_dir>/tools`` as
+                well, for builds with the same pinned version. Defaults to None.
+        recursive: Whether to find notebooks in subdirectories of the folders as well.
+                Defaults to False.
+        include: Glob patterns of which notebooks must match at least one. Defaults to None.
+        exclude: Glob patterns of notebooks and directories to skip. Defaults to None.
+
+    Returns:
+        The number of environments (dependency sets and the marimo tool) and the
+        errors of those that could not be installed.
+
+    Raises:
+        ValueError: If marimo_version is not an exact release version.
+
+    Example::
+
+        from marimushka.export import prefetch_environments
+
+        result = prefetch_environments(".marimushka-cache", find_links="wheels", offline=True)
+        assert not result.failures
+
+    """
+    bin_path_obj: Path | None = Path(bin_path) if bin_path else None
+    if marimo_version:
+        marimo_version = validate_marimo_version(marimo_version)
+    environments = _environment_pool(
+        cache_dir, env_cache_size, bin_path_obj, index_url, find_links, offline, marimo_version
+    )
+    all_notebooks = [
+        *folder2notebooks(folder=notebooks, kind=Kind.NB, recursive=recursive, include=include, exclude=exclude),
+        *folder2notebooks(folder=apps, kind=Kind.APP, recursive=recursive, include=include, exclude=exclude),
+        *folder2notebooks(
+            folder=notebooks_wasm, kind=Kind.NB_WASM, recursive=recursive, include=include, exclude=exclude
+        ),
+    ]
+    logger.info(f"Prefetching environments of {len(all_notebooks)} notebooks into {environments.root}")
+    result = _prefetch(environments, all_notebooks, max_workers)
+
+    if marimo_version:
+        result.environments += 1
+        try:
+            _install_marimo_tool(
+                marimo_version, Path(cache_dir) / TOOLS_DIRNAME, bin_path_obj, index_url, find_links, offline
+            )
+        except ExportEnvironmentError as e:
+            logger.error(f"Could not install marimo {marimo_version}: {e}")
+            result.failures.append(e)
+    return result
+
+
+def _discover_notebooks(
+    notebooks: str | Path | None,
+    apps: str | Path | None,
+    notebooks_wasm: str | Path | None,
+    recursive: bool = False,
+    include: Sequence[str] | None = None,
+    exclude: Sequence[str] | None = None,
+    cache_dir: str | Path | None = None,
+) -> tuple[list[Notebook], list[Notebook], list[Notebook]]:
+    """Find the notebooks of each Kind and log how many there are.
+
+    With a cache directory, the source checks of earlier builds are reused
+    and the checks of this discovery are persisted there.
+    """
+    checks_path = Path(cache_dir) / CHECKS_FILENAME if cache_dir else None
+    if checks_path is not None:
+        source_checks().load(checks_path)
+    notebooks_data = folder2notebooks(
+        folder=notebooks, kind=Kind.NB, recursive=recursive, include=include, exclude=exclude
+    )
+    apps_data = folder2notebooks(folder=apps, kind=Kind.APP, recursive=recursive, include=include, exclude=exclude)
+    notebooks_wasm_data = folder2notebooks(
+        folder=notebooks_wasm, kind=Kind.NB_WASM, recursive=recursive, include=include, exclude=exclude
+    )
+
+    logger.info(f"# notebooks_data: {len(notebooks_data)}")
+    logger.info(f"# apps_data: {len(apps_data)}")
+    logger.info(f"# notebooks_wasm_data: {len(notebooks_wasm_data)}")
+    if checks_path is not None:
+        source_checks().save(checks_path)
+    return notebooks_data, apps_data, notebooks_wasm_data
+
+
+def _changes_since(
+    since: str,
+    folders: dict[Kind, str | Path | None],
+    template: Path,
+    output: Path,
+    discovered: Iterable[Notebook],
+) -> ChangeSet:
+    """Return the changes since a git revision, plus the notebooks missing from the output directory.
+
+    Notebooks without a previous export are exported as well, so a fresh
+    checkout of the previous site still ends up complete.
+
+    Raises:
+        GitDiffError: If the changed files cannot be determined.
+
+    """
+    cwd = next((Path(folder) for folder in folders.values() if folder and Path(folder).is_dir()), Path())
+    changes = changes_since(since, folders, template, output, cwd)
+    missing = frozenset(nb.path.resolve() for nb in discovered if not (output / nb.html_path).is_file())
+    if missing:
+        logger.info(f"{len(missing)} notebooks have no previous export in {output} and are exported as well")
+    return ChangeSet(changes.notebooks | missing, changes.template)
+
+
+class BuildSession:
+    """Builds a site repeatedly with one configuration, keeping its resources warm.
+
+    ``main()`` runs a single build in a session of its own and discards it
+    afterwards. A session used for many builds keeps, until ``close()``:
+
+    - the audit logger and configuration of its Dependencies,
+    - the uvx executable, validated and looked up in bin_path once,
+    - the export cache; the marimo version of its keys is resolved per build,
+    - the export history, the shared environments and the pinned marimo tool,
+    - the Jinja2 environment of the index template, which recompiles the
+      template only when it changes,
+    - the thread pool of the "threads" engine, or the worker pool of the
+      "workers" engine.
+
+    Embedding applications that build many times in one process therefore pay
+    for these once.
+
+    Attributes:
+        deps: The audit logger and configuration of the builds.
+        output: Output directory of the builds.
+        template: Path to the index template.
+        executable: The uvx executable of the exports, or None if bin_path
+            holds none, in which case every export fails with
+            ExportExecutableNotFoundError.
+        builds: Number of builds started so far.
+        last_result: BatchExportResult of the latest build that exported
+            notebooks, or None.
+
+    Example::
+
+        from marimushka.config import MarimushkaConfig
+        from marimushka.dependencies import create_dependencies
+        from marimushka.export import BuildSession
+
+        deps = create_dependencies(config=MarimushkaConfig(cache_dir=".marimushka-cache"))
+        with BuildSession(deps, incremental=True) as session:
+            session.build()
+            session.rebuild(["notebooks/demo.py"])
+
+    """
+
+    def __init__(
+        self,
+        deps: Dependencies | None = None,
+        bin_path: str | Path | None = None,
+        incremental: bool = False,
+        engine: str = "threads",
+        worker_max_jobs: int = DEFAULT_MAX_JOBS,
+        worker_max_memory: int = DEFAULT_MAX_MEMORY_MB,
+        on_progress: ProgressCallback | None = None,
+        worker_pool: WorkerPool | None = None,
+    ) -> None:
+        """Initialize the session; notebooks are only discovered by ``build()``.
+
+        Args:
+            deps: Audit logger and configuration of the builds. Defaults to None
+                (create_dependencies()).
+            bin_path: Custom path to uvx executable. Defaults to None.
+            incremental: Whether to skip notebooks whose previous export is still
+                up to date according to the build manifest. Defaults to False.
+            engine: Export engine, one of "threads", "asyncio" or "workers".
+                Defaults to "threads".
+            worker_max_jobs: Number of exports after which a worker of the workers
+                engine is replaced. Defaults to 50.
+            worker_max_memory: Resident memory in megabytes above which a worker of
+                the workers engine is replaced. Defaults to 1024.
+            on_progress: Optional callback called after each notebook export with
+                signature: on_progress(completed, total, notebook_name).
+            worker_pool: Pool of persistent marimo workers used by the workers
+                engine instead of one owned by the session. The caller closes it.
+                Defaults to None.
+
+        Raises:
+            ValueError: If the engine is unknown or the configured marimo version
+                is not an exact release version.
+
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown export engine {engine!r}, expected one of {', '.join(ENGINES)}")  # noqa: TRY003
+
+        self.deps = deps if deps is not None else create_dependencies()
+        config = self.deps.config
+        self.output = Path(config.output or "_site")
+        self.template = Path(config.template) if config.template else _DEFAULT_TEMPLATE
+        self.bin_path: Path | None = Path(bin_path) if bin_path else None
+        self.executable: str | None
+        try:
+            self.executable = resolve_executable(self.bin_path, self.deps.audit_logger)
+        except ExportExecutableNotFoundError:
+            self.executable = None  # Every export reports the missing executable
+        self.incremental = incremental
+        self.engine = engine
+        self.worker_max_jobs = worker_max_jobs
+        self.worker_max_memory = worker_max_memory
+        self.on_progress = on_progress
+        self.marimo_version = validate_marimo_version(config.marimo_version) if config.marimo_version else None
+        self.builds = 0
+        self.last_result: BatchExportResult | None = None
+
+        cache_dir = config.cache_dir
+        self.cache: ExportCache | None = ExportCache(Path(cache_dir)) if cache_dir else None
+        self.history: ExportHistory | None = (
+            ExportHistory.load(Path(cache_dir) / HISTORY_FILENAME) if cache_dir else None
+        )
+        self.environments: EnvironmentPool | None = None
+        self.shared_envs = config.shared_envs or config.prefetch
+        if not cache_dir:
+            if self.shared_envs:
+                logger.warning("Shared environments require a cache directory; exporting in per-notebook sandboxes")
+        elif self.shared_envs and config.sandbox:
+            self.environments = _environment_pool(
+                cache_dir,
+                config.env_cache_size,
+                self.bin_path,
+                config.index_url,
+                config.find_links,
+                config.offline,
+                self.marimo_version,
+            )
+
+        self._stack = contextlib.ExitStack()
+        self._template_environment = create_template_environment(self.template.parent)
+        self._executor: ThreadPoolExecutor | None = None
+        self._worker_pool = worker_pool
+        self._marimo_tool: MarimoTool | None = None
+
+    def __enter__(self) -> "BuildSession":
+        """Return the session."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the session."""
+        self.close()
+
+    def build(
+        self,
+        changes: ChangeSet | None = None,
+        cancellation: Cancellation | None = None,
+        on_complete: ResultCallback | None = None,
+        return_html: bool = True,
+        since: str | None = None,
+        on_progress: ProgressCallback | None = None,
+    ) -> str:
+        """Export the notebooks and generate the index page.
+
+        Args:
+            changes: Changes of a rebuild (see marimushka.watch). Only the affected
+                notebooks are exported. Defaults to None (full build).
+            cancellation: Cancel flags of the notebook exports. Defaults to None.
+            on_complete: Optional callback called with the BatchExportResult of the
+                build once the index is written. Defaults to None.
+            return_html: Whether to return the index page. If False, it is streamed
+                into the index file without being held in memory. Defaults to True.
+            since: Git revision whose changes are exported, see ``main()``.
+                Defaults to None (all notebooks).
+            on_progress: Optional progress callback of this build only, used
+                instead of the session's on_progress. Defaults to None.
+
+        Returns:
+            Rendered HTML content as string, empty if no notebooks found or
+            return_html is False.
+
+        Raises:
+            GitDiffError: If since is set and the changed files cannot be determined.
+            ExportEnvironmentError: If the pinned marimo version cannot be installed.
+            TemplateNotFoundError: If the template file does not exist.
+            TemplateInvalidError: If the template path is not a file.
+            TemplateRenderError: If the template fails to render.
+            IndexWriteError: If the index file cannot be written.
+
+        """
+        config = self.deps.config
+        self.builds += 1
+        logger.info("Starting marimushka build process")
+        logger.info(f"Version of Marimushka: {__version__}")
+        logger.info(f"Output directory: {self.output}")
+        self.output.mkdir(parents=True, exist_ok=True)
+        validate_template(self.template, self.deps.audit_logger)
+        if self.builds == 1:
+            self._log_settings()
+
+        notebooks_data, apps_data, notebooks_wasm_data = _discover_notebooks(
+            config.notebooks,
+            config.apps,
+            config.notebooks_wasm,
+            config.recursive,
+            config.include,
+            config.exclude,
+            config.cache_dir,
+        )
+        if not notebooks_data and not apps_data and not notebooks_wasm_data:
+            logger.warning("No notebooks or apps found!")
+            return ""
+
+        if since:
+            logger.info(f"Since: {since}")
+            since_changes = _changes_since(
+                since,
+                {Kind.NB: config.notebooks, Kind.APP: config.apps, Kind.NB_WASM: config.notebooks_wasm},
+                self.template,
+                self.output,
+                [*notebooks_data, *apps_data, *notebooks_wasm_data],
+            )
+            changes = since_changes if changes is None else changes.merge(since_changes)
+
+        if config.prefetch and self.environments is not None:
+            _prefetch(
+                self.environments,
+                [*notebooks_data, *apps_data, *notebooks_wasm_data],
+                config.max_workers if config.parallel else 1,
+            )
+
+        def complete(result: BatchExportResult) -> None:
+            self.last_result = result
+            if on_complete is not None:
+                on_complete(result)
+
+        return generate_index(
+            output=self.output,
+            template_file=self.template,
+            notebooks=notebooks_data,
+            apps=apps_data,
+            notebooks_wasm=notebooks_wasm_data,
+            sandbox=config.sandbox,
+            bin_path=self.bin_path,
+            parallel=config.parallel,
+            max_workers=config.max_workers,
+            timeout=config.timeout,
+            on_progress=on_progress if on_progress is not None else self.on_progress,
+            audit_logger=self.deps.audit_logger,
+            cache=self.cache,
+            incremental=self.incremental,
+            history=self.history,
+            estimated_duration=config.estimated_duration,
+            engine=self.engine,
+            worker_max_jobs=self.worker_max_jobs,
+            worker_max_memory=self.worker_max_memory,
+            environments=self.environments,
+            marimo_tool=self._ensure_marimo_tool(),
+            changes=changes,
+            cancellation=cancellation,
+            worker_pool=self._ensure_worker_pool(),
+            on_complete=complete,
+            executor=self._ensure_executor(),
+            template_environment=self._template_environment,
+            return_html=return_html,
+            page_size=config.page_size,
+            search=config.search,
+            executable=self.executable,
+        )
+
+    def rebuild(
+        self,
+        paths: Iterable[str | Path],
+        cancellation: Cancellation | None = None,
+        on_complete: ResultCallback | None = None,
+        return_html: bool = True,
+    ) -> str:
+        """Export only the notebooks that changes to some files affect.
+
+        Paths are mapped like watch mode changes: a notebook source affects
+        that notebook, a file of a ``public`` directory every notebook next to
+        that directory, and a file next to the template the index. Deleted
+        notebooks are removed from the site.
+
+        Args:
+            paths: Added, modified or deleted files.
+            cancellation: Cancel flags of the notebook exports. Defaults to None.
+            on_complete: Optional callback called with the BatchExportResult of the
+                build once the index is written. Defaults to None.
+            return_html: Whether to return the index page. Defaults to True.
+
+        Returns:
+            Rendered HTML content as string, empty if no notebooks found or
+            return_html is False.
+
+        """
+        config = self.deps.config
+        folders = {Kind.NB: config.notebooks, Kind.APP: config.apps, Kind.NB_WASM: config.notebooks_wasm}
+        changes = classify_changes(((None, str(path)) for path in paths), folders, self.template, self.output)
+        return self.build(changes=changes, cancellation=cancellation, on_complete=on_complete, return_html=return_html)
+
+    def close(self) -> None:
+        """Shut down the session's pools and remove its temporary marimo tool."""
+        self._stack.close()
+        self._executor = None
+        self._marimo_tool = None
+
+    def _log_settings(self) -> None:
+        """Log the settings of the session's builds."""
+        config = self.deps.config
+        logger.info(f"Using template file: {self.template}")
+        logger.info(f"Notebooks: {config.notebooks}")
+        logger.info(f"Apps: {config.apps}")
+        logger.info(f"Notebooks-wasm: {config.notebooks_wasm}")
+        if config.recursive:
+            logger.info(f"Recursive: {config.recursive} (include={config.include}, exclude={config.exclude})")
+        logger.info(f"Sandbox: {config.sandbox}")
+        logger.info(f"Parallel: {config.parallel} (max_workers={config.max_workers})")
+        logger.info(f"Bin path: {self.bin_path}")
+        logger.info(f"Timeout: {config.timeout}s")
+        logger.info(f"Cache directory: {config.cache_dir}")
+        logger.info(f"Incremental: {self.incremental}")
+        logger.info(f"Estimated duration: {config.estimated_duration}s")
+        logger.info(f"Engine: {self.engine}")
+        if self.engine == "workers":
+            logger.info(f"Worker limits: {self.worker_max_jobs} jobs, {self.worker_max_memory} MB")
+        if self.marimo_version:
+            logger.info(f"Pinned marimo version: {self.marimo_version}")
+        logger.info(
+            f"Shared environments: {self.shared_envs} (limit {config.env_cache_size} MB, prefetch: {config.prefetch})"
+        )
+        if config.page_size:
+            logger.info(f"Index page size: {config.page_size}")
+        logger.info(f"Search index: {config.search}")
+
+    def _ensure_executor(self) -> ThreadPoolExecutor | None:
+        """Return the thread pool of the threads engine, starting it on first use."""
+        config = self.deps.config
+        if self.engine != "threads" or not config.parallel:
+            return None
+        if self._executor is None:
+            self._executor = self._stack.enter_context(
+                ThreadPoolExecutor(max_workers=validate_max_workers(config.max_workers))
+            )
+        return self._executor
+
+    def _ensure_worker_pool(self) -> WorkerPool | None:
+        """Return the pool of the workers engine, starting it on first use."""
+        if self.engine != "workers":
+            return None
+        if self._worker_pool is None:
+            config = self.deps.config
+            pool_size = validate_max_workers(config.max_workers) if config.parallel else 1
+            self._worker_pool = self._stack.enter_context(
+                WorkerPool(pool_size, max_jobs=self.worker_max_jobs, max_memory_mb=self.worker_max_memory)
+            )
+        return self._worker_pool
+
+    def _ensure_marimo_tool(self) -> MarimoTool | None:
+        """Return the pinned marimo installation, installing it on first use."""
+        if not self.marimo_version:
+            return None
+        if self._marimo_tool is None:
+            config = self.deps.config
+            # Without a cache directory the tool environment only lives as long as the session
+            tools_root = (
+                Path(config.cache_dir)
+                if config.cache_dir
+                else Path(self._stack.enter_context(tempfile.TemporaryDirectory()))
+            ) / TOOLS_DIRNAME
+            self._marimo_tool = _install_marimo_tool(
+                self.marimo_version, tools_root, self.bin_path, config.index_url, config.find_links, config.offline
+            )
+        return self._marimo_tool
 
 
 def main(
     output: str | Path = "_site",
-    template: str | Path = Path(__file__).parent / "templates" / "tailwind.html.j2",
+    template: str | Path = _DEFAULT_TEMPLATE,
     notebooks: str | Path = "notebooks",
     apps: str | Path = "apps",
     notebooks_wasm: str | Path = "notebooks",
@@ -36,6 +612,30 @@ def main(
     max_workers: int = 4,
     timeout: int = 300,
     on_progress: ProgressCallback | None = None,
+    cache_dir: str | Path | None = None,
+    incremental: bool = False,
+    estimated_duration: float = DEFAULT_ESTIMATED_DURATION,
+    engine: str = "threads",
+    worker_max_jobs: int = DEFAULT_MAX_JOBS,
+    worker_max_memory: int = DEFAULT_MAX_MEMORY_MB,
+    shared_envs: bool = False,
+    env_cache_size: int = DEFAULT_MAX_ENV_CACHE_MB,
+    prefetch: bool = False,
+    index_url: str | None = None,
+    find_links: str | None = None,
+    offline: bool = False,
+    marimo_version: str | None = None,
+    page_size: int = 0,
+    search: bool = False,
+    recursive: bool = False,
+    include: Sequence[str] | None = None,
+    exclude: Sequence[str] | None = None,
+    since: str | None = None,
+    changes: ChangeSet | None = None,
+    cancellation: Cancellation | None = None,
+    worker_pool: WorkerPool | None = None,
+    on_complete: ResultCallback | None = None,
+    return_html: bool = True,
 ) -> str:
     """Export marimo notebooks and generate an index page.
 
@@ -52,11 +652,84 @@ def main(
         timeout: Maximum time in seconds for each export. Defaults to 300.
         on_progress: Optional callback for progress tracking. Called after each notebook export
                     with signature: on_progress(completed, total, notebook_name).
+        cache_dir: Directory of the persistent export cache. Unchanged notebooks are
+                  restored from it instead of being re-exported. Defaults to None (no cache).
+        incremental: Whether to skip notebooks whose previous export in the output directory
+                    is still up to date according to the build manifest. Defaults to False.
+        estimated_duration: Estimated export duration in seconds of notebooks without recorded
+                    history. Durations are recorded in the cache directory and used to export the
+                    slowest notebooks first. Defaults to 30 seconds.
+        engine: Export engine, "threads", "asyncio" or "workers". The asyncio engine runs
+                    exports as asyncio subprocesses on a fixed number of worker tasks instead of a
+                    thread pool, and allows up to 64 concurrent exports. The workers engine runs exports
+                    in persistent marimo worker processes that import marimo only once; it requires
+                    sandbox=False, sandboxed exports run as plain subprocesses. Defaults to "threads".
+        worker_max_jobs: Number of exports after which a worker of the workers engine is
+                    replaced. Defaults to 50.
+        worker_max_memory: Resident memory in megabytes above which a worker of the workers
+                    engine is replaced. Defaults to 1024.
+        shared_envs: Whether sandboxed notebooks with identical PEP 723 dependencies share one
+                    environment, created once in the cache directory and reused across builds.
+                    Requires cache_dir. Defaults to False.
+        env_cache_size: Size limit in megabytes of the shared environments; the least recently
+                    used ones are removed beyond it. Defaults to 5120.
+        prefetch: Whether to create the shared environments of all notebooks, each distinct
+                    dependency set once and max_workers at a time, before any export starts.
+                    Implies shared_envs. Defaults to False.
+        index_url: Package index used instead of PyPI to create shared environments, e.g. a
+                    local mirror. Defaults to None.
+        find_links: Wheelhouse directory or URL searched for packages when creating shared
+                    environments. Defaults to None.
+        offline: Whether shared environments are created from uv's cache and find_links only,
+                    without network access. Defaults to False.
+        marimo_version: Exact marimo version to export with, e.g. "0.18.4". It is installed
+                    once per build into a tool environment (kept in ``<cache_dir>/tools`` if
+                    cache_dir is set) whose interpreter runs every export instead of
+                    ``uvx marimo``. Defaults to None (latest marimo via uvx).
+        page_size: Maximum number of notebooks of a kind on one index page. With a page size,
+                    index.html lists the first page of each kind and links to per-kind pages such
+                    as notebooks/index.html and notebooks/page-2.html. Defaults to 0 (a single
+                    index page).
+        search: Whether to write search-index.json, a prebuilt inverted index over the display
+                    names, module docstrings and markdown headings of all notebooks, which the
+                    built-in template queries from a search box. Notebooks unchanged since the
+                    previous build are not parsed again. Defaults to False.
+        recursive: Whether to find notebooks in subdirectories of the folders as well. Exports
+                    mirror the source tree, e.g. notebooks/team/demo.py is exported to
+                    notebooks/team/demo.html, and every directory gets an index page.
+                    Defaults to False.
+        include: Glob patterns of which notebooks must match at least one, e.g. ``["*_demo.py"]``.
+                    Defaults to None (all notebooks).
+        exclude: Glob patterns of notebooks and directories to skip, e.g. ``["drafts"]``.
+                    ``.marimushkaignore`` files in the folders add patterns of their own.
+                    Defaults to None.
+        since: Git revision, e.g. ``"origin/main"``. Only the notebooks changed since its merge
+                    base with HEAD (in commits, the working tree or untracked files), those whose
+                    local modules or referenced ``public/`` files changed, and those missing from
+                    the output directory are exported; the rest of the previous site is reused and
+                    the index is only re-rendered if needed. Defaults to None (all notebooks).
+        changes: Changes of a watch mode rebuild (see marimushka.watch). Only the affected
+                    notebooks are exported, and the index is only re-rendered if the template
+                    or the set of notebooks changed. Defaults to None (full build).
+        cancellation: Cancel flags of the notebook exports, set by watch mode when a notebook
+                    changes again during its export. Defaults to None.
+        worker_pool: Pool of persistent marimo workers used by the workers engine instead of
+                    one started for this build, so long-running callers keep workers warm
+                    across builds. The caller closes it. Defaults to None.
+        on_complete: Optional callback called with the BatchExportResult of the build once
+                    the index is written. Not called if no notebooks were found.
+                    Defaults to None.
+        return_html: Whether to return the index page. If False, the template is streamed
+                    into the index file, which is then atomically replaced, without holding
+                    the page in memory; useful for very large sites. Defaults to True.
 
     Returns:
-        Rendered HTML content as string, empty if no notebooks found.
+        Rendered HTML content as string, empty if no notebooks found or return_html is False.
 
     Raises:
+        ValueError: If marimo_version is not an exact release version or page_size is negative.
+        GitDiffError: If since is set and the changed files cannot be determined.
+        ExportEnvironmentError: If the pinned marimo version cannot be installed.
         TemplateNotFoundError: If the template file does not exist.
         TemplateInvalidError: If the template path is not a file.
         TemplateRenderError: If the template fails to render.
@@ -75,59 +748,148 @@ def main(
 
         main(notebooks="my-notebooks", on_progress=progress_handler)
 
-    """
-    logger.info("Starting marimushka build process")
-    logger.info(f"Version of Marimushka: {__version__}")
-    output = output or "_site"
-
-    # Convert output_dir explicitly to Path
-    output_dir: Path = Path(output)
-    logger.info(f"Output directory: {output_dir}")
-
-    # Make sure the output directory exists
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # Convert template to Path and validate early
-    template_file: Path = Path(template)
-    audit_logger = get_audit_logger()
-    validate_template(template_file, audit_logger)
-
-    logger.info(f"Using template file: {template_file}")
-    logger.info(f"Notebooks: {notebooks}")
-    logger.info(f"Apps: {apps}")
-    logger.info(f"Notebooks-wasm: {notebooks_wasm}")
-    logger.info(f"Sandbox: {sandbox}")
-    logger.info(f"Parallel: {parallel} (max_workers={max_workers})")
-    logger.info(f"Bin path: {bin_path}")
-    logger.info(f"Timeout: {timeout}s")
-
-    # Convert bin_path to Path if provided
-    bin_path_obj: Path | None = Path(bin_path) if bin_path else None
+        # Preview of a pull request: only what changed since the target branch
+        main(notebooks="my-notebooks", since="origin/main")
 
-    notebooks_data = folder2notebooks(folder=notebooks, kind=Kind.NB)
-    apps_data = folder2notebooks(folder=apps, kind=Kind.APP)
-    notebooks_wasm_data = folder2notebooks(folder=notebooks_wasm, kind=Kind.NB_WASM)
-
-    logger.info(f"# notebooks_data: {len(notebooks_data)}")
-    logger.info(f"# apps_data: {len(apps_data)}")
-    logger.info(f"# notebooks_wasm_data: {len(notebooks_wasm_data)}")
-
-    # Exit if no notebooks or apps were found
-    if not notebooks_data and not apps_data and not notebooks_wasm_data:
-        logger.warning("No notebooks or apps found!")
-        return ""
-
-    return generate_index(
-        output=output_dir,
-        template_file=template_file,
-        notebooks=notebooks_data,
-        apps=apps_data,
-        notebooks_wasm=notebooks_wasm_data,
+    """
+    with open_session(
+        output=output,
+        template=template,
+        notebooks=notebooks,
+        apps=apps,
+        notebooks_wasm=notebooks_wasm,
         sandbox=sandbox,
-        bin_path=bin_path_obj,
+        bin_path=bin_path,
         parallel=parallel,
         max_workers=max_workers,
         timeout=timeout,
         on_progress=on_progress,
-        audit_logger=audit_logger,
-    )
+        cache_dir=cache_dir,
+        incremental=incremental,
+        estimated_duration=estimated_duration,
+        engine=engine,
+        worker_max_jobs=worker_max_jobs,
+        worker_max_memory=worker_max_memory,
+        shared_envs=shared_envs,
+        env_cache_size=env_cache_size,
+        prefetch=prefetch,
+        index_url=index_url,
+        find_links=find_links,
+        offline=offline,
+        marimo_version=marimo_version,
+        page_size=page_size,
+        search=search,
+        recursive=recursive,
+        include=include,
+        exclude=exclude,
+        worker_pool=worker_pool,
+    ) as session:
+        return session.build(
+            changes=changes,
+            cancellation=cancellation,
+            on_complete=on_complete,
+            return_html=return_html,
+            since=since,
+        )
+
+
+# Options of main_with_deps that are not MarimushkaConfig settings
+_SESSION_OPTIONS = frozenset(inspect.signature(BuildSession).parameters) - {"deps"}
+_BUILD_OPTIONS = frozenset({"since", "changes", "cancellation", "on_complete", "return_html"})
+
+# Defaults of the options of main that configure a session rather than one build
+_MAIN_SESSION_DEFAULTS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(main).parameters.items()
+    if name not in _BUILD_OPTIONS
+}
+
+
+def open_session(**options: Any) -> BuildSession:
+    """Open a BuildSession configured with keyword arguments of ``main()``.
+
+    Long-running callers, such as watch mode, ``marimushka serve`` and the
+    build daemon, open one session and call ``build()`` for every rebuild
+    instead of calling ``main()`` each time.
+
+    Args:
+        **options: Keyword arguments of ``main()`` other than those of
+            ``BuildSession.build()``. Options not given keep the defaults of
+            ``main()``.
+
+    Returns:
+        The session. The caller closes it.
+
+    Raises:
+        TypeError: If an option is not such an argument of ``main()``.
+
+    Example::
+
+        from marimushka.export import open_session
+
+        with open_session(notebooks="notebooks", incremental=True) as session:
+            session.build()
+
+    """
+    unknown = set(options) - set(_MAIN_SESSION_DEFAULTS)
+    if unknown:
+        raise TypeError(f"open_session() got unexpected keyword argument(s): {', '.join(sorted(unknown))}")  # noqa: TRY003
+
+    settings = {**_MAIN_SESSION_DEFAULTS, **options}
+    session_options = {name: settings.pop(name) for name in _SESSION_OPTIONS}
+    settings["output"] = settings["output"] or "_site"
+    for name in ("output", "template"):
+        settings[name] = str(settings[name])
+    # None and "" both mean no folder of that kind
+    for name in ("notebooks", "apps", "notebooks_wasm"):
+        settings[name] = str(settings[name]) if settings[name] else ""
+    settings["cache_dir"] = str(settings["cache_dir"]) if settings["cache_dir"] else None
+    for name in ("include", "exclude"):
+        if settings[name] is not None:
+            settings[name] = list(settings[name])
+    return BuildSession(create_dependencies(config=MarimushkaConfig(**settings)), **session_options)
+
+
+def main_with_deps(deps: Dependencies, **options: Any) -> str:
+    """Export marimo notebooks and generate an index page with injected dependencies.
+
+    The build runs in a BuildSession of its own: the configuration of ``deps``
+    provides its settings and its audit logger records the audit events.
+    Embedding applications that build more than once keep a BuildSession
+    instead.
+
+    Args:
+        deps: Audit logger and configuration of the build.
+        **options: Settings of MarimushkaConfig that override the configuration,
+            e.g. ``notebooks="notebooks"``, and options of BuildSession and of
+            ``BuildSession.build()``, e.g. ``incremental=True``.
+
+    Returns:
+        Rendered HTML content as string, empty if no notebooks found.
+
+    Raises:
+        TypeError: If an option is neither a setting nor an option of the session.
+
+    Example::
+
+        from marimushka.dependencies import create_dependencies
+        from marimushka.export import main_with_deps
+
+        html = main_with_deps(create_dependencies(), notebooks="notebooks", apps="apps")
+
+    """
+    config = copy.copy(deps.config)
+    session_options: dict[str, Any] = {}
+    build_options: dict[str, Any] = {}
+    for name, value in options.items():
+        if name in _BUILD_OPTIONS:
+            build_options[name] = value
+        elif name in _SESSION_OPTIONS:
+            session_options[name] = value
+        elif name in vars(config):
+            setattr(config, name, value)
+        else:
+            raise TypeError(f"main_with_deps() got an unexpected keyword argument {name!r}")  # noqa: TRY003
+
+    with BuildSession(deps.with_config(config), **session_options) as session:
+        return session.build(**build_options)
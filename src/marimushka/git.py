@@ -0,0 +1,118 @@
+"""Notebooks changed since a git revision.
+
+Preview builds of a pull request only need the notebooks the pull request
+touches. ``main(since="origin/main")`` asks the local git repository which
+files changed since the merge base of that revision and ``HEAD``, in commits
+as well as in the working tree, including untracked files that are not
+ignored. The changed paths are mapped to notebooks like the changes of watch
+mode (see classify_changes), so a changed helper module or ``public/`` data
+file affects the notebooks depending on it.
+
+Example::
+
+    from marimushka.git import changed_files
+
+    for path in changed_files("origin/main"):
+        print(path)
+"""
+
+import shutil
+import subprocess  # nosec B404
+from collections.abc import Mapping
+from pathlib import Path
+
+from loguru import logger
+
+from .exceptions import GitDiffError
+from .notebook import Kind
+from .watch import ChangeSet, classify_changes
+
+
+def _git(git: str, revision: str, args: list[str], cwd: Path, timeout: int) -> str:
+    """Run a git command and return its standard output.
+
+    Raises:
+        GitDiffError: If the command fails or times out.
+
+    """
+    cmd = [git, *args]
+    try:
+        result = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, check=False, timeout=timeout)  # nosec B603  # noqa: S603
+    except (OSError, subprocess.SubprocessError) as e:
+        raise GitDiffError(revision, f"git {args[0]} failed", str(e)) from e
+    if result.returncode != 0:
+        raise GitDiffError(revision, f"git {args[0]} failed", result.stderr.strip())
+    return result.stdout
+
+
+def changed_files(since: str, cwd: Path | str = ".", timeout: int = 60) -> list[Path]:
+    """Return the files changed since a revision.
+
+    Changes are taken relative to the merge base of the revision and ``HEAD``,
+    so commits that only landed on the revision's branch do not count. If there
+    is no merge base, e.g. in a shallow clone, the revision itself is used.
+
+    Args:
+        since: A git revision, e.g. ``origin/main`` or a commit hash.
+        cwd: A directory inside the repository. Defaults to the current directory.
+        timeout: Maximum time in seconds for each git command. Defaults to 60.
+
+    Returns:
+        Sorted absolute paths of the files added, modified, deleted or renamed
+        since the revision, including untracked files that are not ignored.
+
+    Raises:
+        GitDiffError: If git is missing, cwd is not inside a repository or the
+            revision is unknown.
+
+    """
+    if not since or since.startswith("-"):
+        raise GitDiffError(since, "not a revision")
+    git = shutil.which("git")
+    if git is None:
+        raise GitDiffError(since, "git is not installed")
+    cwd = Path(cwd)
+
+    root = Path(_git(git, since, ["rev-parse", "--show-toplevel"], cwd, timeout).strip())
+    try:
+        commit = _git(git, since, ["rev-parse", "--verify", "--quiet", f"{since}^{{commit}}"], cwd, timeout).strip()
+    except GitDiffError as e:
+        raise GitDiffError(since, "unknown revision") from e
+    try:
+        base = _git(git, since, ["merge-base", commit, "HEAD"], cwd, timeout).strip()
+    except GitDiffError:
+        logger.warning(f"No merge base of {since} and HEAD; comparing against {since} itself")
+        base = commit
+
+    changed = _git(git, since, ["diff", "--name-only", "--no-renames", "-z", base, "--"], root, timeout)
+    untracked = _git(git, since, ["ls-files", "--others", "--exclude-standard", "-z"], root, timeout)
+    names = {name for name in (changed + untracked).split("\0") if name}
+    return sorted(root / name for name in names)
+
+
+def changes_since(
+    since: str,
+    folders: Mapping[Kind, Path | str | None],
+    template: Path | str,
+    output: Path | str | None = None,
+    cwd: Path | str = ".",
+) -> ChangeSet:
+    """Map the files changed since a revision to the notebooks and template they affect.
+
+    Args:
+        since: A git revision, e.g. ``origin/main``.
+        folders: The notebook folder of each Kind.
+        template: Path to the index template.
+        output: Optional output directory whose own files are never a change.
+        cwd: A directory inside the repository. Defaults to the current directory.
+
+    Returns:
+        The changes, as a watch mode rebuild would see them.
+
+    Raises:
+        GitDiffError: If the changed files cannot be determined.
+
+    """
+    files = changed_files(since, cwd)
+    logger.info(f"{len(files)} files changed since {since}")
+    return classify_changes([("modified", str(path)) for path in files], folders, template, output)
@@ -0,0 +1,124 @@
+"""Export duration history for longest-job-first scheduling.
+
+The history records how long each notebook took to export in previous builds.
+The orchestrator uses it to dispatch the slowest notebooks first, so a single
+heavy notebook never ends up at the tail of a parallel build, and to estimate
+the time remaining while a build runs.
+
+The history is stored as JSON inside the cache directory::
+
+    {
+      "version": 1,
+      "durations": {
+        "notebook:notebooks/demo.py": 12.4
+      }
+    }
+"""
+
+from pathlib import Path
+
+from loguru import logger
+
+from .notebook import Notebook
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the history file inside the cache directory
+HISTORY_FILENAME = "history.json"
+
+# Format of the history file; durations of other versions are discarded
+HISTORY_VERSION = 1
+
+# Estimated export duration in seconds for notebooks without history
+DEFAULT_ESTIMATED_DURATION = 30.0
+
+# Weight of the latest measurement in the moving average of durations
+_SMOOTHING = 0.5
+
+
+class ExportHistory:
+    """Recorded export durations keyed by notebook Kind and path.
+
+    Attributes:
+        path: The JSON file the history is loaded from and saved to.
+        durations: Smoothed export durations in seconds.
+
+    """
+
+    def __init__(self, path: Path, durations: dict[str, float] | None = None) -> None:
+        """Initialize the history.
+
+        Args:
+            path: The JSON file backing the history.
+            durations: Previously recorded durations. Defaults to none.
+
+        """
+        self.path = path
+        self.durations: dict[str, float] = durations or {}
+
+    @staticmethod
+    def _key(notebook: Notebook) -> str:
+        """Return the history key of a notebook."""
+        return f"{notebook.kind.value}:{notebook.path.as_posix()}"
+
+    @classmethod
+    def load(cls, path: Path) -> "ExportHistory":
+        """Load a history file.
+
+        A missing, unreadable or outdated file yields an empty history.
+
+        Args:
+            path: The JSON file backing the history.
+
+        Returns:
+            The loaded history.
+
+        """
+        try:
+            data = read_versioned_json(path, HISTORY_VERSION)
+            if data is None:
+                return cls(path)
+            durations = {str(key): float(value) for key, value in data["durations"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable export history {path}: {e}")
+            return cls(path)
+        return cls(path, durations)
+
+    def save(self) -> None:
+        """Atomically write the history.
+
+        Failures are logged rather than raised: a missing history only affects
+        the order in which the next build dispatches notebooks.
+        """
+        data = {"version": HISTORY_VERSION, "durations": dict(sorted(self.durations.items()))}
+        try:
+            write_json_atomic(self.path, data)
+        except OSError as e:
+            logger.warning(f"Could not write export history {self.path}: {e}")
+
+    def estimate(self, notebook: Notebook, default: float = DEFAULT_ESTIMATED_DURATION) -> float:
+        """Return the expected export duration of a notebook.
+
+        Args:
+            notebook: The notebook to estimate.
+            default: Estimate in seconds for notebooks without history.
+
+        Returns:
+            The expected duration in seconds.
+
+        """
+        return self.durations.get(self._key(notebook), default)
+
+    def record(self, notebook: Notebook, duration: float) -> None:
+        """Record a measured export duration.
+
+        Measurements are blended into a moving average so a single slow or fast
+        run does not dominate future estimates.
+
+        Args:
+            notebook: The exported notebook.
+            duration: The measured export duration in seconds.
+
+        """
+        key = self._key(notebook)
+        previous = self.durations.get(key)
+        self.durations[key] = duration if previous is None else _SMOOTHING * duration + (1 - _SMOOTHING) * previous
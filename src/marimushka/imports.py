@@ -0,0 +1,295 @@
+"""Import graph of the local modules of notebooks.
+
+Notebooks often import helper modules that sit next to them. marimo runs a
+notebook with its directory on ``sys.path``, so ``import helpers`` in
+``notebooks/demo.py`` loads ``notebooks/helpers.py``, and a change to that
+helper changes the export of every notebook that imports it, directly or
+through other helpers.
+
+The ImportGraph finds these modules without running anything: each source is
+parsed with ``ast`` and its ``import`` and ``from ... import`` statements,
+including those inside cell functions, are resolved to files:
+
+- absolute imports against the directory of the notebook,
+- relative imports against the package of the importing module,
+- ``import a.b`` also depends on ``a/__init__.py``, and ``from a import b``
+  on ``a/b.py`` if ``b`` is a submodule.
+
+Imports that do not resolve to a file, e.g. of the standard library or of
+installed packages, are ignored. The imports of a source are cached by the
+SHA-256 digest of its contents, so each version of a module is parsed once;
+builds with a cache directory persist them as ``imports.json`` there.
+
+The digest over a notebook's local modules (``modules_hash``) is part of
+export cache keys and build manifest entries, and watch mode re-exports the
+notebooks whose modules changed.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.imports import import_graph
+
+    for module in import_graph().modules(Path("notebooks/demo.py")):
+        print(module)
+"""
+
+import ast
+import hashlib
+import os
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+from loguru import logger
+
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the persisted imports inside the cache directory
+IMPORTS_FILENAME = "imports.json"
+
+# Format of the persisted imports, including how statements are parsed into them
+IMPORTS_VERSION = 1
+
+# An import statement: module name, relative level and the names imported from it
+ImportRef = tuple[str, int, tuple[str, ...]]
+
+
+def parse_imports(source: bytes, filename: str = "<unknown>") -> tuple[ImportRef, ...]:
+    """Find the import statements of a source.
+
+    Args:
+        source: The Python source.
+        filename: Name of the source, used in log messages.
+
+    Returns:
+        The imports in source order; empty if the source does not parse.
+
+    """
+    try:
+        tree = ast.parse(source, filename=filename)
+    except (SyntaxError, ValueError) as e:
+        logger.debug(f"Not resolving the imports of {filename}: {e}")
+        return ()
+
+    refs: list[tuple[int, int, ImportRef]] = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            refs.extend((node.lineno, node.col_offset, (alias.name, 0, ())) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            names = tuple(alias.name for alias in node.names if alias.name != "*")
+            refs.append((node.lineno, node.col_offset, (node.module or "", node.level, names)))
+    refs.sort(key=lambda item: item[:2])
+    return tuple(ref for _, _, ref in refs)
+
+
+def _module_file(module: Path) -> Path | None:
+    """Return the file of a module or package, or None if there is none."""
+    for candidate in (module.with_name(f"{module.name}.py"), module / "__init__.py"):
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def resolve_import(ref: ImportRef, importer: Path, root: Path) -> list[Path]:
+    """Resolve an import statement to local module files.
+
+    Args:
+        ref: The import statement, see parse_imports.
+        importer: The module containing the statement.
+        root: Directory absolute imports are resolved against, the notebook's directory.
+
+    Returns:
+        The files the statement loads, including the ``__init__.py`` of
+        parent packages; empty for modules that are not local.
+
+    """
+    module, level, names = ref
+    if level:
+        base = importer.parent
+        for _ in range(level - 1):
+            base = base.parent
+    else:
+        base = root
+    found: list[Path] = []
+    package = base
+    for part in filter(None, module.split(".")):
+        package = package / part
+        file = _module_file(package)
+        if file is not None:
+            found.append(file)
+        elif not package.is_dir():
+            # Neither a local module nor a namespace package
+            return []
+    for name in names:
+        submodule = _module_file(package / name)
+        if submodule is not None:
+            found.append(submodule)
+    return found
+
+
+class ImportGraph:
+    """Imports of local modules, parsed once per version of each source.
+
+    Exports running in parallel threads share the graph; sources are parsed
+    outside of its lock, which only guards the entries.
+
+    Attributes:
+        entries: Imports of each parsed source, keyed by the SHA-256 digest of its contents.
+        parsed: Number of sources parsed since the graph was created.
+
+    """
+
+    def __init__(self, entries: dict[str, tuple[ImportRef, ...]] | None = None) -> None:
+        """Initialize the graph.
+
+        Args:
+            entries: Imports keyed by source digest. Defaults to None (empty).
+
+        """
+        self.entries = entries or {}
+        self.parsed = 0
+        self._used: set[str] = set()
+        self._modules: dict[Path, frozenset[Path]] = {}
+        self._lock = threading.Lock()
+
+    def _imports(self, path: Path) -> tuple[str, tuple[ImportRef, ...]]:
+        """Return the digest and the imports of a source, parsing it only if its digest is new."""
+        source = path.read_bytes()
+        digest = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            refs = self.entries.get(digest)
+            self._used.add(digest)
+        if refs is None:
+            refs = parse_imports(source, str(path))
+            with self._lock:
+                self.entries[digest] = refs
+                self.parsed += 1
+        return digest, refs
+
+    def _closure(self, notebook: Path) -> dict[Path, str]:
+        """Return the digests of the local modules a notebook loads, directly or indirectly."""
+        notebook = notebook.resolve()
+        root = notebook.parent
+        digests: dict[Path, str] = {}
+        seen = {notebook}
+        pending = [notebook]
+        while pending:
+            path = pending.pop()
+            try:
+                digest, refs = self._imports(path)
+            except OSError as e:
+                logger.debug(f"Not resolving the imports of {path}: {e}")
+                continue
+            if path != notebook:
+                digests[path] = digest
+            for ref in refs:
+                for module in resolve_import(ref, path, root):
+                    module = module.resolve()
+                    if module not in seen:
+                        seen.add(module)
+                        pending.append(module)
+        return digests
+
+    def modules(self, notebook: Path) -> frozenset[Path]:
+        """Return the resolved paths of the local modules a notebook loads.
+
+        Args:
+            notebook: Path to the notebook source.
+
+        Returns:
+            The modules imported by the notebook or, transitively, by its modules.
+
+        """
+        modules = frozenset(self._closure(notebook))
+        with self._lock:
+            self._modules[notebook.resolve()] = modules
+        return modules
+
+    def modules_hash(self, notebook: Path) -> str | None:
+        """Return a digest over the paths and contents of a notebook's local modules.
+
+        Args:
+            notebook: Path to the notebook source.
+
+        Returns:
+            The hex digest, or None if the notebook imports no local modules.
+
+        """
+        closure = self._closure(notebook)
+        with self._lock:
+            self._modules[notebook.resolve()] = frozenset(closure)
+        if not closure:
+            return None
+        root = notebook.resolve().parent
+        digest = hashlib.sha256()
+        for module, module_digest in sorted(closure.items()):
+            digest.update(os.path.relpath(module, root).encode())
+            digest.update(b"\0")
+            digest.update(module_digest.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def depends_on(self, notebook: Path, changed: Iterable[Path]) -> bool:
+        """Check whether a notebook loads any of some changed modules.
+
+        Both the modules the notebook loads now and those it loaded when last
+        resolved count, so deleting a helper also affects its former dependents.
+
+        Args:
+            notebook: Path to the notebook source.
+            changed: Resolved paths of changed files.
+
+        Returns:
+            True if one of the changed files is a local module of the notebook.
+
+        """
+        changed = set(changed)
+        if not changed:
+            return False
+        with self._lock:
+            previous = self._modules.get(notebook.resolve(), frozenset())
+        return not changed.isdisjoint(previous) or not changed.isdisjoint(self.modules(notebook))
+
+    def load(self, path: Path) -> None:
+        """Add the imports persisted in a file; missing or unreadable files add nothing.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/imports.json``.
+
+        """
+        try:
+            data = read_versioned_json(path, IMPORTS_VERSION)
+            if data is None:
+                return
+            entries = {
+                digest: tuple((module, level, tuple(names)) for module, level, names in refs)
+                for digest, refs in data["entries"].items()
+            }
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable imports {path}: {e}")
+            return
+        with self._lock:
+            for digest, refs in entries.items():
+                self.entries.setdefault(digest, refs)
+
+    def save(self, path: Path) -> None:
+        """Persist the imports of the sources used by this process; failures are logged.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/imports.json``.
+
+        """
+        with self._lock:
+            entries = {digest: self.entries[digest] for digest in sorted(self._used) if digest in self.entries}
+        try:
+            write_json_atomic(path, {"version": IMPORTS_VERSION, "entries": entries}, compact=True)
+        except OSError as e:
+            logger.warning(f"Could not write {path}: {e}")
+
+
+_import_graph = ImportGraph()
+
+
+def import_graph() -> ImportGraph:
+    """Return the import graph shared by the builds of this process."""
+    return _import_graph
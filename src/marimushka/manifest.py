@@ -0,0 +1,277 @@
+"""Build manifest for incremental site builds.
+
+Every build writes a versioned manifest (``.marimushka-manifest.json``) into the
+output directory. It maps each exported file to the notebook it was built from,
+so the next build can tell which notebooks need re-exporting and which
+previously exported files are orphans of notebooks that no longer exist.
+
+Example manifest::
+
+    {
+      "version": 1,
+      "entries": {
+        "notebooks/demo.html": {
+          "source": "notebooks/demo.py",
+          "kind": "notebook",
+          "content_hash": "9f86d08...",
+          "sandbox": true,
+          "duration": 12.4,
+          "marimo_version": "0.18.4",
+          "modules_hash": null,
+          "assets_hash": "2c26b46..."
+        }
+      }
+    }
+"""
+
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from .assets import asset_references
+from .cache import hash_file
+from .exceptions import NotebookExportResult
+from .imports import import_graph
+from .notebook import Kind, Notebook
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the manifest file inside the output directory
+MANIFEST_FILENAME = ".marimushka-manifest.json"
+
+# Format of the manifest; a build with another version behaves like a full build
+MANIFEST_VERSION = 1
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    """Record of a single exported file.
+
+    Attributes:
+        source: Path to the notebook source the file was exported from.
+        kind: Value of the notebook's Kind.
+        content_hash: SHA-256 digest of the notebook source at export time.
+        sandbox: Whether the notebook was exported in a sandbox.
+        duration: Time in seconds the export took, if known.
+        marimo_version: The marimo version used for the export, if known.
+        modules_hash: Digest of the local modules the notebook imported at
+            export time, None if it imported none.
+        assets_hash: Digest of the ``public/`` files the export depended on,
+            None if there were none.
+
+    """
+
+    source: str
+    kind: str
+    content_hash: str
+    sandbox: bool
+    duration: float | None = None
+    marimo_version: str | None = None
+    modules_hash: str | None = None
+    assets_hash: str | None = None
+
+
+def _assets_hash(notebook: Notebook) -> str | None:
+    """Return the digest of the public/ files a notebook's export depends on."""
+    # WebAssembly exports copy the whole public/ directory
+    return asset_references().assets_hash(notebook.path, whole_directory=notebook.kind != Kind.NB)
+
+
+@dataclass
+class BuildManifest:
+    """Mapping of exported files (relative to the output directory) to their sources.
+
+    Attributes:
+        entries: Manifest entries keyed by the POSIX path of the exported file
+            relative to the output directory.
+
+    """
+
+    entries: dict[str, ManifestEntry] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, output_dir: Path) -> "BuildManifest":
+        """Load the manifest of the previous build.
+
+        A missing, unreadable or outdated manifest yields an empty manifest, so
+        the next build simply behaves like a full build.
+
+        Args:
+            output_dir: The output directory of the build.
+
+        Returns:
+            The manifest of the previous build.
+
+        """
+        manifest_path = output_dir / MANIFEST_FILENAME
+        try:
+            data = read_versioned_json(manifest_path, MANIFEST_VERSION)
+            if data is None:
+                return cls()
+            entries = {rel: ManifestEntry(**entry) for rel, entry in data["entries"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable build manifest {manifest_path}: {e}")
+            return cls()
+        return cls(entries=entries)
+
+    def save(self, output_dir: Path) -> None:
+        """Atomically write the manifest into the output directory.
+
+        Failures are logged rather than raised: a missing manifest only makes
+        the next build a full build.
+
+        Args:
+            output_dir: The output directory of the build.
+
+        """
+        manifest_path = output_dir / MANIFEST_FILENAME
+        data = {
+            "version": MANIFEST_VERSION,
+            "entries": {rel: asdict(entry) for rel, entry in sorted(self.entries.items())},
+        }
+        try:
+            write_json_atomic(manifest_path, data)
+        except OSError as e:
+            logger.warning(f"Could not write build manifest {manifest_path}: {e}")
+
+    def is_current(self, notebook: Notebook, output_dir: Path, sandbox: bool, marimo_version: str | None) -> bool:
+        """Check whether a notebook's previous export is still up to date.
+
+        Args:
+            notebook: The notebook to check.
+            output_dir: The output directory of the build.
+            sandbox: Whether the notebook would be exported in a sandbox.
+            marimo_version: The marimo version the build would use, if known.
+
+        Returns:
+            True if the exported file exists and was built from identical inputs,
+            including the notebook's local modules and data files.
+
+        """
+        entry = self.entries.get(notebook.html_path.as_posix())
+        if entry is None or entry.kind != notebook.kind.value or entry.sandbox != sandbox:
+            return False
+        if marimo_version is not None and entry.marimo_version != marimo_version:
+            return False
+        if not (output_dir / notebook.html_path).is_file():
+            return False
+        try:
+            return (
+                entry.content_hash == hash_file(notebook.path)
+                and entry.modules_hash == import_graph().modules_hash(notebook.path)
+                and entry.assets_hash == _assets_hash(notebook)
+            )
+        except OSError:
+            return False
+
+    def orphans(self, current: "BuildManifest") -> list[str]:
+        """Return exported files of this manifest that are absent from another one.
+
+        Args:
+            current: The manifest of the current build.
+
+        Returns:
+            Sorted relative paths of files that no longer belong to the site.
+
+        """
+        return sorted(set(self.entries) - set(current.entries))
+
+
+def update_manifest(
+    previous: BuildManifest,
+    notebooks: list[Notebook],
+    results: list[NotebookExportResult],
+    output_dir: Path,
+    sandbox: bool,
+    marimo_version: str | None,
+) -> BuildManifest:
+    """Build the manifest of the current build.
+
+    Successful exports get fresh entries. Notebooks that were skipped or whose
+    export failed keep their previous entry, so their files are not treated as
+    orphans and a failed notebook is retried by the next incremental build.
+
+    Args:
+        previous: The manifest of the previous build.
+        notebooks: All notebooks that belong to the site.
+        results: Export results of this build.
+        output_dir: The output directory of the build.
+        sandbox: Whether notebooks were exported in a sandbox.
+        marimo_version: The marimo version used by the build, if known.
+
+    Returns:
+        The manifest describing the current build.
+
+    """
+    results_by_path = {result.notebook_path: result for result in results}
+    manifest = BuildManifest()
+
+    for nb in notebooks:
+        rel = nb.html_path.as_posix()
+        old_entry = previous.entries.get(rel)
+        result = results_by_path.get(nb.path)
+
+        if result is None or not result.success or not (output_dir / nb.html_path).is_file():
+            if old_entry is not None:
+                manifest.entries[rel] = old_entry
+            continue
+
+        try:
+            content_hash = hash_file(nb.path)
+            modules_hash = import_graph().modules_hash(nb.path)
+            assets_hash = _assets_hash(nb)
+        except OSError as e:
+            logger.warning(f"Could not hash {nb.path.name} for the build manifest: {e}")
+            continue
+
+        duration = result.duration
+        version = marimo_version
+        if result.cached and old_entry is not None and old_entry.content_hash == content_hash:
+            # Keep the facts of the real export rather than those of the cache restore
+            duration = old_entry.duration
+            version = version or old_entry.marimo_version
+
+        manifest.entries[rel] = ManifestEntry(
+            source=str(nb.path),
+            kind=nb.kind.value,
+            content_hash=content_hash,
+            sandbox=sandbox,
+            duration=duration,
+            marimo_version=version,
+            modules_hash=modules_hash,
+            assets_hash=assets_hash,
+        )
+
+    return manifest
+
+
+def remove_orphans(previous: BuildManifest, current: BuildManifest, output_dir: Path) -> list[Path]:
+    """Delete exported files of notebooks that were removed from the source folders.
+
+    Only files recorded in the previous manifest are ever deleted, so files in
+    the output directory that marimushka did not create are left alone.
+
+    Args:
+        previous: The manifest of the previous build.
+        current: The manifest of the current build.
+        output_dir: The output directory of the build.
+
+    Returns:
+        The paths of the deleted files.
+
+    """
+    removed: list[Path] = []
+    output_root = output_dir.resolve()
+    for rel in previous.orphans(current):
+        orphan = (output_dir / rel).resolve()
+        if not orphan.is_relative_to(output_root):
+            logger.warning(f"Refusing to remove {rel}: outside of the output directory")
+            continue
+        try:
+            orphan.unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not remove orphaned file {rel}: {e}")
+            continue
+        logger.info(f"Removed orphaned export {rel}")
+        removed.append(orphan)
+    return removed
@@ -39,26 +39,49 @@ Example::
     notebooks = folder2notebooks(Path("notebooks"), kind=Kind.NB)
 """
 
+import asyncio
 import dataclasses
 import os
 import shutil
 import subprocess  # nosec B404
+import threading
+import time
+from collections.abc import Callable, Sequence
 from enum import Enum
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from loguru import logger
 
 from .audit import AuditLogger, get_audit_logger
+from .cache import ExportCache
+from .discovery import scan_folder
 from .exceptions import (
-    ExportError,
+    ExportCancelledError,
+    ExportEnvironmentError,
     ExportExecutableNotFoundError,
     ExportSubprocessError,
     NotebookExportResult,
     NotebookInvalidError,
     NotebookNotFoundError,
 )
+from .precheck import source_checks
+from .process import (
+    ProcessResult,
+    ProcessTreeCancelled,
+    ProcessTreeTimeoutExpired,
+    communicate_async,
+    run_process_tree,
+    start_process_tree_async,
+    terminate_process_tree_async,
+)
 from .security import sanitize_error_message, set_secure_file_permissions, validate_bin_path, validate_path_traversal
 
+if TYPE_CHECKING:
+    from .environments import DependencySet, EnvironmentPool
+    from .tool import MarimoTool
+    from .worker import WorkerPool
+
 
 class Kind(Enum):
     """Enumeration of notebook export types.
@@ -177,6 +200,52 @@ class Kind(Enum):
         return paths[self]
 
 
+def resolve_executable(bin_path: Path | None, audit_logger: AuditLogger | None = None) -> str:
+    """Resolve the uvx executable that runs exports.
+
+    Builds resolve it once and pass it to every export (see BuildSession).
+
+    Args:
+        bin_path: Optional directory where the executable is located.
+        audit_logger: Logger for audit events. If None, uses default logger.
+
+    Returns:
+        "uvx" to look it up on PATH, or its full path inside bin_path.
+
+    Raises:
+        ExportExecutableNotFoundError: If bin_path is invalid or holds no executable.
+
+    """
+    executable = "uvx"
+    if not bin_path:
+        return executable
+    if audit_logger is None:
+        audit_logger = get_audit_logger()
+
+    # Validate bin_path for security
+    try:
+        validated_bin_path = validate_bin_path(bin_path)
+        audit_logger.log_path_validation(bin_path, "bin_path", True)
+    except ValueError as e:
+        sanitized_error = sanitize_error_message(str(e))
+        logger.error(f"Invalid bin_path: {sanitized_error}")
+        audit_logger.log_path_validation(bin_path, "bin_path", False, sanitized_error)
+        raise ExportExecutableNotFoundError(executable, bin_path) from e
+
+    # Use shutil.which to find it with platform-specific extensions (like .exe on Windows)
+    exe = shutil.which(executable, path=str(validated_bin_path))
+    if exe:
+        return exe
+    # Fallback: try constructing the path directly
+    exe_path = validated_bin_path / executable
+    if exe_path.is_file() and os.access(exe_path, os.X_OK):
+        return str(exe_path)
+
+    err = ExportExecutableNotFoundError(executable, validated_bin_path)
+    logger.error(str(err))
+    raise err
+
+
 @dataclasses.dataclass(frozen=True)
 class Notebook:
     """Represents a marimo notebook.
@@ -187,20 +256,35 @@ class Notebook:
     Attributes:
         path (Path): Path to the marimo notebook (.py file)
         kind (Kind): How the notebook ts treated
+        subdir (Path): Directory of the notebook relative to the folder it was
+            discovered in; its export is written to the same subdirectory of
+            the kind's output directory. Defaults to the folder itself.
+        validate (bool): Whether to check that the path is an existing file.
+            Discovery passes False for files it has just listed. Defaults to True.
 
     """
 
     path: Path
     kind: Kind = Kind.NB
+    subdir: Path = Path()
+    validate: dataclasses.InitVar[bool] = True
 
-    def __post_init__(self) -> None:
+    def __post_init__(self, validate: bool) -> None:
         """Validate the notebook path after initialization.
 
+        Args:
+            validate: Whether to check that the path is an existing file.
+
         Raises:
             NotebookNotFoundError: If the file does not exist.
-            NotebookInvalidError: If the path is not a file or not a Python file.
+            NotebookInvalidError: If the path is not a file or not a Python file,
+                or if subdir is not a relative path inside the output directory.
 
         """
+        if self.subdir.is_absolute() or ".." in self.subdir.parts:
+            raise NotebookInvalidError(self.path, reason=f"subdirectory {self.subdir} leaves the output directory")
+        if not validate:
+            return
         if not self.path.exists():
             raise NotebookNotFoundError(self.path)
         if not self.path.is_file():
@@ -215,6 +299,11 @@ class Notebook:
         bin_path: Path | None = None,
         timeout: int = 300,
         audit_logger: AuditLogger | None = None,
+        cache: ExportCache | None = None,
+        environments: "EnvironmentPool | None" = None,
+        marimo_tool: "MarimoTool | None" = None,
+        cancel: threading.Event | None = None,
+        executable: str | None = None,
     ) -> NotebookExportResult:
         """Export the notebook to HTML/WebAssembly format.
 
@@ -223,24 +312,238 @@ class Notebook:
         suitable for applications. Otherwise, it's exported in "edit" mode,
         suitable for interactive notebooks.
 
+        When a cache is given and it holds an export with the same inputs, the
+        cached HTML is restored and no subprocess is spawned.
+
         Args:
             output_dir: Directory where the exported HTML file will be saved.
             sandbox: Whether to run the notebook in a sandbox. Defaults to True.
             bin_path: The directory where the executable is located. Defaults to None.
             timeout: Maximum time in seconds for the export process. Defaults to 300.
             audit_logger: Logger for audit events. If None, uses default logger.
+            cache: Optional export cache to reuse unchanged exports. Defaults to None.
+            environments: Optional pool of shared environments. In sandbox mode the
+                notebook is exported in the pool's environment for its PEP 723
+                dependencies instead of a fresh marimo sandbox. Defaults to None.
+            marimo_tool: Optional pinned marimo installation that runs the export
+                instead of ``uvx marimo``. Defaults to None.
+            cancel: Optional event that cancels the export once set: its process
+                tree is terminated and the result fails with ExportCancelledError.
+                Defaults to None.
+            executable: The uvx executable already resolved from bin_path, e.g. by
+                a BuildSession, so it is not looked up again. Defaults to None.
 
         Returns:
             NotebookExportResult indicating success or failure with details.
 
         """
+        started = time.perf_counter()
         if audit_logger is None:
             audit_logger = get_audit_logger()
 
-        # Resolve executable
-        exe = self._resolve_executable(bin_path, audit_logger)
-        if isinstance(exe, NotebookExportResult):
-            return exe
+        plan = self._plan_export(
+            output_dir, sandbox, bin_path, audit_logger, cache, environments, marimo_tool, executable
+        )
+        if isinstance(plan, NotebookExportResult):
+            result = plan
+        else:
+            try:
+                result = self._run_export_subprocess(
+                    plan.command, plan.output_file, timeout, audit_logger, cancel=cancel
+                )
+                plan.store(result)
+            finally:
+                plan.release()
+        return dataclasses.replace(result, duration=time.perf_counter() - started)
+
+    async def export_async(
+        self,
+        output_dir: Path,
+        sandbox: bool = True,
+        bin_path: Path | None = None,
+        timeout: int = 300,
+        audit_logger: AuditLogger | None = None,
+        cache: ExportCache | None = None,
+        environments: "EnvironmentPool | None" = None,
+        marimo_tool: "MarimoTool | None" = None,
+        cancel: threading.Event | None = None,
+        executable: str | None = None,
+    ) -> NotebookExportResult:
+        """Export the notebook without blocking the event loop.
+
+        Behaves like export(), but runs marimo via asyncio.create_subprocess_exec.
+        If the calling task is cancelled, the export process is killed before
+        the cancellation propagates.
+
+        Args:
+            output_dir: Directory where the exported HTML file will be saved.
+            sandbox: Whether to run the notebook in a sandbox. Defaults to True.
+            bin_path: The directory where the executable is located. Defaults to None.
+            timeout: Maximum time in seconds for the export process. Defaults to 300.
+            audit_logger: Logger for audit events. If None, uses default logger.
+            cache: Optional export cache to reuse unchanged exports. Defaults to None.
+            environments: Optional pool of shared environments. In sandbox mode the
+                notebook is exported in the pool's environment for its PEP 723
+                dependencies instead of a fresh marimo sandbox. Defaults to None.
+            marimo_tool: Optional pinned marimo installation that runs the export
+                instead of ``uvx marimo``. Defaults to None.
+            cancel: Optional event that cancels the export once set: its process
+                tree is terminated and the result fails with ExportCancelledError.
+                Defaults to None.
+            executable: The uvx executable already resolved from bin_path, e.g. by
+                a BuildSession, so it is not looked up again. Defaults to None.
+
+        Returns:
+            NotebookExportResult indicating success or failure with details.
+
+        """
+        started = time.perf_counter()
+        if audit_logger is None:
+            audit_logger = get_audit_logger()
+
+        if environments is None:
+            plan = self._plan_export(
+                output_dir, sandbox, bin_path, audit_logger, cache, marimo_tool=marimo_tool, executable=executable
+            )
+        else:
+            # Creating a shared environment blocks, so keep it off the event loop
+            plan = await asyncio.to_thread(
+                self._plan_export,
+                output_dir,
+                sandbox,
+                bin_path,
+                audit_logger,
+                cache,
+                environments,
+                marimo_tool,
+                executable,
+            )
+        if isinstance(plan, NotebookExportResult):
+            result = plan
+        else:
+            try:
+                result = await self._run_export_subprocess_async(
+                    plan.command, plan.output_file, timeout, audit_logger, cancel
+                )
+                plan.store(result)
+            finally:
+                plan.release()
+        return dataclasses.replace(result, duration=time.perf_counter() - started)
+
+    def export_in_worker(
+        self,
+        worker_pool: "WorkerPool",
+        output_dir: Path,
+        sandbox: bool = True,
+        bin_path: Path | None = None,
+        timeout: int = 300,
+        audit_logger: AuditLogger | None = None,
+        cache: ExportCache | None = None,
+        environments: "EnvironmentPool | None" = None,
+        marimo_tool: "MarimoTool | None" = None,
+        cancel: threading.Event | None = None,
+        executable: str | None = None,
+    ) -> NotebookExportResult:
+        """Export the notebook in a persistent worker of a worker pool.
+
+        Behaves like export(), but runs marimo inside a warm worker process
+        instead of a fresh ``uvx marimo export`` subprocess. Only exports
+        without a sandbox run in a worker: marimo re-runs a ``--sandbox``
+        export in a new uv environment and interpreter, and shared
+        environments need their own interpreter, so these exports run as
+        plain subprocesses.
+
+        Args:
+            worker_pool: The pool whose workers run the export.
+            output_dir: Directory where the exported HTML file will be saved.
+            sandbox: Whether to run the notebook in a sandbox. Defaults to True.
+            bin_path: The directory where the executable is located. Defaults to None.
+            timeout: Maximum time in seconds for the export. Defaults to 300.
+            audit_logger: Logger for audit events. If None, uses default logger.
+            cache: Optional export cache to reuse unchanged exports. Defaults to None.
+            environments: Optional pool of shared environments. In sandbox mode the
+                notebook is exported in the pool's environment for its PEP 723
+                dependencies instead of a fresh marimo sandbox. Defaults to None.
+            marimo_tool: Optional pinned marimo installation that runs the export
+                instead of ``uvx marimo``. Defaults to None.
+            cancel: Optional event that cancels the export once set: its process
+                tree is terminated and the result fails with ExportCancelledError.
+                Defaults to None.
+            executable: The uvx executable already resolved from bin_path, e.g. by
+                a BuildSession, so it is not looked up again. Defaults to None.
+
+        Returns:
+            NotebookExportResult indicating success or failure with details.
+
+        """
+        started = time.perf_counter()
+        if audit_logger is None:
+            audit_logger = get_audit_logger()
+
+        plan = self._plan_export(
+            output_dir, sandbox, bin_path, audit_logger, cache, environments, marimo_tool, executable
+        )
+        if isinstance(plan, NotebookExportResult):
+            result = plan
+        else:
+            # A sandboxed marimo restarts itself in a fresh environment, which a warm worker cannot save
+            runner = None if sandbox else worker_pool.run
+            try:
+                result = self._run_export_subprocess(
+                    plan.command, plan.output_file, timeout, audit_logger, runner=runner, cancel=cancel
+                )
+                plan.store(result)
+            finally:
+                plan.release()
+        return dataclasses.replace(result, duration=time.perf_counter() - started)
+
+    def _plan_export(
+        self,
+        output_dir: Path,
+        sandbox: bool,
+        bin_path: Path | None,
+        audit_logger: AuditLogger,
+        cache: ExportCache | None,
+        environments: "EnvironmentPool | None" = None,
+        marimo_tool: "MarimoTool | None" = None,
+        executable: str | None = None,
+    ) -> "_ExportPlan | NotebookExportResult":
+        """Run the export steps that precede the subprocess.
+
+        Args:
+            output_dir: Directory where the exported HTML file will be saved.
+            sandbox: Whether to run the notebook in a sandbox.
+            bin_path: The directory where the executable is located.
+            audit_logger: Audit logger for security logging.
+            cache: Optional export cache to reuse unchanged exports.
+            environments: Optional pool of shared environments used in sandbox mode.
+            marimo_tool: Optional pinned marimo installation replacing ``uvx marimo``.
+            executable: Optional uvx executable already resolved from bin_path.
+
+        Returns:
+            The command to run, or a NotebookExportResult if the export already
+            finished (on a validation error or a cache hit).
+
+        """
+        # Notebooks that do not compile fail without spawning a process
+        try:
+            check = source_checks().get(self.path)
+        except OSError:
+            check = None  # Unreadable sources are reported by the export itself
+        if check is not None and check.error is not None:
+            invalid = NotebookInvalidError(self.path, reason=check.error)
+            logger.error(str(invalid))
+            audit_logger.log_export(self.path, None, False, check.error)
+            return NotebookExportResult.failed(self.path, invalid)
+
+        # Resolve executable; a pinned marimo tool does not need uvx
+        if marimo_tool is not None:
+            exe = str(marimo_tool.python)
+        else:
+            resolved = self._resolve_executable(bin_path, audit_logger, executable)
+            if isinstance(resolved, NotebookExportResult):
+                return resolved
+            exe = resolved
 
         # Prepare output path
         output_file_or_error = self._prepare_output_path(output_dir, audit_logger)
@@ -248,53 +551,111 @@ class Notebook:
             return output_file_or_error
         output_file = output_file_or_error
 
-        # Build and run command
-        cmd = self._build_command(exe, sandbox, output_file)
-        return self._run_export_subprocess(cmd, output_file, timeout, audit_logger)
+        # Reuse a previous export if none of its inputs changed
+        cache_key: str | None = None
+        if cache is not None:
+            cache_key = cache.key(self, sandbox, exe)
+            if cache_key is not None and self._restore_from_cache(cache, cache_key, output_file):
+                logger.debug(f"Cache hit for {self.path.name}")
+                audit_logger.log_export(self.path, output_file, True)
+                return NotebookExportResult.succeeded(self.path, output_file, cached=True)
+
+        shared = self._shared_environment(environments) if sandbox and environments is not None else None
+        if shared is not None:
+            dependencies, python = shared
+            command = self._build_command(exe, False, output_file, python=python)
+            return _ExportPlan(command, output_file, cache, cache_key, environments, dependencies)
+        if marimo_tool is not None:
+            command = self._build_command(exe, sandbox, output_file, python=marimo_tool.python)
+        else:
+            command = self._build_command(exe, sandbox, output_file)
+        return _ExportPlan(command, output_file, cache, cache_key)
+
+    def _shared_environment(self, environments: "EnvironmentPool") -> "tuple[DependencySet, Path] | None":
+        """Return the shared environment for this notebook's dependencies.
 
-    def _resolve_executable(self, bin_path: Path | None, audit_logger: AuditLogger) -> str | NotebookExportResult:
+        Args:
+            environments: The pool of shared environments.
+
+        Returns:
+            The dependency set and the environment's interpreter, or None to
+            fall back to marimo's own sandbox if the environment cannot be
+            created. The caller releases the environment after the export.
+
+        """
+        from .environments import dependency_set
+
+        dependencies = dependency_set(self)
+        try:
+            return dependencies, environments.ensure(dependencies)
+        except ExportEnvironmentError as e:
+            logger.warning(f"{e}; exporting {self.path.name} in a marimo sandbox instead")
+            return None
+
+    def _restore_from_cache(self, cache: ExportCache, key: str, output_file: Path) -> bool:
+        """Restore a cached export, including the side files marimo would write.
+
+        WebAssembly exports also need marimo's shared ``assets/`` directory and
+        the notebook's ``public/`` folder next to the HTML file. Only the HTML is
+        cached, so WebAssembly entries are restored only when an earlier export
+        already populated the assets.
+
+        Args:
+            cache: The export cache.
+            key: Cache key of this export.
+            output_file: Where the exported HTML should be written.
+
+        Returns:
+            True if the export was restored, False if it must be re-run.
+
+        """
+        output_dir = output_file.parent
+        is_wasm = self.kind != Kind.NB
+        if is_wasm and not (output_dir / "assets").is_dir():
+            return False
+
+        if not cache.restore(key, output_file):
+            return False
+
+        # WebAssembly exports copy the sibling public/ folder next to the HTML file
+        public_dir = self.path.parent / "public"
+        if is_wasm and public_dir.is_dir():
+            try:
+                shutil.copytree(public_dir, output_dir / "public", dirs_exist_ok=True)
+            except OSError as e:  # pragma: no cover
+                logger.warning(f"Could not copy public folder for {self.path.name}: {e}")
+
+        try:
+            set_secure_file_permissions(output_file, mode=0o644)
+        except ValueError as e:  # pragma: no cover
+            logger.warning(f"Could not set secure permissions on {output_file}: {e}")
+        return True
+
+    def _resolve_executable(
+        self, bin_path: Path | None, audit_logger: AuditLogger, executable: str | None = None
+    ) -> str | NotebookExportResult:
         """Resolve the executable path.
 
         Args:
             bin_path: Optional directory where the executable is located.
             audit_logger: Audit logger for security logging.
+            executable: Optional executable already resolved from bin_path.
 
         Returns:
             Executable string on success, or NotebookExportResult on error.
 
         """
-        executable = "uvx"
-
-        if not bin_path:
+        if executable is not None:
+            # Validated once by the caller; every export still leaves its audit record
+            if bin_path:
+                audit_logger.log_path_validation(bin_path, "bin_path", True)
             return executable
-
-        # Validate bin_path for security
         try:
-            validated_bin_path = validate_bin_path(bin_path)
-            audit_logger.log_path_validation(bin_path, "bin_path", True)
-        except ValueError as e:
-            err: ExportError = ExportExecutableNotFoundError(executable, bin_path)
-            sanitized_error = sanitize_error_message(str(e))
-            logger.error(f"Invalid bin_path: {sanitized_error}")
-            audit_logger.log_path_validation(bin_path, "bin_path", False, sanitized_error)
-            return NotebookExportResult.failed(self.path, err)
-
-        # Construct the full executable path
-        # Use shutil.which to find it with platform-specific extensions (like .exe on Windows)
-        exe = shutil.which(executable, path=str(validated_bin_path))
-        if not exe:
-            # Fallback: try constructing the path directly
-            exe_path = validated_bin_path / executable
-            if exe_path.is_file() and os.access(exe_path, os.X_OK):
-                return str(exe_path)
-
-            err = ExportExecutableNotFoundError(executable, validated_bin_path)
-            logger.error(str(err))
+            return resolve_executable(bin_path, audit_logger)
+        except ExportExecutableNotFoundError as err:
             audit_logger.log_export(self.path, None, False, str(err))
             return NotebookExportResult.failed(self.path, err)
 
-        return exe
-
     def _prepare_output_path(self, output_dir: Path, audit_logger: AuditLogger) -> Path | NotebookExportResult:
         """Validate and prepare the output path.
 
@@ -306,7 +667,7 @@ class Notebook:
             Output file Path on success, or NotebookExportResult on error.
 
         """
-        output_file = output_dir / f"{self.path.stem}.html"
+        output_file = output_dir / self.subdir / f"{self.path.stem}.html"
 
         # Validate output path to prevent path traversal
         try:
@@ -341,19 +702,21 @@ class Notebook:
 
         return output_file
 
-    def _build_command(self, exe: str, sandbox: bool, output_file: Path) -> list[str]:
+    def _build_command(self, exe: str, sandbox: bool, output_file: Path, python: Path | None = None) -> list[str]:
         """Build the export command.
 
         Args:
             exe: Executable to use (e.g., 'uvx' or full path).
             sandbox: Whether to run the notebook in a sandbox.
             output_file: Path where the exported HTML file will be saved.
+            python: Optional interpreter of an environment with marimo installed;
+                marimo is then run with ``python -m marimo`` instead of exe.
 
         Returns:
             Command list ready for subprocess execution.
 
         """
-        cmd = [exe, *self.kind.command]
+        cmd = [exe, *self.kind.command] if python is None else [str(python), "-m", *self.kind.command]
         if sandbox:
             cmd.append("--sandbox")
         else:
@@ -362,7 +725,13 @@ class Notebook:
         return cmd
 
     def _run_export_subprocess(
-        self, cmd: list[str], output_file: Path, timeout: int, audit_logger: AuditLogger
+        self,
+        cmd: list[str],
+        output_file: Path,
+        timeout: int,
+        audit_logger: AuditLogger,
+        runner: Callable[..., ProcessResult] | None = None,
+        cancel: threading.Event | None = None,
     ) -> NotebookExportResult:
         """Run the export subprocess and handle results.
 
@@ -371,75 +740,191 @@ class Notebook:
             output_file: Path where the exported HTML file will be saved.
             timeout: Maximum time in seconds for the export process.
             audit_logger: Audit logger for security logging.
+            runner: Runs the command instead of run_process_tree, e.g. WorkerPool.run.
+                Defaults to None (run_process_tree).
+            cancel: Optional event that terminates the export once set. Defaults to None.
 
         Returns:
             NotebookExportResult indicating success or failure.
 
         """
         try:
-            # Run marimo export command with timeout
+            # Run marimo export command with timeout, in its own session so the
+            # whole process tree can be terminated
             logger.debug(f"Running command: {cmd}")
-            result = subprocess.run(cmd, capture_output=True, text=True, check=False, timeout=timeout)  # nosec B603  # noqa: S603
+            result = (runner or run_process_tree)(cmd, timeout=timeout, cancel=cancel)
+        except ProcessTreeTimeoutExpired as e:
+            return self._timeout_result(cmd, timeout, audit_logger, reaped=e.reaped)
+        except ProcessTreeCancelled as e:
+            return self._cancelled_result(audit_logger, e.reaped)
+        except subprocess.TimeoutExpired:
+            return self._timeout_result(cmd, timeout, audit_logger)
+        except FileNotFoundError as e:
+            return self._executable_not_found_result(cmd, e, audit_logger)
+        except subprocess.SubprocessError as e:
+            return self._subprocess_error_result(cmd, e, audit_logger)
+        completed = self._completed_result(
+            cmd, output_file, result.returncode, result.stdout, result.stderr, audit_logger
+        )
+        return dataclasses.replace(completed, reaped_processes=result.reaped)
 
-            nb_logger = logger.bind(subprocess=f"[{self.path.name}] ")
+    async def _run_export_subprocess_async(
+        self,
+        cmd: list[str],
+        output_file: Path,
+        timeout: int,
+        audit_logger: AuditLogger,
+        cancel: threading.Event | None = None,
+    ) -> NotebookExportResult:
+        """Run the export subprocess on the event loop and handle results.
 
-            if result.stdout:
-                nb_logger.info(f"stdout:\n{result.stdout.strip()}")
+        Args:
+            cmd: Command list to execute.
+            output_file: Path where the exported HTML file will be saved.
+            timeout: Maximum time in seconds for the export process.
+            audit_logger: Audit logger for security logging.
+            cancel: Optional event that terminates the export once set. Defaults to None.
 
-            if result.stderr:
-                nb_logger.warning(f"stderr:\n{result.stderr.strip()}")
+        Returns:
+            NotebookExportResult indicating success or failure.
 
-            if result.returncode != 0:
-                sanitized_stderr = sanitize_error_message(result.stderr)
-                err = ExportSubprocessError(
-                    notebook_path=self.path,
-                    command=cmd,
-                    return_code=result.returncode,
-                    stdout=result.stdout,
-                    stderr=sanitized_stderr,
-                )
-                nb_logger.error(str(err))
-                audit_logger.log_export(self.path, None, False, sanitized_stderr)
-                return NotebookExportResult.failed(self.path, err)
+        Raises:
+            asyncio.CancelledError: If the calling task is cancelled; the export
+                process tree is terminated first.
 
-            # Set secure permissions on output file
-            try:
-                set_secure_file_permissions(output_file, mode=0o644)
-            except ValueError as e:  # pragma: no cover
-                logger.warning(f"Could not set secure permissions on {output_file}: {e}")
+        """
+        logger.debug(f"Running command: {cmd}")
+        if cancel is not None and cancel.is_set():
+            return self._cancelled_result(audit_logger)
+        try:
+            process = await start_process_tree_async(cmd)
+        except FileNotFoundError as e:
+            return self._executable_not_found_result(cmd, e, audit_logger)
+        except OSError as e:
+            return self._subprocess_error_result(cmd, e, audit_logger)
 
-            audit_logger.log_export(self.path, output_file, True)
-            return NotebookExportResult.succeeded(self.path, output_file)
+        try:
+            output = await asyncio.wait_for(communicate_async(process, cancel), timeout=timeout)
+        except TimeoutError:
+            reaped = await terminate_process_tree_async(process)
+            return self._timeout_result(cmd, timeout, audit_logger, reaped=reaped)
+        except asyncio.CancelledError:
+            reaped = await terminate_process_tree_async(process)
+            logger.info(f"Export of {self.path.name} cancelled, terminated {reaped} process(es)")
+            raise
+        if output is None:
+            return self._cancelled_result(audit_logger, await terminate_process_tree_async(process))
+        stdout, stderr = output
+
+        completed = self._completed_result(
+            cmd,
+            output_file,
+            process.returncode if process.returncode is not None else -1,
+            stdout.decode(errors="replace"),
+            stderr.decode(errors="replace"),
+            audit_logger,
+        )
+        return dataclasses.replace(completed, reaped_processes=await terminate_process_tree_async(process))
+
+    def _completed_result(
+        self,
+        cmd: list[str],
+        output_file: Path,
+        returncode: int,
+        stdout: str,
+        stderr: str,
+        audit_logger: AuditLogger,
+    ) -> NotebookExportResult:
+        """Turn the output of a finished export process into a result.
 
-        except subprocess.TimeoutExpired:
-            err = ExportSubprocessError(
-                notebook_path=self.path,
-                command=cmd,
-                return_code=-1,
-                stderr=f"Export timed out after {timeout} seconds",
-            )
-            logger.error(str(err))
-            audit_logger.log_export(self.path, None, False, f"timeout after {timeout}s")
-            return NotebookExportResult.failed(self.path, err)
-        except FileNotFoundError as e:
-            # Executable not found in PATH
-            exec_err = ExportExecutableNotFoundError(cmd[0])
-            sanitized_error = sanitize_error_message(str(e))
-            logger.error(f"{exec_err}: {sanitized_error}")
-            audit_logger.log_export(self.path, None, False, sanitized_error)
-            return NotebookExportResult.failed(self.path, exec_err)
-        except subprocess.SubprocessError as e:
-            sanitized_error = sanitize_error_message(str(e))
+        Args:
+            cmd: The executed command.
+            output_file: Path where the exported HTML file was saved.
+            returncode: Exit code of the process.
+            stdout: Captured standard output.
+            stderr: Captured standard error.
+            audit_logger: Audit logger for security logging.
+
+        Returns:
+            NotebookExportResult indicating success or failure.
+
+        """
+        nb_logger = logger.bind(subprocess=f"[{self.path.name}] ")
+
+        if stdout:
+            nb_logger.info(f"stdout:\n{stdout.strip()}")
+
+        if stderr:
+            nb_logger.warning(f"stderr:\n{stderr.strip()}")
+
+        if returncode != 0:
+            sanitized_stderr = sanitize_error_message(stderr)
             err = ExportSubprocessError(
                 notebook_path=self.path,
                 command=cmd,
-                return_code=-1,
-                stderr=sanitized_error,
+                return_code=returncode,
+                stdout=stdout,
+                stderr=sanitized_stderr,
             )
-            logger.error(str(err))
-            audit_logger.log_export(self.path, None, False, sanitized_error)
+            nb_logger.error(str(err))
+            audit_logger.log_export(self.path, None, False, sanitized_stderr)
             return NotebookExportResult.failed(self.path, err)
 
+        # Set secure permissions on output file
+        try:
+            set_secure_file_permissions(output_file, mode=0o644)
+        except ValueError as e:  # pragma: no cover
+            logger.warning(f"Could not set secure permissions on {output_file}: {e}")
+
+        audit_logger.log_export(self.path, output_file, True)
+        return NotebookExportResult.succeeded(self.path, output_file)
+
+    def _timeout_result(
+        self, cmd: list[str], timeout: int, audit_logger: AuditLogger, reaped: int = 0
+    ) -> NotebookExportResult:
+        """Return the result of an export that exceeded its timeout and was terminated."""
+        err = ExportSubprocessError(
+            notebook_path=self.path,
+            command=cmd,
+            return_code=-1,
+            stderr=f"Export timed out after {timeout} seconds",
+        )
+        logger.error(f"{err} (terminated {reaped} process(es))")
+        audit_logger.log_export(self.path, None, False, f"timeout after {timeout}s")
+        return dataclasses.replace(NotebookExportResult.failed(self.path, err), reaped_processes=reaped)
+
+    def _cancelled_result(self, audit_logger: AuditLogger, reaped: int = 0) -> NotebookExportResult:
+        """Return the result of an export that was cancelled and terminated."""
+        err = ExportCancelledError(self.path, reaped)
+        logger.info(f"{err} (terminated {reaped} process(es))")
+        audit_logger.log_export(self.path, None, False, "cancelled")
+        return dataclasses.replace(NotebookExportResult.failed(self.path, err), reaped_processes=reaped)
+
+    def _executable_not_found_result(
+        self, cmd: list[str], error: FileNotFoundError, audit_logger: AuditLogger
+    ) -> NotebookExportResult:
+        """Return the result of an export whose executable is not in PATH."""
+        exec_err = ExportExecutableNotFoundError(cmd[0])
+        sanitized_error = sanitize_error_message(str(error))
+        logger.error(f"{exec_err}: {sanitized_error}")
+        audit_logger.log_export(self.path, None, False, sanitized_error)
+        return NotebookExportResult.failed(self.path, exec_err)
+
+    def _subprocess_error_result(
+        self, cmd: list[str], error: Exception, audit_logger: AuditLogger
+    ) -> NotebookExportResult:
+        """Return the result of an export whose process could not be run."""
+        sanitized_error = sanitize_error_message(str(error))
+        err = ExportSubprocessError(
+            notebook_path=self.path,
+            command=cmd,
+            return_code=-1,
+            stderr=sanitized_error,
+        )
+        logger.error(str(err))
+        audit_logger.log_export(self.path, None, False, sanitized_error)
+        return NotebookExportResult.failed(self.path, err)
+
     @property
     def display_name(self) -> str:
         """Return the display name for the notebook.
@@ -463,16 +948,56 @@ class Notebook:
     @property
     def html_path(self) -> Path:
         """Return the path to the exported HTML file."""
-        return self.kind.html_path / f"{self.path.stem}.html"
-
+        return self.kind.html_path / self.subdir / f"{self.path.stem}.html"
 
-def folder2notebooks(folder: Path | str | None, kind: Kind = Kind.NB) -> list[Notebook]:
-    """Discover and create Notebook instances for all Python files in a directory.
 
-    This function scans a directory for Python files (*.py) and creates Notebook
-    instances for each one. It assumes all Python files in the directory are
-    valid marimo notebooks. The resulting list is sorted alphabetically by
-    filename to ensure consistent ordering across runs.
+@dataclasses.dataclass(frozen=True)
+class _ExportPlan:
+    """The export subprocess that remains to be run for a notebook."""
+
+    command: list[str]
+    output_file: Path
+    cache: ExportCache | None
+    cache_key: str | None
+    environments: "EnvironmentPool | None" = None
+    dependencies: "DependencySet | None" = None
+
+    def store(self, result: NotebookExportResult) -> None:
+        """Add a successful export to the cache."""
+        if self.cache is not None and self.cache_key is not None and result.success:
+            self.cache.store(self.cache_key, self.output_file)
+
+    def release(self) -> None:
+        """Release the shared environment the export ran in, if any."""
+        if self.environments is not None and self.dependencies is not None:
+            self.environments.release(self.dependencies)
+
+
+def folder2notebooks(
+    folder: Path | str | None,
+    kind: Kind = Kind.NB,
+    recursive: bool = False,
+    include: Sequence[str] | None = None,
+    exclude: Sequence[str] | None = None,
+    check: bool = True,
+) -> list[Notebook]:
+    """Discover and create Notebook instances for the marimo notebooks in a directory.
+
+    This function scans a directory for Python files (*.py) and creates a
+    Notebook instance for each marimo notebook among them. The resulting list
+    is sorted alphabetically by path to ensure consistent ordering across runs.
+
+    With recursive set, subdirectories are scanned as well and each notebook
+    keeps its directory relative to the folder, so the exported site mirrors
+    the source tree. ``.marimushkaignore`` files and the include and exclude
+    patterns select the notebooks, see marimushka.discovery.
+
+    With check set (the default), a static pre-check (see marimushka.precheck)
+    reads every file without running it. Files that are not marimo notebooks,
+    e.g. helper modules, are skipped and counted in an info message, and
+    unreadable files are skipped with a warning. Notebooks with syntax errors
+    are kept and logged with a warning; their exports then fail without
+    running marimo. Without check, every Python file is taken as a notebook.
 
     Args:
         folder: Path to the directory to scan for notebooks. Can be a Path
@@ -481,16 +1006,17 @@ def folder2notebooks(folder: Path | str | None, kind: Kind = Kind.NB) -> list[No
         kind: The export type for all discovered notebooks. Defaults to Kind.NB
             (static HTML export). All notebooks in the folder will be assigned
             this kind.
+        recursive: Whether to scan subdirectories. Defaults to False.
+        include: Glob patterns of which notebooks must match at least one.
+            Defaults to None (all notebooks).
+        exclude: Glob patterns of notebooks and directories to skip. Defaults to None.
+        check: Whether to pre-check the files and skip those that are not
+            marimo notebooks. Defaults to True.
 
     Returns:
-        A list of Notebook instances, one for each Python file found in the
-        directory, sorted alphabetically by filename. Returns an empty list
-        if the folder is None, empty, or contains no Python files.
-
-    Raises:
-        NotebookNotFoundError: If a discovered file does not exist (unlikely
-            in normal usage but possible in race conditions).
-        NotebookInvalidError: If a discovered path is not a valid file.
+        A list of Notebook instances, one for each notebook found in the
+        directory, sorted alphabetically by path. Returns an empty list
+        if the folder is None, empty, missing, or contains no notebooks.
 
     Example::
 
@@ -503,6 +1029,9 @@ def folder2notebooks(folder: Path | str | None, kind: Kind = Kind.NB) -> list[No
         # Get all notebooks as interactive apps
         apps = folder2notebooks("apps", Kind.APP)
 
+        # Include subdirectories, except drafts
+        nested = folder2notebooks("notebooks", recursive=True, exclude=["drafts"])
+
         # Handle empty or missing directories gracefully
         empty = folder2notebooks(None)  # Returns []
         empty = folder2notebooks("")    # Returns []
@@ -520,7 +1049,25 @@ def folder2notebooks(folder: Path | str | None, kind: Kind = Kind.NB) -> list[No
     if folder is None or folder == "":
         return []
 
-    notebooks = list(Path(folder).glob("*.py"))
-    notebooks.sort()
-
-    return [Notebook(path=nb, kind=kind) for nb in notebooks]
+    folder = Path(folder)
+    checks = source_checks()
+    notebooks: list[Notebook] = []
+    skipped = 0
+    for relative in scan_folder(folder, recursive=recursive, include=include, exclude=exclude):
+        path = folder / relative
+        if check:
+            try:
+                result = checks.get(path)
+            except OSError as e:
+                logger.warning(f"Skipping unreadable {path}: {e}")
+                continue
+            if not result.notebook:
+                logger.debug(f"Skipping {path}: not a marimo notebook")
+                skipped += 1
+                continue
+            if result.error is not None:
+                logger.warning(f"{path} has a {result.error}")
+        notebooks.append(Notebook(path=path, kind=kind, subdir=relative.parent, validate=False))
+    if skipped:
+        logger.info(f"Skipped {skipped} Python files in {folder} that are not marimo notebooks")
+    return notebooks
@@ -4,28 +4,81 @@ This module handles the core export workflow including parallel/sequential expor
 template rendering, and index file generation.
 """
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import collections
+import contextlib
+import functools
+import queue
+import shutil
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 import jinja2
 from jinja2.sandbox import SandboxedEnvironment
 from loguru import logger
-from rich.progress import BarColumn, Progress, SpinnerColumn, TaskID, TaskProgressColumn, TextColumn
+from rich.progress import (
+    BarColumn,
+    Progress,
+    ProgressColumn,
+    SpinnerColumn,
+    Task,
+    TaskID,
+    TaskProgressColumn,
+    TextColumn,
+)
+from rich.text import Text
 
+from .assets import ASSETS_FILENAME, asset_references
 from .audit import AuditLogger, get_audit_logger
+from .cache import ExportCache, resolve_marimo_version
+from .discovery import PUBLIC_DIRNAME
+from .environments import EnvironmentPool, dependency_set
 from .exceptions import (
     BatchExportResult,
+    ExportCancelledError,
     IndexWriteError,
     NotebookExportResult,
     ProgressCallback,
+    ResultCallback,
     TemplateRenderError,
 )
-from .notebook import Notebook
+from .history import DEFAULT_ESTIMATED_DURATION, ExportHistory
+from .imports import IMPORTS_FILENAME, import_graph
+from .manifest import BuildManifest, remove_orphans, update_manifest
+from .notebook import Kind, Notebook
+from .pagination import INDEX_FILENAME, Directory, IndexPage, Pagination, plan_index_pages
+from .search import SEARCH_INDEX_FILENAME, write_search_index
 from .security import (
     sanitize_error_message,
-    set_secure_file_permissions,
     validate_max_workers,
 )
+from .storage import atomic_path
+from .tool import MarimoTool
+from .watch import Cancellation, ChangeSet
+from .worker import DEFAULT_MAX_JOBS, DEFAULT_MAX_MEMORY_MB, WorkerPool
+
+# Upper bound of concurrent exports in the asyncio engine; no thread is held per export
+MAX_ASYNC_CONCURRENCY = 64
+
+# Export engines selectable in generate_index
+ENGINES = ("threads", "asyncio", "workers")
+
+# Directory of the built-in index template
+BUILTIN_TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+# The built-in templates compiled to Python modules, see compile_builtin_templates
+PRECOMPILED_TEMPLATES = BUILTIN_TEMPLATE_DIR / "compiled.zip"
+
+# File name pattern of compiled templates in Jinja2's per-user bytecode cache directory
+_BYTECODE_CACHE_PATTERN = "__marimushka_jinja2_%s.cache"
+
+_AUTOESCAPE = jinja2.select_autoescape(["html", "xml"])
+
+# Template environments by resolved template directory, with the directory's mtime
+_template_environments: dict[Path, tuple[int, jinja2.Environment]] = {}
+_template_environments_lock = threading.Lock()
 
 
 def export_notebook(
@@ -34,6 +87,12 @@ def export_notebook(
     sandbox: bool,
     bin_path: Path | None,
     timeout: int = 300,
+    cache: ExportCache | None = None,
+    worker_pool: WorkerPool | None = None,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    cancel: threading.Event | None = None,
+    executable: str | None = None,
 ) -> NotebookExportResult:
     """Export a single notebook and return the result.
 
@@ -43,74 +102,515 @@ def export_notebook(
         sandbox: Whether to use sandbox mode.
         bin_path: Custom path to uvx executable.
         timeout: Maximum time in seconds for the export process. Defaults to 300.
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
+        worker_pool: Optional pool of persistent marimo workers to export in
+            instead of a fresh subprocess. Defaults to None.
+        environments: Optional pool of shared sandbox environments keyed by the
+            notebook's PEP 723 dependencies. Defaults to None.
+        marimo_tool: Optional pinned marimo installation that runs the export
+            instead of ``uvx marimo``. Defaults to None.
+        cancel: Optional event that cancels the export once set. Defaults to None.
+        executable: Optional uvx executable already resolved from bin_path. Defaults to None.
 
     Returns:
         NotebookExportResult with success status and details.
 
     """
-    return notebook.export(output_dir=output_dir, sandbox=sandbox, bin_path=bin_path, timeout=timeout)
+    if worker_pool is not None:
+        return notebook.export_in_worker(
+            worker_pool,
+            output_dir=output_dir,
+            sandbox=sandbox,
+            bin_path=bin_path,
+            timeout=timeout,
+            cache=cache,
+            environments=environments,
+            marimo_tool=marimo_tool,
+            cancel=cancel,
+            executable=executable,
+        )
+    return notebook.export(
+        output_dir=output_dir,
+        sandbox=sandbox,
+        bin_path=bin_path,
+        timeout=timeout,
+        cache=cache,
+        environments=environments,
+        marimo_tool=marimo_tool,
+        cancel=cancel,
+        executable=executable,
+    )
 
 
-def export_notebooks_parallel(
-    notebooks: list[Notebook],
-    output_dir: Path,
+class EstimatedTimeRemainingColumn(ProgressColumn):
+    """Progress column showing the remaining build time estimated from export history."""
+
+    def render(self, task: Task) -> Text:
+        """Render the ETA stored in the task's ``eta`` field."""
+        return Text(task.fields.get("eta", ""), style="progress.remaining")
+
+
+def _format_eta(seconds: float) -> str:
+    """Format a number of seconds as an ETA label."""
+    minutes, secs = divmod(round(seconds), 60)
+    return f"ETA {minutes}:{secs:02d}"
+
+
+@dataclass(frozen=True)
+class ExportJob:
+    """A single notebook export scheduled on the shared work queue.
+
+    Attributes:
+        notebook: The notebook to export.
+        output_dir: Output directory for the exported HTML.
+        task_id: Optional Rich progress task advanced when the job completes.
+        estimate: Expected export duration in seconds, if known. Jobs with
+            larger estimates are dispatched first.
+
+    """
+
+    notebook: Notebook
+    output_dir: Path
+    task_id: TaskID | None = None
+    estimate: float | None = None
+
+
+class _BatchTracker:
+    """Collects the results of a batch of export jobs and reports progress.
+
+    Shared by the thread and asyncio engines, so both order jobs, record
+    durations and display progress identically.
+    """
+
+    def __init__(
+        self,
+        jobs: list[ExportJob],
+        workers: int,
+        on_progress: ProgressCallback | None,
+        progress: Progress | None,
+        history: ExportHistory | None,
+    ) -> None:
+        """Initialize the tracker and show the initial ETA."""
+        self.batch_result = BatchExportResult()
+        self._total = len(jobs)
+        self._workers = workers
+        self._on_progress = on_progress
+        self._progress = progress
+        self._history = history
+        self._remaining_estimate = sum(job.estimate or 0.0 for job in jobs)
+        self._show_eta = progress is not None and self._remaining_estimate > 0
+        self._task_ids = {job.task_id for job in jobs if job.task_id is not None}
+        self._update_eta()
+
+    def _update_eta(self) -> None:
+        """Show the estimated time remaining on every progress task."""
+        if not self._progress or not self._show_eta:
+            return
+        pending = self._total - self.batch_result.total
+        eta = _format_eta(self._remaining_estimate / min(self._workers, pending)) if pending else ""
+        for task_id in self._task_ids:
+            self._progress.update(task_id, eta=eta)
+
+    def record(self, job: ExportJob, result: NotebookExportResult) -> None:
+        """Collect a finished job and report progress."""
+        self.batch_result.add(result)
+        self._remaining_estimate = max(self._remaining_estimate - (job.estimate or 0.0), 0.0)
+
+        cancelled = isinstance(result.error, ExportCancelledError)
+        if not result.success and not cancelled:
+            error_msg = sanitize_error_message(str(result.error)) if result.error else "Unknown error"
+            logger.error(f"Failed to export {result.notebook_path.name}: {error_msg}")
+
+        # Cache hits and cancelled exports say nothing about how long the export takes
+        if self._history is not None and result.duration is not None and not result.cached and not cancelled:
+            self._history.record(job.notebook, result.duration)
+
+        # Call user callback if provided
+        if self._on_progress:
+            self._on_progress(self.batch_result.total, self._total, job.notebook.path.name)
+
+        if self._progress and job.task_id is not None:
+            self._progress.advance(job.task_id)
+        self._update_eta()
+
+
+def _schedule(jobs: list[ExportJob]) -> list[ExportJob]:
+    """Order jobs longest processing time first; ties keep their order."""
+    return sorted(jobs, key=lambda job: job.estimate or 0.0, reverse=True)
+
+
+class _Cluster:
+    """Jobs sharing one dependency set, in dispatch order."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.jobs: collections.deque[ExportJob] = collections.deque()
+        self.load = 0.0
+
+
+def _job_weight(job: ExportJob) -> float:
+    """Return the expected cost of a job; jobs without an estimate count as one unit."""
+    return job.estimate if job.estimate is not None else 1.0
+
+
+class _AffinityScheduler:
+    """Hands out export jobs to workers, keeping dependency sets together.
+
+    Jobs are clustered by the key of their PEP 723 dependency set and whole
+    clusters are assigned to workers, largest first, to the least loaded
+    worker. Each worker runs its own clusters back to back, so consecutive
+    sandboxed exports on a worker share an environment (and uv's cache) rather
+    than alternating between unrelated dependency stacks.
+
+    A worker whose queue runs dry steals from the other workers, preferring a
+    cluster with the dependency set it exported last and otherwise the tail
+    cluster of the most loaded worker. It steals the first remaining job of
+    that cluster, so a single cluster is still dispatched longest job first.
+    """
+
+    def __init__(self, jobs: list[ExportJob], workers: int, keys: list[str]) -> None:
+        """Cluster the jobs and assign the clusters to workers.
+
+        Args:
+            jobs: The jobs in dispatch order.
+            workers: The number of workers.
+            keys: The dependency set key of every job, in the same order.
+
+        """
+        clusters: dict[str, _Cluster] = {}
+        for job, key in zip(jobs, keys, strict=True):
+            cluster = clusters.setdefault(key, _Cluster(key))
+            cluster.jobs.append(job)
+            cluster.load += _job_weight(job)
+
+        self._queues: list[collections.deque[_Cluster]] = [collections.deque() for _ in range(workers)]
+        loads = [0.0] * workers
+        for cluster in sorted(clusters.values(), key=lambda c: c.load, reverse=True):
+            worker = loads.index(min(loads))
+            self._queues[worker].append(cluster)
+            loads[worker] += cluster.load
+
+        self._last: list[str | None] = [None] * workers
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.dispatches = 0
+        self.steals = 0
+
+    def _victim(self, worker: int) -> tuple[collections.deque[_Cluster], _Cluster] | None:
+        """Return the queue and cluster a worker with an empty queue steals from."""
+        queues = [pending for pending in self._queues if pending]
+        if not queues:
+            return None
+        for pending in queues:
+            for cluster in pending:
+                if cluster.key == self._last[worker]:
+                    return pending, cluster
+        busiest = max(queues, key=lambda pending: (sum(cluster.load for cluster in pending), len(pending)))
+        return busiest, busiest[-1]
+
+    def next_job(self, worker: int) -> ExportJob | None:
+        """Return the next job for a worker, or None when no job is left.
+
+        Args:
+            worker: The index of the worker asking for work.
+
+        Returns:
+            The job to export next, or None.
+
+        """
+        with self._lock:
+            owner = self._queues[worker]
+            if owner:
+                cluster = owner[0]
+            else:
+                stolen = self._victim(worker)
+                if stolen is None:
+                    return None
+                owner, cluster = stolen
+                self.steals += 1
+
+            job = cluster.jobs.popleft()
+            cluster.load -= _job_weight(job)
+            if not cluster.jobs:
+                owner.remove(cluster)
+
+            if self._last[worker] is not None:
+                self.dispatches += 1
+                if cluster.key == self._last[worker]:
+                    self.hits += 1
+            self._last[worker] = cluster.key
+            return job
+
+    def cancel(self) -> None:
+        """Drop all remaining jobs, e.g. after an unexpected error."""
+        with self._lock:
+            for pending in self._queues:
+                pending.clear()
+
+
+def _affinity_keys(jobs: list[ExportJob], sandbox: bool) -> list[str]:
+    """Return the dependency set key of every job; without a sandbox all jobs share one environment."""
+    if not sandbox:
+        return [""] * len(jobs)
+    return [dependency_set(job.notebook).key for job in jobs]
+
+
+def _affinity_scheduler(jobs: list[ExportJob], workers: int, sandbox: bool) -> _AffinityScheduler:
+    """Create the scheduler of a batch, using at most one worker per job."""
+    return _AffinityScheduler(jobs, min(workers, len(jobs)), _affinity_keys(jobs, sandbox))
+
+
+def _record_affinity(batch_result: BatchExportResult, scheduler: _AffinityScheduler, sandbox: bool) -> None:
+    """Store the affinity statistics of a sandboxed batch."""
+    if sandbox:
+        batch_result.affinity_hits = scheduler.hits
+        batch_result.affinity_dispatches = scheduler.dispatches
+
+
+def export_jobs(
+    jobs: list[ExportJob],
     sandbox: bool,
     bin_path: Path | None,
+    parallel: bool = True,
     max_workers: int = 4,
-    progress: Progress | None = None,
-    task_id: TaskID | None = None,
     timeout: int = 300,
     on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
+    progress: Progress | None = None,
+    history: ExportHistory | None = None,
+    worker_pool: WorkerPool | None = None,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    cancellation: Cancellation | None = None,
+    executor: Executor | None = None,
+    executable: str | None = None,
 ) -> BatchExportResult:
-    """Export notebooks in parallel using a thread pool.
+    """Export a batch of jobs, of any Kind, from a single work queue.
+
+    In parallel mode all jobs are shared by one thread pool, so workers move
+    straight on to the next job regardless of its Kind instead of idling until
+    the slowest notebook of a category has finished.
+
+    Jobs are dispatched longest-estimate-first; jobs without an estimate keep
+    their order after all estimated jobs. When estimates are available, each
+    progress task shows the estimated time remaining for the whole batch.
+
+    In sandbox mode, jobs are clustered by the PEP 723 dependency set of their
+    notebook and each worker runs whole clusters back to back, stealing work
+    from other workers once its own clusters are done. The share of exports
+    that followed one with the same dependency set on the same worker is
+    reported as the batch's affinity hit rate.
 
     Args:
-        notebooks: List of notebooks to export.
-        output_dir: Output directory for exported HTML files.
+        jobs: The export jobs to run.
         sandbox: Whether to use sandbox mode.
         bin_path: Custom path to uvx executable.
+        parallel: Whether to export in parallel. Defaults to True.
         max_workers: Maximum number of parallel workers. Defaults to 4.
-        progress: Optional Rich Progress instance for progress tracking.
-        task_id: Optional task ID for progress updates.
         timeout: Maximum time in seconds for each export. Defaults to 300.
         on_progress: Optional callback called after each notebook export.
                     Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
+        progress: Optional Rich Progress instance; each job advances its own task_id.
+        history: Optional export history that records the measured duration of
+            every export that actually ran. Defaults to None.
+        worker_pool: Optional pool of persistent marimo workers that run the
+            exports. Defaults to None (one subprocess per export).
+        environments: Optional pool of shared sandbox environments. Defaults to None.
+        marimo_tool: Optional pinned marimo installation replacing ``uvx marimo``. Defaults to None.
+        cancellation: Optional cancel flags of the notebook exports, e.g. of a
+            watch mode rebuild. Defaults to None.
+        executor: Optional thread pool, with at least max_workers threads, that
+            runs the exports instead of a pool started for this batch. The
+            caller owns it. Defaults to None.
+        executable: Optional uvx executable already resolved from bin_path. Defaults to None.
 
     Returns:
         BatchExportResult containing individual results and summary statistics.
 
     """
+    if not jobs:
+        return BatchExportResult()
+
+    jobs = _schedule(jobs)
+
     # Validate and bound max_workers for security
-    max_workers = validate_max_workers(max_workers)
+    workers = validate_max_workers(max_workers) if parallel else 1
+    tracker = _BatchTracker(jobs, workers, on_progress, progress, history)
+    scheduler = _affinity_scheduler(jobs, workers, sandbox)
+
+    def export(job: ExportJob) -> NotebookExportResult:
+        """Export one job."""
+        cancel = cancellation.event(job.notebook.path) if cancellation is not None else None
+        return export_notebook(
+            job.notebook,
+            job.output_dir,
+            sandbox,
+            bin_path,
+            timeout,
+            cache,
+            worker_pool,
+            environments,
+            marimo_tool,
+            cancel,
+            executable,
+        )
 
-    batch_result = BatchExportResult()
+    if not parallel:
+        while (job := scheduler.next_job(0)) is not None:
+            tracker.record(job, export(job))
+        _record_affinity(tracker.batch_result, scheduler, sandbox)
+        return tracker.batch_result
+
+    # Results are recorded on this thread, like before, so callbacks never run concurrently
+    finished: queue.Queue[tuple[ExportJob, NotebookExportResult] | Exception] = queue.Queue()
+
+    def drain(worker: int) -> None:
+        """Export the jobs the scheduler hands to one worker."""
+        try:
+            while (job := scheduler.next_job(worker)) is not None:
+                finished.put((job, export(job)))
+        except Exception as e:
+            finished.put(e)
+
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+        for worker in range(min(workers, len(jobs))):
+            executor.submit(drain, worker)
+
+        for _ in jobs:
+            item = finished.get()
+            if isinstance(item, Exception):
+                scheduler.cancel()
+                raise item
+            tracker.record(*item)
+
+    _record_affinity(tracker.batch_result, scheduler, sandbox)
+    return tracker.batch_result
+
+
+async def export_jobs_async(
+    jobs: list[ExportJob],
+    sandbox: bool,
+    bin_path: Path | None,
+    max_concurrency: int = 4,
+    timeout: int = 300,
+    on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
+    progress: Progress | None = None,
+    history: ExportHistory | None = None,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    cancellation: Cancellation | None = None,
+    executable: str | None = None,
+) -> BatchExportResult:
+    """Export a batch of jobs on the running event loop.
 
-    if not notebooks:
-        return batch_result
+    The asyncio counterpart of export_jobs(): every export runs as an asyncio
+    subprocess and a fixed number of worker tasks bound how many run at once,
+    so no thread is held per export. The workers take jobs in the same order,
+    and with the same dependency-set affinity, as export_jobs(). Cancelling
+    the calling task kills all running export processes.
 
-    total_notebooks = len(notebooks)
-    completed_count = 0
+    Args:
+        jobs: The export jobs to run.
+        sandbox: Whether to use sandbox mode.
+        bin_path: Custom path to uvx executable.
+        max_concurrency: Maximum number of concurrent exports, at most
+            MAX_ASYNC_CONCURRENCY. Defaults to 4.
+        timeout: Maximum time in seconds for each export. Defaults to 300.
+        on_progress: Optional callback called after each notebook export.
+                    Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
+        progress: Optional Rich Progress instance; each job advances its own task_id.
+        history: Optional export history that records the measured duration of
+            every export that actually ran. Defaults to None.
+        environments: Optional pool of shared sandbox environments. Defaults to None.
+        marimo_tool: Optional pinned marimo installation replacing ``uvx marimo``. Defaults to None.
+        cancellation: Optional cancel flags of the notebook exports, e.g. of a
+            watch mode rebuild. Defaults to None.
+        executable: Optional uvx executable already resolved from bin_path. Defaults to None.
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(export_notebook, nb, output_dir, sandbox, bin_path, timeout): nb for nb in notebooks}
+    Returns:
+        BatchExportResult containing individual results and summary statistics.
 
-        for future in as_completed(futures):
-            result = future.result()
-            batch_result.add(result)
-            completed_count += 1
+    """
+    if not jobs:
+        return BatchExportResult()
+
+    jobs = _schedule(jobs)
+    concurrency = validate_max_workers(max_concurrency, max_allowed=MAX_ASYNC_CONCURRENCY)
+    tracker = _BatchTracker(jobs, concurrency, on_progress, progress, history)
+    scheduler = _affinity_scheduler(jobs, concurrency, sandbox)
+
+    async def drain(worker: int) -> None:
+        """Export the jobs the scheduler hands to one worker task."""
+        while (job := scheduler.next_job(worker)) is not None:
+            result = await job.notebook.export_async(
+                output_dir=job.output_dir,
+                sandbox=sandbox,
+                bin_path=bin_path,
+                timeout=timeout,
+                cache=cache,
+                environments=environments,
+                marimo_tool=marimo_tool,
+                cancel=cancellation.event(job.notebook.path) if cancellation is not None else None,
+                executable=executable,
+            )
+            tracker.record(job, result)
+
+    async with asyncio.TaskGroup() as group:
+        for worker in range(min(concurrency, len(jobs))):
+            group.create_task(drain(worker))
+
+    _record_affinity(tracker.batch_result, scheduler, sandbox)
+    return tracker.batch_result
 
-            if not result.success:
-                error_msg = sanitize_error_message(str(result.error)) if result.error else "Unknown error"
-                logger.error(f"Failed to export {result.notebook_path.name}: {error_msg}")
 
-            # Call user callback if provided
-            if on_progress:
-                on_progress(completed_count, total_notebooks, result.notebook_path.name)
+def export_notebooks_parallel(
+    notebooks: list[Notebook],
+    output_dir: Path,
+    sandbox: bool,
+    bin_path: Path | None,
+    max_workers: int = 4,
+    progress: Progress | None = None,
+    task_id: TaskID | None = None,
+    timeout: int = 300,
+    on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
+) -> BatchExportResult:
+    """Export notebooks in parallel using a thread pool.
 
-            if progress and task_id is not None:
-                progress.advance(task_id)
+    Args:
+        notebooks: List of notebooks to export.
+        output_dir: Output directory for exported HTML files.
+        sandbox: Whether to use sandbox mode.
+        bin_path: Custom path to uvx executable.
+        max_workers: Maximum number of parallel workers. Defaults to 4.
+        progress: Optional Rich Progress instance for progress tracking.
+        task_id: Optional task ID for progress updates.
+        timeout: Maximum time in seconds for each export. Defaults to 300.
+        on_progress: Optional callback called after each notebook export.
+                    Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
 
-    return batch_result
+    Returns:
+        BatchExportResult containing individual results and summary statistics.
+
+    """
+    jobs = [ExportJob(nb, output_dir, task_id) for nb in notebooks]
+    return export_jobs(
+        jobs,
+        sandbox,
+        bin_path,
+        parallel=True,
+        max_workers=max_workers,
+        timeout=timeout,
+        on_progress=on_progress,
+        cache=cache,
+        progress=progress,
+    )
 
 
 def export_notebooks_sequential(
@@ -122,6 +622,7 @@ def export_notebooks_sequential(
     task_id: TaskID | None = None,
     timeout: int = 300,
     on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
 ) -> BatchExportResult:
     """Export notebooks sequentially.
 
@@ -135,26 +636,23 @@ def export_notebooks_sequential(
         timeout: Maximum time in seconds for each export. Defaults to 300.
         on_progress: Optional callback called after each notebook export.
                     Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
 
     Returns:
         BatchExportResult containing individual results and summary statistics.
 
     """
-    batch_result = BatchExportResult()
-    total_notebooks = len(notebooks)
-
-    for idx, nb in enumerate(notebooks, 1):
-        result = nb.export(output_dir=output_dir, sandbox=sandbox, bin_path=bin_path, timeout=timeout)
-        batch_result.add(result)
-
-        # Call user callback if provided
-        if on_progress:
-            on_progress(idx, total_notebooks, nb.path.name)
-
-        if progress and task_id is not None:
-            progress.advance(task_id)
-
-    return batch_result
+    jobs = [ExportJob(nb, output_dir, task_id) for nb in notebooks]
+    return export_jobs(
+        jobs,
+        sandbox,
+        bin_path,
+        parallel=False,
+        timeout=timeout,
+        on_progress=on_progress,
+        cache=cache,
+        progress=progress,
+    )
 
 
 def export_all_notebooks(
@@ -168,9 +666,23 @@ def export_all_notebooks(
     max_workers: int,
     timeout: int = 300,
     on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
+    history: ExportHistory | None = None,
+    estimated_duration: float = DEFAULT_ESTIMATED_DURATION,
+    worker_pool: WorkerPool | None = None,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    cancellation: Cancellation | None = None,
+    executor: Executor | None = None,
+    executable: str | None = None,
 ) -> BatchExportResult:
     """Export all notebooks with progress tracking.
 
+    Notebooks, apps and interactive notebooks share a single work queue and,
+    in parallel mode, a single thread pool. Progress is still reported per
+    category. With an export history, the slowest notebooks are dispatched
+    first and the progress display shows an estimated time remaining.
+
     Args:
         output: Base output directory.
         notebooks: List of notebooks for static HTML export.
@@ -183,58 +695,284 @@ def export_all_notebooks(
         timeout: Maximum time in seconds for each export. Defaults to 300.
         on_progress: Optional callback called after each notebook export.
                     Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
+        history: Optional export history used to order the jobs and updated with
+            the measured durations. Defaults to None (notebooks keep their order).
+        estimated_duration: Estimated duration in seconds of notebooks without
+            history. Defaults to DEFAULT_ESTIMATED_DURATION.
+        worker_pool: Optional pool of persistent marimo workers that run the
+            exports. Defaults to None (one subprocess per export).
+        environments: Optional pool of shared sandbox environments. Defaults to None.
+        marimo_tool: Optional pinned marimo installation replacing ``uvx marimo``. Defaults to None.
+        cancellation: Optional cancel flags of the notebook exports, e.g. of a
+            watch mode rebuild. Defaults to None.
+        executor: Optional thread pool running the exports instead of a pool
+            started for this call. Defaults to None.
+        executable: Optional uvx executable already resolved from bin_path. Defaults to None.
 
     Returns:
         BatchExportResult containing all export results.
 
     """
-    total_notebooks = len(notebooks) + len(apps) + len(notebooks_wasm)
-    combined_batch_result = BatchExportResult()
+    if not (notebooks or apps or notebooks_wasm):
+        return BatchExportResult()
+
+    with _export_progress() as progress:
+        jobs = _build_jobs(output, notebooks, apps, notebooks_wasm, progress, history, estimated_duration)
+        combined_batch_result = export_jobs(
+            jobs,
+            sandbox,
+            bin_path,
+            parallel=parallel,
+            max_workers=max_workers,
+            timeout=timeout,
+            on_progress=on_progress,
+            cache=cache,
+            progress=progress,
+            history=history,
+            worker_pool=worker_pool,
+            environments=environments,
+            marimo_tool=marimo_tool,
+            cancellation=cancellation,
+            executor=executor,
+            executable=executable,
+        )
 
-    if total_notebooks == 0:
-        return combined_batch_result
+    _log_batch_summary(combined_batch_result, cache)
+    return combined_batch_result
 
-    # Define notebook categories and their output directories
-    notebook_categories = [
-        (notebooks, output / "notebooks"),
-        (apps, output / "apps"),
-        (notebooks_wasm, output / "notebooks_wasm"),
-    ]
 
-    with Progress(
+async def export_all_notebooks_async(
+    output: Path,
+    notebooks: list[Notebook],
+    apps: list[Notebook],
+    notebooks_wasm: list[Notebook],
+    sandbox: bool = True,
+    bin_path: Path | None = None,
+    max_concurrency: int = 4,
+    timeout: int = 300,
+    on_progress: ProgressCallback | None = None,
+    cache: ExportCache | None = None,
+    history: ExportHistory | None = None,
+    estimated_duration: float = DEFAULT_ESTIMATED_DURATION,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    cancellation: Cancellation | None = None,
+    executable: str | None = None,
+) -> BatchExportResult:
+    """Export all notebooks with the asyncio engine.
+
+    The asyncio counterpart of export_all_notebooks() for callers that already
+    run an event loop::
+
+        result = await export_all_notebooks_async(Path("_site"), notebooks, apps, [])
+
+    Pass a cache with a known marimo version, e.g. from ``cache.for_build()``;
+    otherwise every cache lookup queries the marimo version with a blocking
+    subprocess.
+
+    Args:
+        output: Base output directory.
+        notebooks: List of notebooks for static HTML export.
+        apps: List of notebooks for app export.
+        notebooks_wasm: List of notebooks for interactive WebAssembly export.
+        sandbox: Whether to use sandbox mode. Defaults to True.
+        bin_path: Custom path to uvx executable. Defaults to None.
+        max_concurrency: Maximum number of concurrent exports, at most
+            MAX_ASYNC_CONCURRENCY. Defaults to 4.
+        timeout: Maximum time in seconds for each export. Defaults to 300.
+        on_progress: Optional callback called after each notebook export.
+                    Signature: on_progress(completed, total, notebook_name)
+        cache: Optional export cache to reuse unchanged exports. Defaults to None.
+        history: Optional export history used to order the jobs and updated with
+            the measured durations. Defaults to None (notebooks keep their order).
+        estimated_duration: Estimated duration in seconds of notebooks without
+            history. Defaults to DEFAULT_ESTIMATED_DURATION.
+        environments: Optional pool of shared sandbox environments. Defaults to None.
+        marimo_tool: Optional pinned marimo installation replacing ``uvx marimo``. Defaults to None.
+        cancellation: Optional cancel flags of the notebook exports, e.g. of a
+            watch mode rebuild. Defaults to None.
+        executable: Optional uvx executable already resolved from bin_path. Defaults to None.
+
+    Returns:
+        BatchExportResult containing all export results.
+
+    """
+    if not (notebooks or apps or notebooks_wasm):
+        return BatchExportResult()
+
+    with _export_progress() as progress:
+        jobs = _build_jobs(output, notebooks, apps, notebooks_wasm, progress, history, estimated_duration)
+        combined_batch_result = await export_jobs_async(
+            jobs,
+            sandbox,
+            bin_path,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            on_progress=on_progress,
+            cache=cache,
+            progress=progress,
+            history=history,
+            environments=environments,
+            marimo_tool=marimo_tool,
+            cancellation=cancellation,
+            executable=executable,
+        )
+
+    _log_batch_summary(combined_batch_result, cache)
+    return combined_batch_result
+
+
+def _export_progress() -> Progress:
+    """Create the Rich progress display used while exporting."""
+    return Progress(
         SpinnerColumn(),
         TextColumn("[progress.description]{task.description}"),
         BarColumn(),
         TaskProgressColumn(),
         TextColumn("[cyan]{task.completed}/{task.total}"),
-    ) as progress:
-        task = progress.add_task("[green]Exporting notebooks...", total=total_notebooks)
+        EstimatedTimeRemainingColumn(),
+    )
 
-        for nb_list, out_dir in notebook_categories:
-            if not nb_list:
-                continue
 
-            if parallel:
-                batch_result = export_notebooks_parallel(
-                    nb_list, out_dir, sandbox, bin_path, max_workers, progress, task, timeout, on_progress
-                )
-            else:
-                batch_result = export_notebooks_sequential(
-                    nb_list, out_dir, sandbox, bin_path, progress, task, timeout, on_progress
-                )
+def _build_jobs(
+    output: Path,
+    notebooks: list[Notebook],
+    apps: list[Notebook],
+    notebooks_wasm: list[Notebook],
+    progress: Progress,
+    history: ExportHistory | None,
+    estimated_duration: float,
+) -> list[ExportJob]:
+    """Create one progress task per category and the export jobs of all categories."""
+    # Define notebook categories and their output directories
+    notebook_categories = [
+        ("notebooks", notebooks, output / "notebooks"),
+        ("apps", apps, output / "apps"),
+        ("notebooks_wasm", notebooks_wasm, output / "notebooks_wasm"),
+    ]
+
+    jobs: list[ExportJob] = []
+    for label, nb_list, out_dir in notebook_categories:
+        if not nb_list:
+            continue
+        task = progress.add_task(f"[green]Exporting {label}...", total=len(nb_list))
+        jobs.extend(
+            ExportJob(nb, out_dir, task, history.estimate(nb, estimated_duration) if history else None)
+            for nb in nb_list
+        )
+    return jobs
+
 
-            for result in batch_result.results:
-                combined_batch_result.add(result)
+def _log_batch_summary(batch_result: BatchExportResult, cache: ExportCache | None) -> None:
+    """Log cache reuse and failures of a finished batch."""
+    if cache is not None:
+        logger.info(f"Export cache: {batch_result.cached}/{batch_result.total} notebooks reused")
 
-    if combined_batch_result.failed > 0:  # pragma: no cover
-        logger.warning(
-            f"Export completed: {combined_batch_result.succeeded} succeeded, {combined_batch_result.failed} failed"
+    if batch_result.affinity_hit_rate is not None:
+        logger.info(
+            f"Environment affinity: {batch_result.affinity_hits}/{batch_result.affinity_dispatches} exports "
+            f"followed one with the same dependencies ({batch_result.affinity_hit_rate:.0%})"
         )
-        for failure in combined_batch_result.failures:
+
+    if batch_result.failed > 0:  # pragma: no cover
+        cancelled = sum(isinstance(failure.error, ExportCancelledError) for failure in batch_result.failures)
+        summary = f"{batch_result.succeeded} succeeded, {batch_result.failed - cancelled} failed"
+        if cancelled:
+            summary += f", {cancelled} cancelled"
+        logger.warning(f"Export completed: {summary}")
+        for failure in batch_result.failures:
             error_detail = sanitize_error_message(str(failure.error)) if failure.error else "Unknown error"
             logger.debug(f"  - {failure.notebook_path.name}: {error_detail}")
 
-    return combined_batch_result
+
+@functools.cache
+def _bytecode_cache() -> jinja2.BytecodeCache | None:
+    """Return the on-disk cache of compiled templates, or None if it cannot be used."""
+    try:
+        return jinja2.FileSystemBytecodeCache(pattern=_BYTECODE_CACHE_PATTERN)
+    except (OSError, RuntimeError) as e:
+        # Raised if the per-user cache directory cannot be created or is not private
+        logger.debug(f"Template bytecode cache disabled: {e}")
+        return None
+
+
+def _new_template_environment(template_dir: Path) -> jinja2.Environment:
+    """Create a sandboxed environment loading templates from a directory."""
+    loader: jinja2.BaseLoader = jinja2.FileSystemLoader(template_dir)
+    if template_dir == BUILTIN_TEMPLATE_DIR.resolve() and PRECOMPILED_TEMPLATES.is_file():
+        # Modules missing from the archive, or compiled by an incompatible Jinja2, fall back to the sources
+        loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(PRECOMPILED_TEMPLATES), loader])
+    # Use SandboxedEnvironment for security
+    return SandboxedEnvironment(loader=loader, autoescape=_AUTOESCAPE, bytecode_cache=_bytecode_cache())
+
+
+def create_template_environment(template_dir: Path) -> jinja2.Environment:
+    """Return the sandboxed Jinja2 environment that renders templates of a directory.
+
+    Environments are kept per directory for the lifetime of the process and
+    replaced once the directory's modification time changes, i.e. files were
+    added, removed or renamed. Edits to a template are picked up by Jinja2's
+    own modification check on every load. Compiled templates are stored in a
+    bytecode cache on disk, so a new process does not parse unchanged
+    templates again, and the built-in templates are loaded precompiled from
+    PRECOMPILED_TEMPLATES.
+
+    Args:
+        template_dir: Directory the templates are loaded from.
+
+    Returns:
+        The environment.
+
+    """
+    key = template_dir.resolve()
+    try:
+        mtime = key.stat().st_mtime_ns
+    except OSError:
+        # Nothing to cache; loading a template reports the missing directory
+        return _new_template_environment(key)
+
+    with _template_environments_lock:
+        cached = _template_environments.get(key)
+        if cached is None or cached[0] != mtime:
+            cached = _template_environments[key] = (mtime, _new_template_environment(key))
+        return cached[1]
+
+
+def compile_builtin_templates(target: Path = PRECOMPILED_TEMPLATES) -> None:
+    """Compile the built-in templates into the archive loaded by the default environment.
+
+    Run this after changing a file in BUILTIN_TEMPLATE_DIR::
+
+        python -c "from marimushka.orchestrator import compile_builtin_templates; compile_builtin_templates()"
+
+    Args:
+        target: Path of the zip archive to write. Defaults to PRECOMPILED_TEMPLATES.
+
+    """
+    env = SandboxedEnvironment(loader=jinja2.FileSystemLoader(BUILTIN_TEMPLATE_DIR), autoescape=_AUTOESCAPE)
+    env.compile_templates(
+        target, zip="deflated", filter_func=lambda name: name.endswith((".j2", ".css")), ignore_errors=False
+    )
+
+
+def _template_context(
+    notebooks: list[Notebook],
+    apps: list[Notebook],
+    notebooks_wasm: list[Notebook],
+    pagination: Pagination | None,
+    search_index: str | None,
+    directory: Directory | None = None,
+) -> dict[str, object]:
+    """Return the variables of the index template; optional ones only if set."""
+    context: dict[str, object] = {"notebooks": notebooks, "apps": apps, "notebooks_wasm": notebooks_wasm}
+    if pagination is not None:
+        context["pagination"] = pagination
+    if directory is not None:
+        context["directory"] = directory
+    if search_index is not None:
+        context["search_index"] = search_index
+    return context
 
 
 def render_template(
@@ -243,6 +981,10 @@ def render_template(
     apps: list[Notebook],
     notebooks_wasm: list[Notebook],
     audit_logger: AuditLogger,
+    environment: jinja2.Environment | None = None,
+    pagination: Pagination | None = None,
+    search_index: str | None = None,
+    directory: Directory | None = None,
 ) -> str:
     """Render the index template with notebook data.
 
@@ -252,6 +994,14 @@ def render_template(
         apps: List of notebooks for app export.
         notebooks_wasm: List of notebooks for interactive WebAssembly export.
         audit_logger: Logger for audit events.
+        environment: Optional Jinja2 environment loading from the template's
+            directory. Defaults to None (create_template_environment).
+        pagination: Position of the page among the index pages, passed to the
+            template as ``pagination``. Defaults to None (a single index page).
+        search_index: URL of the search index relative to the site root, passed
+            to the template as ``search_index``. Defaults to None (no search).
+        directory: Position of the page in the source tree of nested notebooks,
+            passed to the template as ``directory``. Defaults to None.
 
     Returns:
         The rendered HTML content as a string.
@@ -260,20 +1010,12 @@ def render_template(
         TemplateRenderError: If the template fails to render.
 
     """
-    template_dir = template_file.parent
-    template_name = template_file.name
-
     try:
-        # Use SandboxedEnvironment for security
-        env = SandboxedEnvironment(
-            loader=jinja2.FileSystemLoader(template_dir), autoescape=jinja2.select_autoescape(["html", "xml"])
-        )
-        template = env.get_template(template_name)
+        env = environment if environment is not None else create_template_environment(template_file.parent)
+        template = env.get_template(template_file.name)
 
         rendered = template.render(
-            notebooks=notebooks,
-            apps=apps,
-            notebooks_wasm=notebooks_wasm,
+            **_template_context(notebooks, apps, notebooks_wasm, pagination, search_index, directory)
         )
         audit_logger.log_template_render(template_file, True)
     except jinja2.exceptions.TemplateError as e:
@@ -287,6 +1029,10 @@ def render_template(
 def write_index_file(index_path: Path, content: str, audit_logger: AuditLogger) -> None:
     """Write the rendered HTML content to the index file.
 
+    The content is written to a temporary file next to the index, which then
+    atomically replaces the index, so readers never see a partially written
+    index.
+
     Args:
         index_path: Path where the index.html file will be written.
         content: The rendered HTML content to write.
@@ -297,13 +1043,9 @@ def write_index_file(index_path: Path, content: str, audit_logger: AuditLogger)
 
     """
     try:
-        # Write file with secure content
-        with Path.open(index_path, "w") as f:
+        with atomic_path(index_path) as temp_path, Path.open(temp_path, "w") as f:
             f.write(content)
 
-        # Set secure file permissions
-        set_secure_file_permissions(index_path, mode=0o644)
-
         logger.info(f"Successfully generated index file at {index_path}")
         audit_logger.log_file_access(index_path, "write", True)
     except OSError as e:
@@ -312,6 +1054,201 @@ def write_index_file(index_path: Path, content: str, audit_logger: AuditLogger)
         raise IndexWriteError(index_path, e) from e
 
 
+def render_index_file(
+    template_file: Path,
+    index_path: Path,
+    notebooks: list[Notebook],
+    apps: list[Notebook],
+    notebooks_wasm: list[Notebook],
+    audit_logger: AuditLogger,
+    environment: jinja2.Environment | None = None,
+    pagination: Pagination | None = None,
+    search_index: str | None = None,
+    directory: Directory | None = None,
+) -> None:
+    """Render the index template straight into the index file.
+
+    The chunks produced by the template are written to a temporary file next
+    to the index as they are generated, so the page is never held in memory
+    as a whole. The temporary file then atomically replaces the index, and
+    readers never see a partially written index.
+
+    Args:
+        template_file: Path to the Jinja2 template file.
+        index_path: Path where the index.html file will be written.
+        notebooks: List of notebooks for static HTML export.
+        apps: List of notebooks for app export.
+        notebooks_wasm: List of notebooks for interactive WebAssembly export.
+        audit_logger: Logger for audit events.
+        environment: Optional Jinja2 environment loading from the template's
+            directory. Defaults to None (create_template_environment).
+        pagination: Position of the page among the index pages, passed to the
+            template as ``pagination``. Defaults to None (a single index page).
+        search_index: URL of the search index relative to the site root, passed
+            to the template as ``search_index``. Defaults to None (no search).
+        directory: Position of the page in the source tree of nested notebooks,
+            passed to the template as ``directory``. Defaults to None.
+
+    Raises:
+        TemplateRenderError: If the template fails to render.
+        IndexWriteError: If the index file cannot be written.
+
+    """
+    try:
+        env = environment if environment is not None else create_template_environment(template_file.parent)
+        template = env.get_template(template_file.name)
+        with atomic_path(index_path) as temp_path, Path.open(temp_path, "w") as f:
+            f.writelines(
+                template.generate(
+                    **_template_context(notebooks, apps, notebooks_wasm, pagination, search_index, directory)
+                )
+            )
+    except jinja2.exceptions.TemplateError as e:
+        sanitized_error = sanitize_error_message(str(e))
+        audit_logger.log_template_render(template_file, False, sanitized_error)
+        raise TemplateRenderError(template_file, e) from e
+    except OSError as e:
+        sanitized_error = sanitize_error_message(str(e))
+        audit_logger.log_file_access(index_path, "write", False, sanitized_error)
+        raise IndexWriteError(index_path, e) from e
+
+    audit_logger.log_template_render(template_file, True)
+    logger.info(f"Successfully generated index file at {index_path}")
+    audit_logger.log_file_access(index_path, "write", True)
+
+
+def render_index_pages(
+    output: Path,
+    template_file: Path,
+    pages: list[IndexPage],
+    audit_logger: AuditLogger,
+    exports: set[Path] | None = None,
+    environment: jinja2.Environment | None = None,
+    executor: Executor | None = None,
+    max_workers: int = 4,
+    search_index: str | None = None,
+) -> list[Path]:
+    """Render the pages of each kind and of each directory in parallel.
+
+    Pages whose path is taken by a notebook export are skipped. Earlier pages
+    that are no longer part of the index, e.g. after the page size grew or a
+    directory was removed, are removed.
+
+    Args:
+        output: The output directory.
+        template_file: Path to the Jinja2 template file.
+        pages: The pages to render, see plan_index_pages. The front page
+            ``index.html`` is rendered by generate_index and ignored here.
+        audit_logger: Logger for audit events.
+        exports: Paths of the notebook exports relative to output. Defaults to None.
+        environment: Optional Jinja2 environment loading from the template's
+            directory. Defaults to None (create_template_environment).
+        executor: Optional thread pool rendering the pages. The caller owns it.
+            Defaults to None (a pool of max_workers threads for this call).
+        max_workers: Number of threads of the pool started for this call. Defaults to 4.
+        search_index: URL of the search index relative to the site root. Defaults to None.
+
+    Returns:
+        Paths of the rendered pages relative to output.
+
+    Raises:
+        TemplateRenderError: If the template fails to render.
+        IndexWriteError: If a page cannot be written.
+
+    """
+    exports = exports or set()
+    pages = [page for page in pages if page.path != Path(INDEX_FILENAME)]
+    for page in pages:
+        if page.path in exports:
+            logger.warning(f"Not writing index page {page.path}: a notebook is exported to the same path")
+    pages = [page for page in pages if page.path not in exports]
+    if pages and environment is None:
+        environment = create_template_environment(template_file.parent)
+
+    def render(page: IndexPage) -> Path:
+        """Render one page into its file."""
+        index_path = output / page.path
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        render_index_file(
+            template_file,
+            index_path,
+            page.notebooks,
+            page.apps,
+            page.notebooks_wasm,
+            audit_logger,
+            environment=environment,
+            pagination=page.pagination,
+            search_index=search_index,
+            directory=page.directory,
+        )
+        return page.path
+
+    with contextlib.ExitStack() as stack:
+        if executor is None and len(pages) > 1:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=min(max_workers, len(pages))))
+        written = list(executor.map(render, pages)) if executor is not None else [render(page) for page in pages]
+
+    _remove_stale_pages(output, set(written) | exports)
+    return written
+
+
+def _remove_stale_pages(output: Path, keep: set[Path]) -> None:
+    """Remove index pages of the kinds' output directories that were not written by this build.
+
+    Directory pages are found below the kinds' output directories, except in
+    the ``public`` and ``assets`` directories copied by the exports.
+    """
+    for kind in Kind:
+        folder = output / kind.html_path
+        if not folder.is_dir():
+            continue
+        nested = (
+            path
+            for path in folder.glob(f"*/**/{INDEX_FILENAME}")
+            if not {PUBLIC_DIRNAME, "assets"} & set(path.relative_to(folder).parts)
+        )
+        for path in [folder / INDEX_FILENAME, *folder.glob("page-*.html"), *nested]:
+            if path.relative_to(output) not in keep and path.is_file():
+                logger.debug(f"Removing stale index page {path}")
+                path.unlink(missing_ok=True)
+
+
+def resolve_build_marimo_version(
+    bin_path: Path | None, cache: ExportCache | None = None, executable: str | None = None
+) -> str | None:
+    """Resolve the marimo version used by a build.
+
+    Args:
+        bin_path: Custom directory of the uvx executable, if any.
+        cache: Optional export cache; its pinned version wins if set.
+        executable: Optional uvx executable already resolved from bin_path.
+
+    Returns:
+        The marimo version, or None if it could not be determined.
+
+    """
+    if cache is not None and cache.marimo_version:
+        return cache.marimo_version
+
+    if executable is None:
+        executable = "uvx"
+        if bin_path:
+            executable = shutil.which(executable, path=str(bin_path)) or str(bin_path / executable)
+
+    return resolve_marimo_version(executable)
+
+
+def _site_changed(previous: BuildManifest, notebooks: list[Notebook], index_path: Path) -> bool:
+    """Return True if the index lists other notebooks than the previous build's.
+
+    Display names derive from file names, so the index only changes when the
+    set of exported files does.
+    """
+    if not index_path.is_file():
+        return True
+    return set(previous.entries) != {nb.html_path.as_posix() for nb in notebooks}
+
+
 def generate_index(
     output: Path,
     template_file: Path,
@@ -325,6 +1262,25 @@ def generate_index(
     timeout: int = 300,
     on_progress: ProgressCallback | None = None,
     audit_logger: AuditLogger | None = None,
+    cache: ExportCache | None = None,
+    incremental: bool = False,
+    history: ExportHistory | None = None,
+    estimated_duration: float = DEFAULT_ESTIMATED_DURATION,
+    engine: str = "threads",
+    worker_max_jobs: int = DEFAULT_MAX_JOBS,
+    worker_max_memory: int = DEFAULT_MAX_MEMORY_MB,
+    environments: EnvironmentPool | None = None,
+    marimo_tool: MarimoTool | None = None,
+    changes: ChangeSet | None = None,
+    cancellation: Cancellation | None = None,
+    worker_pool: WorkerPool | None = None,
+    on_complete: ResultCallback | None = None,
+    executor: Executor | None = None,
+    template_environment: jinja2.Environment | None = None,
+    return_html: bool = True,
+    page_size: int = 0,
+    search: bool = False,
+    executable: str | None = None,
 ) -> str:
     """Generate an index.html file that lists all the notebooks.
 
@@ -332,6 +1288,25 @@ def generate_index(
     notebooks. The index page includes the marimo logo and displays each notebook
     with a formatted title and a link to open it.
 
+    Every build records what it exported in a manifest inside the output directory
+    (see the manifest module). Files recorded by the previous build whose notebooks
+    no longer exist are removed. With incremental=True, notebooks whose previous
+    export is still up to date according to the manifest are not exported again.
+    A notebook is also out of date once a local module it imports or a file of
+    its ``public/`` directory it references changed (see the imports and
+    assets modules).
+
+    With changes (a watch mode rebuild), only the changed notebooks and those
+    importing changed modules are exported, and the index is only re-rendered
+    if the template changed or the site's notebooks differ from those of the
+    previous build.
+
+    With a page_size, index.html only lists the first page_size notebooks of
+    each kind, and every kind gets its own pages such as notebooks/index.html
+    and notebooks/page-2.html (see the pagination module), rendered in parallel.
+    Notebooks in subdirectories of their folder additionally get an index page
+    per directory, such as notebooks/team/index.html.
+
     Args:
         output: Directory where the index.html file will be saved.
         template_file: Path to the Jinja2 template file.
@@ -346,41 +1321,252 @@ def generate_index(
         on_progress: Optional callback called after each notebook export.
             Signature: on_progress(completed, total, notebook_name).
         audit_logger: Logger for audit events. If None, creates a default logger.
+        cache: Optional export cache to reuse unchanged exports. The imports of
+            the notebooks' local modules and their references to data files
+            are kept next to it. Defaults to None.
+        incremental: Whether to skip notebooks that are up to date according to
+            the build manifest. Defaults to False.
+        history: Optional export history used for longest-job-first scheduling.
+            It is updated with this build's durations and saved. Defaults to None.
+        estimated_duration: Estimated duration in seconds of notebooks without
+            history. Defaults to DEFAULT_ESTIMATED_DURATION.
+        engine: Export engine, one of ENGINES. "threads" runs each export in a
+            worker thread; "asyncio" runs all exports as asyncio subprocesses
+            on a private event loop; "workers" runs exports in persistent marimo
+            worker processes that import marimo only once; sandboxed exports
+            run as plain subprocesses. Defaults to "threads".
+        worker_max_jobs: Number of exports after which a worker of the
+            "workers" engine is replaced. Defaults to DEFAULT_MAX_JOBS.
+        worker_max_memory: Resident memory in megabytes above which a worker of
+            the "workers" engine is replaced. Defaults to DEFAULT_MAX_MEMORY_MB.
+        environments: Optional pool of shared sandbox environments. In sandbox
+            mode, notebooks with identical PEP 723 dependencies are exported in
+            one shared environment instead of a fresh marimo sandbox each.
+            Defaults to None.
+        marimo_tool: Optional pinned marimo installation that runs every export
+            instead of ``uvx marimo``. Its version is also the build's marimo
+            version for the cache and the manifest. Defaults to None.
+        changes: Optional changes of a watch mode rebuild. Notebooks they do not
+            affect are neither exported nor removed. Defaults to None (export all).
+        cancellation: Optional cancel flags of the notebook exports, e.g. of a
+            watch mode rebuild. Defaults to None.
+        worker_pool: Optional pool of persistent marimo workers used by the
+            "workers" engine instead of a pool started for this build. The
+            caller owns it; it stays open afterwards. Defaults to None.
+        on_complete: Optional callback called with the BatchExportResult once
+            the index and the manifest are written. Defaults to None.
+        executor: Optional thread pool of the "threads" engine, with at least
+            max_workers threads, used instead of a pool started for this build.
+            The caller owns it. Defaults to None.
+        template_environment: Optional Jinja2 environment kept by the caller,
+            see create_template_environment. Defaults to None.
+        return_html: Whether to return the index page. If False, the template
+            is streamed into the index file (see render_index_file) instead of
+            being rendered to a string first. Defaults to True.
+        page_size: Maximum number of notebooks of a kind on one index page.
+            Defaults to 0 (a single index page listing every notebook).
+        search: Whether to write the search index search-index.json over the
+            names, docstrings and markdown headings of all notebooks (see the
+            search module) and pass its URL to the template. Defaults to False.
+        executable: Optional uvx executable already resolved from bin_path, e.g.
+            by a BuildSession. Defaults to None (resolved by every export).
 
     Returns:
-        The rendered HTML content as a string.
+        The rendered HTML content as a string, or the content of the existing
+        index file if it did not need to be re-rendered. Empty if return_html
+        is False.
 
     Raises:
+        ValueError: If the engine is unknown or page_size is negative.
         TemplateRenderError: If the template fails to render.
         IndexWriteError: If the index file cannot be written.
 
     """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown export engine {engine!r}, expected one of {', '.join(ENGINES)}")  # noqa: TRY003
+
     if audit_logger is None:
         audit_logger = get_audit_logger()
 
     notebooks = notebooks or []
     apps = apps or []
     notebooks_wasm = notebooks_wasm or []
+    all_notebooks = [*notebooks, *apps, *notebooks_wasm]
+    pages = plan_index_pages(notebooks, apps, notebooks_wasm, page_size)
+    front = pages[0]
+
+    previous_manifest = BuildManifest.load(output)
+    if cache is not None:
+        import_graph().load(cache.cache_dir / IMPORTS_FILENAME)
+        asset_references().load(cache.cache_dir / ASSETS_FILENAME)
+    if marimo_tool is not None:
+        marimo_version: str | None = marimo_tool.version
+    elif incremental or cache is not None:
+        marimo_version = resolve_build_marimo_version(bin_path, cache, executable)
+    else:
+        marimo_version = None
+    if cache is not None:
+        # Resolved per build: a long-lived session notices marimo upgrades
+        cache = cache.for_build(marimo_version)
+
+    def is_stale(nb: Notebook) -> bool:
+        """Return True if the notebook has to be exported in this build."""
+        if changes is not None and not changes.affects(nb):
+            return False
+        return not (incremental and previous_manifest.is_current(nb, output, sandbox, marimo_version))
+
+    stale_notebooks = [nb for nb in notebooks if is_stale(nb)]
+    stale_apps = [nb for nb in apps if is_stale(nb)]
+    stale_notebooks_wasm = [nb for nb in notebooks_wasm if is_stale(nb)]
+    if incremental or changes is not None:
+        up_to_date = len(all_notebooks) - len(stale_notebooks) - len(stale_apps) - len(stale_notebooks_wasm)
+        logger.info(f"Incremental build: {up_to_date}/{len(all_notebooks)} notebooks are up to date")
+    index_path = output / INDEX_FILENAME
+    search_index = SEARCH_INDEX_FILENAME if search else None
+    render_index = changes is None or changes.template or _site_changed(previous_manifest, all_notebooks, index_path)
 
     # Export all notebooks with progress tracking
-    export_all_notebooks(
-        output=output,
-        notebooks=notebooks,
-        apps=apps,
-        notebooks_wasm=notebooks_wasm,
-        sandbox=sandbox,
-        bin_path=bin_path,
-        parallel=parallel,
-        max_workers=max_workers,
-        timeout=timeout,
-        on_progress=on_progress,
-    )
+    if engine == "asyncio":
+        batch_result = asyncio.run(
+            export_all_notebooks_async(
+                output=output,
+                notebooks=stale_notebooks,
+                apps=stale_apps,
+                notebooks_wasm=stale_notebooks_wasm,
+                sandbox=sandbox,
+                bin_path=bin_path,
+                max_concurrency=max_workers if parallel else 1,
+                timeout=timeout,
+                on_progress=on_progress,
+                cache=cache,
+                history=history,
+                estimated_duration=estimated_duration,
+                environments=environments,
+                marimo_tool=marimo_tool,
+                cancellation=cancellation,
+                executable=executable,
+            )
+        )
+    elif engine == "workers":
+        if sandbox:
+            logger.warning("The workers engine only speeds up --no-sandbox builds; exporting in sandbox subprocesses")
+        with contextlib.ExitStack() as stack:
+            if worker_pool is None:
+                pool_size = validate_max_workers(max_workers) if parallel else 1
+                worker_pool = stack.enter_context(
+                    WorkerPool(pool_size, max_jobs=worker_max_jobs, max_memory_mb=worker_max_memory)
+                )
+            batch_result = export_all_notebooks(
+                output=output,
+                notebooks=stale_notebooks,
+                apps=stale_apps,
+                notebooks_wasm=stale_notebooks_wasm,
+                sandbox=sandbox,
+                bin_path=bin_path,
+                parallel=parallel,
+                max_workers=max_workers,
+                timeout=timeout,
+                on_progress=on_progress,
+                cache=cache,
+                history=history,
+                estimated_duration=estimated_duration,
+                worker_pool=worker_pool,
+                environments=environments,
+                marimo_tool=marimo_tool,
+                cancellation=cancellation,
+                executable=executable,
+            )
+        logger.info(f"Export workers: {worker_pool.started} started, {worker_pool.recycled} recycled")
+    else:
+        batch_result = export_all_notebooks(
+            output=output,
+            notebooks=stale_notebooks,
+            apps=stale_apps,
+            notebooks_wasm=stale_notebooks_wasm,
+            sandbox=sandbox,
+            bin_path=bin_path,
+            parallel=parallel,
+            max_workers=max_workers,
+            timeout=timeout,
+            on_progress=on_progress,
+            cache=cache,
+            history=history,
+            estimated_duration=estimated_duration,
+            environments=environments,
+            marimo_tool=marimo_tool,
+            cancellation=cancellation,
+            executor=executor,
+            executable=executable,
+        )
+    if history is not None:
+        history.save()
+    if environments is not None:
+        logger.info(f"Shared environments: {environments.created} created, {environments.reused} reused")
 
     # Ensure the output directory exists
     output.mkdir(parents=True, exist_ok=True)
 
     # Render template and write index file
-    rendered_html = render_template(template_file, notebooks, apps, notebooks_wasm, audit_logger)
-    write_index_file(output / "index.html", rendered_html, audit_logger)
-
+    rendered_html = ""
+    if render_index and return_html:
+        rendered_html = render_template(
+            template_file,
+            front.notebooks,
+            front.apps,
+            front.notebooks_wasm,
+            audit_logger,
+            environment=template_environment,
+            pagination=front.pagination,
+            search_index=search_index,
+            directory=front.directory,
+        )
+        write_index_file(index_path, rendered_html, audit_logger)
+    elif render_index:
+        render_index_file(
+            template_file,
+            index_path,
+            front.notebooks,
+            front.apps,
+            front.notebooks_wasm,
+            audit_logger,
+            environment=template_environment,
+            pagination=front.pagination,
+            search_index=search_index,
+            directory=front.directory,
+        )
+    if render_index:
+        render_index_pages(
+            output,
+            template_file,
+            pages[1:],
+            audit_logger,
+            exports={nb.html_path for nb in all_notebooks},
+            environment=template_environment,
+            executor=executor,
+            max_workers=validate_max_workers(max_workers) if parallel else 1,
+            search_index=search_index,
+        )
+    else:
+        logger.info("Notebooks and template unchanged, keeping index file")
+        if return_html:
+            rendered_html = index_path.read_text()
+
+    if search:
+        try:
+            write_search_index(output, all_notebooks)
+        except OSError as e:
+            sanitized_error = sanitize_error_message(str(e))
+            audit_logger.log_file_access(output / SEARCH_INDEX_FILENAME, "write", False, sanitized_error)
+            raise IndexWriteError(output / SEARCH_INDEX_FILENAME, e) from e
+
+    # Record this build and drop exports of notebooks that no longer exist
+    manifest = update_manifest(previous_manifest, all_notebooks, batch_result.results, output, sandbox, marimo_version)
+    remove_orphans(previous_manifest, manifest, output)
+    manifest.save(output)
+    if cache is not None:
+        import_graph().save(cache.cache_dir / IMPORTS_FILENAME)
+        asset_references().save(cache.cache_dir / ASSETS_FILENAME)
+
+    if on_complete is not None:
+        on_complete(batch_result)
     return rendered_html
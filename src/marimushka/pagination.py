@@ -0,0 +1,343 @@
+"""Paginated, per-kind and per-directory index pages.
+
+A single ``index.html`` listing thousands of notebooks is large and slow to
+load. With a page size, the index is split into shards:
+
+- ``index.html``, the front page, lists the first page of every kind,
+- every kind with notebooks gets its own pages in its output directory:
+  ``notebooks/index.html``, ``notebooks/page-2.html``, ``apps/index.html``, ...
+
+Every page is rendered with the same template. Besides ``notebooks``, ``apps``
+and ``notebooks_wasm`` (only the kind of a kind page is filled), the template
+receives ``pagination``, a Pagination describing the page. URLs in it are
+relative to the site root; kind pages live one directory below it, so
+templates prefix links with ``pagination.root`` or set
+``<base href="{{ pagination.root }}">``.
+
+Notebooks discovered recursively keep their directory below the folder, and
+every such directory gets an index page of its own, e.g.
+``notebooks/team/index.html``, listing the notebooks directly in it and
+linking to its subdirectories. These pages, and the front page of a nested
+site, receive ``directory``, a Directory with the links to the subdirectories
+and the page's own ``root``. Directory pages are not paginated.
+
+Example::
+
+    from marimushka.pagination import plan_index_pages
+
+    for page in plan_index_pages(notebooks, apps, notebooks_wasm, page_size=50):
+        print(page.path, page.pagination.number, page.pagination.count)
+"""
+
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .notebook import Kind, Notebook
+
+# File name of the first page of a shard
+INDEX_FILENAME = "index.html"
+
+# File name of the following pages of a kind
+PAGE_FILENAME = "page-{number}.html"
+
+# Template variable listing the notebooks of each Kind
+TEMPLATE_VARIABLES = {Kind.NB: "notebooks", Kind.APP: "apps", Kind.NB_WASM: "notebooks_wasm"}
+
+
+def page_path(kind: Kind, number: int) -> Path:
+    """Return the path of a page of a kind, relative to the output directory.
+
+    Args:
+        kind: The kind listed by the page.
+        number: Number of the page, starting at 1.
+
+    Returns:
+        ``<kind dir>/index.html`` for the first page, ``<kind dir>/page-<n>.html`` otherwise.
+
+    """
+    return kind.html_path / (INDEX_FILENAME if number == 1 else PAGE_FILENAME.format(number=number))
+
+
+@dataclass(frozen=True)
+class Shard:
+    """The pages of one kind.
+
+    Attributes:
+        kind: The kind listed by the pages.
+        total: Number of notebooks of the kind.
+        urls: URLs of the pages, relative to the site root.
+
+    """
+
+    kind: Kind
+    total: int
+    urls: tuple[str, ...]
+
+    @property
+    def url(self) -> str:
+        """Return the URL of the first page."""
+        return self.urls[0]
+
+    @property
+    def count(self) -> int:
+        """Return the number of pages."""
+        return len(self.urls)
+
+
+@dataclass(frozen=True)
+class Pagination:
+    """Position of an index page among the pages of its kind.
+
+    Attributes:
+        kind: Kind listed by the page, or None for the front page.
+        number: Number of the page, starting at 1.
+        urls: URLs of all pages of the kind (only the front page for the
+            front page), relative to the site root.
+        total: Number of notebooks of the kind, or of all kinds on the front page.
+        page_size: Maximum number of notebooks of a kind on one page.
+        root: URL of the site root relative to the page, "" or "../".
+        shards: The pages of every kind with notebooks, keyed by the template
+            variable listing it, e.g. ``pagination.shards.apps.url``.
+
+    """
+
+    kind: Kind | None
+    number: int
+    urls: tuple[str, ...]
+    total: int
+    page_size: int
+    root: str
+    shards: Mapping[str, Shard] = field(default_factory=dict)
+
+    @property
+    def count(self) -> int:
+        """Return the number of pages of the kind."""
+        return len(self.urls)
+
+    @property
+    def url(self) -> str:
+        """Return the URL of this page."""
+        return self.urls[self.number - 1]
+
+    @property
+    def previous_url(self) -> str | None:
+        """Return the URL of the previous page, or None on the first page."""
+        return self.urls[self.number - 2] if self.number > 1 else None
+
+    @property
+    def next_url(self) -> str | None:
+        """Return the URL of the next page, or None on the last page."""
+        return self.urls[self.number] if self.number < self.count else None
+
+
+@dataclass(frozen=True)
+class Folder:
+    """A subdirectory linked from an index page.
+
+    Attributes:
+        kind: Kind of the notebooks in the subdirectory.
+        name: Name of the subdirectory.
+        url: URL of the subdirectory's page, relative to the site root.
+        total: Number of notebooks in the subdirectory and below it.
+
+    """
+
+    kind: Kind
+    name: str
+    url: str
+    total: int
+
+
+@dataclass(frozen=True)
+class Directory:
+    """Position of an index page in the source tree of a nested site.
+
+    Attributes:
+        kind: Kind listed by the page, or None for the front page.
+        path: POSIX path of the directory relative to the kind's folder, ""
+            for the front page.
+        root: URL of the site root relative to the page, e.g. "../../".
+        parent_url: URL of the parent directory's page relative to the site
+            root, None for the front page.
+        folders: The subdirectories with notebooks, keyed by the template
+            variable listing their kind, e.g. ``directory.folders.apps``.
+
+    """
+
+    kind: Kind | None
+    path: str
+    root: str
+    parent_url: str | None
+    folders: Mapping[str, tuple[Folder, ...]] = field(default_factory=dict)
+
+    @property
+    def url(self) -> str:
+        """Return the URL of this page."""
+        if self.kind is None:
+            return INDEX_FILENAME
+        return directory_path(self.kind, Path(self.path)).as_posix()
+
+
+@dataclass(frozen=True)
+class IndexPage:
+    """One index page to render.
+
+    Attributes:
+        path: Path of the page relative to the output directory.
+        notebooks: Static notebooks listed on the page.
+        apps: Apps listed on the page.
+        notebooks_wasm: Interactive notebooks listed on the page.
+        pagination: The page's position, None if the index is not paginated.
+        directory: The page's directory, None unless notebooks are nested.
+
+    """
+
+    path: Path
+    notebooks: list[Notebook]
+    apps: list[Notebook]
+    notebooks_wasm: list[Notebook]
+    pagination: Pagination | None = None
+    directory: Directory | None = None
+
+
+def directory_path(kind: Kind, subdir: Path) -> Path:
+    """Return the path of the page of a directory, relative to the output directory.
+
+    Args:
+        kind: Kind of the notebooks in the directory.
+        subdir: Path of the directory relative to the kind's folder.
+
+    Returns:
+        ``<kind dir>/<subdir>/index.html``.
+
+    """
+    return kind.html_path / subdir / INDEX_FILENAME
+
+
+def _folders(kind: Kind, subdirs: set[Path], totals: Counter[Path]) -> tuple[Folder, ...]:
+    """Return the links to some subdirectories, sorted by name."""
+    return tuple(
+        Folder(kind, subdir.name, directory_path(kind, subdir).as_posix(), totals[subdir]) for subdir in sorted(subdirs)
+    )
+
+
+def plan_directory_pages(
+    notebooks: list[Notebook], apps: list[Notebook], notebooks_wasm: list[Notebook]
+) -> tuple[Directory | None, list[IndexPage]]:
+    """Plan an index page for every directory below the folders that holds notebooks.
+
+    Args:
+        notebooks: Static notebooks of the site.
+        apps: Apps of the site.
+        notebooks_wasm: Interactive notebooks of the site.
+
+    Returns:
+        The directory of the front page, None if no notebook is nested, and
+        the pages of the directories, parents before their subdirectories.
+
+    """
+    top = Path()
+    root_folders: dict[str, tuple[Folder, ...]] = {}
+    pages: list[IndexPage] = []
+    for kind, items in {Kind.NB: notebooks, Kind.APP: apps, Kind.NB_WASM: notebooks_wasm}.items():
+        listed: defaultdict[Path, list[Notebook]] = defaultdict(list)
+        totals: Counter[Path] = Counter()
+        children: defaultdict[Path, set[Path]] = defaultdict(set)
+        for nb in items:
+            listed[nb.subdir].append(nb)
+            child = nb.subdir
+            for parent in nb.subdir.parents:
+                children[parent].add(child)
+                child = parent
+            totals.update([nb.subdir, *nb.subdir.parents])
+
+        variable = TEMPLATE_VARIABLES[kind]
+        if children[top]:
+            root_folders[variable] = _folders(kind, children[top], totals)
+        for subdir in sorted(totals, key=lambda path: path.parts):
+            if subdir == top:
+                continue
+            parent_url = INDEX_FILENAME if subdir.parent == top else directory_path(kind, subdir.parent).as_posix()
+            directory = Directory(
+                kind,
+                subdir.as_posix(),
+                "../" * (len(subdir.parts) + 1),
+                parent_url,
+                {variable: _folders(kind, children[subdir], totals)},
+            )
+            pages.append(
+                IndexPage(
+                    directory_path(kind, subdir),
+                    notebooks=listed[subdir] if kind == Kind.NB else [],
+                    apps=listed[subdir] if kind == Kind.APP else [],
+                    notebooks_wasm=listed[subdir] if kind == Kind.NB_WASM else [],
+                    directory=directory,
+                )
+            )
+
+    if not root_folders:
+        return None, []
+    return Directory(None, "", "", None, root_folders), pages
+
+
+def plan_index_pages(
+    notebooks: list[Notebook], apps: list[Notebook], notebooks_wasm: list[Notebook], page_size: int = 0
+) -> list[IndexPage]:
+    """Split the index into the front page and the pages of every kind.
+
+    Args:
+        notebooks: Static notebooks of the site.
+        apps: Apps of the site.
+        notebooks_wasm: Interactive notebooks of the site.
+        page_size: Maximum number of notebooks of a kind on one page. Defaults
+            to 0 (a single index page listing everything).
+
+    Returns:
+        The front page ``index.html`` first, then the pages of each kind, then
+        the pages of the directories of nested notebooks (see plan_directory_pages).
+
+    Raises:
+        ValueError: If page_size is negative.
+
+    """
+    if page_size < 0:
+        raise ValueError(f"Page size must not be negative, got {page_size}")  # noqa: TRY003
+    root, directory_pages = plan_directory_pages(notebooks, apps, notebooks_wasm)
+    if page_size == 0:
+        return [IndexPage(Path(INDEX_FILENAME), notebooks, apps, notebooks_wasm, directory=root), *directory_pages]
+
+    by_kind = {Kind.NB: notebooks, Kind.APP: apps, Kind.NB_WASM: notebooks_wasm}
+    shards: dict[str, Shard] = {}
+    for kind, items in by_kind.items():
+        if items:
+            count = -(-len(items) // page_size)
+            urls = tuple(page_path(kind, number).as_posix() for number in range(1, count + 1))
+            shards[TEMPLATE_VARIABLES[kind]] = Shard(kind, len(items), urls)
+
+    front = Pagination(
+        None, 1, (INDEX_FILENAME,), len(notebooks) + len(apps) + len(notebooks_wasm), page_size, "", shards
+    )
+    pages = [
+        IndexPage(
+            Path(INDEX_FILENAME), notebooks[:page_size], apps[:page_size], notebooks_wasm[:page_size], front, root
+        )
+    ]
+    for kind, items in by_kind.items():
+        if not items:
+            continue
+        shard = shards[TEMPLATE_VARIABLES[kind]]
+        for number in range(1, shard.count + 1):
+            listed = items[(number - 1) * page_size : number * page_size]
+            pagination = Pagination(kind, number, shard.urls, shard.total, page_size, "../", shards)
+            pages.append(
+                IndexPage(
+                    page_path(kind, number),
+                    notebooks=listed if kind == Kind.NB else [],
+                    apps=listed if kind == Kind.APP else [],
+                    notebooks_wasm=listed if kind == Kind.NB_WASM else [],
+                    pagination=pagination,
+                )
+            )
+    return pages + directory_pages
@@ -0,0 +1,213 @@
+"""Static pre-check of notebook sources.
+
+Every ``.py`` file of a notebook folder used to be exported, so a helper
+module or an ``__init__.py`` cost a full ``uvx marimo export`` that failed
+after seconds of environment setup. The pre-check tells marimo notebooks from
+other Python files without running anything:
+
+- a file that does not mention ``marimo`` in its first HEADER_BYTES bytes is
+  not a notebook; only this header is read,
+- otherwise the file is a notebook if it calls ``marimo.App(``, found by a
+  regular expression for the usual ``app = marimo.App(...)`` line or, failing
+  that, by scanning the file's tokens, which skips strings and comments,
+- notebooks are compiled to an AST to find syntax errors.
+
+Discovery skips files that are not notebooks, and notebooks with a syntax
+error fail with NotebookInvalidError before their export spawns a process.
+
+Results are kept in a SourceCheckCache keyed by path and validated by
+modification time and size, so unchanged files are not read again. The cache
+of the process is shared by discovery and exports; builds with a cache
+directory persist it as ``source-checks.json`` there.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.precheck import check_source
+
+    check = check_source(Path("notebooks/helpers.py"))
+    if not check.notebook:
+        print("not a marimo notebook")
+"""
+
+import ast
+import io
+import os
+import re
+import threading
+import tokenize
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the persisted checks inside the cache directory
+CHECKS_FILENAME = "source-checks.json"
+
+# Format of the persisted checks; covers the check logic, as the results depend on it
+CHECK_VERSION = 1
+
+# Bytes read to decide whether a file can be a notebook at all
+HEADER_BYTES = 16 * 1024
+
+_APP_LINE = re.compile(rb"^[ \t]*\w+[ \t]*=[ \t]*marimo\.App\(", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class SourceCheck:
+    """Result of checking one source file.
+
+    Attributes:
+        mtime_ns: Modification time of the file when it was checked.
+        size: Size in bytes of the file when it was checked.
+        notebook: Whether the file is a marimo notebook.
+        error: The syntax error of a notebook, None if it compiles.
+
+    """
+
+    mtime_ns: int
+    size: int
+    notebook: bool
+    error: str | None = None
+
+
+def _calls_marimo_app(source: bytes) -> bool:
+    """Return True if the tokens of a source contain ``marimo.App(``."""
+    window: list[str] = []
+    try:
+        for token in tokenize.tokenize(io.BytesIO(source).readline):
+            if token.type in (tokenize.NAME, tokenize.OP):
+                window = [*window[-3:], token.string]
+                if window == ["marimo", ".", "App", "("]:
+                    return True
+    except (tokenize.TokenError, SyntaxError):
+        # Sources that cannot be tokenized are judged by their text
+        return b"marimo.App(" in source
+    return False
+
+
+def check_source(path: Path, stat: os.stat_result | None = None) -> SourceCheck:
+    """Check whether a file is a marimo notebook and whether it compiles.
+
+    Args:
+        path: Path to the source file.
+        stat: The file's stat, if already known. Defaults to None (stat the file).
+
+    Returns:
+        The result of the check.
+
+    Raises:
+        OSError: If the file cannot be read.
+
+    """
+    stat = stat if stat is not None else path.stat()
+    with path.open("rb") as f:
+        source = f.read(HEADER_BYTES)
+        if b"marimo" not in source:
+            return SourceCheck(stat.st_mtime_ns, stat.st_size, notebook=False)
+        source += f.read()
+
+    if _APP_LINE.search(source) is None and not _calls_marimo_app(source):
+        return SourceCheck(stat.st_mtime_ns, stat.st_size, notebook=False)
+    try:
+        compile(source, str(path), "exec", flags=ast.PyCF_ONLY_AST, dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        message = getattr(e, "msg", None) or str(e)
+        error = f"syntax error in line {line}: {message}" if line else f"syntax error: {message}"
+        return SourceCheck(stat.st_mtime_ns, stat.st_size, notebook=True, error=error)
+    return SourceCheck(stat.st_mtime_ns, stat.st_size, notebook=True)
+
+
+class SourceCheckCache:
+    """Checks of source files, reused while the files are unchanged.
+
+    Discovery and the threads of a parallel export share one cache, so its
+    entries are only accessed under a lock.
+
+    Attributes:
+        entries: Checks keyed by source path.
+        checked: Number of files checked since the cache was created.
+
+    """
+
+    def __init__(self, entries: dict[str, SourceCheck] | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            entries: Checks keyed by source path. Defaults to None (empty).
+
+        """
+        self.entries = entries or {}
+        self.checked = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, stat: os.stat_result | None = None) -> SourceCheck:
+        """Return the check of a file, checking it again only if it changed.
+
+        Args:
+            path: Path to the source file.
+            stat: The file's stat, if already known. Defaults to None (stat the file).
+
+        Returns:
+            The result of the check.
+
+        Raises:
+            OSError: If the file cannot be read.
+
+        """
+        stat = stat if stat is not None else path.stat()
+        key = str(path)
+        with self._lock:
+            cached = self.entries.get(key)
+        if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+            return cached
+        check = check_source(path, stat)
+        with self._lock:
+            self.entries[key] = check
+            self.checked += 1
+        return check
+
+    def load(self, path: Path) -> None:
+        """Add the checks persisted in a file; missing or unreadable files add nothing.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/source-checks.json``.
+
+        """
+        try:
+            data = read_versioned_json(path, CHECK_VERSION)
+            if data is None:
+                return
+            entries = {source: SourceCheck(**entry) for source, entry in data["entries"].items()}
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable source checks {path}: {e}")
+            return
+        with self._lock:
+            for source, entry in entries.items():
+                self.entries.setdefault(source, entry)
+
+    def save(self, path: Path) -> None:
+        """Persist the checks of files that still exist; failures are logged.
+
+        Args:
+            path: The JSON file, e.g. ``<cache_dir>/source-checks.json``.
+
+        """
+        with self._lock:
+            entries = {source: asdict(entry) for source, entry in sorted(self.entries.items())}
+        entries = {source: entry for source, entry in entries.items() if os.path.exists(source)}
+        try:
+            write_json_atomic(path, {"version": CHECK_VERSION, "entries": entries})
+        except OSError as e:
+            logger.warning(f"Could not write {path}: {e}")
+
+
+_source_checks = SourceCheckCache()
+
+
+def source_checks() -> SourceCheckCache:
+    """Return the cache of source checks shared by discovery and exports of this process."""
+    return _source_checks
@@ -0,0 +1,386 @@
+"""Process-tree management for export subprocesses.
+
+``uvx marimo export`` spawns a tree of processes: uvx itself, the marimo
+interpreter it launches and, in sandbox mode, ``uv`` building the sandbox
+environment. Killing only the direct child on a timeout leaves the rest of the
+tree running. This module therefore starts every export in its own session
+(and process group) and, on timeout or cancellation, terminates the whole
+session: SIGTERM first, SIGKILL for anything still alive after a grace period.
+A run can also be cancelled from another thread through a ``threading.Event``,
+e.g. when watch mode finds that the notebook being exported changed again.
+
+Session members are discovered through ``/proc`` where available, which also
+catches descendants that moved to a process group of their own. Elsewhere the
+process group is signalled with ``os.killpg``. On platforms without process
+groups only the direct child is killed.
+
+Example::
+
+    from marimushka.process import run_process_tree
+
+    result = run_process_tree(["uvx", "marimo", "--version"], timeout=60)
+    print(result.stdout, result.reaped)
+"""
+
+import asyncio
+import contextlib
+import os
+import signal
+import subprocess  # nosec B404
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+# Seconds to wait after SIGTERM before escalating to SIGKILL
+DEFAULT_GRACE_PERIOD = 5.0
+
+# Interval in seconds between checks whether terminated processes have exited
+_POLL_INTERVAL = 0.05
+
+# Interval in seconds between checks whether a running process tree was cancelled
+CANCEL_POLL_INTERVAL = 0.1
+
+_PROC = Path("/proc")
+
+# Whether processes can be started in their own session and signalled as a group
+_HAS_SESSIONS = os.name == "posix" and hasattr(os, "killpg")
+
+
+@dataclass(frozen=True)
+class ProcessResult:
+    """Outcome of a process run with run_process_tree.
+
+    Attributes:
+        args: The executed command.
+        returncode: Exit code of the direct child.
+        stdout: Captured standard output.
+        stderr: Captured standard error.
+        reaped: Number of processes of the tree that had to be terminated.
+
+    """
+
+    args: list[str]
+    returncode: int
+    stdout: str
+    stderr: str
+    reaped: int = 0
+
+
+class ProcessTreeTimeoutExpired(subprocess.TimeoutExpired):
+    """Raised when a process tree exceeded its timeout and was terminated.
+
+    Attributes:
+        reaped: Number of processes of the tree that were terminated.
+
+    """
+
+    def __init__(self, cmd: list[str], timeout: float, reaped: int) -> None:
+        """Initialize the exception.
+
+        Args:
+            cmd: The executed command.
+            timeout: The timeout in seconds that expired.
+            reaped: Number of processes of the tree that were terminated.
+
+        """
+        super().__init__(cmd, timeout)
+        self.reaped = reaped
+
+
+class ProcessTreeCancelled(subprocess.SubprocessError):
+    """Raised when a process tree was terminated because its run was cancelled.
+
+    Attributes:
+        cmd: The executed command.
+        reaped: Number of processes of the tree that were terminated.
+
+    """
+
+    def __init__(self, cmd: list[str], reaped: int) -> None:
+        """Initialize the exception.
+
+        Args:
+            cmd: The executed command.
+            reaped: Number of processes of the tree that were terminated.
+
+        """
+        super().__init__(f"Command {cmd!r} was cancelled")
+        self.cmd = cmd
+        self.reaped = reaped
+
+
+def _session_members(session_id: int) -> list[int] | None:
+    """Return the live (non-zombie) processes of a session.
+
+    Args:
+        session_id: The session id, i.e. the pid of the session leader.
+
+    Returns:
+        The pids of the session's live processes, or None if the process table
+        cannot be inspected on this platform.
+
+    """
+    if not _PROC.is_dir():
+        return None
+
+    members = []
+    for entry in _PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The command name is parenthesised and may contain spaces; fields follow the last ')'
+        fields = stat[stat.rfind(")") + 2 :].split()
+        state, session = fields[0], int(fields[3])
+        if session == session_id and state not in ("Z", "X"):
+            members.append(int(entry.name))
+    return members
+
+
+def _signal_tree(session_id: int, members: list[int] | None, sig: signal.Signals) -> None:
+    """Send a signal to a session's process group and all known members."""
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(session_id, sig)
+    for pid in members or []:
+        with contextlib.suppress(ProcessLookupError, PermissionError):
+            os.kill(pid, sig)
+
+
+def _begin_termination(process: subprocess.Popen[str] | asyncio.subprocess.Process) -> tuple[list[int] | None, int]:
+    """Send SIGTERM to a process tree.
+
+    Returns:
+        The members signalled (None if unknown) and the number of processes to reap.
+
+    """
+    if not _HAS_SESSIONS:
+        if process.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                process.kill()
+            return None, 1
+        return None, 0
+
+    members = _session_members(process.pid)
+    # Without a process table, assume the direct child and its group are alive
+    members_count = len(members) if members is not None else int(process.returncode is None)
+    if members_count:
+        _signal_tree(process.pid, members, signal.SIGTERM)
+    return members, members_count
+
+
+def _tree_alive(process_id: int, members: list[int] | None) -> bool:
+    """Return True if any process of the terminated tree is still alive."""
+    if members is None:
+        try:
+            os.killpg(process_id, 0)
+        except (ProcessLookupError, PermissionError):
+            return False
+        return True
+    return bool(_session_members(process_id))
+
+
+def _finish_termination(process_id: int, members: list[int] | None) -> None:
+    """Send SIGKILL to whatever survived the grace period."""
+    survivors = _session_members(process_id) if members is not None else None
+    logger.warning(f"Process tree {process_id} survived SIGTERM, sending SIGKILL")
+    _signal_tree(process_id, survivors, signal.SIGKILL)
+
+
+def terminate_process_tree(process: subprocess.Popen[str], grace_period: float = DEFAULT_GRACE_PERIOD) -> int:
+    """Terminate a process started by run_process_tree and all its descendants.
+
+    Args:
+        process: The direct child, started in its own session.
+        grace_period: Seconds to wait after SIGTERM before sending SIGKILL.
+
+    Returns:
+        The number of processes that were still alive and had to be terminated.
+
+    """
+    members, count = _begin_termination(process)
+    if not count or not _HAS_SESSIONS:
+        return count
+
+    deadline = time.monotonic() + grace_period
+    # Reap the direct child so it does not linger as a zombie
+    while process.poll() is None or _tree_alive(process.pid, members):
+        if time.monotonic() >= deadline:
+            _finish_termination(process.pid, members)
+            break
+        time.sleep(_POLL_INTERVAL)
+    return count
+
+
+async def terminate_process_tree_async(
+    process: asyncio.subprocess.Process, grace_period: float = DEFAULT_GRACE_PERIOD
+) -> int:
+    """Terminate an asyncio process and all its descendants without blocking the event loop.
+
+    Args:
+        process: The direct child, started in its own session.
+        grace_period: Seconds to wait after SIGTERM before sending SIGKILL.
+
+    Returns:
+        The number of processes that were still alive and had to be terminated.
+
+    """
+    members, count = _begin_termination(process)
+    if count and _HAS_SESSIONS:
+        deadline = time.monotonic() + grace_period
+        while process.returncode is None or _tree_alive(process.pid, members):
+            if time.monotonic() >= deadline:
+                _finish_termination(process.pid, members)
+                break
+            await asyncio.sleep(_POLL_INTERVAL)
+    await process.wait()
+    return count
+
+
+def start_process_tree(cmd: list[str], stdin: int | None = None) -> subprocess.Popen[str]:
+    """Start a command in its own session with captured text output.
+
+    Args:
+        cmd: The command to run.
+        stdin: Optional stdin of the process, e.g. subprocess.PIPE. Defaults to None.
+
+    Returns:
+        The started process.
+
+    Raises:
+        FileNotFoundError: If the executable does not exist.
+
+    """
+    return subprocess.Popen(  # nosec B603  # noqa: S603
+        cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=_HAS_SESSIONS
+    )
+
+
+def _communicate(
+    process: subprocess.Popen[str], timeout: float, cancel: threading.Event | None
+) -> tuple[str, str] | None:
+    """Wait for a process like communicate(), checking a cancel event meanwhile.
+
+    Returns:
+        The captured output, or None if cancel was set first; the process is
+        then still running.
+
+    Raises:
+        subprocess.TimeoutExpired: If the process did not finish within the timeout.
+
+    """
+    if cancel is None:
+        return process.communicate(timeout=timeout)
+
+    deadline = time.monotonic() + timeout
+    while not cancel.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        # Retrying communicate() after a timeout does not lose any output
+        with contextlib.suppress(subprocess.TimeoutExpired):
+            return process.communicate(timeout=min(remaining, CANCEL_POLL_INTERVAL))
+    return None
+
+
+def run_process_tree(
+    cmd: list[str],
+    timeout: float,
+    grace_period: float = DEFAULT_GRACE_PERIOD,
+    cancel: threading.Event | None = None,
+) -> ProcessResult:
+    """Run a command in its own session and capture its output.
+
+    Processes the command leaves behind after it exits are terminated as well.
+
+    Args:
+        cmd: The command to run.
+        timeout: Maximum time in seconds to wait for the command.
+        grace_period: Seconds to wait after SIGTERM before sending SIGKILL.
+        cancel: Optional event; once it is set, the process tree is terminated.
+            Defaults to None.
+
+    Returns:
+        The exit code, output and number of reaped processes.
+
+    Raises:
+        ProcessTreeTimeoutExpired: If the command did not finish within the
+            timeout; the whole process tree has been terminated.
+        ProcessTreeCancelled: If cancel was set before the command finished;
+            the whole process tree has been terminated.
+        FileNotFoundError: If the executable does not exist.
+
+    """
+    if cancel is not None and cancel.is_set():
+        raise ProcessTreeCancelled(cmd, 0)
+    process = start_process_tree(cmd)
+    try:
+        output = _communicate(process, timeout, cancel)
+    except subprocess.TimeoutExpired:
+        reaped = terminate_process_tree(process, grace_period)
+        process.communicate()
+        raise ProcessTreeTimeoutExpired(cmd, timeout, reaped) from None
+    except BaseException:
+        # e.g. KeyboardInterrupt: never leave the tree running
+        terminate_process_tree(process, grace_period)
+        process.wait()
+        raise
+
+    if output is None:
+        reaped = terminate_process_tree(process, grace_period)
+        process.communicate()
+        raise ProcessTreeCancelled(cmd, reaped)
+
+    reaped = terminate_process_tree(process, grace_period)
+    return ProcessResult(cmd, process.returncode, *output, reaped)
+
+
+async def start_process_tree_async(cmd: list[str]) -> asyncio.subprocess.Process:
+    """Start a command in its own session with captured output on the running event loop.
+
+    Args:
+        cmd: The command to run.
+
+    Returns:
+        The started process.
+
+    """
+    return await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=_HAS_SESSIONS,
+    )  # nosec B603
+
+
+async def communicate_async(
+    process: asyncio.subprocess.Process, cancel: threading.Event | None = None
+) -> tuple[bytes, bytes] | None:
+    """Wait for an asyncio process like communicate(), checking a cancel event meanwhile.
+
+    Args:
+        process: The process to wait for.
+        cancel: Optional event that stops the wait once it is set. Defaults to None.
+
+    Returns:
+        The captured output, or None if cancel was set first; the process is
+        then still running.
+
+    """
+    if cancel is None:
+        return await process.communicate()
+
+    task = asyncio.ensure_future(process.communicate())
+    try:
+        while not cancel.is_set():
+            done, _ = await asyncio.wait({task}, timeout=CANCEL_POLL_INTERVAL)
+            if done:
+                return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+    return None
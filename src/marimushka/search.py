@@ -0,0 +1,275 @@
+"""Prebuilt client-side search index of the generated site.
+
+With ``search=True`` every build writes ``search-index.json`` next to
+``index.html``: an inverted index over the display names, module docstrings
+and markdown headings of all notebooks. Terms are sorted, so the browser finds
+all terms starting with a query word by binary search, without building
+anything itself.
+
+Example index::
+
+    {
+      "version": 1,
+      "documents": [["fibonacci", "notebooks/fibonacci.html", "notebook", "Compute Fibonacci numbers"]],
+      "terms": ["compute", "fibonacci", "numbers"],
+      "postings": [[0, 1], [0, 4], [0, 1]]
+    }
+
+``postings[i]`` lists pairs of document number and score for ``terms[i]``.
+A term scores 3 in a display name, 2 in a heading and 1 in a docstring.
+
+Metadata extracted from each notebook source is kept in
+``.marimushka-search.json`` in the output directory, keyed by source path
+and validated by modification time and size, so unchanged notebooks are not
+parsed again.
+"""
+
+import ast
+import re
+import textwrap
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from .notebook import Notebook
+from .storage import read_versioned_json, write_json_atomic
+
+# Name of the search index inside the output directory
+SEARCH_INDEX_FILENAME = "search-index.json"
+
+# Name of the per-notebook metadata cache inside the output directory
+SEARCH_METADATA_FILENAME = ".marimushka-search.json"
+
+# Format of both the index and the metadata cache, which are written together
+SEARCH_VERSION = 1
+
+# Score of a term per field it occurs in
+TITLE_WEIGHT = 3
+HEADING_WEIGHT = 2
+DOCSTRING_WEIGHT = 1
+
+_HEADING = re.compile(r"^ {0,3}#{1,6}\s+(.+?)\s*#*\s*$", re.MULTILINE)
+_TERM = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase search terms.
+
+    Args:
+        text: Any text, e.g. a display name or a heading.
+
+    Returns:
+        The words and numbers of the text, lowercased. Single characters are dropped.
+
+    """
+    return [term for term in _TERM.findall(text.casefold()) if len(term) > 1]
+
+
+@dataclass(frozen=True)
+class NotebookMetadata:
+    """Searchable text of one notebook source.
+
+    Attributes:
+        mtime_ns: Modification time of the source when it was parsed.
+        size: Size in bytes of the source when it was parsed.
+        docstring: The module docstring, empty if there is none.
+        headings: Markdown headings of the notebook's ``mo.md`` cells.
+
+    """
+
+    mtime_ns: int
+    size: int
+    docstring: str = ""
+    headings: tuple[str, ...] = ()
+
+
+def _markdown_strings(tree: ast.AST) -> list[str]:
+    """Return the dedented string literals passed to ``*.md(...)`` calls, in source order."""
+    strings: list[tuple[int, str]] = []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and node.args and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr != "md":
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            strings.append((node.lineno, arg.value))
+        elif isinstance(arg, ast.JoinedStr):
+            text = "".join(v.value for v in arg.values if isinstance(v, ast.Constant) and isinstance(v.value, str))
+            strings.append((node.lineno, text))
+    return [textwrap.dedent(text) for _, text in sorted(strings)]
+
+
+def extract_metadata(path: Path) -> NotebookMetadata:
+    """Parse the searchable text of a notebook source.
+
+    Sources that do not parse yield their stat only, so they are still found
+    by display name and not parsed again until they change.
+
+    Args:
+        path: Path to the notebook source.
+
+    Returns:
+        The module docstring and markdown headings of the notebook.
+
+    Raises:
+        OSError: If the source cannot be read.
+
+    """
+    stat = path.stat()
+    source = path.read_bytes()
+    try:
+        tree = ast.parse(source, filename=str(path))
+    except (SyntaxError, ValueError) as e:
+        logger.debug(f"Not indexing the content of {path.name}: {e}")
+        return NotebookMetadata(stat.st_mtime_ns, stat.st_size)
+
+    headings = tuple(
+        heading for text in _markdown_strings(tree) for heading in _HEADING.findall(text) if heading.strip()
+    )
+    return NotebookMetadata(stat.st_mtime_ns, stat.st_size, (ast.get_docstring(tree) or "").strip(), headings)
+
+
+class SearchMetadataCache:
+    """Metadata of the notebooks of the previous build, reused while their sources are unchanged.
+
+    Attributes:
+        entries: Metadata keyed by notebook source path.
+        parsed: Number of sources parsed since the cache was loaded.
+
+    """
+
+    def __init__(self, entries: dict[str, NotebookMetadata] | None = None) -> None:
+        """Initialize the cache.
+
+        Args:
+            entries: Metadata keyed by notebook source path. Defaults to None (empty).
+
+        """
+        self.entries = entries or {}
+        self.parsed = 0
+
+    @classmethod
+    def load(cls, output_dir: Path) -> "SearchMetadataCache":
+        """Load the metadata of the previous build; missing or unreadable metadata yields an empty cache.
+
+        Args:
+            output_dir: The output directory of the build.
+
+        Returns:
+            The cached metadata.
+
+        """
+        path = output_dir / SEARCH_METADATA_FILENAME
+        try:
+            data = read_versioned_json(path, SEARCH_VERSION)
+            if data is None:
+                return cls()
+            entries = {
+                source: NotebookMetadata(entry["mtime_ns"], entry["size"], entry["docstring"], tuple(entry["headings"]))
+                for source, entry in data["entries"].items()
+            }
+        except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+            logger.warning(f"Ignoring unreadable search metadata {path}: {e}")
+            return cls()
+        return cls(entries)
+
+    def get(self, notebook: Notebook) -> NotebookMetadata | None:
+        """Return the metadata of a notebook, parsing its source only if it changed.
+
+        Args:
+            notebook: The notebook.
+
+        Returns:
+            The notebook's metadata, or None if its source cannot be read.
+
+        """
+        key = str(notebook.path)
+        cached = self.entries.get(key)
+        try:
+            stat = notebook.path.stat()
+            if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+                return cached
+            metadata = extract_metadata(notebook.path)
+        except OSError as e:
+            logger.warning(f"Could not index {notebook.path.name} for search: {e}")
+            return None
+        self.entries[key] = metadata
+        self.parsed += 1
+        return metadata
+
+    def save(self, output_dir: Path, notebooks: list[Notebook]) -> None:
+        """Write the metadata of the site's notebooks into the output directory.
+
+        Args:
+            output_dir: The output directory of the build.
+            notebooks: Notebooks of the site; metadata of other sources is dropped.
+
+        """
+        keep = {str(nb.path) for nb in notebooks}
+        data = {
+            "version": SEARCH_VERSION,
+            "entries": {source: asdict(entry) for source, entry in sorted(self.entries.items()) if source in keep},
+        }
+        path = output_dir / SEARCH_METADATA_FILENAME
+        try:
+            write_json_atomic(path, data)
+        except OSError as e:
+            logger.warning(f"Could not write {path}: {e}")
+
+
+def build_search_index(notebooks: list[Notebook], metadata: SearchMetadataCache) -> dict[str, Any]:
+    """Build the inverted search index of the site.
+
+    Args:
+        notebooks: Notebooks of the site, in the order of the index page.
+        metadata: Metadata of the notebooks; sources that changed are parsed.
+
+    Returns:
+        The search index, see the module docstring for its layout.
+
+    """
+    documents = []
+    scores: defaultdict[str, defaultdict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for number, nb in enumerate(notebooks):
+        meta = metadata.get(nb) or NotebookMetadata(0, 0)
+        summary = meta.docstring.splitlines()[0] if meta.docstring else (meta.headings[0] if meta.headings else "")
+        documents.append([nb.display_name, nb.html_path.as_posix(), nb.kind.value, summary])
+        fields = [
+            (nb.display_name, TITLE_WEIGHT),
+            *((heading, HEADING_WEIGHT) for heading in meta.headings),
+            (meta.docstring, DOCSTRING_WEIGHT),
+        ]
+        for text, weight in fields:
+            for term in set(tokenize(text)):
+                scores[term][number] += weight
+
+    terms = sorted(scores)
+    postings = [[value for pair in sorted(scores[term].items()) for value in pair] for term in terms]
+    return {"version": SEARCH_VERSION, "documents": documents, "terms": terms, "postings": postings}
+
+
+def write_search_index(output_dir: Path, notebooks: list[Notebook]) -> Path:
+    """Write the search index of the site into the output directory.
+
+    Args:
+        output_dir: The output directory of the build.
+        notebooks: Notebooks of the site, in the order of the index page.
+
+    Returns:
+        Path of the search index.
+
+    Raises:
+        OSError: If the search index cannot be written.
+
+    """
+    metadata = SearchMetadataCache.load(output_dir)
+    index = build_search_index(notebooks, metadata)
+    index_path = output_dir / SEARCH_INDEX_FILENAME
+    write_json_atomic(index_path, index, compact=True)
+    metadata.save(output_dir, notebooks)
+    logger.info(f"Search index: {len(index['terms'])} terms for {len(notebooks)} notebooks ({metadata.parsed} parsed)")
+    return index_path
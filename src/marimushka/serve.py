@@ -0,0 +1,256 @@
+"""Development server with live reload.
+
+``marimushka serve`` runs watch mode and serves the output directory with the
+standard library's HTTP server. Every HTML page it serves gets a small script
+that subscribes to a server-sent events stream. A second watcher follows the
+output directory; as soon as an exported page is rewritten, its URL path is
+pushed to every open page, and only the page showing that URL reloads.
+
+Example::
+
+    import threading
+    from pathlib import Path
+    from marimushka.serve import ReloadBroker, create_server, watch_pages
+
+    broker = ReloadBroker()
+    server = create_server(Path("_site"), broker, port=8000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    watch_pages(Path("_site"), broker, stop_event=threading.Event())
+"""
+
+import queue
+import re
+import threading
+from collections.abc import Iterable
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+# URL path of the server-sent events stream announcing rewritten pages
+EVENTS_PATH = "/__marimushka__/events"
+
+# Seconds between keep-alive comments on an idle events stream
+KEEPALIVE_INTERVAL = 15.0
+
+# Script added to every served HTML page; reloads the page when its own URL is announced
+RELOAD_SCRIPT = f"""<script>
+(() => {{
+  const path = location.pathname.endsWith("/") ? location.pathname + "index.html" : location.pathname;
+  const page = decodeURIComponent(path);
+  const events = new EventSource("{EVENTS_PATH}");
+  events.onmessage = (event) => {{ if (event.data === page) location.reload(); }};
+}})();
+</script>
+"""
+
+_BODY_END = re.compile(rb"</body\s*>", re.IGNORECASE)
+
+
+def inject_reload_script(html: bytes) -> bytes:
+    """Add the live reload script to an HTML page.
+
+    Args:
+        html: The page as served from disk.
+
+    Returns:
+        The page with the script before its last ``</body>`` tag, or appended
+        if it has none.
+
+    """
+    script = RELOAD_SCRIPT.encode()
+    matches = list(_BODY_END.finditer(html))
+    if not matches:
+        return html + script
+    position = matches[-1].start()
+    return html[:position] + script + html[position:]
+
+
+def page_urls(changes: Iterable[tuple[Any, str]], root: Path) -> set[str]:
+    """Map watchfiles changes in the output directory to the URL paths of rewritten pages.
+
+    Args:
+        changes: Pairs of change type and path, as yielded by ``watchfiles.watch``.
+        root: The served output directory.
+
+    Returns:
+        URL paths such as ``/notebooks/demo.html`` of HTML files that still exist.
+
+    """
+    root = root.resolve()
+    urls = set()
+    for _, changed in changes:
+        path = Path(changed).resolve()
+        if path.suffix == ".html" and path.is_relative_to(root) and path.is_file():
+            urls.add("/" + path.relative_to(root).as_posix())
+    return urls
+
+
+class ReloadBroker:
+    """Fans out rewritten page URLs to the connected event streams."""
+
+    def __init__(self) -> None:
+        """Initialize a broker without clients."""
+        self._lock = threading.Lock()
+        self._clients: set[queue.Queue[str | None]] = set()
+
+    def subscribe(self) -> "queue.Queue[str | None]":
+        """Register an event stream.
+
+        Returns:
+            The queue receiving URL paths, and None once the broker is closed.
+
+        """
+        client: queue.Queue[str | None] = queue.Queue()
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client: "queue.Queue[str | None]") -> None:
+        """Remove an event stream.
+
+        Args:
+            client: A queue returned by ``subscribe()``.
+
+        """
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, urls: Iterable[str]) -> int:
+        """Announce rewritten pages to every event stream.
+
+        Args:
+            urls: URL paths of the rewritten pages.
+
+        Returns:
+            The number of connected event streams.
+
+        """
+        urls = sorted(urls)
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            for url in urls:
+                client.put(url)
+        return len(clients)
+
+    def close(self) -> None:
+        """End every event stream."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.put(None)
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    """Serves the output directory, adding the reload script to HTML pages."""
+
+    def __init__(self, *args: Any, broker: ReloadBroker, **kwargs: Any) -> None:
+        """Initialize the handler.
+
+        Args:
+            *args: Positional arguments of SimpleHTTPRequestHandler.
+            broker: The broker announcing rewritten pages.
+            **kwargs: Keyword arguments of SimpleHTTPRequestHandler, e.g. directory.
+
+        """
+        self.broker = broker
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:
+        """Serve the event stream, an HTML page with the reload script, or a plain file."""
+        url_path = urlsplit(self.path).path
+        if url_path == EVENTS_PATH:
+            self._stream_events()
+            return
+
+        path = Path(self.translate_path(self.path))
+        if path.is_dir() and url_path.endswith("/"):
+            path = path / "index.html"
+        if path.suffix == ".html" and path.is_file():
+            self._send_page(path)
+            return
+        super().do_GET()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Log requests at debug level instead of writing them to stderr."""
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_page(self, path: Path) -> None:
+        """Send an HTML page with the reload script."""
+        body = inject_reload_script(path.read_bytes())
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self) -> None:
+        """Send rewritten page URLs as server-sent events until the broker closes."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        client = self.broker.subscribe()
+        try:
+            while True:
+                try:
+                    url = client.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                else:
+                    if url is None:
+                        break
+                    self.wfile.write(f"data: {url}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Live reload client disconnected")
+        finally:
+            self.broker.unsubscribe(client)
+
+
+def create_server(
+    directory: Path, broker: ReloadBroker, host: str = "127.0.0.1", port: int = 8000
+) -> ThreadingHTTPServer:
+    """Create the live reload server for an output directory.
+
+    Args:
+        directory: The output directory to serve.
+        broker: The broker announcing rewritten pages.
+        host: Interface to listen on. Defaults to "127.0.0.1".
+        port: Port to listen on; 0 picks a free port. Defaults to 8000.
+
+    Returns:
+        The server, not yet serving; run ``serve_forever()`` on a thread.
+
+    """
+    handler = partial(LiveReloadHandler, broker=broker, directory=str(directory))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def watch_pages(output: Path, broker: ReloadBroker, stop_event: threading.Event, debounce: int = 100) -> None:
+    """Announce rewritten pages of the output directory until stopped.
+
+    Args:
+        output: The served output directory.
+        broker: The broker announcing rewritten pages.
+        stop_event: Event that ends the watch.
+        debounce: Milliseconds to let a page's writes settle before announcing it.
+            Defaults to 100.
+
+    """
+    from watchfiles import watch as watchfiles_watch
+
+    for changes in watchfiles_watch(output, debounce=debounce, stop_event=stop_event):
+        urls = page_urls(changes, output)
+        if urls:
+            clients = broker.publish(urls)
+            logger.info(f"Reloading {', '.join(sorted(urls))} in {clients} open page(s)")
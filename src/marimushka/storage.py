@@ -0,0 +1,108 @@
+"""Atomic writes and versioned JSON files.
+
+Builds persist their state between runs: the export cache and the export
+history in the cache directory, the build manifest and the search files in
+the output directory. Concurrent builds and readers such as a running web
+server must never see a partially written file, so every file is written to a
+temporary file next to it and renamed into place.
+
+The JSON files carry a format version. A file written by another version is
+ignored, so bumping the version of a file whenever its layout, or the logic
+that produced its contents, changes makes the next build recompute it.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.storage import read_versioned_json, write_json_atomic
+
+    path = Path(".marimushka-cache/history.json")
+    write_json_atomic(path, {"version": 1, "durations": {}})
+    data = read_versioned_json(path, 1)
+"""
+
+import json
+import os
+import tempfile
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+
+@contextmanager
+def atomic_path(path: Path, mode: int = 0o644) -> Generator[Path]:
+    """Provide a temporary file that replaces a file once it is written.
+
+    The parent directory is created if needed. If the block raises, the
+    temporary file is removed and the target is left untouched.
+
+    Args:
+        path: The file to replace.
+        mode: Permission mode of the written file. Defaults to 0o644.
+
+    Yields:
+        Path of the temporary file to write.
+
+    Raises:
+        OSError: If the file cannot be created or replaced.
+
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def write_json_atomic(path: Path, data: object, compact: bool = False) -> None:
+    """Atomically write JSON to a file.
+
+    Args:
+        path: The JSON file.
+        data: The data to write.
+        compact: Write without whitespace and with non-ASCII characters as is,
+            for large or served files. Defaults to False (indented).
+
+    Raises:
+        OSError: If the file cannot be written.
+
+    """
+    with atomic_path(path) as tmp_path, tmp_path.open("w", encoding="utf-8") as f:
+        if compact:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        else:
+            json.dump(data, f, indent=2)
+
+
+def read_versioned_json(path: Path, version: int) -> dict[str, Any] | None:
+    """Read a JSON object written with a format version.
+
+    Args:
+        path: The JSON file.
+        version: The format version the caller understands.
+
+    Returns:
+        The object, or None if the file is missing or has another version.
+
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If the file is not a JSON object.
+
+    """
+    if not path.is_file():
+        return None
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")  # noqa: TRY003, TRY004
+    if data.get("version") != version:
+        logger.info(f"Ignoring {path} with unsupported version {data.get('version')!r}")
+        return None
+    return data
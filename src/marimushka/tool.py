@@ -0,0 +1,105 @@
+"""Pinned marimo tool environment.
+
+By default every export runs ``uvx marimo export``, so each of hundreds of
+subprocesses asks uv to resolve the latest marimo again, and a marimo release
+published during a build changes the output of the remaining notebooks. With a
+pinned version, marimushka installs exactly that marimo once per build into a
+dedicated tool environment and runs the environment's interpreter directly for
+every export.
+
+Tool environments are EnvironmentPool environments holding nothing but
+``marimo==<version>``. With a cache directory they live in
+``<cache-dir>/tools`` and are reused across builds.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.tool import install_marimo
+
+    tool = install_marimo("0.18.4", Path(".marimushka-cache/tools"))
+    # Exports now run ``<tool.python> -m marimo export ...``
+"""
+
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from .environments import DependencySet, EnvironmentPool
+
+# Name of the tool environment directory inside the cache directory
+TOOLS_DIRNAME = "tools"
+
+# A release version such as 0.18.4 or 0.19.0rc1
+_VERSION = re.compile(r"^\d+(\.\d+)*([a-z]+\d*)?(\.post\d+)?(\.dev\d+)?$")
+
+
+@dataclass(frozen=True)
+class MarimoTool:
+    """A marimo installation pinned to one version.
+
+    Attributes:
+        version: The installed marimo version.
+        python: Interpreter of the tool environment.
+
+    """
+
+    version: str
+    python: Path
+
+
+def validate_marimo_version(version: str) -> str:
+    """Validate a pinned marimo version.
+
+    Args:
+        version: The version, e.g. "0.18.4".
+
+    Returns:
+        The version without surrounding whitespace.
+
+    Raises:
+        ValueError: If the version is not an exact release version.
+
+    Examples:
+        >>> validate_marimo_version(" 0.18.4 ")
+        '0.18.4'
+
+    """
+    version = version.strip()
+    if not _VERSION.match(version):
+        raise ValueError(f"Invalid marimo version {version!r}, expected an exact version such as 0.18.4")  # noqa: TRY003
+    return version
+
+
+def install_marimo(
+    version: str,
+    root: Path,
+    uv: str = "uv",
+    index_url: str | None = None,
+    find_links: str | None = None,
+    offline: bool = False,
+) -> MarimoTool:
+    """Install a marimo version into a tool environment, reusing an existing one.
+
+    Args:
+        version: The exact marimo version.
+        root: Directory holding the tool environments.
+        uv: The uv executable. Defaults to "uv" (looked up in PATH).
+        index_url: Package index used instead of PyPI. Defaults to None.
+        find_links: Wheelhouse directory or URL searched for packages. Defaults to None.
+        offline: Whether to install from uv's cache and find_links only. Defaults to False.
+
+    Returns:
+        The installed tool.
+
+    Raises:
+        ValueError: If the version is not an exact release version.
+        ExportEnvironmentError: If the environment cannot be created.
+
+    """
+    version = validate_marimo_version(version)
+    pool = EnvironmentPool(root, uv=uv, index_url=index_url, find_links=find_links, offline=offline)
+    python = pool.ensure(DependencySet((f"marimo=={version}",)))
+    logger.info(f"Using marimo {version} from {python.parent.parent}")
+    return MarimoTool(version, python)
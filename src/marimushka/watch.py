@@ -0,0 +1,336 @@
+"""Incremental rebuilds for watch mode.
+
+Every filesystem event used to rebuild the whole site, so a one-character edit
+re-exported every notebook in all three folders. A ChangeSet records what a
+batch of watchfiles changes actually affects: the notebooks to export again and
+whether the index template changed. generate_index then exports only those
+notebooks, and re-renders ``index.html`` only if the template changed or the
+site gained or lost notebooks.
+
+Changes are mapped as follows:
+
+- ``<folder>/<name>.py``, or ``<folder>/<subdir>/<name>.py``: that notebook
+  (added, modified or deleted), and every notebook importing it as a local
+  module, directly or through other modules (see the imports module)
+- ``<folder>/<subdir>/public/...``: the notebooks of the directory owning
+  ``public`` that reference the file (see the assets module); for apps and
+  WebAssembly notebooks every notebook of the directory, as their exports
+  copy the whole ``public`` directory
+- ``<folder>/<subdir>/.marimushkaignore``: every notebook below its directory,
+  as some may now be included or ignored
+- anything else in the template's directory: the template
+- anything else, including files in the output directory: nothing
+
+Rebuilds run one at a time from a RebuildQueue. Every batch of changes starts a
+new generation; batches that arrive during a rebuild are coalesced into the
+next one, and exports of the running rebuild that the new changes affect are
+cancelled, so feedback follows the newest edit rather than a backlog.
+
+Example::
+
+    from marimushka.export import main
+    from marimushka.notebook import Kind
+    from marimushka.watch import classify_changes
+
+    changes = classify_changes(batch, {Kind.NB: "notebooks"}, template="templates/index.html.j2")
+    if not changes.empty:
+        main(notebooks="notebooks", template="templates/index.html.j2", changes=changes)
+"""
+
+import threading
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from .assets import asset_references, covers
+from .discovery import IGNORE_FILENAME, PUBLIC_DIRNAME
+from .imports import import_graph
+from .notebook import Kind, Notebook
+
+
+@dataclass(frozen=True)
+class ChangeSet:
+    """What a batch of filesystem changes affects.
+
+    Attributes:
+        notebooks: Resolved paths of the Python sources that were added,
+            modified or deleted: notebooks and the local modules they import.
+        template: Whether the index template (or a file next to it) changed.
+
+    """
+
+    notebooks: frozenset[Path] = frozenset()
+    template: bool = False
+
+    @property
+    def empty(self) -> bool:
+        """Return True if the changes affect neither notebooks nor the template."""
+        return not self.notebooks and not self.template
+
+    def merge(self, other: "ChangeSet") -> "ChangeSet":
+        """Return the changes of both change sets.
+
+        Args:
+            other: Changes that happened after this change set.
+
+        Returns:
+            A change set affecting everything either one affects.
+
+        """
+        return ChangeSet(self.notebooks | other.notebooks, self.template or other.template)
+
+    def affects(self, notebook: Notebook | Path) -> bool:
+        """Check whether a notebook has to be exported again.
+
+        Args:
+            notebook: A notebook of the site, or the path to its source.
+
+        Returns:
+            True if the notebook's source or one of its local modules changed.
+
+        """
+        path = notebook.path if isinstance(notebook, Notebook) else Path(notebook)
+        return path.resolve() in self.notebooks or import_graph().depends_on(path, self.notebooks)
+
+
+def classify_changes(
+    changes: Iterable[tuple[Any, str]],
+    folders: Mapping[Kind, Path | str | None],
+    template: Path | str,
+    output: Path | str | None = None,
+) -> ChangeSet:
+    """Map a batch of watchfiles changes to the notebooks and template they affect.
+
+    Args:
+        changes: Pairs of change type and path, as yielded by ``watchfiles.watch``.
+            The change type is ignored; deletions are found by the next discovery.
+        folders: The notebook folder of each Kind. Empty folders are ignored.
+        template: Path to the index template.
+        output: Optional output directory whose own files are never a change.
+
+    Returns:
+        The affected notebooks and whether the template changed.
+
+    """
+    notebook_folders = {Path(folder).resolve(): kind for kind, folder in folders.items() if folder}
+    template_dir = Path(template).resolve().parent
+    output_dir = Path(output).resolve() if output else None
+
+    notebooks: set[Path] = set()
+    template_changed = False
+    for _, changed in changes:
+        path = Path(changed).resolve()
+        if output_dir is not None and path.is_relative_to(output_dir):
+            continue
+
+        folder = next((f for f in notebook_folders if path.is_relative_to(f)), None)
+        if folder is None:
+            template_changed = template_changed or path.is_relative_to(template_dir)
+            continue
+
+        parts = path.relative_to(folder).parts
+        if PUBLIC_DIRNAME in parts[:-1]:
+            index = parts.index(PUBLIC_DIRNAME)
+            owner = folder.joinpath(*parts[:index])
+            relative = "/".join(parts[index + 1 :])
+            notebooks.update(
+                nb.resolve() for nb in owner.glob("*.py") if _uses_asset(nb, relative, notebook_folders[folder])
+            )
+        elif path.name == IGNORE_FILENAME:
+            notebooks.update(nb.resolve() for nb in path.parent.rglob("*.py"))
+        elif path.suffix == ".py":
+            notebooks.add(path)
+
+    return ChangeSet(frozenset(notebooks), template_changed)
+
+
+def _uses_asset(notebook: Path, relative: str, kind: Kind) -> bool:
+    """Return True if a notebook's export depends on a file of its ``public`` directory."""
+    if kind != Kind.NB:
+        return True
+    try:
+        return covers(asset_references().references(notebook), relative)
+    except OSError:
+        return True
+
+
+class Cancellation:
+    """Cancel flags of the notebook exports of one build.
+
+    Each notebook export polls the threading.Event returned by ``event()``;
+    once it is set, the export's process tree is terminated.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the flags; no export is cancelled."""
+        self._lock = threading.Lock()
+        self._events: dict[Path, threading.Event] = {}
+        self._all = False
+
+    def event(self, notebook_path: Path) -> threading.Event:
+        """Return the cancel event of a notebook's export.
+
+        Args:
+            notebook_path: Path to the notebook source.
+
+        Returns:
+            The event, already set if the export was cancelled before it started.
+
+        """
+        key = notebook_path.resolve()
+        with self._lock:
+            event = self._events.get(key)
+            if event is None:
+                event = self._events[key] = threading.Event()
+                if self._all:
+                    event.set()
+            return event
+
+    @property
+    def started(self) -> frozenset[Path]:
+        """Return the resolved paths of the notebooks whose exports have started."""
+        with self._lock:
+            return frozenset(self._events)
+
+    def cancel(self, notebook_paths: Iterable[Path]) -> None:
+        """Cancel the exports of some notebooks.
+
+        Args:
+            notebook_paths: Paths to the notebook sources.
+
+        """
+        for path in notebook_paths:
+            self.event(path).set()
+
+    def cancel_all(self) -> None:
+        """Cancel every export of the build, including those not started yet."""
+        with self._lock:
+            self._all = True
+            events = list(self._events.values())
+        for event in events:
+            event.set()
+
+
+@dataclass(frozen=True)
+class Rebuild:
+    """A rebuild taken from a RebuildQueue.
+
+    Attributes:
+        generation: The newest generation of changes the rebuild covers.
+        first_generation: The oldest generation of changes the rebuild covers.
+        changes: The coalesced changes of these generations.
+        cancellation: Cancel flags of the rebuild's exports.
+
+    """
+
+    generation: int
+    first_generation: int
+    changes: ChangeSet
+    cancellation: Cancellation = field(default_factory=Cancellation, compare=False)
+
+
+class RebuildQueue:
+    """Coalesces watch mode changes into one rebuild at a time.
+
+    The watcher thread submits each batch of changes as a new generation, and
+    the building thread takes rebuilds with ``get()``. Submitting changes that
+    affect notebooks the running rebuild has started exporting, through their
+    sources, local modules or ``public`` files, cancels those exports; the
+    notebooks are exported again by the next rebuild.
+
+    Attributes:
+        generation: Number of change batches submitted so far.
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty queue."""
+        self.generation = 0
+        self._changed = threading.Condition()
+        self._pending: ChangeSet | None = None
+        self._first_pending = 0
+        self._running: Rebuild | None = None
+        self._stopped = False
+        self._error: BaseException | None = None
+
+    def submit(self, changes: ChangeSet) -> int:
+        """Add a batch of changes as a new generation.
+
+        Args:
+            changes: The changes of the batch.
+
+        Returns:
+            The generation of the batch.
+
+        """
+        with self._changed:
+            self.generation += 1
+            if self._pending is None:
+                self._pending, self._first_pending = changes, self.generation
+            else:
+                self._pending = self._pending.merge(changes)
+            if self._running is not None:
+                stale = {path for path in self._running.cancellation.started if changes.affects(path)}
+                if stale:
+                    logger.info(f"Cancelling {len(stale)} outdated export(s) of rebuild #{self._running.generation}")
+                    self._running.cancellation.cancel(stale)
+            self._changed.notify_all()
+            return self.generation
+
+    def stop(self, error: BaseException | None = None) -> None:
+        """Stop handing out rebuilds once the pending changes are built.
+
+        Args:
+            error: Optional exception of the watcher, raised by ``get()`` after
+                the pending rebuild. Defaults to None.
+
+        """
+        with self._changed:
+            self._stopped = True
+            self._error = error
+            self._changed.notify_all()
+
+    def get(self, timeout: float | None = None) -> Rebuild | None:
+        """Wait for changes and take them as the running rebuild.
+
+        Args:
+            timeout: Maximum time in seconds to wait. Defaults to None (no limit).
+
+        Returns:
+            The rebuild, or None if the queue was stopped or the timeout passed.
+
+        Raises:
+            BaseException: The error the queue was stopped with, once no
+                changes are pending.
+
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._pending is not None or self._stopped, timeout)
+            if self._pending is None:
+                if self._error is not None:
+                    raise self._error
+                return None
+            self._running = Rebuild(self.generation, self._first_pending, self._pending)
+            self._pending = None
+            return self._running
+
+    def done(self, rebuild: Rebuild) -> None:
+        """Mark a rebuild taken with ``get()`` as finished.
+
+        Args:
+            rebuild: The finished rebuild.
+
+        """
+        with self._changed:
+            if self._running is rebuild:
+                self._running = None
+
+    def cancel(self) -> None:
+        """Cancel the exports of the running rebuild and drop pending changes."""
+        with self._changed:
+            self._pending = None
+            if self._running is not None:
+                self._running.cancellation.cancel_all()
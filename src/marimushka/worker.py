@@ -0,0 +1,386 @@
+"""Pool of persistent marimo export workers.
+
+Every ``uvx marimo export`` subprocess pays for uvx resolving marimo's
+environment, interpreter startup and ``import marimo`` before it exports a
+single cell. For sites with many small notebooks that start-up cost dominates
+the build. A WorkerPool instead keeps long-lived worker processes that import
+marimo once and run each export through marimo's command-line entry point in
+process (see ``_worker_main.py`` for the worker side of the protocol). If a
+marimo installation cannot run its command line in process, the pool exports
+with its commands as plain subprocesses instead.
+
+Workers are recycled after a configurable number of jobs or once their
+resident memory exceeds a limit, so state leaking between exports cannot
+accumulate. A worker that exceeds the export timeout is terminated with its
+whole process tree, like an export subprocess.
+
+Example::
+
+    from pathlib import Path
+    from marimushka.notebook import Notebook
+    from marimushka.worker import WorkerPool
+
+    with WorkerPool(size=4) as pool:
+        result = Notebook(Path("notebooks/demo.py")).export_in_worker(pool, Path("_site/notebooks"))
+"""
+
+import collections
+import contextlib
+import json
+import queue
+import subprocess  # nosec B404
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any
+
+from loguru import logger
+
+from .process import (
+    CANCEL_POLL_INTERVAL,
+    DEFAULT_GRACE_PERIOD,
+    ProcessResult,
+    ProcessTreeCancelled,
+    ProcessTreeTimeoutExpired,
+    run_process_tree,
+    start_process_tree,
+    terminate_process_tree,
+)
+
+# Number of exports after which a worker is replaced
+DEFAULT_MAX_JOBS = 50
+
+# Resident memory in megabytes above which a worker is replaced after its export
+DEFAULT_MAX_MEMORY_MB = 1024
+
+# Script run by each worker with the interpreter of marimo's uvx environment
+WORKER_SCRIPT = Path(__file__).with_name("_worker_main.py")
+
+# Number of trailing stderr lines of a worker kept to explain a crash
+_STDERR_TAIL = 20
+
+
+def worker_command(executable: str, interpreter: bool = False) -> list[str]:
+    """Return the command that starts a worker.
+
+    Args:
+        executable: The uvx executable, or the Python interpreter of an
+            environment with marimo installed.
+        interpreter: Whether executable is such an interpreter. Defaults to False.
+
+    Returns:
+        The command list.
+
+    """
+    if interpreter:
+        return [executable, "-u", str(WORKER_SCRIPT)]
+    return [executable, "--from", "marimo", "python", "-u", str(WORKER_SCRIPT)]
+
+
+class WorkerUnavailableError(ChildProcessError):
+    """Raised when a worker cannot run marimo's command line in process."""
+
+
+class ExportWorker:
+    """A single persistent worker process.
+
+    Attributes:
+        executable: The uvx executable or interpreter the worker was started with.
+        jobs: Number of exports the worker has run.
+        rss: Resident memory in bytes reported after the last export.
+
+    """
+
+    def __init__(self, executable: str, interpreter: bool = False) -> None:
+        """Start the worker process.
+
+        The worker imports marimo in the background; the first job waits for it.
+
+        Args:
+            executable: The uvx executable, or the interpreter of a pinned
+                marimo tool environment.
+            interpreter: Whether executable is an interpreter. Defaults to False.
+
+        Raises:
+            FileNotFoundError: If the executable does not exist.
+
+        """
+        self.executable = executable
+        self.jobs = 0
+        self.rss = 0
+        self._ready = False
+        self._process = start_process_tree(worker_command(executable, interpreter), stdin=subprocess.PIPE)
+        if self._process.stdin is None:  # pragma: no cover
+            raise ChildProcessError("Export worker has no stdin")  # noqa: TRY003
+        self._stdin = self._process.stdin
+        self._messages: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._stderr: collections.deque[str] = collections.deque(maxlen=_STDERR_TAIL)
+        threading.Thread(target=self._read_messages, args=(self._process.stdout,), daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(self._process.stderr,), daemon=True).start()
+        logger.debug(f"Started export worker {self._process.pid}")
+
+    def _read_messages(self, stream: IO[str]) -> None:
+        """Forward the worker's protocol messages; None marks the end of the stream."""
+        for line in stream:
+            try:
+                self._messages.put(json.loads(line))
+            except ValueError:
+                self._stderr.append(line)
+        self._messages.put(None)
+
+    def _read_stderr(self, stream: IO[str]) -> None:
+        """Keep the tail of the worker's stderr so a crash can be explained."""
+        for line in stream:
+            self._stderr.append(line)
+
+    @property
+    def alive(self) -> bool:
+        """Whether the worker process is still running."""
+        return self._process.poll() is None
+
+    def _receive(
+        self, cmd: list[str], timeout: float, deadline: float, cancel: threading.Event | None = None
+    ) -> dict[str, Any]:
+        """Return the next message of the worker, terminating it once the deadline passes or cancel is set.
+
+        Raises:
+            ProcessTreeTimeoutExpired: If no message arrived before the deadline.
+            ProcessTreeCancelled: If cancel was set before a message arrived.
+            ChildProcessError: If the worker exited.
+
+        """
+        while True:
+            remaining = max(deadline - time.monotonic(), 0.0)
+            try:
+                message = self._messages.get(
+                    timeout=remaining if cancel is None else min(remaining, CANCEL_POLL_INTERVAL)
+                )
+                break
+            except queue.Empty:
+                if cancel is not None and cancel.is_set():
+                    raise ProcessTreeCancelled(cmd, self.terminate()) from None
+                if cancel is None or time.monotonic() >= deadline:
+                    reaped = self.terminate()
+                    raise ProcessTreeTimeoutExpired(cmd, timeout, reaped) from None
+        if message is None:
+            self._process.wait()
+            tail = "".join(self._stderr).strip()
+            raise ChildProcessError(f"Export worker exited with status {self._process.returncode}\n{tail}".strip())
+        return message
+
+    def _await_ready(
+        self, cmd: list[str], timeout: float, deadline: float, cancel: threading.Event | None = None
+    ) -> None:
+        """Wait for the worker to announce that marimo is imported.
+
+        Raises:
+            WorkerUnavailableError: If the worker cannot run marimo in process.
+
+        """
+        hello = self._receive(cmd, timeout, deadline, cancel)
+        if not hello.get("ready"):
+            raise WorkerUnavailableError(str(hello.get("error", "worker is not ready")))
+        self._ready = True
+
+    def run(self, cmd: list[str], timeout: float, cancel: threading.Event | None = None) -> ProcessResult:
+        """Run one export in the worker.
+
+        Args:
+            cmd: The export command; everything after ``marimo`` is passed to
+                marimo's command line inside the worker.
+            timeout: Maximum time in seconds, including the worker's start-up
+                if it is not ready yet.
+            cancel: Optional event; once it is set, the worker is terminated.
+                Defaults to None.
+
+        Returns:
+            The exit code and output of the export.
+
+        Raises:
+            ProcessTreeTimeoutExpired: If the export did not finish in time; the
+                worker and its process tree have been terminated.
+            ProcessTreeCancelled: If cancel was set before the export finished; the
+                worker and its process tree have been terminated.
+            WorkerUnavailableError: If the worker cannot run marimo in process; it
+                has been terminated.
+            ChildProcessError: If the worker exited before answering.
+
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            if not self._ready:
+                self._await_ready(cmd, timeout, deadline, cancel)
+            try:
+                self._stdin.write(json.dumps({"args": cmd[cmd.index("marimo") + 1 :]}) + "\n")
+                self._stdin.flush()
+            except OSError:
+                # The worker died; report why once its output is drained
+                pass
+            reply = self._receive(cmd, timeout, deadline, cancel)
+        except BaseException:
+            # e.g. KeyboardInterrupt: never leave the worker running
+            self.terminate()
+            raise
+
+        self.jobs += 1
+        self.rss = int(reply.get("rss", 0))
+        return ProcessResult(cmd, int(reply["returncode"]), reply.get("stdout", ""), reply.get("stderr", ""))
+
+    def terminate(self, grace_period: float = DEFAULT_GRACE_PERIOD) -> int:
+        """Terminate the worker and every process it started.
+
+        Returns:
+            The number of processes that had to be terminated.
+
+        """
+        with contextlib.suppress(OSError):
+            self._stdin.close()
+        reaped = terminate_process_tree(self._process, grace_period)
+        self._process.wait()
+        return reaped
+
+    def close(self, grace_period: float = DEFAULT_GRACE_PERIOD) -> None:
+        """Ask the worker to exit by closing its stdin, terminating it if it does not."""
+        with contextlib.suppress(OSError):
+            self._stdin.close()
+        with contextlib.suppress(subprocess.TimeoutExpired):
+            self._process.wait(timeout=grace_period)
+        # Also reaps kernels the worker left behind
+        self.terminate(grace_period)
+        logger.debug(f"Stopped export worker {self._process.pid} after {self.jobs} job(s)")
+
+
+class WorkerPool:
+    """A pool of persistent export workers shared by concurrent exports.
+
+    Workers are started on demand, one per concurrent export, and kept warm
+    between exports. At most ``size`` idle workers are kept.
+
+    Attributes:
+        size: Maximum number of workers kept alive between exports.
+        max_jobs: Number of exports after which a worker is replaced.
+        max_memory_mb: Resident memory in megabytes above which a worker is
+            replaced after its export.
+        started: Number of workers started so far.
+        recycled: Number of workers replaced because of max_jobs or max_memory_mb.
+
+    """
+
+    def __init__(
+        self, size: int = 4, max_jobs: int = DEFAULT_MAX_JOBS, max_memory_mb: int = DEFAULT_MAX_MEMORY_MB
+    ) -> None:
+        """Initialize the pool without starting any worker.
+
+        Args:
+            size: Maximum number of workers kept alive between exports. Defaults to 4.
+            max_jobs: Number of exports after which a worker is replaced.
+                Defaults to DEFAULT_MAX_JOBS.
+            max_memory_mb: Resident memory in megabytes above which a worker is
+                replaced. Defaults to DEFAULT_MAX_MEMORY_MB.
+
+        Raises:
+            ValueError: If any limit is not positive.
+
+        """
+        if size < 1 or max_jobs < 1 or max_memory_mb < 1:
+            raise ValueError("Worker pool size, max_jobs and max_memory_mb must be positive")  # noqa: TRY003
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.started = 0
+        self.recycled = 0
+        self._idle: list[ExportWorker] = []
+        # Executables whose marimo cannot run in a worker; their exports run as subprocesses
+        self._unavailable: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "WorkerPool":
+        """Return the pool."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Stop all idle workers."""
+        self.close()
+
+    def _acquire(self, executable: str, interpreter: bool) -> ExportWorker:
+        """Take an idle worker for the executable or start a new one."""
+        dead = []
+        with self._lock:
+            matching = [worker for worker in self._idle if worker.executable == executable]
+            for worker in matching:
+                self._idle.remove(worker)
+                if worker.alive:
+                    return worker
+                dead.append(worker)
+            self.started += 1
+        for worker in dead:
+            worker.close()
+        return ExportWorker(executable, interpreter)
+
+    def _release(self, worker: ExportWorker) -> None:
+        """Return a worker to the pool, or stop it if it is used up."""
+        exhausted = worker.jobs >= self.max_jobs or worker.rss > self.max_memory_mb * 1024 * 1024
+        with self._lock:
+            keep = worker.alive and not exhausted and len(self._idle) < self.size
+            if keep:
+                self._idle.append(worker)
+            elif exhausted:
+                self.recycled += 1
+        if not keep:
+            if exhausted:
+                logger.debug(f"Recycling export worker after {worker.jobs} job(s), {worker.rss // 2**20} MB resident")
+            worker.close()
+
+    def run(self, cmd: list[str], timeout: float, cancel: threading.Event | None = None) -> ProcessResult:
+        """Run an export command in a warm worker.
+
+        Has the same contract as run_process_tree, so it can replace it. If the
+        executable's marimo cannot run in a worker, the command runs as a
+        subprocess, and so do later exports with the same executable.
+
+        Args:
+            cmd: The export command, e.g. ``["uvx", "marimo", "export", "html", ...]``
+                or ``[python, "-m", "marimo", "export", ...]`` for a pinned marimo
+                tool. Its first element selects the executable workers are started with.
+            timeout: Maximum time in seconds for the export.
+            cancel: Optional event; once it is set, the export's worker is
+                terminated. Defaults to None.
+
+        Returns:
+            The exit code and output of the export.
+
+        Raises:
+            ProcessTreeTimeoutExpired: If the export did not finish in time.
+            ProcessTreeCancelled: If cancel was set before the export finished.
+            FileNotFoundError: If the uvx executable does not exist.
+            subprocess.SubprocessError: If the worker crashed.
+
+        """
+        if cancel is not None and cancel.is_set():
+            raise ProcessTreeCancelled(cmd, 0)
+        with self._lock:
+            unavailable = cmd[0] in self._unavailable
+        if unavailable:
+            return run_process_tree(cmd, timeout, cancel=cancel)
+        # A failed worker has already been terminated by ExportWorker.run
+        worker = self._acquire(cmd[0], interpreter=cmd[1:2] == ["-m"])
+        try:
+            result = worker.run(cmd, timeout, cancel)
+        except WorkerUnavailableError as e:
+            with self._lock:
+                first = cmd[0] not in self._unavailable
+                self._unavailable.add(cmd[0])
+            if first:
+                logger.warning(f"Export workers cannot run marimo in process ({e}); exporting with subprocesses")
+            return run_process_tree(cmd, timeout, cancel=cancel)
+        except ChildProcessError as e:
+            raise subprocess.SubprocessError(str(e)) from e
+        self._release(worker)
+        return result
+
+    def close(self) -> None:
+        """Stop all idle workers."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
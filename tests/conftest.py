@@ -13,12 +13,14 @@ Security notes:
 import shutil
 import sys
 from pathlib import Path
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 from hypothesis import HealthCheck, Phase, settings
 
 from marimushka.notebook import Kind, Notebook
+from marimushka.orchestrator import generate_index
+from marimushka.process import ProcessResult
 
 # Hypothesis configuration for faster tests on Python 3.14+
 # Python 3.14 has some performance regressions that affect hypothesis
@@ -275,3 +277,170 @@ def mock_audit_logger():
     logger.log_file_access = MagicMock()
     logger.log_template_render = MagicMock()
     return logger
+
+
+def _write_export(cmd, **kwargs):
+    """Simulate a marimo export by writing the notebook source, wrapped in <html>, to the output file."""
+    Path(cmd[-1]).write_text(f"<html>{Path(cmd[-3]).read_text()}</html>")
+    return ProcessResult(cmd, 0, "", "")
+
+
+@pytest.fixture
+def fake_export():
+    """Replace the subprocess of notebook exports with a fake marimo export.
+
+    The fake writes the notebook source, wrapped in ``<html>``, to the output
+    file named last on the command line.
+
+    Yields:
+        MagicMock: The patched ``run_process_tree``, recording the commands.
+
+    """
+    with patch("marimushka.notebook.run_process_tree", side_effect=_write_export) as mock_run:
+        yield mock_run
+
+
+@pytest.fixture
+def site(tmp_path):
+    """Create a notebooks folder with two notebooks, an output directory and a template.
+
+    Args:
+        tmp_path: Pytest temporary path fixture.
+
+    Returns:
+        tuple: The notebooks folder, the output directory (not created yet) and
+            the template, which lives in a directory of its own.
+
+    """
+    folder = tmp_path / "notebooks"
+    folder.mkdir()
+    (folder / "alpha.py").write_text("import marimo\n")
+    (folder / "beta.py").write_text("import marimo\n")
+    templates = tmp_path / "templates"
+    templates.mkdir()
+    template = templates / "index.html.j2"
+    template.write_text("{% for nb in notebooks %}{{ nb.display_name }};{% endfor %}")
+    return folder, tmp_path / "_site", template
+
+
+@pytest.fixture
+def export_site(site):
+    """Return a function running generate_index over all notebooks of the site fixture.
+
+    Args:
+        site: The site fixture.
+
+    Returns:
+        Callable: Takes keyword arguments of generate_index and returns its result.
+
+    """
+    folder, output, template = site
+
+    def export(**kwargs):
+        notebooks = [Notebook(p) for p in sorted(folder.glob("*.py"))]
+        return generate_index(output=output, template_file=template, notebooks=notebooks, parallel=False, **kwargs)
+
+    return export
+
+
+@pytest.fixture
+def fake_uvx(tmp_path):
+    """Create a directory holding a fake ``uvx`` executable for real subprocess tests.
+
+    The fake writes ``<html>`` to the output file named last on its command line.
+    Its behavior is controlled by markers in the notebook source:
+
+    - ``FAIL``: print an error to stderr and exit with status 1
+    - ``SLEEP``: sleep for a minute before exporting
+    - ``CRASH``: exit at once with status 3, taking an export worker down with it
+
+    Started as ``uvx --from marimo python ...``, the fake runs the given Python
+    script against a fake ``marimo`` package implementing the same behavior, so
+    export workers can be tested without marimo. The package declares its
+    ``marimo`` console script in ``site/marimo-0.0.0.dist-info``.
+
+    Args:
+        tmp_path: Pytest temporary path fixture.
+
+    Returns:
+        Path: The directory to pass as ``bin_path``.
+
+    """
+    bin_dir = tmp_path / "fake-bin"
+    cli_dir = bin_dir / "site" / "marimo" / "_cli"
+    cli_dir.mkdir(parents=True)
+    (cli_dir.parent / "__init__.py").write_text("")
+    (cli_dir / "__init__.py").write_text("")
+    (cli_dir / "cli.py").write_text(
+        "import os, pathlib, sys, time\n"
+        "class Command:\n"
+        "    def main(self, args, prog_name=None, standalone_mode=True):\n"
+        "        source = pathlib.Path(args[-3]).read_text()\n"
+        "        if 'FAIL' in source:\n"
+        "            sys.stderr.write('export failed')\n"
+        "            sys.exit(1)\n"
+        "        if 'CRASH' in source:\n"
+        "            os._exit(3)\n"
+        "        if 'SLEEP' in source:\n"
+        "            time.sleep(60)\n"
+        "        pathlib.Path(args[-1]).write_text('<html></html>')\n"
+        "    __call__ = main\n"
+        "main = Command()\n"
+    )
+    dist_info = bin_dir / "site" / "marimo-0.0.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Metadata-Version: 2.1\nName: marimo\nVersion: 0.0.0\n")
+    (dist_info / "entry_points.txt").write_text("[console_scripts]\nmarimo = marimo._cli.cli:main\n")
+    script = bin_dir / "uvx"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import os, pathlib, sys\n"
+        "site = pathlib.Path(__file__).parent / 'site'\n"
+        "if sys.argv[1:3] == ['--from', 'marimo']:\n"
+        "    os.environ['PYTHONPATH'] = str(site)\n"
+        "    args = sys.argv[sys.argv.index('python') + 1 :]\n"
+        "    os.execv(sys.executable, [sys.executable, *args])\n"
+        "sys.path.insert(0, str(site))\n"
+        "from marimo._cli.cli import main\n"
+        "main(sys.argv[2:])\n"
+    )
+    script.chmod(0o755)
+    return bin_dir
+
+
+@pytest.fixture
+def fake_uv(tmp_path):
+    """Create a fake ``uv`` that creates environments without installing anything.
+
+    ``uv venv DIR`` creates ``DIR/bin/python``; ``uv pip install`` records the
+    requirements in ``installed.txt`` and fails for requirements named ``broken``.
+    Every invocation is appended to ``calls.log`` next to the script.
+
+    Args:
+        tmp_path: Pytest temporary path fixture.
+
+    Returns:
+        str: The path of the fake uv executable.
+
+    """
+    script = tmp_path / "fake-uv" / "uv"
+    script.parent.mkdir()
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import pathlib, sys\n"
+        "args = sys.argv[1:]\n"
+        "with open(pathlib.Path(__file__).with_name('calls.log'), 'a') as log:\n"
+        "    log.write(' '.join(args) + '\\n')\n"
+        "if args[0] == 'venv':\n"
+        "    (pathlib.Path(args[-1]) / 'bin').mkdir(parents=True)\n"
+        "    (pathlib.Path(args[-1]) / 'bin' / 'python').write_text('')\n"
+        "else:\n"
+        "    requirements = args[args.index('--python') + 2 :]\n"
+        "    if any(r.startswith('broken') for r in requirements):\n"
+        "        sys.stderr.write('No solution found')\n"
+        "        sys.exit(1)\n"
+        "    env = pathlib.Path(args[args.index('--python') + 1]).parent.parent\n"
+        "    (env / 'installed.txt').write_text('\\n'.join(requirements))\n"
+    )
+    script.chmod(0o755)
+    return str(script)
@@ -0,0 +1,130 @@
+"""Tests for the assets.py module.
+
+This module contains tests for finding the files of the public/ directory a
+notebook references and for tracking their contents.
+"""
+
+import json
+from unittest.mock import patch
+
+from marimushka.assets import ASSETS_VERSION, AssetReferences, covers, scan_references
+from marimushka.cache import hash_file
+
+PENGUINS = b"""import marimo
+
+app = marimo.App()
+
+
+@app.cell
+def _(mo, os, pl, name):
+    penguins = pl.read_csv(str(mo.notebook_location() / "public" / "penguins.csv"))
+    logo = mo.image("public/images/logo.png")
+    legacy = os.path.join(mo.notebook_location(), "public", "legacy", "old.csv")
+    chart = mo.notebook_location() / "public" / "charts" / name
+    return
+"""
+
+
+class TestScanReferences:
+    """Tests for scan_references."""
+
+    def test_literals_and_path_expressions(self):
+        """Test that literals, ``/`` chains and join calls are found, up to their first dynamic part."""
+        assert scan_references(PENGUINS) == ("charts", "images/logo.png", "legacy/old.csv", "penguins.csv")
+
+    def test_whole_directory(self):
+        """Test that a bare public literal or a dynamic f-string covers the whole directory."""
+        assert scan_references(b'data = f"public/{name}.csv"\n') == ("",)
+        assert scan_references(b'public = mo.notebook_location() / "public"\n') == ("",)
+
+    def test_unrelated_strings(self):
+        """Test that strings not starting at public are no references, and bad sources have none."""
+        assert scan_references(b'x = "data/public/a.csv"\ny = "publication.csv"\n') == ()
+        assert scan_references(b"def (:") == ()
+        assert scan_references(b'path = f"{root}/public/a.csv"\n') == ()
+
+    def test_covers(self):
+        """Test that references cover their files and everything below their directories."""
+        references = ("charts", "penguins.csv")
+
+        assert covers(references, "penguins.csv")
+        assert covers(references, "charts/bar.png")
+        assert not covers(references, "chartsx.png")
+        assert covers(("",), "anything.csv")
+
+
+class TestAssetReferences:
+    """Tests for AssetReferences."""
+
+    def test_files_and_hash(self, tmp_path):
+        """Test that only referenced files count, including missing ones, unless the whole directory does."""
+        notebook = tmp_path / "penguins.py"
+        notebook.write_text('DATA = "public/penguins.csv"\nOTHER = "public/missing.csv"\n')
+        (tmp_path / "public").mkdir()
+        (tmp_path / "public" / "penguins.csv").write_text("species\n")
+        (tmp_path / "public" / "unused.csv").write_text("x\n")
+        assets = AssetReferences()
+
+        assert assets.files(notebook) == [tmp_path / "public" / "missing.csv", tmp_path / "public" / "penguins.csv"]
+        assert len(assets.files(notebook, whole_directory=True)) == 2
+        first = assets.assets_hash(notebook)
+
+        (tmp_path / "public" / "unused.csv").write_text("y\n")
+        assert assets.assets_hash(notebook) == first
+        (tmp_path / "public" / "missing.csv").write_text("now here\n")
+        assert assets.assets_hash(notebook) != first
+
+    def test_no_references(self, tmp_path):
+        """Test that a notebook without references has no asset digest."""
+        notebook = tmp_path / "plain.py"
+        notebook.write_text("import marimo\n")
+
+        assert AssetReferences().assets_hash(notebook) is None
+
+    def test_whole_directory_missing(self, tmp_path):
+        """Test that a notebook depending on a missing public directory has no data files."""
+        notebook = tmp_path / "app.py"
+        notebook.write_text("import marimo\n")
+
+        assert AssetReferences().files(notebook, whole_directory=True) == []
+
+    def test_unchanged_files_not_hashed_again(self, tmp_path):
+        """Test that data files and sources are only hashed and scanned again once they change."""
+        notebook = tmp_path / "penguins.py"
+        notebook.write_text('DATA = "public/penguins.csv"\n')
+        (tmp_path / "public").mkdir()
+        (tmp_path / "public" / "penguins.csv").write_text("species\n")
+        assets = AssetReferences()
+
+        with patch("marimushka.assets.hash_file", wraps=hash_file) as mock_hash:
+            assets.assets_hash(notebook)
+            assets.assets_hash(notebook)
+
+        mock_hash.assert_called_once()
+        assert assets.scanned == 1
+
+    def test_save_and_load(self, tmp_path):
+        """Test that persisted references are reused without scanning the source again."""
+        notebook = tmp_path / "penguins.py"
+        notebook.write_text('DATA = "public/penguins.csv"\n')
+        assets = AssetReferences()
+        assets.references(notebook)
+        assets.save(tmp_path / "cache" / "assets.json")
+
+        loaded = AssetReferences()
+        loaded.load(tmp_path / "cache" / "assets.json")
+
+        assert loaded.references(notebook) == ("penguins.csv",)
+        assert loaded.scanned == 0
+
+    def test_load_unreadable_and_save_failure(self, tmp_path):
+        """Test that unreadable references load as nothing and failed writes only log a warning."""
+        path = tmp_path / "assets.json"
+        path.write_text(json.dumps({"version": ASSETS_VERSION, "entries": []}))
+        assets = AssetReferences()
+
+        assets.load(path)
+        assets.save(path / "assets.json")
+
+        assert assets.entries == {}
+        assert json.loads(path.read_text())["entries"] == []
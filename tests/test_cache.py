@@ -0,0 +1,276 @@
+"""Tests for the cache.py module.
+
+This module contains tests for the content-addressed export cache and its
+integration with Notebook.export.
+"""
+
+import hashlib
+import subprocess
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka.cache import ExportCache, hash_file, resolve_marimo_version
+from marimushka.notebook import Kind, Notebook
+
+
+@pytest.fixture
+def notebook_file(tmp_path):
+    """Create a notebook file with a sibling public/ directory."""
+    folder = tmp_path / "notebooks"
+    (folder / "public").mkdir(parents=True)
+    (folder / "public" / "data.csv").write_text("a,b\n1,2\n")
+    nb = folder / "demo.py"
+    nb.write_text('import marimo\napp = marimo.App()\nDATA = "public/data.csv"\n')
+    return nb
+
+
+class TestHashing:
+    """Tests for the hashing helpers."""
+
+    def test_hash_file_changes_with_content(self, tmp_path):
+        """Test that the file digest reflects the file contents."""
+        f = tmp_path / "a.txt"
+        f.write_text("one")
+        first = hash_file(f)
+        f.write_text("two")
+        assert hash_file(f) != first
+
+    def test_hash_large_file(self, tmp_path):
+        """Test that files hashed from memory-mapped chunks get the digest of their contents."""
+        data = bytes(range(256)) * (5 * 4096 + 7)
+        f = tmp_path / "large.bin"
+        f.write_bytes(data)
+
+        assert hash_file(f) == hashlib.sha256(data).hexdigest()
+
+    def test_hash_unmappable_file(self, tmp_path):
+        """Test that large files that cannot be memory-mapped are hashed by plain reads."""
+        data = bytes(range(256)) * (5 * 4096 + 7)
+        f = tmp_path / "large.bin"
+        f.write_bytes(data)
+
+        with patch("marimushka.cache.mmap.mmap", side_effect=OSError("not mappable")):
+            assert hash_file(f) == hashlib.sha256(data).hexdigest()
+
+
+class TestResolveMarimoVersion:
+    """Tests for resolve_marimo_version."""
+
+    @patch("subprocess.run")
+    def test_success(self, mock_run):
+        """Test that the version is read from stdout."""
+        mock_run.return_value = MagicMock(returncode=0, stdout="0.18.4\n", stderr="")
+        assert resolve_marimo_version("uvx") == "0.18.4"
+        assert mock_run.call_args[0][0] == ["uvx", "marimo", "--version"]
+
+    @patch("subprocess.run")
+    def test_nonzero_exit(self, mock_run):
+        """Test that a failing version query yields None."""
+        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="boom")
+        assert resolve_marimo_version("uvx") is None
+
+    @patch("subprocess.run")
+    def test_missing_executable(self, mock_run):
+        """Test that a missing executable yields None."""
+        mock_run.side_effect = FileNotFoundError("uvx")
+        assert resolve_marimo_version("uvx") is None
+
+    @patch("subprocess.run")
+    def test_not_memoized(self, mock_run):
+        """Test that every call queries the version, so failures and upgrades are not remembered."""
+        mock_run.side_effect = [FileNotFoundError("uvx"), MagicMock(returncode=0, stdout="0.18.4", stderr="")]
+        assert resolve_marimo_version("uvx") is None
+        assert resolve_marimo_version("uvx") == "0.18.4"
+
+
+class TestExportCache:
+    """Tests for the ExportCache class."""
+
+    def test_key_is_stable(self, tmp_path, notebook_file):
+        """Test that identical inputs produce identical keys."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+        assert cache.key(nb, sandbox=True) == cache.key(nb, sandbox=True)
+
+    def test_key_covers_all_inputs(self, tmp_path, notebook_file):
+        """Test that every input of the export changes the key."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+        base = cache.key(nb, sandbox=True)
+
+        assert cache.key(Notebook(notebook_file, kind=Kind.APP), sandbox=True) != base
+        assert cache.key(nb, sandbox=False) != base
+        assert ExportCache(tmp_path / "cache", marimo_version="0.19.0").key(nb, sandbox=True) != base
+
+        # Static exports depend on the referenced files, WebAssembly exports on all of public/
+        app = Notebook(notebook_file, kind=Kind.APP)
+        app_base = cache.key(app, sandbox=True)
+        (notebook_file.parent / "public" / "unused.csv").write_text("x\n")
+        assert cache.key(nb, sandbox=True) == base
+        assert cache.key(app, sandbox=True) != app_base
+
+        (notebook_file.parent / "public" / "data.csv").write_text("a,b\n3,4\n")
+        public_changed = cache.key(nb, sandbox=True)
+        assert public_changed != base
+
+        (notebook_file.parent / "helpers.py").write_text("VALUE = 1\n")
+        notebook_file.write_text("import helpers\nimport marimo\napp = marimo.App(width='full')\n")
+        source_changed = cache.key(nb, sandbox=True)
+        assert source_changed != public_changed
+
+        (notebook_file.parent / "helpers.py").write_text("VALUE = 2\n")
+        assert cache.key(nb, sandbox=True) != source_changed
+
+    def test_key_resolves_version_from_executable(self, tmp_path, notebook_file):
+        """Test that the marimo version is resolved when none is pinned."""
+        cache = ExportCache(tmp_path / "cache")
+        with patch("marimushka.cache.resolve_marimo_version", return_value="0.18.4") as mock_resolve:
+            cache.key(Notebook(notebook_file), sandbox=True, executable="/opt/bin/uvx")
+        mock_resolve.assert_called_once_with("/opt/bin/uvx")
+
+    def test_unknown_version_disables_caching(self, tmp_path, notebook_file):
+        """Test that no key is built, and nothing is restored or stored, without a marimo version."""
+        cache = ExportCache(tmp_path / "cache")
+        with patch("marimushka.cache.resolve_marimo_version", return_value=None):
+            assert cache.key(Notebook(notebook_file), sandbox=True) is None
+
+    def test_for_build(self, tmp_path, notebook_file):
+        """Test that a build's cache uses the build's version without resolving or pinning it."""
+        cache = ExportCache(tmp_path / "cache")
+        nb = Notebook(notebook_file)
+        with patch("marimushka.cache.resolve_marimo_version") as mock_resolve:
+            build_cache = cache.for_build("0.18.4")
+            assert build_cache.key(nb, sandbox=True) == ExportCache(tmp_path / "cache", "0.18.4").key(nb, sandbox=True)
+            assert cache.for_build(None).key(nb, sandbox=True) is None
+        mock_resolve.assert_not_called()
+        assert cache.marimo_version is None
+        assert build_cache.cache_dir == cache.cache_dir
+
+    def test_store_and_restore(self, tmp_path):
+        """Test that stored entries can be restored."""
+        cache = ExportCache(tmp_path / "cache")
+        exported = tmp_path / "out.html"
+        exported.write_text("<html>ok</html>")
+
+        assert not cache.contains("ab" * 32)
+        cache.store("ab" * 32, exported)
+        assert cache.contains("ab" * 32)
+
+        target = tmp_path / "restored.html"
+        assert cache.restore("ab" * 32, target) is True
+        assert target.read_text() == "<html>ok</html>"
+
+    def test_restore_miss(self, tmp_path):
+        """Test that restoring an unknown key reports a miss."""
+        cache = ExportCache(tmp_path / "cache")
+        assert cache.restore("cd" * 32, tmp_path / "out.html") is False
+
+    def test_restore_failure_is_a_miss(self, tmp_path):
+        """Test that an entry that cannot be copied is treated as a miss."""
+        cache = ExportCache(tmp_path / "cache")
+        exported = tmp_path / "out.html"
+        exported.write_text("<html>ok</html>")
+        cache.store("ab" * 32, exported)
+
+        (tmp_path / "restored.html").mkdir()
+
+        assert cache.restore("ab" * 32, tmp_path / "restored.html") is False
+
+    def test_store_failure_is_not_fatal(self, tmp_path):
+        """Test that a failing store only logs a warning."""
+        cache = ExportCache(tmp_path / "cache")
+        cache.store("ef" * 32, tmp_path / "missing.html")
+        assert not cache.contains("ef" * 32)
+        assert list((tmp_path / "cache" / "exports" / "ef").iterdir()) == []
+
+
+class TestNotebookExportWithCache:
+    """Tests for Notebook.export with an export cache."""
+
+    def test_second_export_is_a_cache_hit(self, tmp_path, notebook_file, fake_export):
+        """Test that an unchanged notebook is restored without a subprocess."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+
+        first = nb.export(tmp_path / "site1", cache=cache)
+        assert first.success is True
+        assert first.cached is False
+        assert fake_export.call_count == 1
+
+        second = nb.export(tmp_path / "site2", cache=cache)
+        assert second.success is True
+        assert second.cached is True
+        assert fake_export.call_count == 1
+        assert second.output_path is not None
+        assert second.output_path.read_text() == first.output_path.read_text()
+
+    def test_changed_notebook_is_re_exported(self, tmp_path, notebook_file, fake_export):
+        """Test that editing the notebook invalidates the cache entry."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+        nb.export(tmp_path / "site", cache=cache)
+
+        notebook_file.write_text("import marimo\napp = marimo.App(width='full')\n")
+        result = nb.export(tmp_path / "site", cache=cache)
+
+        assert result.cached is False
+        assert fake_export.call_count == 2
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_failed_export_is_not_cached(self, mock_run, tmp_path, notebook_file):
+        """Test that failed exports never populate the cache."""
+        mock_run.return_value = MagicMock(returncode=1, stdout="", stderr="boom")
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+
+        assert nb.export(tmp_path / "site", cache=cache).success is False
+        assert nb.export(tmp_path / "site", cache=cache).cached is False
+        assert mock_run.call_count == 2
+
+    def test_wasm_hit_requires_assets(self, tmp_path, notebook_file, fake_export):
+        """Test that WebAssembly entries are only restored next to marimo's assets."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file, kind=Kind.APP)
+        nb.export(tmp_path / "site1", cache=cache)
+
+        # Clean output directory without assets: must re-export
+        assert nb.export(tmp_path / "site2", cache=cache).cached is False
+        assert fake_export.call_count == 2
+
+        # Assets present: restored, and public/ copied alongside
+        (tmp_path / "site3" / "assets").mkdir(parents=True)
+        result = nb.export(tmp_path / "site3", cache=cache)
+        assert result.cached is True
+        assert (tmp_path / "site3" / "public" / "data.csv").exists()
+        assert fake_export.call_count == 2
+
+    def test_subprocess_error_is_not_cached(self, tmp_path, notebook_file):
+        """Test that subprocess exceptions leave the cache untouched."""
+        cache = ExportCache(tmp_path / "cache", marimo_version="0.18.4")
+        nb = Notebook(notebook_file)
+        with patch("marimushka.notebook.run_process_tree", side_effect=subprocess.SubprocessError("boom")):
+            assert nb.export(tmp_path / "site", cache=cache).success is False
+        assert not any((tmp_path / "cache" / "exports").rglob("*.html"))
+
+    @patch("marimushka.orchestrator.resolve_marimo_version")
+    def test_version_is_resolved_per_build(self, mock_version, tmp_path, fake_export, site, export_site):
+        """Test that builds sharing a cache notice a marimo upgrade and skip the cache without a version."""
+        folder, _, _ = site
+        (folder / "beta.py").write_text("import marimo\napp = marimo.App()\n")
+        cache = ExportCache(tmp_path / "cache")
+
+        mock_version.return_value = None
+        export_site(cache=cache)
+        assert not any((tmp_path / "cache" / "exports").rglob("*.html"))
+
+        mock_version.return_value = "0.18.4"
+        export_site(cache=cache)
+        export_site(cache=cache)
+        assert fake_export.call_count == 4
+
+        mock_version.return_value = "0.19.0"
+        export_site(cache=cache)
+        assert fake_export.call_count == 6
+        assert mock_version.call_count == 4
+        assert cache.marimo_version is None
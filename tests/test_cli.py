@@ -3,7 +3,8 @@
 import subprocess
 from unittest.mock import patch
 
-from marimushka.cli import cli, version_command
+from marimushka import cli as cli_module
+from marimushka.cli import cli, configure_logging, version_command
 
 
 @patch("marimushka.cli.app")
@@ -16,6 +17,19 @@ def test_cli(mock_app):
     mock_app.assert_called_once()
 
 
+def test_configure_debug_logging(capsys):
+    """Test that debug logging shows debug messages with their source location."""
+    try:
+        configure_logging(debug=True)
+
+        assert cli_module._debug_mode is True
+        assert "cli:configure_logging" in capsys.readouterr().err
+    finally:
+        configure_logging(debug=False)
+
+    assert cli_module._debug_mode is False
+
+
 @patch("marimushka.cli.rich_print")
 def test_version(mock_rich_print):
     """Test the version command."""
@@ -157,3 +157,34 @@ output = "custom_site"
         # Assert - should use defaults since file doesn't exist
         assert config.output == "_site"  # Default value
         assert config.max_workers == 4  # Default value
+
+    def test_page_size(self, tmp_path):
+        """Test that the index page size is read from the file and defaults to a single page."""
+        config_file = tmp_path / ".marimushka.toml"
+        config_file.write_text("[marimushka]\npage_size = 50\n")
+
+        config = MarimushkaConfig.from_file(config_file)
+
+        assert config.page_size == 50
+        assert config.to_dict()["page_size"] == 50
+        assert MarimushkaConfig().page_size == 0
+
+    def test_search(self, tmp_path):
+        """Test that the search index setting is read from the file and off by default."""
+        config_file = tmp_path / ".marimushka.toml"
+        config_file.write_text("[marimushka]\nsearch = true\n")
+
+        assert MarimushkaConfig.from_file(config_file).search is True
+        assert MarimushkaConfig().to_dict()["search"] is False
+
+    def test_discovery_settings(self, tmp_path):
+        """Test that recursion and the include and exclude patterns are read from the file."""
+        config_file = tmp_path / ".marimushka.toml"
+        config_file.write_text('[marimushka]\nrecursive = true\nexclude = ["drafts"]\n')
+
+        config = MarimushkaConfig.from_file(config_file)
+
+        assert config.recursive is True
+        assert config.include is None
+        assert config.to_dict()["exclude"] == ["drafts"]
+        assert MarimushkaConfig().recursive is False
@@ -0,0 +1,388 @@
+"""Tests for the daemon.py module.
+
+This module contains tests for the build daemon: validating build options,
+streaming progress and results over the Unix domain socket, reusing worker
+pools across builds, shutting down and the daemon command.
+"""
+
+import json
+import socket
+import stat
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import typer
+
+from marimushka.cli import daemon_command
+from marimushka.daemon import DEFAULT_SOCKET, BuildDaemon, _default_socket, resolve_build_options, send_request
+from marimushka.exceptions import BatchExportResult, NotebookExportResult, TemplateNotFoundError
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="requires Unix domain sockets")
+
+
+def _serve(build_daemon):
+    """Start a daemon's serve loop in a thread and wait until it listens."""
+    ready = threading.Event()
+    thread = threading.Thread(target=build_daemon.serve_forever, args=(ready,), daemon=True)
+    thread.start()
+    assert ready.wait(10)
+    return thread
+
+
+def _send_lines(socket_path, data):
+    """Send raw request lines to a daemon and return the decoded events."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(10)
+        client.connect(str(socket_path))
+        client.sendall(data)
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as stream:
+            return [json.loads(line) for line in stream]
+
+
+class _FakeSession:
+    """Stand-in for a BuildSession whose builds export one notebook."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.builds = []
+        self.closed = False
+
+    def build(self, since=None, on_complete=None, return_html=True, on_progress=None):
+        """Simulate a build of one notebook, reporting progress and the result."""
+        self.builds.append(since)
+        on_progress(1, 1, "demo.py")
+        batch = BatchExportResult()
+        batch.add(NotebookExportResult.succeeded(Path("notebooks/demo.py"), Path(self.options["output"]) / "demo.html"))
+        on_complete(batch)
+        return ""
+
+    def close(self):
+        """Record that the daemon closed the session."""
+        self.closed = True
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    """Run a build daemon on a socket in the temporary directory."""
+    build_daemon = BuildDaemon(tmp_path / "d.sock")
+    thread = _serve(build_daemon)
+    yield build_daemon
+    build_daemon.shutdown()
+    thread.join(10)
+
+
+class TestResolveBuildOptions:
+    """Tests for resolve_build_options."""
+
+    def test_paths_resolved_against_cwd(self, tmp_path):
+        """Test that relative path options are resolved against the client's directory."""
+        options = resolve_build_options({"output": "_site", "notebooks": "nbs", "parallel": False}, tmp_path)
+
+        assert options == {"output": str(tmp_path / "_site"), "notebooks": str(tmp_path / "nbs"), "parallel": False}
+
+    def test_unknown_and_reserved_options_rejected(self):
+        """Test that options main does not take, or that the daemon sets, are rejected."""
+        with pytest.raises(ValueError, match="colour"):
+            resolve_build_options({"colour": "blue"})
+        with pytest.raises(ValueError, match="on_progress"):
+            resolve_build_options({"on_progress": None})
+
+    @pytest.mark.parametrize("name", ["bin_path", "index_url", "find_links"])
+    def test_executable_options_rejected(self, name):
+        """Test that requests cannot choose the executables or package sources of a build."""
+        with pytest.raises(ValueError, match=f"only accepted when starting the daemon: {name}"):
+            resolve_build_options({name: "elsewhere/bin"})
+
+
+class TestBuildDaemon:
+    """Tests for BuildDaemon over its socket."""
+
+    def test_ping(self, daemon):
+        """Test that a ping is answered with the daemon's state."""
+        (event,) = send_request(daemon.socket_path, {"command": "ping"}, timeout=10)
+
+        assert event["event"] == "pong"
+        assert event["builds"] == 0
+
+    @patch("marimushka.daemon.open_session", side_effect=_FakeSession)
+    def test_build_streams_progress_and_result(self, mock_open, daemon, tmp_path):
+        """Test that a build reports start, progress and the batch result."""
+        request = {"command": "build", "options": {"output": "_site", "parallel": False}, "cwd": str(tmp_path)}
+
+        events = list(send_request(daemon.socket_path, request, timeout=10))
+
+        assert [e["event"] for e in events] == ["started", "progress", "result"]
+        assert events[1]["notebook"] == "demo.py"
+        assert events[2]["result"]["succeeded"] == 1
+        assert events[2]["result"]["results"][0]["output_path"] == str(tmp_path / "_site" / "demo.html")
+        assert mock_open.call_args.kwargs["output"] == str(tmp_path / "_site")
+        assert mock_open.call_args.kwargs["worker_pool"] is None
+        assert mock_open.call_args.kwargs["bin_path"] is None
+        assert "since" not in mock_open.call_args.kwargs
+
+    @patch("marimushka.daemon.open_session", side_effect=_FakeSession)
+    def test_daemon_options_applied_to_builds(self, mock_open, tmp_path):
+        """Test that the executable options given to the daemon reach every build."""
+        build_daemon = BuildDaemon(tmp_path / "d.sock", bin_path=tmp_path / "bin", index_url="https://mirror/simple")
+        thread = _serve(build_daemon)
+
+        list(send_request(build_daemon.socket_path, {"command": "build", "options": {"output": "_site"}}, timeout=10))
+        build_daemon.shutdown()
+        thread.join(10)
+
+        assert mock_open.call_args.kwargs["bin_path"] == str(tmp_path / "bin")
+        assert mock_open.call_args.kwargs["index_url"] == "https://mirror/simple"
+
+    def test_executable_options_refused_from_requests(self, daemon):
+        """Test that a request naming its own uvx is refused without running a build."""
+        request = {"command": "build", "options": {"bin_path": "elsewhere/bin"}}
+
+        (event,) = send_request(daemon.socket_path, request, timeout=10)
+
+        assert event["event"] == "error"
+        assert "bin_path" in event["message"]
+        assert daemon.builds == 0
+
+    @patch("marimushka.daemon.open_session", side_effect=TemplateNotFoundError(Path("missing.j2")))
+    def test_build_error(self, mock_open, daemon):
+        """Test that a failing build reports the error type and keeps the daemon running."""
+        events = list(send_request(daemon.socket_path, {"command": "build", "options": {}}, timeout=10))
+
+        assert events[-1]["event"] == "error"
+        assert events[-1]["error"] == "TemplateNotFoundError"
+        assert next(send_request(daemon.socket_path, {"command": "ping"}, timeout=10))["builds"] == 1
+
+    def test_invalid_requests(self, daemon):
+        """Test that unknown options and commands are reported without running a build."""
+        (unknown_option,) = send_request(daemon.socket_path, {"command": "build", "options": {"colour": 1}}, timeout=10)
+        (unknown_command,) = send_request(daemon.socket_path, {"command": "deploy"}, timeout=10)
+
+        assert unknown_option["event"] == "error"
+        assert unknown_command["event"] == "error"
+        assert daemon.builds == 0
+
+    @patch("marimushka.daemon.open_session", side_effect=_FakeSession)
+    def test_worker_pool_reused_across_builds(self, mock_open, daemon):
+        """Test that workers-engine builds with the same limits share one warm pool."""
+        for output in ("_site", "_other"):
+            request = {"command": "build", "options": {"engine": "workers", "max_workers": 2, "output": output}}
+            list(send_request(daemon.socket_path, request, timeout=10))
+
+        first, second = (call.kwargs["worker_pool"] for call in mock_open.call_args_list)
+        assert first is not None
+        assert first is second
+
+    def test_session_reused_per_configuration(self, tmp_path):
+        """Test that builds with the same configuration share one session and since is passed per build."""
+        sessions = []
+
+        def open_session(**options):
+            sessions.append(_FakeSession(**options))
+            return sessions[-1]
+
+        build_daemon = BuildDaemon(tmp_path / "d.sock")
+        thread = _serve(build_daemon)
+        with patch("marimushka.daemon.open_session", side_effect=open_session):
+            for options in ({"output": "_site"}, {"output": "_site", "since": "main"}, {"output": "_other"}):
+                list(send_request(build_daemon.socket_path, {"command": "build", "options": options}, timeout=10))
+        build_daemon.shutdown()
+        thread.join(10)
+
+        assert [session.options["output"] for session in sessions] == ["_site", "_other"]
+        assert sessions[0].builds == [None, "main"]
+        assert all(session.closed for session in sessions)
+
+    def test_shutdown(self, tmp_path):
+        """Test that the shutdown command stops the daemon and removes its socket."""
+        build_daemon = BuildDaemon(tmp_path / "d.sock")
+        thread = _serve(build_daemon)
+
+        (event,) = send_request(build_daemon.socket_path, {"command": "shutdown"}, timeout=10)
+        thread.join(10)
+
+        assert event["event"] == "stopping"
+        assert not thread.is_alive()
+        assert not build_daemon.socket_path.exists()
+
+    def test_refuses_socket_in_use(self, daemon):
+        """Test that a second daemon does not take over a live socket."""
+        with pytest.raises(OSError, match="already listening"):
+            BuildDaemon(daemon.socket_path).serve_forever()
+
+    def test_replaces_stale_socket(self, tmp_path):
+        """Test that a socket file left behind by a stopped daemon is replaced."""
+        socket_path = tmp_path / "d.sock"
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+            stale.bind(str(socket_path))
+        build_daemon = BuildDaemon(socket_path)
+        build_daemon.shutdown()
+
+        thread = threading.Thread(target=build_daemon.serve_forever, daemon=True)
+        thread.start()
+        while build_daemon._server is None:
+            time.sleep(0.01)
+        (event,) = send_request(socket_path, {"command": "ping"}, timeout=10)
+        build_daemon.shutdown()
+        thread.join(10)
+
+        assert event["event"] == "pong"
+        assert not socket_path.exists()
+
+    def test_malformed_lines(self, daemon):
+        """Test that blank lines are skipped and lines that are not JSON objects are reported."""
+        events = _send_lines(daemon.socket_path, b'\nnot json\n[1, 2]\n{"command": "ping"}\n')
+
+        assert [(e["event"], e.get("error")) for e in events] == [
+            ("error", "JSONDecodeError"),
+            ("error", "ValueError"),
+            ("pong", None),
+        ]
+
+    def test_build_queued_behind_running_build(self, daemon):
+        """Test that a request arriving during a build is told it waits, then runs."""
+        running, release = threading.Event(), threading.Event()
+
+        class BlockingSession(_FakeSession):
+            def build(self, **kwargs):
+                """Hold the build lock until the test releases the build."""
+                running.set()
+                assert release.wait(10)
+                return super().build(**kwargs)
+
+        request = {"command": "build", "options": {"output": "_site"}}
+        with patch("marimushka.daemon.open_session", side_effect=BlockingSession):
+            first = threading.Thread(target=lambda: list(send_request(daemon.socket_path, request, timeout=10)))
+            first.start()
+            assert running.wait(10)
+            second = send_request(daemon.socket_path, request, timeout=10)
+            assert next(second)["event"] == "queued"
+            release.set()
+            assert [e["event"] for e in second] == ["started", "progress", "result"]
+            first.join(10)
+
+        assert daemon.builds == 2
+
+    def test_least_recently_used_session_closed(self, daemon):
+        """Test that sessions beyond MAX_SESSIONS are closed, the least recently used first."""
+        sessions = []
+
+        def open_session(**options):
+            sessions.append(_FakeSession(**options))
+            return sessions[-1]
+
+        with (
+            patch("marimushka.daemon.open_session", side_effect=open_session),
+            patch("marimushka.daemon.MAX_SESSIONS", 1),
+        ):
+            for output in ("_site", "_other"):
+                list(send_request(daemon.socket_path, {"command": "build", "options": {"output": output}}, timeout=10))
+
+        assert [session.closed for session in sessions] == [True, False]
+
+    def test_client_disconnect_during_build(self, daemon):
+        """Test that a build whose client went away finishes and the daemon keeps serving."""
+        disconnected, finished = threading.Event(), threading.Event()
+
+        class SlowSession(_FakeSession):
+            def build(self, **kwargs):
+                """Report progress and the result only after the client disconnected."""
+                assert disconnected.wait(10)
+                try:
+                    return super().build(**kwargs)
+                finally:
+                    finished.set()
+
+        with patch("marimushka.daemon.open_session", side_effect=SlowSession):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(str(daemon.socket_path))
+            client.sendall(b'{"command": "build", "options": {"output": "_site"}}\n{"command": "ping"}\n')
+            assert client.recv(1024)
+            client.close()
+            disconnected.set()
+            assert finished.wait(10)
+
+        assert next(send_request(daemon.socket_path, {"command": "ping"}, timeout=10))["builds"] == 1
+
+
+class TestSocketPermissions:
+    """Tests for the location and permissions of the daemon's socket."""
+
+    def test_socket_bound_private(self, daemon):
+        """Test that the socket is only accessible to its owner."""
+        assert stat.S_IMODE(daemon.socket_path.stat().st_mode) == 0o600
+
+    def test_default_socket_in_runtime_dir(self, monkeypatch, tmp_path):
+        """Test that the default socket lives in $XDG_RUNTIME_DIR when it is set."""
+        monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+
+        assert _default_socket() == tmp_path / "marimushka" / "daemon.sock"
+
+    def test_default_socket_directory_created_private(self, tmp_path):
+        """Test that the directory of the default socket is created with mode 0700."""
+        socket_path = tmp_path / "marimushka" / "daemon.sock"
+        with patch("marimushka.daemon.DEFAULT_SOCKET", socket_path):
+            build_daemon = BuildDaemon(socket_path)
+            thread = _serve(build_daemon)
+            build_daemon.shutdown()
+            thread.join(10)
+
+        assert stat.S_IMODE(socket_path.parent.stat().st_mode) == 0o700
+
+    def test_refuses_shared_default_directory(self, tmp_path):
+        """Test that the daemon does not listen in a default directory others can access."""
+        socket_path = tmp_path / "marimushka" / "daemon.sock"
+        socket_path.parent.mkdir()
+        socket_path.parent.chmod(0o777)
+
+        with (
+            patch("marimushka.daemon.DEFAULT_SOCKET", socket_path),
+            pytest.raises(OSError, match="mode 0700"),
+        ):
+            BuildDaemon(socket_path).serve_forever()
+
+        assert not socket_path.exists()
+
+
+class TestDaemonCommand:
+    """Tests for the daemon command."""
+
+    @staticmethod
+    def _run(socket_path=None):
+        """Run the daemon command with its defaults."""
+        daemon_command(socket_path=socket_path, bin_path="bin", index_url=None, find_links=None, debug=False)
+
+    @patch("marimushka.cli.rich_print")
+    @patch("marimushka.daemon.BuildDaemon")
+    def test_starts_daemon(self, mock_daemon, mock_print, tmp_path):
+        """Test that the daemon listens on the given socket with the executable options."""
+        self._run(str(tmp_path / "d.sock"))
+
+        mock_daemon.assert_called_once_with(tmp_path / "d.sock", bin_path="bin", index_url=None, find_links=None)
+        mock_daemon.return_value.serve_forever.assert_called_once_with()
+
+    @patch("marimushka.cli.rich_print")
+    @patch("marimushka.daemon.BuildDaemon")
+    def test_default_socket_and_interrupt(self, mock_daemon, mock_print):
+        """Test that the default socket is used and Ctrl+C stops the daemon cleanly."""
+        mock_daemon.return_value.serve_forever.side_effect = KeyboardInterrupt
+
+        self._run()
+
+        assert mock_daemon.call_args.args[0] == DEFAULT_SOCKET
+        assert "stopped" in mock_print.call_args.args[0]
+
+    @patch("marimushka.cli.rich_print")
+    @patch("marimushka.daemon.BuildDaemon")
+    def test_socket_error_exits(self, mock_daemon, mock_print):
+        """Test that a socket that cannot be used ends the command with exit code 1."""
+        mock_daemon.return_value.serve_forever.side_effect = OSError("A daemon is already listening")
+
+        with pytest.raises(typer.Exit) as exc_info:
+            self._run()
+
+        assert exc_info.value.exit_code == 1
+        assert "already listening" in mock_print.call_args.args[0]
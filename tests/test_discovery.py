@@ -0,0 +1,205 @@
+"""Tests for the discovery.py module.
+
+This module contains tests for finding notebooks in nested folders: ignore
+files, include and exclude patterns, and the notebooks folder2notebooks
+creates from them.
+"""
+
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka.discovery import IGNORE_FILENAME, IgnoreRule, is_ignored, parse_patterns, scan_folder
+from marimushka.exceptions import NotebookInvalidError
+from marimushka.export import main
+from marimushka.notebook import Kind, Notebook, folder2notebooks
+
+NOTEBOOK = "import marimo\n\napp = marimo.App()\n"
+
+
+def _tree(root: Path, *files: str) -> Path:
+    """Create minimal notebooks below root and return root."""
+    for name in files:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(NOTEBOOK)
+    return root
+
+
+class TestIgnoreRule:
+    """Tests for IgnoreRule and is_ignored."""
+
+    def test_parse(self):
+        """Test that comments are skipped and negation, directories and anchoring are parsed."""
+        assert IgnoreRule.parse("# comment") is None
+        assert IgnoreRule.parse("   ") is None
+        assert IgnoreRule.parse("/") is None
+        assert IgnoreRule.parse("!drafts/", "team") == IgnoreRule("drafts", "team", True, True, False)
+        assert IgnoreRule.parse("/scratch.py").anchored is True
+
+    def test_name_and_path_patterns(self):
+        """Test that patterns without a slash match names at any depth, others relative paths."""
+        by_name = IgnoreRule.parse("draft_*.py")
+        by_path = IgnoreRule.parse("team/draft_*.py")
+
+        assert by_name.matches("team/sub/draft_1.py", False)
+        assert not by_path.matches("other/team/draft_1.py", False)
+        assert by_path.matches("team/draft_1.py", False)
+
+    def test_base_and_directory_only(self):
+        """Test that rules of a nested ignore file only apply below its directory."""
+        rule = IgnoreRule.parse("data/", "team")
+
+        assert rule.matches("team/data", True)
+        assert not rule.matches("team/data", False)
+        assert not rule.matches("other/data", True)
+
+    def test_last_match_wins(self):
+        """Test that a later negated pattern re-includes a path."""
+        rules = parse_patterns(["*.py", "!keep.py"])
+
+        assert is_ignored(rules, "drop.py", False)
+        assert not is_ignored(rules, "keep.py", False)
+
+
+class TestScanFolder:
+    """Tests for scan_folder."""
+
+    def test_top_level_only_by_default(self, tmp_path):
+        """Test that without recursion only the folder's own Python files are found."""
+        _tree(tmp_path, "b.py", "a.py", "readme.md", "team/c.py")
+
+        assert scan_folder(tmp_path) == [Path("a.py"), Path("b.py")]
+
+    def test_recursive(self, tmp_path):
+        """Test that nested notebooks are found, skipping hidden, public and cache directories."""
+        _tree(
+            tmp_path,
+            "a.py",
+            "team/b.py",
+            "team/sub/c.py",
+            ".hidden/d.py",
+            "public/e.py",
+            "team/__pycache__/f.py",
+            "team/__marimo__/g.py",
+        )
+
+        assert scan_folder(tmp_path, recursive=True) == [Path("a.py"), Path("team/b.py"), Path("team/sub/c.py")]
+
+    def test_ignore_files(self, tmp_path):
+        """Test that ignore files apply to their directory and below, and nested files add rules."""
+        _tree(tmp_path, "a.py", "drafts/b.py", "team/c.py", "team/scratch.py", "team/sub/scratch.py")
+        (tmp_path / IGNORE_FILENAME).write_text("# drafts are private\ndrafts/\nscratch.py\n")
+        (tmp_path / "team" / "sub" / IGNORE_FILENAME).write_text("!scratch.py\n")
+
+        assert scan_folder(tmp_path, recursive=True) == [Path("a.py"), Path("team/c.py"), Path("team/sub/scratch.py")]
+
+    def test_include_and_exclude(self, tmp_path):
+        """Test that exclude patterns prune directories and include patterns select files."""
+        _tree(tmp_path, "a_demo.py", "b.py", "team/c_demo.py", "old/d_demo.py")
+
+        found = scan_folder(tmp_path, recursive=True, include=["*_demo.py"], exclude=["old"])
+
+        assert found == [Path("a_demo.py"), Path("team/c_demo.py")]
+
+    def test_missing_folder(self, tmp_path):
+        """Test that a missing folder has no notebooks."""
+        assert scan_folder(tmp_path / "missing", recursive=True) == []
+
+    def test_unreadable_ignore_file(self, tmp_path):
+        """Test that an ignore file that cannot be decoded adds no rules."""
+        _tree(tmp_path, "a.py")
+        (tmp_path / IGNORE_FILENAME).write_bytes(b"\xff\xfe*.py\n")
+
+        assert scan_folder(tmp_path) == [Path("a.py")]
+
+    def test_unscannable_folder(self, tmp_path):
+        """Test that a folder that cannot be listed has no notebooks."""
+        (tmp_path / "file.py").write_text(NOTEBOOK)
+
+        assert scan_folder(tmp_path / "file.py") == []
+
+    def test_entries_that_cannot_be_inspected_skipped(self, tmp_path):
+        """Test that entries whose type cannot be determined are skipped."""
+        entry = MagicMock()
+        entry.name = "a.py"
+        entry.is_dir.side_effect = OSError("stale file handle")
+
+        with patch("marimushka.discovery.os.scandir") as mock_scandir:
+            mock_scandir.return_value.__enter__.return_value = iter([entry])
+            assert scan_folder(tmp_path) == []
+
+
+class TestFolder2NotebooksRecursive:
+    """Tests for recursive folder2notebooks."""
+
+    def test_subdirectories_mirrored(self, tmp_path):
+        """Test that nested notebooks keep their directory in their export path."""
+        _tree(tmp_path, "a.py", "team/sub/b.py")
+
+        top, nested = folder2notebooks(tmp_path, Kind.APP, recursive=True)
+
+        assert top.html_path == Path("apps/a.html")
+        assert nested.path == tmp_path / "team" / "sub" / "b.py"
+        assert nested.html_path == Path("apps/team/sub/b.html")
+
+    def test_files_not_checked_again(self, tmp_path):
+        """Test that discovered notebooks are created without checking their files again."""
+        _tree(tmp_path, "a.py", "team/b.py")
+
+        with patch.object(Path, "exists") as mock_exists, patch.object(Path, "is_file") as mock_is_file:
+            notebooks = folder2notebooks(tmp_path, recursive=True)
+
+        assert len(notebooks) == 2
+        mock_exists.assert_not_called()
+        mock_is_file.assert_not_called()
+
+    def test_non_notebooks_skipped(self, tmp_path):
+        """Test that Python files without a marimo app are not notebooks unless checks are off."""
+        _tree(tmp_path, "a.py")
+        (tmp_path / "helpers.py").write_text("def helper():\n    return 1\n")
+        (tmp_path / "__init__.py").touch()
+
+        assert [nb.path.name for nb in folder2notebooks(tmp_path)] == ["a.py"]
+        assert len(folder2notebooks(tmp_path, check=False)) == 3
+
+    def test_unreadable_files_skipped(self, tmp_path):
+        """Test that files that cannot be checked are skipped."""
+        _tree(tmp_path, "a.py")
+
+        with patch("marimushka.precheck.SourceCheckCache.get", side_effect=PermissionError("denied")):
+            assert folder2notebooks(tmp_path) == []
+
+    def test_notebooks_with_syntax_errors_kept(self, tmp_path):
+        """Test that a notebook that does not compile is still discovered, so its export reports the error."""
+        (tmp_path / "broken.py").write_text(NOTEBOOK + "def (:\n")
+
+        assert [nb.path.name for nb in folder2notebooks(tmp_path)] == ["broken.py"]
+
+    @patch("marimushka.export.generate_index")
+    def test_main_recursive(self, mock_generate_index, tmp_path):
+        """Test that main passes the nested notebooks matching the include and exclude patterns."""
+        _tree(tmp_path / "notebooks", "a.py", "team/b.py", "old/c.py")
+        template = tmp_path / "index.html.j2"
+        template.write_text("")
+
+        main(
+            output=tmp_path / "_site",
+            template=template,
+            notebooks=tmp_path / "notebooks",
+            apps="",
+            notebooks_wasm="",
+            recursive=True,
+            exclude=["old"],
+        )
+
+        notebooks = mock_generate_index.call_args.kwargs["notebooks"]
+        assert [nb.html_path.as_posix() for nb in notebooks] == ["notebooks/a.html", "notebooks/team/b.html"]
+
+    def test_subdir_must_stay_inside(self, tmp_path):
+        """Test that a subdirectory leaving the output directory is rejected."""
+        _tree(tmp_path, "a.py")
+
+        with pytest.raises(NotebookInvalidError, match="leaves the output directory"):
+            Notebook(tmp_path / "a.py", subdir=Path("../elsewhere"))
@@ -0,0 +1,534 @@
+"""Tests for the environments.py module.
+
+This module contains tests for PEP 723 metadata parsing, dependency set
+normalization and the pool of shared sandbox environments. Environments are
+created by a fake ``uv`` executable.
+"""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+import typer
+
+from marimushka.cli import prefetch_command
+from marimushka.environments import (
+    ENV_MARKER,
+    DependencySet,
+    EnvironmentPool,
+    PrefetchResult,
+    _directory_size,
+    dependency_set,
+    normalize_requirement,
+    parse_script_metadata,
+    resolve_uv,
+)
+from marimushka.exceptions import ExportEnvironmentError
+from marimushka.export import main, prefetch_environments
+from marimushka.notebook import Notebook
+from marimushka.process import ProcessResult, ProcessTreeTimeoutExpired
+
+PENGUINS_HEADER = """# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "marimo>=0.18",
+#     "polars>=1.30.0",
+# ]
+# ///
+import marimo
+
+app = marimo.App()
+"""
+
+
+def _calls(fake_uv):
+    """Return the argument lists the fake uv was called with."""
+    log = Path(fake_uv).with_name("calls.log")
+    return [line.split() for line in log.read_text().splitlines()] if log.exists() else []
+
+
+def _write_notebooks(folder, dependencies):
+    """Write one notebook per dependency list and return the folder."""
+    folder.mkdir()
+    for i, deps in enumerate(dependencies):
+        header = ", ".join(f'"{dep}"' for dep in deps)
+        (folder / f"nb{i}.py").write_text(
+            f"# /// script\n# dependencies = [{header}]\n# ///\nimport marimo\n\napp = marimo.App()\n"
+        )
+    return folder
+
+
+def _age(env_dir, seconds):
+    """Make an environment look unused for the given number of seconds."""
+    marker = env_dir / ENV_MARKER
+    past = marker.stat().st_mtime - seconds
+    os.utime(marker, (past, past))
+
+
+def _set_size(env_dir, size):
+    """Record a size in bytes in an environment's marker."""
+    marker = env_dir / ENV_MARKER
+    mtime = marker.stat().st_mtime
+    info = json.loads(marker.read_text())
+    info["size"] = size
+    marker.write_text(json.dumps(info))
+    os.utime(marker, (mtime, mtime))
+
+
+class TestScriptMetadata:
+    """Tests for parsing and normalizing inline script metadata."""
+
+    def test_parse(self):
+        """Test that the script block is parsed as TOML."""
+        metadata = parse_script_metadata(PENGUINS_HEADER)
+        assert metadata == {"requires-python": ">=3.12", "dependencies": ["marimo>=0.18", "polars>=1.30.0"]}
+
+    def test_parse_without_block(self):
+        """Test that sources without a script block have no metadata."""
+        assert parse_script_metadata("import marimo\n") is None
+
+    def test_parse_invalid_toml(self):
+        """Test that a malformed block is ignored."""
+        assert parse_script_metadata("# /// script\n# dependencies = [\n# ///\n") is None
+
+    def test_parse_rejects_two_blocks(self):
+        """Test that more than one script block is ignored, as PEP 723 requires."""
+        assert parse_script_metadata(PENGUINS_HEADER + PENGUINS_HEADER) is None
+
+    def test_equivalent_spellings_share_a_key(self):
+        """Test that order, duplicates, case and whitespace do not change the key."""
+        a = DependencySet.from_metadata({"dependencies": ["Polars >= 1.30", "scikit_learn", "polars>=1.30"]})
+        b = DependencySet.from_metadata({"dependencies": ["scikit-learn", "polars>=1.30"]})
+        assert a == b
+        assert a.key == b.key
+
+    def test_requires_python_changes_key(self):
+        """Test that requires-python is part of the key."""
+        a = DependencySet.from_metadata({"dependencies": ["polars"]})
+        b = DependencySet.from_metadata({"dependencies": ["polars"], "requires-python": ">=3.12"})
+        assert a.key != b.key
+
+    def test_requirements_include_marimo(self):
+        """Test that marimo is installed even if the notebook does not declare it."""
+        assert DependencySet(("polars",)).requirements == ["marimo", "polars"]
+        assert DependencySet(("marimo>=0.18", "polars")).requirements == ["marimo>=0.18", "polars"]
+
+    def test_normalize_requirement_keeps_extras(self):
+        """Test that extras and markers survive normalization."""
+        assert normalize_requirement("Marimo[SQL] >= 0.18") == "marimo[SQL]>=0.18"
+
+    def test_normalize_requirement_without_name(self):
+        """Test that requirements not starting with a name are only stripped of whitespace."""
+        assert normalize_requirement(" ./local wheel ") == "./localwheel"
+
+    def test_dependency_set_of_resource_notebook(self, resource_dir):
+        """Test reading the dependencies of a notebook with a PEP 723 header."""
+        deps = dependency_set(Notebook(resource_dir / "marimo" / "notebooks" / "penguins.py"))
+        assert deps.requires_python == ">=3.12"
+        assert "polars>=1.30.0" in deps.dependencies
+
+    def test_dependency_set_without_header(self, tmp_path):
+        """Test that notebooks without a header share the empty dependency set."""
+        path = tmp_path / "plain.py"
+        path.write_text("import marimo\n")
+        assert dependency_set(Notebook(path)) == DependencySet()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake uv is a POSIX script")
+class TestEnvironmentPool:
+    """Tests for the EnvironmentPool class."""
+
+    def test_created_once_and_reused(self, tmp_path, fake_uv):
+        """Test that one dependency set gets one environment."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+        deps = DependencySet(("polars",))
+
+        python = pool.ensure(deps)
+        assert pool.ensure(deps) == python
+
+        assert python == pool.path(deps) / "bin" / "python"
+        assert (pool.path(deps) / "installed.txt").read_text().split() == ["marimo", "polars"]
+        assert (pool.created, pool.reused) == (1, 1)
+
+    def test_pinned_marimo(self, tmp_path, fake_uv):
+        """Test that a pinned marimo version is installed unless the notebook names marimo itself."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv, marimo_version="0.18.4")
+        deps = DependencySet(("polars",))
+        own = DependencySet(("marimo>=0.17", "polars"))
+
+        pool.ensure(deps)
+        pool.ensure(own)
+
+        assert (pool.path(deps) / "installed.txt").read_text().split() == ["marimo==0.18.4", "polars"]
+        assert (pool.path(own) / "installed.txt").read_text().split() == ["marimo>=0.17", "polars"]
+        assert pool.path(deps) != EnvironmentPool(tmp_path / "envs", uv=fake_uv).path(deps)
+
+    def test_reused_across_builds(self, tmp_path, fake_uv):
+        """Test that environments persist for later pools on the same directory."""
+        deps = DependencySet(("polars",))
+        EnvironmentPool(tmp_path / "envs", uv=fake_uv).ensure(deps)
+
+        later = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+        later.ensure(deps)
+
+        assert (later.created, later.reused) == (0, 1)
+
+    def test_failure_raises_and_cleans_up(self, tmp_path, fake_uv):
+        """Test that a failed installation raises and leaves no partial environment."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        with pytest.raises(ExportEnvironmentError, match="No solution found"):
+            pool.ensure(DependencySet(("broken",)))
+
+        assert list((tmp_path / "envs").iterdir()) == []
+
+    def test_requires_python(self, tmp_path, fake_uv):
+        """Test that the environment is created for the Python version the notebook requires."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        pool.ensure(DependencySet(("polars",), requires_python=">=3.12"))
+
+        venv, _ = _calls(fake_uv)
+        assert venv[venv.index("--python") + 1] == ">=3.12"
+
+    def test_timeout(self, tmp_path):
+        """Test that a uv command that times out raises with the timeout."""
+        pool = EnvironmentPool(tmp_path / "envs", uv="uv", timeout=5)
+
+        with (
+            patch("marimushka.environments.run_process_tree", side_effect=ProcessTreeTimeoutExpired(["uv"], 5, 0)),
+            pytest.raises(ExportEnvironmentError, match="timed out after 5 seconds"),
+        ):
+            pool.ensure(DependencySet(("polars",)))
+
+    def test_created_concurrently(self, tmp_path, fake_uv):
+        """Test that an environment another build moved into place first is used."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+        deps = DependencySet(("polars",))
+
+        def other_build_first(self, target):
+            target.mkdir()
+            (target / ENV_MARKER).write_text("{}")
+            raise OSError("Directory not empty")  # noqa: TRY003
+
+        with patch.object(Path, "rename", other_build_first):
+            assert pool.ensure(deps) == pool.path(deps) / "bin" / "python"
+
+        assert [p.name for p in (tmp_path / "envs").iterdir()] == [pool.path(deps).name]
+
+    def test_move_failure(self, tmp_path, fake_uv):
+        """Test that an environment that cannot be moved into place raises and is cleaned up."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        with (
+            patch.object(Path, "rename", side_effect=OSError("Permission denied")),
+            pytest.raises(ExportEnvironmentError, match="Permission denied"),
+        ):
+            pool.ensure(DependencySet(("polars",)))
+
+        assert list((tmp_path / "envs").iterdir()) == []
+
+    def test_prune_without_environments(self, tmp_path):
+        """Test that pruning a pool whose directory does not exist removes nothing."""
+        assert EnvironmentPool(tmp_path / "envs", uv="uv").prune() == []
+
+    def test_directory_size_skips_vanished_files(self, tmp_path):
+        """Test that files that disappear while an environment is measured are not counted."""
+        (tmp_path / "a.txt").write_text("abc")
+
+        with patch("marimushka.environments.os.lstat", side_effect=FileNotFoundError):
+            assert _directory_size(tmp_path) == 0
+
+    def test_missing_uv(self, tmp_path):
+        """Test that a missing uv executable raises ExportEnvironmentError."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=str(tmp_path / "missing-uv"))
+        with pytest.raises(ExportEnvironmentError):
+            pool.ensure(DependencySet())
+
+    def test_prune_evicts_least_recently_used(self, tmp_path, fake_uv):
+        """Test that the oldest environments not used by this pool are removed first."""
+        envs = tmp_path / "envs"
+        old_pool = EnvironmentPool(envs, uv=fake_uv)
+        oldest, older = DependencySet(("a",)), DependencySet(("b",))
+        for age, deps in ((300, oldest), (200, older)):
+            old_pool.ensure(deps)
+            _set_size(old_pool.path(deps), 2 * 2**20)
+            _age(old_pool.path(deps), age)
+
+        pool = EnvironmentPool(envs, max_size_mb=3, uv=fake_uv)
+        current = DependencySet(("c",))
+        pool.ensure(current)
+
+        # Creating the new environment evicted the oldest one to fit the limit
+        assert not pool.path(oldest).exists()
+        assert pool.path(older).is_dir()
+
+        _set_size(pool.path(current), 2 * 2**20)
+        assert pool.prune() == [pool.path(older)]
+        assert pool.path(current).is_dir()
+
+    def test_released_environments_are_evicted(self, tmp_path, fake_uv):
+        """Test that an environment is protected until its last user releases it, as in a long-lived session."""
+        pool = EnvironmentPool(tmp_path / "envs", max_size_mb=1, uv=fake_uv)
+        deps = DependencySet(("a",))
+        pool.ensure(deps)
+        pool.ensure(deps)
+        _set_size(pool.path(deps), 2 * 2**20)
+
+        pool.release(deps)
+        assert pool.prune() == []
+
+        pool.release(deps)
+        assert pool.prune() == [pool.path(deps)]
+
+    def test_failed_creation_is_released(self, tmp_path, fake_uv):
+        """Test that an environment that could not be created is not kept in use."""
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        with pytest.raises(ExportEnvironmentError):
+            pool.ensure(DependencySet(("broken",)))
+
+        assert not pool._in_use
+
+    def test_index_options(self, tmp_path, fake_uv):
+        """Test that the index, wheelhouse and offline options reach uv."""
+        pool = EnvironmentPool(
+            tmp_path / "envs", uv=fake_uv, index_url="https://mirror/simple", find_links="wheels", offline=True
+        )
+        pool.ensure(DependencySet(("polars",)))
+
+        venv, install = _calls(fake_uv)
+        assert venv[0] == "venv"
+        assert "--offline" in venv
+        assert install[:2] == ["pip", "install"]
+        assert install[install.index("--index-url") + 1] == "https://mirror/simple"
+        assert install[install.index("--find-links") + 1] == "wheels"
+        assert "--offline" in install
+
+    def test_resolve_uv(self, tmp_path, fake_uv):
+        """Test that uv is taken from bin_path when it is there."""
+        assert resolve_uv(Path(fake_uv).parent) == fake_uv
+        assert resolve_uv(tmp_path) == "uv"
+        assert resolve_uv() == "uv"
+
+
+class TestSharedEnvironmentExport:
+    """Tests for exporting notebooks in shared environments."""
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_export_uses_environment_interpreter(self, mock_run, tmp_path):
+        """Test that sandboxed exports run marimo from the shared environment."""
+        path = tmp_path / "demo.py"
+        path.write_text(PENGUINS_HEADER)
+        mock_run.return_value = ProcessResult([], 0, "", "")
+        pool = MagicMock()
+        pool.ensure.return_value = Path("/envs/abc/bin/python")
+
+        result = Notebook(path).export(tmp_path / "out", environments=pool)
+
+        assert result.success
+        cmd = mock_run.call_args.args[0]
+        assert cmd[:5] == ["/envs/abc/bin/python", "-m", "marimo", "export", "html"]
+        assert "--no-sandbox" in cmd
+        assert pool.ensure.call_args.args[0].requires_python == ">=3.12"
+        pool.release.assert_called_once_with(pool.ensure.call_args.args[0])
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_falls_back_to_sandbox(self, mock_run, tmp_path):
+        """Test that a failed environment falls back to marimo's own sandbox."""
+        path = tmp_path / "demo.py"
+        path.write_text(PENGUINS_HEADER)
+        mock_run.return_value = ProcessResult([], 0, "", "")
+        pool = MagicMock()
+        pool.ensure.side_effect = ExportEnvironmentError("abc", "No solution found")
+
+        assert Notebook(path).export(tmp_path / "out", environments=pool).success
+
+        cmd = mock_run.call_args.args[0]
+        assert cmd[:2] == ["uvx", "marimo"]
+        assert "--sandbox" in cmd
+
+    def test_async_falls_back_to_sandbox(self, fake_uvx, tmp_path):
+        """Test that the asyncio export prepares the environment and falls back like export()."""
+        path = tmp_path / "demo.py"
+        path.write_text(PENGUINS_HEADER)
+        pool = MagicMock()
+        pool.ensure.side_effect = ExportEnvironmentError("abc", "No solution found")
+
+        result = asyncio.run(Notebook(path).export_async(tmp_path / "out", bin_path=fake_uvx, environments=pool))
+
+        assert result.success
+        pool.ensure.assert_called_once()
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_ignored_without_sandbox(self, mock_run, tmp_path):
+        """Test that --no-sandbox exports do not create environments."""
+        path = tmp_path / "demo.py"
+        path.write_text(PENGUINS_HEADER)
+        mock_run.return_value = ProcessResult([], 0, "", "")
+        pool = MagicMock()
+
+        Notebook(path).export(tmp_path / "out", sandbox=False, environments=pool)
+
+        pool.ensure.assert_not_called()
+        assert mock_run.call_args.args[0][:2] == ["uvx", "marimo"]
+
+    def test_build_exports_in_environments(self, site, fake_export, export_site):
+        """Test that a build with a pool exports every sandboxed notebook in a shared environment."""
+        pool = MagicMock(created=1, reused=1)
+        pool.ensure.return_value = Path("/envs/abc/bin/python")
+
+        export_site(environments=pool)
+
+        assert pool.ensure.call_count == 2
+        assert all(c.args[0][0] == "/envs/abc/bin/python" for c in fake_export.call_args_list)
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_creates_pool_in_cache_dir(self, mock_generate_index, tmp_path):
+        """Test that main keeps shared environments inside the cache directory."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        (folder / "demo.py").write_text(PENGUINS_HEADER)
+
+        main(notebooks=folder, apps="", notebooks_wasm="", cache_dir=tmp_path / "cache", shared_envs=True)
+
+        environments = mock_generate_index.call_args.kwargs["environments"]
+        assert environments.root == tmp_path / "cache" / "envs"
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_requires_cache_dir(self, mock_generate_index, tmp_path):
+        """Test that shared environments are skipped without a cache directory."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        (folder / "demo.py").write_text(PENGUINS_HEADER)
+
+        main(notebooks=folder, apps="", notebooks_wasm="", shared_envs=True)
+
+        assert mock_generate_index.call_args.kwargs["environments"] is None
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake uv is a POSIX script")
+class TestPrefetch:
+    """Tests for creating the environments of all notebooks ahead of the export."""
+
+    def test_each_dependency_set_installed_once(self, tmp_path, fake_uv):
+        """Test that notebooks sharing dependencies are installed only once."""
+        folder = _write_notebooks(tmp_path / "notebooks", [["polars"], ["pandas"], ["polars"]])
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        result = pool.prefetch([Notebook(path) for path in sorted(folder.glob("*.py"))], max_workers=2)
+
+        assert (result.environments, result.succeeded, result.failures) == (2, 2, [])
+        assert pool.created == 2
+        assert [call[:2] for call in _calls(fake_uv)].count(["pip", "install"]) == 2
+        assert not pool._in_use
+
+    def test_failures_are_collected(self, tmp_path, fake_uv):
+        """Test that a failing dependency set does not stop the others."""
+        folder = _write_notebooks(tmp_path / "notebooks", [["broken"], ["polars"]])
+        pool = EnvironmentPool(tmp_path / "envs", uv=fake_uv)
+
+        result = pool.prefetch(Notebook(path) for path in folder.glob("*.py"))
+
+        assert result.succeeded == 1
+        assert len(result.failures) == 1
+        assert "No solution found" in result.failures[0].stderr
+
+    def test_prefetch_environments(self, tmp_path, fake_uv):
+        """Test prefetching the notebooks of all folders into the cache directory."""
+        _write_notebooks(tmp_path / "notebooks", [["polars"]])
+        _write_notebooks(tmp_path / "apps", [["polars"], ["altair"]])
+
+        result = prefetch_environments(
+            tmp_path / "cache",
+            notebooks=tmp_path / "notebooks",
+            apps=tmp_path / "apps",
+            notebooks_wasm="",
+            bin_path=Path(fake_uv).parent,
+        )
+
+        assert result.environments == 2
+        assert len(list((tmp_path / "cache" / "envs").iterdir())) == 2
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_prefetches_before_export(self, mock_generate_index, tmp_path, fake_uv):
+        """Test that main(prefetch=True) creates every environment before exporting."""
+        folder = _write_notebooks(tmp_path / "notebooks", [["polars"], ["pandas"]])
+
+        main(
+            notebooks=folder,
+            apps="",
+            notebooks_wasm="",
+            cache_dir=tmp_path / "cache",
+            bin_path=Path(fake_uv).parent,
+            prefetch=True,
+        )
+
+        environments = mock_generate_index.call_args.kwargs["environments"]
+        assert environments.created == 2
+        assert len(list(environments.root.iterdir())) == 2
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_pins_marimo_in_shared_environments(self, mock_generate_index, tmp_path, fake_uv):
+        """Test that shared environments install the pinned marimo version the build records."""
+        folder = _write_notebooks(tmp_path / "notebooks", [["polars"]])
+
+        main(
+            notebooks=folder,
+            apps="",
+            notebooks_wasm="",
+            cache_dir=tmp_path / "cache",
+            bin_path=Path(fake_uv).parent,
+            shared_envs=True,
+            prefetch=True,
+            marimo_version="0.18.4",
+        )
+
+        kwargs = mock_generate_index.call_args.kwargs
+        assert kwargs["marimo_tool"].version == "0.18.4"
+        (environment,) = kwargs["environments"].root.iterdir()
+        assert (environment / "installed.txt").read_text().split() == ["marimo==0.18.4", "polars"]
+
+    @staticmethod
+    def _run_command():
+        """Run the prefetch command with a wheelhouse and offline installs."""
+        prefetch_command(
+            cache_dir=".cache",
+            notebooks="notebooks",
+            apps="apps",
+            notebooks_wasm="notebooks_wasm",
+            bin_path=None,
+            max_workers=4,
+            env_cache_size=5120,
+            index_url=None,
+            find_links="wheels",
+            offline=True,
+            marimo_version=None,
+            recursive=False,
+            include=None,
+            exclude=None,
+            debug=False,
+        )
+
+    @patch("marimushka.export.prefetch_environments")
+    def test_command_fails_on_errors(self, mock_prefetch):
+        """Test that the prefetch command exits with status 1 if an environment failed."""
+        mock_prefetch.return_value = PrefetchResult(2, [ExportEnvironmentError("abc", "No solution found")])
+
+        with pytest.raises(typer.Exit) as exc_info:
+            self._run_command()
+
+        assert exc_info.value.exit_code == 1
+        assert mock_prefetch.call_args.kwargs["find_links"] == "wheels"
+        assert mock_prefetch.call_args.kwargs["offline"] is True
+
+    @patch("marimushka.cli.rich_print")
+    @patch("marimushka.export.prefetch_environments", return_value=PrefetchResult(2))
+    def test_command_reports_prepared_environments(self, mock_prefetch, mock_print):
+        """Test that the prefetch command reports the prepared environments."""
+        self._run_command()
+
+        mock_print.assert_called_once_with("[bold green]Prepared 2 environments[/bold green]")
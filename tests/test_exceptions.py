@@ -3,15 +3,19 @@
 This module contains tests for the custom exception hierarchy and result types.
 """
 
+import json
 from pathlib import Path
 
 import pytest
 
 from marimushka.exceptions import (
     BatchExportResult,
+    ExportCancelledError,
+    ExportEnvironmentError,
     ExportError,
     ExportExecutableNotFoundError,
     ExportSubprocessError,
+    GitDiffError,
     IndexWriteError,
     MarimushkaError,
     NotebookError,
@@ -199,6 +203,43 @@ class TestExportSubprocessError:
         assert len(str(error)) < 500
 
 
+class TestExportEnvironmentError:
+    """Tests for ExportEnvironmentError."""
+
+    def test_attributes(self):
+        """Test that the key is shortened and stderr is only shown if there is any."""
+        error = ExportEnvironmentError("ab" * 32, "No solution found")
+        assert isinstance(error, ExportError)
+        assert error.key == "ab" * 32
+        assert str(error) == "Failed to create export environment abababababab: No solution found"
+        assert str(ExportEnvironmentError("ab" * 32)) == "Failed to create export environment abababababab"
+
+
+class TestExportCancelledError:
+    """Tests for ExportCancelledError."""
+
+    def test_attributes(self):
+        """Test that attributes are set correctly."""
+        error = ExportCancelledError(Path("/notebooks/demo.py"), reaped=2)
+        assert isinstance(error, ExportError)
+        assert error.notebook_path == Path("/notebooks/demo.py")
+        assert error.reaped == 2
+        assert "demo.py was cancelled" in str(error)
+
+
+class TestGitDiffError:
+    """Tests for GitDiffError."""
+
+    def test_attributes(self):
+        """Test that attributes are set correctly and stderr is truncated."""
+        error = GitDiffError("origin/main", "git diff failed", "fatal: " + "x" * 300)
+        assert isinstance(error, MarimushkaError)
+        assert error.revision == "origin/main"
+        assert error.stderr.startswith("fatal: ")
+        assert "Cannot find changes since 'origin/main': git diff failed: fatal: " in str(error)
+        assert len(str(error)) < 300
+
+
 class TestIndexWriteError:
     """Tests for IndexWriteError."""
 
@@ -272,6 +313,20 @@ class TestBatchExportResult:
         assert batch.failed == 1
         assert batch.all_succeeded is False
 
+    def test_to_dict(self):
+        """Test that a batch converts to JSON-serializable data."""
+        batch = BatchExportResult()
+        batch.add(NotebookExportResult.succeeded(Path("/nb1.py"), Path("/out1.html"), cached=True))
+        batch.add(NotebookExportResult.failed(Path("/nb2.py"), ExportSubprocessError(Path("/nb2.py"), ["cmd"], 1)))
+
+        data = batch.to_dict()
+
+        assert json.loads(json.dumps(data)) == data
+        assert (data["total"], data["succeeded"], data["failed"], data["cached"]) == (2, 1, 1, 1)
+        assert data["results"][0]["output_path"] == "/out1.html"
+        assert data["results"][1]["error_type"] == "ExportSubprocessError"
+        assert "exit code 1" in data["results"][1]["error"]
+
     def test_failures_and_successes(self):
         """Test failures and successes properties."""
         batch = BatchExportResult()
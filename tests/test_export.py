@@ -9,9 +9,13 @@ This module contains tests for the functions in the export.py module:
 - cli
 """
 
+import asyncio
+import os
 import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import ANY, MagicMock, mock_open, patch
+from unittest.mock import ANY, AsyncMock, MagicMock, call, mock_open, patch
 
 import jinja2
 import pytest
@@ -20,8 +24,12 @@ from hypothesis import given
 from hypothesis import strategies as st
 
 from marimushka.audit import get_audit_logger
+from marimushka.config import MarimushkaConfig
+from marimushka.dependencies import Dependencies
+from marimushka.environments import DependencySet
 from marimushka.exceptions import (
     BatchExportResult,
+    ExportExecutableNotFoundError,
     ExportSubprocessError,
     IndexWriteError,
     NotebookExportResult,
@@ -29,15 +37,32 @@ from marimushka.exceptions import (
     TemplateNotFoundError,
     TemplateRenderError,
 )
-from marimushka.export import main
-from marimushka.notebook import Kind, folder2notebooks
+from marimushka.export import BuildSession, main, main_with_deps, open_session
+from marimushka.notebook import Kind, Notebook, folder2notebooks
 from marimushka.orchestrator import (
+    BUILTIN_TEMPLATE_DIR,
+    PRECOMPILED_TEMPLATES,
+    ExportJob,
+    _AffinityScheduler,
+    _bytecode_cache,
+    compile_builtin_templates,
+    create_template_environment,
+    export_all_notebooks,
+    export_all_notebooks_async,
+    export_jobs,
+    export_jobs_async,
     export_notebook,
     export_notebooks_parallel,
     export_notebooks_sequential,
     generate_index,
+    render_index_file,
+    render_template,
+    write_index_file,
 )
+from marimushka.security import validate_bin_path
+from marimushka.tool import install_marimo
 from marimushka.validators import validate_template
+from marimushka.watch import ChangeSet
 
 
 class TestFolder2Notebooks:
@@ -80,8 +105,8 @@ class TestFolder2Notebooks:
         # Create some test notebook files
         notebook1 = notebooks_folder / "notebook1.py"
         notebook2 = notebooks_folder / "notebook2.py"
-        notebook1.write_text("# Test notebook 1")
-        notebook2.write_text("# Test notebook 2")
+        notebook1.write_text("# Test notebook 1\nimport marimo\n\napp = marimo.App()\n")
+        notebook2.write_text("# Test notebook 2\nimport marimo\n\napp = marimo.App()\n")
 
         # Execute
         result = folder2notebooks(folder=notebooks_folder, kind=Kind.NB)
@@ -213,7 +238,17 @@ class TestExportNotebook:
         # Assert
         assert result is mock_result
         assert result.success is True
-        mock_notebook.export.assert_called_once_with(output_dir=output_dir, sandbox=True, bin_path=None, timeout=300)
+        mock_notebook.export.assert_called_once_with(
+            output_dir=output_dir,
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
 
     def test_export_notebook_failure(self):
         """Test notebook export failure."""
@@ -272,6 +307,7 @@ class TestExportNotebooksParallel:
             # Create a mock path with a name attribute
             mock_path = MagicMock()
             mock_path.name = f"notebook{i}.py"
+            mock_path.read_text.return_value = ""
             nb.path = mock_path
             if i != 1:  # Second notebook fails
                 nb.export.return_value = NotebookExportResult.succeeded(
@@ -319,7 +355,17 @@ class TestExportNotebooksSequential:
         assert result.all_succeeded is True
         # Verify all notebooks were exported
         for nb in mock_notebooks:
-            nb.export.assert_called_once_with(output_dir=Path("/output"), sandbox=True, bin_path=None, timeout=300)
+            nb.export.assert_called_once_with(
+                output_dir=Path("/output"),
+                sandbox=True,
+                bin_path=None,
+                timeout=300,
+                cache=None,
+                environments=None,
+                marimo_tool=None,
+                cancel=None,
+                executable=None,
+            )
 
     def test_export_notebooks_sequential_empty_list(self):
         """Test sequential export with empty list."""
@@ -332,13 +378,329 @@ class TestExportNotebooksSequential:
         assert result.failed == 0
 
 
+class TestExportJobs:
+    """Tests for the shared export work queue."""
+
+    @staticmethod
+    def _notebook(name):
+        """Create a mock notebook whose export succeeds."""
+        nb = MagicMock()
+        nb.path = Path(f"/{name}.py")
+        nb.export.return_value = NotebookExportResult.succeeded(nb.path, Path(f"/output/{name}.html"))
+        return nb
+
+    def test_export_jobs_routes_each_job_to_its_output_dir(self):
+        """Test that jobs of different kinds keep their own output directories."""
+        nb = self._notebook("nb")
+        app = self._notebook("app")
+
+        result = export_jobs(
+            [ExportJob(nb, Path("/output/notebooks")), ExportJob(app, Path("/output/apps"))],
+            sandbox=True,
+            bin_path=None,
+            max_workers=2,
+        )
+
+        assert result.succeeded == 2
+        nb.export.assert_called_once_with(
+            output_dir=Path("/output/notebooks"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+        app.export.assert_called_once_with(
+            output_dir=Path("/output/apps"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+
+    def test_export_jobs_advances_per_job_task(self):
+        """Test that each job advances the progress task it was scheduled with."""
+        progress = MagicMock()
+        jobs = [ExportJob(self._notebook("a"), Path("/out"), 1), ExportJob(self._notebook("b"), Path("/out"), 2)]
+
+        export_jobs(jobs, sandbox=True, bin_path=None, parallel=False, progress=progress)
+
+        assert [c.args for c in progress.advance.call_args_list] == [(1,), (2,)]
+
+    @patch("marimushka.orchestrator.ThreadPoolExecutor")
+    def test_export_all_notebooks_uses_one_pool(self, mock_executor):
+        """Test that all kinds are exported through a single thread pool."""
+        mock_executor.side_effect = ThreadPoolExecutor
+        notebooks = [self._notebook(f"nb{i}") for i in range(2)]
+        apps = [self._notebook("app")]
+        wasm = [self._notebook("wasm")]
+        progress_calls = []
+
+        result = export_all_notebooks(
+            Path("/output"),
+            notebooks,
+            apps,
+            wasm,
+            sandbox=True,
+            bin_path=None,
+            parallel=True,
+            max_workers=4,
+            on_progress=lambda done, total, name: progress_calls.append((done, total)),
+        )
+
+        mock_executor.assert_called_once_with(max_workers=4)
+        assert result.total == 4
+        assert result.succeeded == 4
+        assert sorted(progress_calls) == [(1, 4), (2, 4), (3, 4), (4, 4)]
+        wasm[0].export.assert_called_once_with(
+            output_dir=Path("/output/notebooks_wasm"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+
+
+class TestExportJobsAsync:
+    """Tests for the asyncio export engine."""
+
+    @staticmethod
+    def _notebook(name, delay=0.0, running=None):
+        """Create a mock notebook whose async export succeeds after a delay."""
+        nb = MagicMock()
+        nb.path = Path(f"/{name}.py")
+
+        async def export_async(**kwargs):
+            """Simulate an export while counting concurrent exports."""
+            if running is not None:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(delay)
+            if running is not None:
+                running["now"] -= 1
+            return NotebookExportResult.succeeded(nb.path, kwargs["output_dir"] / f"{name}.html")
+
+        nb.export_async.side_effect = export_async
+        return nb
+
+    def test_semaphore_bounds_concurrency(self):
+        """Test that no more than max_concurrency exports run at once."""
+        running = {"now": 0, "max": 0}
+        jobs = [ExportJob(self._notebook(f"nb{i}", 0.01, running), Path("/out")) for i in range(10)]
+
+        result = asyncio.run(export_jobs_async(jobs, sandbox=True, bin_path=None, max_concurrency=3))
+
+        assert result.succeeded == 10
+        assert running["max"] == 3
+
+    def test_no_jobs(self):
+        """Test that an empty batch returns an empty result."""
+        result = asyncio.run(export_jobs_async([], sandbox=True, bin_path=None))
+
+        assert result.total == 0
+
+    def test_export_all_notebooks_async(self):
+        """Test that all kinds are exported into their own directories."""
+        nb = self._notebook("nb")
+        app = self._notebook("app")
+        progress_calls = []
+
+        result = asyncio.run(
+            export_all_notebooks_async(
+                Path("/output"),
+                [nb],
+                [app],
+                [],
+                on_progress=lambda done, total, name: progress_calls.append((done, total)),
+            )
+        )
+
+        assert result.succeeded == 2
+        assert sorted(progress_calls) == [(1, 2), (2, 2)]
+        nb.export_async.assert_called_once_with(
+            output_dir=Path("/output/notebooks"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+        app.export_async.assert_called_once_with(
+            output_dir=Path("/output/apps"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+
+    def test_export_all_notebooks_async_empty(self):
+        """Test that an empty batch returns an empty result."""
+        result = asyncio.run(export_all_notebooks_async(Path("/output"), [], [], []))
+        assert result.total == 0
+
+    @patch("marimushka.orchestrator.export_all_notebooks")
+    @patch("marimushka.orchestrator.export_all_notebooks_async")
+    def test_generate_index_asyncio_engine(self, mock_async, mock_threads, tmp_path):
+        """Test that generate_index runs the asyncio engine when selected."""
+        mock_async.return_value = BatchExportResult()
+        template = tmp_path / "template.html.j2"
+        template.write_text("ok")
+
+        generate_index(output=tmp_path / "_site", template_file=template, engine="asyncio", max_workers=32)
+
+        mock_threads.assert_not_called()
+        mock_async.assert_called_once()
+        assert mock_async.call_args.kwargs["max_concurrency"] == 32
+
+    def test_generate_index_unknown_engine(self, tmp_path):
+        """Test that an unknown engine is rejected."""
+        with pytest.raises(ValueError, match="Unknown export engine"):
+            generate_index(output=tmp_path, template_file=tmp_path / "t.j2", engine="fibers")
+
+
+class TestAffinityScheduling:
+    """Tests for clustering sandboxed jobs by dependency set."""
+
+    @staticmethod
+    def _notebook(folder, name, dependencies):
+        """Create a mock notebook backed by a file declaring the given dependencies."""
+        path = folder / f"{name}.py"
+        deps = ", ".join(f'"{dep}"' for dep in dependencies)
+        path.write_text(f"# /// script\n# dependencies = [{deps}]\n# ///\nimport marimo\n")
+        nb = MagicMock()
+        nb.path = path
+        nb.export.return_value = NotebookExportResult.succeeded(path, Path(f"/output/{name}.html"))
+        return nb
+
+    def test_sequential_runs_clusters_back_to_back(self, tmp_path):
+        """Test that notebooks with the same dependencies are exported consecutively."""
+        a = self._notebook(tmp_path, "a", ["polars"])
+        b = self._notebook(tmp_path, "b", ["pandas"])
+        c = self._notebook(tmp_path, "c", ["polars"])
+        order = []
+        for nb in (a, b, c):
+            nb.export.side_effect = lambda nb=nb, **kwargs: order.append(nb.path.stem) or nb.export.return_value
+
+        result = export_jobs([ExportJob(nb, Path("/out")) for nb in (a, b, c)], True, None, parallel=False)
+
+        assert order == ["a", "c", "b"]
+        assert (result.affinity_hits, result.affinity_dispatches) == (1, 2)
+        assert result.affinity_hit_rate == 0.5
+
+    def test_clusters_assigned_to_least_loaded_worker(self):
+        """Test that whole clusters go to workers, largest first."""
+        jobs = [ExportJob(MagicMock(), Path("/out"), estimate=estimate) for estimate in (5.0, 4.0, 3.0, 2.0)]
+        scheduler = _AffinityScheduler(jobs, 2, ["x", "y", "x", "z"])
+
+        assert scheduler.next_job(0) is jobs[0]
+        assert scheduler.next_job(1) is jobs[1]
+        assert scheduler.next_job(0) is jobs[2]
+        assert scheduler.next_job(1) is jobs[3]
+        assert scheduler.next_job(0) is None
+        assert (scheduler.hits, scheduler.dispatches, scheduler.steals) == (1, 2, 0)
+
+    def test_idle_worker_steals_longest_job_of_a_cluster(self):
+        """Test that a single cluster is shared by all workers longest job first."""
+        jobs = [ExportJob(MagicMock(), Path("/out"), estimate=estimate) for estimate in (4.0, 3.0, 2.0, 1.0)]
+        scheduler = _AffinityScheduler(jobs, 2, ["x"] * 4)
+
+        assert [scheduler.next_job(worker) for worker in (0, 1, 1, 0)] == jobs
+        assert scheduler.steals == 2
+        assert scheduler.hits == scheduler.dispatches == 2
+
+    def test_steal_prefers_last_dependency_set(self):
+        """Test that a thief keeps its dependency set rather than robbing the busiest worker."""
+        estimates = (5.0, 5.0, 4.0, 4.0, 4.0, 1.0)
+        jobs = [ExportJob(MagicMock(), Path("/out"), estimate=estimate) for estimate in estimates]
+        # Worker 0 owns x (12s), worker 1 owns y (10s) and worker 2 owns z (1s)
+        scheduler = _AffinityScheduler(jobs, 3, ["y", "y", "x", "x", "x", "z"])
+
+        assert scheduler.next_job(0) is jobs[2]
+        assert scheduler.next_job(2) is jobs[5]
+        # Worker 2 ran dry and robs the busiest worker, 1
+        assert scheduler.next_job(2) is jobs[0]
+        # Worker 0 is busier now, but worker 2 sticks with y
+        assert scheduler.next_job(2) is jobs[1]
+        assert scheduler.next_job(1) is jobs[3]
+        assert (scheduler.steals, scheduler.hits, scheduler.dispatches) == (3, 1, 2)
+
+    def test_cancel_drops_remaining_jobs(self):
+        """Test that no job is handed out after the schedule is cancelled."""
+        jobs = [ExportJob(MagicMock(), Path("/out"), estimate=estimate) for estimate in (2.0, 1.0)]
+        scheduler = _AffinityScheduler(jobs, 2, ["x", "y"])
+
+        scheduler.cancel()
+
+        assert scheduler.next_job(0) is None
+        assert scheduler.next_job(1) is None
+
+    def test_parallel_worker_error_is_raised(self, tmp_path):
+        """Test that an unexpected error in a worker cancels the batch and is raised."""
+        notebooks = [self._notebook(tmp_path, f"nb{i}", ["polars"]) for i in range(3)]
+        notebooks[0].export.side_effect = RuntimeError("worker crashed")
+
+        with pytest.raises(RuntimeError, match="worker crashed"):
+            export_jobs([ExportJob(nb, Path("/out")) for nb in notebooks], True, None, max_workers=1)
+
+    def test_parallel_reports_hit_rate(self, tmp_path):
+        """Test that parallel sandboxed batches report the affinity statistic."""
+        notebooks = [self._notebook(tmp_path, f"nb{i}", ["polars"] if i % 2 else ["pandas"]) for i in range(6)]
+
+        result = export_jobs([ExportJob(nb, Path("/out")) for nb in notebooks], True, None, max_workers=2)
+
+        assert result.succeeded == 6
+        # Each of the two workers changes dependency set at most once
+        assert result.affinity_dispatches >= 4
+        assert result.affinity_hits >= result.affinity_dispatches - 2
+
+    def test_async_reports_hit_rate(self, tmp_path):
+        """Test that the asyncio engine schedules with the same affinity."""
+        notebooks = [self._notebook(tmp_path, f"nb{i}", ["polars"]) for i in range(4)]
+        for nb in notebooks:
+            nb.export_async = AsyncMock(return_value=nb.export.return_value)
+
+        result = asyncio.run(
+            export_jobs_async([ExportJob(nb, Path("/out")) for nb in notebooks], True, None, max_concurrency=2)
+        )
+
+        assert result.succeeded == 4
+        assert result.affinity_hit_rate == 1.0
+
+    def test_no_statistic_without_sandbox(self, tmp_path):
+        """Test that unsandboxed batches share one environment and report no hit rate."""
+        notebooks = [self._notebook(tmp_path, f"nb{i}", [f"pkg{i}"]) for i in range(3)]
+
+        result = export_jobs([ExportJob(nb, Path("/out")) for nb in notebooks], False, None, parallel=False)
+
+        assert result.succeeded == 3
+        assert result.affinity_hit_rate is None
+
+
 class TestGenerateIndex:
     """Tests for the _generate_index function."""
 
-    @patch("marimushka.orchestrator.set_secure_file_permissions")
+    @patch("marimushka.orchestrator.dependency_set", return_value=DependencySet())
     @patch.object(Path, "open", new_callable=mock_open)
     @patch("marimushka.orchestrator.SandboxedEnvironment")
-    def test_generate_index_success(self, mock_env, mock_file_open, mock_permissions, tmp_path):
+    def test_generate_index_success(self, mock_env, mock_file_open, mock_deps, tmp_path):
         """Test the successful generation of index.html."""
         # Setup
         output_dir = tmp_path / "output"
@@ -361,6 +723,8 @@ class TestGenerateIndex:
         notebooks = [mock_notebook1, mock_notebook2]
         apps = [mock_app1]
         notebooks_wasm = [mock_notebook1_wasm]
+        for nb in [*notebooks, *apps, *notebooks_wasm]:
+            nb.subdir = Path()
 
         # Mock the template rendering
         mock_template = MagicMock()
@@ -380,28 +744,55 @@ class TestGenerateIndex:
         # Assert
         # Check that export was called for each notebook and app
         mock_notebook1.export.assert_called_once_with(
-            output_dir=output_dir / "notebooks", sandbox=True, bin_path=None, timeout=300
+            output_dir=output_dir / "notebooks",
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
         )
         mock_notebook2.export.assert_called_once_with(
-            output_dir=output_dir / "notebooks", sandbox=True, bin_path=None, timeout=300
+            output_dir=output_dir / "notebooks",
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
         )
         mock_app1.export.assert_called_once_with(
-            output_dir=output_dir / "apps", sandbox=True, bin_path=None, timeout=300
+            output_dir=output_dir / "apps",
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
         )
 
         # Check that the template was rendered and written to file
         mock_env.assert_called_once()
         mock_env.return_value.get_template.assert_called_once_with(template_file.name)
         mock_template.render.assert_called_once_with(notebooks=notebooks, apps=apps, notebooks_wasm=notebooks_wasm)
-        # Check that the index.html file was opened for writing (audit logger also uses Path.open)
-        mock_file_open.assert_any_call(output_dir / "index.html", "w")
+        # Check that a temporary file next to index.html was opened for writing (audit logger also uses Path.open)
+        index_writes = [c for c in mock_file_open.call_args_list if c.args[1:] == ("w",)]
+        assert [c.args[0].name.startswith(".index.html.") for c in index_writes] == [True]
+        assert (output_dir / "index.html").exists()
 
         # Check that the function returns the rendered HTML
         assert result == "<html>Rendered content</html>"
 
+    @patch("marimushka.orchestrator.dependency_set", return_value=DependencySet())
     @patch.object(Path, "open", side_effect=OSError("File error"))
     @patch("marimushka.orchestrator.SandboxedEnvironment")
-    def test_generate_index_file_error(self, mock_env, mock_file_open, tmp_path):
+    def test_generate_index_file_error(self, mock_env, mock_file_open, mock_deps, tmp_path):
         """Test handling of file error during index generation."""
         # Setup
         output_dir = tmp_path / "output"
@@ -429,12 +820,21 @@ class TestGenerateIndex:
 
         # Check that export was still called before the error
         mock_notebook.export.assert_called_once_with(
-            output_dir=output_dir / "notebooks", sandbox=True, bin_path=None, timeout=300
+            output_dir=output_dir / "notebooks",
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
         )
 
+    @patch("marimushka.orchestrator.dependency_set", return_value=DependencySet())
     @patch("marimushka.orchestrator.SandboxedEnvironment")
     @patch.object(Path, "mkdir")
-    def test_generate_index_template_error(self, mock_mkdir, mock_env, tmp_path):
+    def test_generate_index_template_error(self, mock_mkdir, mock_env, mock_deps, tmp_path):
         """Test handling of template error during index generation."""
         # Setup
         output_dir = tmp_path / "output"
@@ -460,7 +860,15 @@ class TestGenerateIndex:
 
         # Check that export was still called before the template error
         mock_notebook.export.assert_called_once_with(
-            output_dir=output_dir / "notebooks", sandbox=True, bin_path=None, timeout=300
+            output_dir=output_dir / "notebooks",
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
         )
 
     def test_generate_index_no_notebooks(self, tmp_path):
@@ -483,6 +891,238 @@ class TestGenerateIndex:
         assert "[]" in result
 
 
+class TestTemplateEnvironment:
+    """Tests for the cached template environments."""
+
+    def test_cached_per_directory_and_mtime(self, tmp_path):
+        """Test that a directory keeps its environment until its modification time changes."""
+        (tmp_path / "index.html.j2").write_text("{{ notebooks | length }}")
+        env = create_template_environment(tmp_path)
+
+        assert create_template_environment(tmp_path) is env
+        assert env.bytecode_cache is not None
+
+        (tmp_path / "partial.html.j2").write_text("")
+        os.utime(tmp_path, ns=(0, tmp_path.stat().st_mtime_ns + 1_000_000_000))
+
+        assert create_template_environment(tmp_path) is not env
+
+    def test_bytecode_cache_unavailable(self):
+        """Test that templates are compiled without an on-disk cache if its directory is unusable."""
+        _bytecode_cache.cache_clear()
+        try:
+            with patch("marimushka.orchestrator.jinja2.FileSystemBytecodeCache", side_effect=OSError("read-only")):
+                assert _bytecode_cache() is None
+        finally:
+            _bytecode_cache.cache_clear()
+
+    def test_builtin_template_is_precompiled(self):
+        """Test that the built-in template renders without reading template sources."""
+        with patch.object(jinja2.FileSystemLoader, "get_source", side_effect=AssertionError("parsed")):
+            html = render_template(BUILTIN_TEMPLATE_DIR / "tailwind.html.j2", [], [], [], get_audit_logger())
+
+        assert "<html" in html
+
+    def test_precompiled_templates_up_to_date(self, tmp_path):
+        """Test that the shipped archive matches the built-in templates (run compile_builtin_templates)."""
+        compile_builtin_templates(tmp_path / "compiled.zip")
+
+        with zipfile.ZipFile(tmp_path / "compiled.zip") as fresh, zipfile.ZipFile(PRECOMPILED_TEMPLATES) as shipped:
+            assert {name: fresh.read(name) for name in fresh.namelist()} == {
+                name: shipped.read(name) for name in shipped.namelist()
+            }
+
+
+class TestRenderIndexFile:
+    """Tests for streaming the index template into the index file."""
+
+    def test_streams_into_index(self, tmp_path):
+        """Test that the streamed index equals the rendered one and no temporary file is left."""
+        template = tmp_path / "index.html.j2"
+        template.write_text("{% for nb in notebooks %}<p>{{ nb }}</p>{% endfor %}")
+        index_path = tmp_path / "index.html"
+
+        render_index_file(template, index_path, ["a", "b"], [], [], get_audit_logger())
+
+        assert index_path.read_text() == render_template(template, ["a", "b"], [], [], get_audit_logger())
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["index.html", "index.html.j2"]
+
+    def test_failed_render_keeps_previous_index(self, tmp_path):
+        """Test that a template failing midway leaves the previous index untouched."""
+        template = tmp_path / "index.html.j2"
+        template.write_text("<p>partial</p>{{ missing() }}")
+        index_path = tmp_path / "index.html"
+        index_path.write_text("previous")
+
+        with pytest.raises(TemplateRenderError):
+            render_index_file(template, index_path, [], [], [], get_audit_logger())
+
+        assert index_path.read_text() == "previous"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["index.html", "index.html.j2"]
+
+    def test_failed_write_keeps_previous_index(self, tmp_path):
+        """Test that an index that cannot replace the previous one raises and leaves no temporary file."""
+        template = tmp_path / "index.html.j2"
+        template.write_text("<p>new</p>")
+        index_path = tmp_path / "index.html"
+        index_path.write_text("previous")
+
+        with (
+            patch("marimushka.storage.os.replace", side_effect=OSError("disk full")),
+            pytest.raises(IndexWriteError),
+        ):
+            render_index_file(template, index_path, [], [], [], get_audit_logger())
+
+        assert index_path.read_text() == "previous"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["index.html", "index.html.j2"]
+
+    def test_write_index_file_replaces_atomically(self, tmp_path):
+        """Test that write_index_file replaces the index and keeps it if the rename fails."""
+        index_path = tmp_path / "index.html"
+        index_path.write_text("previous")
+
+        with (
+            patch("marimushka.storage.os.replace", side_effect=OSError("disk full")),
+            pytest.raises(IndexWriteError),
+        ):
+            write_index_file(index_path, "<p>new</p>", get_audit_logger())
+        assert index_path.read_text() == "previous"
+
+        write_index_file(index_path, "<p>new</p>", get_audit_logger())
+        assert index_path.read_text() == "<p>new</p>"
+        assert index_path.stat().st_mode & 0o777 == 0o644
+        assert [p.name for p in tmp_path.iterdir()] == ["index.html"]
+
+    def test_generate_index_without_html(self, tmp_path):
+        """Test that generate_index streams the index and returns nothing if asked to."""
+        template = tmp_path / "index.html.j2"
+        template.write_text("<html>{{ notebooks | length }}</html>")
+
+        with patch("marimushka.orchestrator.render_template") as mock_render:
+            result = generate_index(output=tmp_path / "_site", template_file=template, return_html=False)
+
+        assert result == ""
+        assert (tmp_path / "_site" / "index.html").read_text() == "<html>0</html>"
+        mock_render.assert_not_called()
+
+
+class TestPaginatedIndex:
+    """Tests for generate_index with a page size."""
+
+    @staticmethod
+    def _generate(tmp_path, count, page_size, executor=None):
+        """Generate the built-in index of the notebooks folder, adding count notebooks, without exporting them."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir(exist_ok=True)
+        for i in range(count):
+            (folder / f"nb_{i:02d}.py").write_text("import marimo")
+        notebooks = [Notebook(path, Kind.NB) for path in sorted(folder.glob("*.py"))]
+        with patch("marimushka.orchestrator.export_all_notebooks", return_value=BatchExportResult()):
+            generate_index(
+                output=tmp_path / "_site",
+                template_file=BUILTIN_TEMPLATE_DIR / "tailwind.html.j2",
+                notebooks=notebooks,
+                page_size=page_size,
+                executor=executor,
+                return_html=False,
+            )
+        return tmp_path / "_site"
+
+    def test_pages_per_kind(self, tmp_path):
+        """Test that the front page links to the kind's pages, which link to each other."""
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            output = self._generate(tmp_path, 5, page_size=2, executor=executor)
+
+        front = (output / "index.html").read_text()
+        second = (output / "notebooks" / "page-2.html").read_text()
+        assert "nb 01" in front
+        assert "nb 02" not in front
+        assert 'href="notebooks/index.html"' in front
+        assert "<base" not in front
+        assert '<base href="../">' in second
+        assert 'href="notebooks/nb_02.html"' in second
+        assert 'href="notebooks/page-3.html"' in second
+        assert "Page 2 of 3" in second
+        assert sorted(p.name for p in (output / "notebooks").iterdir()) == ["index.html", "page-2.html", "page-3.html"]
+
+    def test_stale_pages_removed(self, tmp_path):
+        """Test that pages of an earlier, longer pagination are removed."""
+        self._generate(tmp_path, 5, page_size=2)
+
+        output = self._generate(tmp_path, 5, page_size=0)
+
+        assert "nb 04" in (output / "index.html").read_text()
+        assert list((output / "notebooks").glob("*.html")) == []
+
+    def test_notebook_export_wins_over_page(self, tmp_path):
+        """Test that a page is not written over the export of a notebook with the same path."""
+        (tmp_path / "notebooks").mkdir()
+        (tmp_path / "notebooks" / "index.py").write_text("import marimo")
+        output = tmp_path / "_site"
+        (output / "notebooks").mkdir(parents=True)
+        (output / "notebooks" / "index.html").write_text("exported notebook")
+
+        self._generate(tmp_path, 2, page_size=1)
+
+        assert (output / "notebooks" / "index.html").read_text() == "exported notebook"
+        assert (output / "notebooks" / "page-2.html").exists()
+
+    def test_main_paginates(self, tmp_path):
+        """Test that main passes the page size to the index."""
+        (tmp_path / "notebooks").mkdir()
+        (tmp_path / "notebooks" / "nb.py").write_text("import marimo\n\napp = marimo.App()\n")
+
+        with patch("marimushka.export.generate_index", return_value="") as mock_generate_index:
+            main(notebooks=tmp_path / "notebooks", apps="", notebooks_wasm="", page_size=25)
+
+        assert mock_generate_index.call_args.kwargs["page_size"] == 25
+
+
+class TestNestedIndex:
+    """Tests for generate_index with notebooks in subdirectories."""
+
+    @staticmethod
+    def _generate(tmp_path, *names):
+        """Generate the built-in index of nested notebooks without exporting them."""
+        folder = tmp_path / "notebooks"
+        for name in names:
+            (folder / name).parent.mkdir(parents=True, exist_ok=True)
+            (folder / name).write_text("import marimo\n\napp = marimo.App()\n")
+        with patch("marimushka.orchestrator.export_all_notebooks", return_value=BatchExportResult()):
+            generate_index(
+                output=tmp_path / "_site",
+                template_file=BUILTIN_TEMPLATE_DIR / "tailwind.html.j2",
+                notebooks=folder2notebooks(folder, recursive=True),
+                return_html=False,
+            )
+        return tmp_path / "_site"
+
+    def test_directory_pages(self, tmp_path):
+        """Test that the front page links to directory pages, which link back up and down."""
+        output = self._generate(tmp_path, "top.py", "team/member.py", "team/sub/deep.py")
+
+        front = (output / "index.html").read_text()
+        team = (output / "notebooks" / "team" / "index.html").read_text()
+        sub = (output / "notebooks" / "team" / "sub" / "index.html").read_text()
+        assert 'href="notebooks/team/sub/deep.html"' in front
+        assert 'href="notebooks/team/index.html"' in front
+        assert '<base href="../../">' in team
+        assert 'href="notebooks/team/member.html"' in team
+        assert "deep.html" not in team
+        assert 'href="notebooks/team/sub/index.html"' in team
+        assert '<base href="../../../">' in sub
+        assert 'href="notebooks/team/index.html"' in sub
+
+    def test_stale_directory_pages_removed(self, tmp_path):
+        """Test that the page of a directory without notebooks is removed."""
+        self._generate(tmp_path, "top.py", "team/member.py")
+        (tmp_path / "notebooks" / "team" / "member.py").unlink()
+
+        output = self._generate(tmp_path)
+
+        assert not (output / "notebooks" / "team" / "index.html").exists()
+
+
 class TestMain:
     """Tests for the main function."""
 
@@ -502,9 +1142,13 @@ class TestMain:
 
         # Assert
         assert mock_folder2notebooks.call_count == 3
-        mock_folder2notebooks.assert_any_call(folder="notebooks", kind=Kind.NB)
-        mock_folder2notebooks.assert_any_call(folder="apps", kind=Kind.APP)
-        mock_folder2notebooks.assert_any_call(folder="notebooks", kind=Kind.NB_WASM)
+        mock_folder2notebooks.assert_any_call(
+            folder="notebooks", kind=Kind.NB, recursive=False, include=None, exclude=None
+        )
+        mock_folder2notebooks.assert_any_call(folder="apps", kind=Kind.APP, recursive=False, include=None, exclude=None)
+        mock_folder2notebooks.assert_any_call(
+            folder="notebooks", kind=Kind.NB_WASM, recursive=False, include=None, exclude=None
+        )
         mock_generate_index.assert_called_once()
 
     @patch("marimushka.export.validate_template")
@@ -520,9 +1164,13 @@ class TestMain:
 
         # Assert
         assert mock_folder2notebooks.call_count == 3
-        mock_folder2notebooks.assert_any_call(folder="notebooks", kind=Kind.NB)
-        mock_folder2notebooks.assert_any_call(folder="apps", kind=Kind.APP)
-        mock_folder2notebooks.assert_any_call(folder="notebooks", kind=Kind.NB_WASM)
+        mock_folder2notebooks.assert_any_call(
+            folder="notebooks", kind=Kind.NB, recursive=False, include=None, exclude=None
+        )
+        mock_folder2notebooks.assert_any_call(folder="apps", kind=Kind.APP, recursive=False, include=None, exclude=None)
+        mock_folder2notebooks.assert_any_call(
+            folder="notebooks", kind=Kind.NB_WASM, recursive=False, include=None, exclude=None
+        )
         mock_generate_index.assert_not_called()
 
     @patch("marimushka.export.validate_template")
@@ -552,10 +1200,16 @@ class TestMain:
             notebooks_wasm=custom_notebooks_wasm,
         )
 
-        # Assert
-        mock_folder2notebooks.assert_any_call(folder=custom_notebooks, kind=Kind.NB)
-        mock_folder2notebooks.assert_any_call(folder=custom_apps, kind=Kind.APP)
-        mock_folder2notebooks.assert_any_call(folder=custom_notebooks_wasm, kind=Kind.NB_WASM)
+        # Assert - main builds in a BuildSession, whose configuration holds the folders as strings
+        mock_folder2notebooks.assert_any_call(
+            folder=str(custom_notebooks), kind=Kind.NB, recursive=False, include=None, exclude=None
+        )
+        mock_folder2notebooks.assert_any_call(
+            folder=str(custom_apps), kind=Kind.APP, recursive=False, include=None, exclude=None
+        )
+        mock_folder2notebooks.assert_any_call(
+            folder=str(custom_notebooks_wasm), kind=Kind.NB_WASM, recursive=False, include=None, exclude=None
+        )
 
         mock_generate_index.assert_called_once_with(
             output=custom_output,
@@ -570,6 +1224,25 @@ class TestMain:
             timeout=300,
             on_progress=None,
             audit_logger=ANY,  # audit_logger is created internally
+            cache=None,
+            incremental=False,
+            history=None,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            environments=None,
+            marimo_tool=None,
+            changes=None,
+            cancellation=None,
+            worker_pool=None,
+            on_complete=ANY,  # records the session's last result
+            executor=ANY,  # the session's thread pool
+            template_environment=ANY,
+            return_html=True,
+            page_size=0,
+            search=False,
+            executable="uvx",
         )
 
     @patch("marimushka.export.validate_template")
@@ -597,6 +1270,42 @@ class TestMain:
         assert call_kwargs["parallel"] is False
         assert call_kwargs["max_workers"] == 8
 
+    @patch("marimushka.export.BuildSession")
+    def test_main_builds_in_session(self, mock_session, tmp_path):
+        """Test that main runs one build in a BuildSession configured with its arguments."""
+        session = mock_session.return_value.__enter__.return_value
+        session.build.return_value = "<html></html>"
+
+        html = main(output=tmp_path / "out", cache_dir=tmp_path / "cache", incremental=True, since="origin/main")
+
+        assert html == "<html></html>"
+        deps = mock_session.call_args.args[0]
+        assert deps.config.output == str(tmp_path / "out")
+        assert deps.config.cache_dir == str(tmp_path / "cache")
+        assert mock_session.call_args.kwargs["incremental"] is True
+        session.build.assert_called_once_with(
+            changes=None, cancellation=None, on_complete=None, return_html=True, since="origin/main"
+        )
+
+    def test_open_session_defaults_of_main(self, tmp_path):
+        """Test that open_session fills in main's defaults and rejects options of a single build."""
+        with open_session(output=tmp_path / "out", include=("*_demo.py",)) as session:
+            config = session.deps.config
+
+        assert session.output == tmp_path / "out"
+        assert config.notebooks_wasm == "notebooks"
+        assert config.include == ["*_demo.py"]
+        assert config.cache_dir is None
+        with pytest.raises(TypeError, match="since"):
+            open_session(since="origin/main")
+
+    def test_open_session_without_folders(self, tmp_path):
+        """Test that None folders mean no folder, like an empty string, rather than a folder named 'None'."""
+        with open_session(output=tmp_path / "out", notebooks=None, apps=None, notebooks_wasm="") as session:
+            config = session.deps.config
+
+        assert (config.notebooks, config.apps, config.notebooks_wasm) == ("", "", "")
+
     def test_main_invalid_template(self, tmp_path):
         """Test main function with non-existent template."""
         # Setup
@@ -608,6 +1317,190 @@ class TestMain:
         assert exc_info.value.template_path == nonexistent_template
 
 
+class TestBuildSession:
+    """Tests for BuildSession."""
+
+    @staticmethod
+    def _deps(tmp_path, **settings):
+        """Return dependencies of a session building into the temporary directory."""
+        template = tmp_path / "index.html.j2"
+        template.write_text("{{ notebooks | length }}")
+        config = MarimushkaConfig(output=str(tmp_path / "_site"), template=str(template), **settings)
+        return Dependencies(audit_logger=get_audit_logger(), config=config)
+
+    @patch("marimushka.export.folder2notebooks")
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_resources_kept_across_builds(self, mock_generate_index, mock_folder2notebooks, tmp_path):
+        """Test that every build gets the same cache, history, pool and template environment."""
+        mock_folder2notebooks.side_effect = lambda folder, kind, **options: [MagicMock()] if kind == Kind.NB else []
+        deps = self._deps(tmp_path, cache_dir=str(tmp_path / "cache"))
+
+        with BuildSession(deps) as session:
+            assert session.build() == "<html></html>"
+            session.build()
+
+        first, second = (call.kwargs for call in mock_generate_index.call_args_list)
+        for name in ("audit_logger", "cache", "history", "executor", "template_environment"):
+            assert first[name] is not None
+            assert first[name] is second[name]
+        assert first["audit_logger"] is deps.audit_logger
+        assert first["executor"]._shutdown
+        assert session.builds == 2
+
+    def test_executable_resolved_once(self, fake_export, site, tmp_path):
+        """Test that the session looks up uvx once and every export still records the bin_path validation."""
+        folder, _, _ = site
+        for name in ("alpha", "beta"):
+            (folder / f"{name}.py").write_text(f"import marimo\n\napp = marimo.App()  # {name}\n")
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        (bin_dir / "uvx").write_text("#!/bin/sh\n")
+        (bin_dir / "uvx").chmod(0o755)
+        deps = self._deps(tmp_path, notebooks=str(folder), apps="", notebooks_wasm="", parallel=False)
+        deps.audit_logger = MagicMock()
+
+        with (
+            patch("marimushka.notebook.validate_bin_path", wraps=validate_bin_path) as mock_validate,
+            patch("marimushka.notebook.get_audit_logger") as mock_get_audit_logger,
+            BuildSession(deps, bin_path=bin_dir) as session,
+        ):
+            session.build()
+            session.build()
+
+        export_audit = mock_get_audit_logger.return_value
+        assert Path(session.executable).name == "uvx"
+        mock_validate.assert_called_once()
+        assert {call.args[0][0] for call in fake_export.call_args_list} == {session.executable}
+        assert deps.audit_logger.log_path_validation.call_args_list.count(call(bin_dir, "bin_path", True)) == 1
+        assert fake_export.call_count == 4
+        assert export_audit.log_path_validation.call_args_list.count(call(bin_dir, "bin_path", True)) == 4
+
+    @patch("marimushka.export.folder2notebooks")
+    @patch("marimushka.export.generate_index", return_value="")
+    def test_marimo_tool_installed_once(self, mock_generate_index, mock_folder2notebooks, tmp_path, fake_uv):
+        """Test that a session installs its pinned marimo version once for all builds."""
+        mock_folder2notebooks.side_effect = lambda folder, kind, **options: [MagicMock()] if kind == Kind.NB else []
+
+        with (
+            patch("marimushka.export.install_marimo", wraps=install_marimo) as mock_install,
+            BuildSession(self._deps(tmp_path, marimo_version="0.18.4"), bin_path=Path(fake_uv).parent) as session,
+        ):
+            session.build()
+            session.build()
+
+        first, second = (call.kwargs["marimo_tool"] for call in mock_generate_index.call_args_list)
+        assert first is second
+        assert first.version == "0.18.4"
+        mock_install.assert_called_once()
+
+    @patch("marimushka.orchestrator.resolve_marimo_version", return_value="0.18.4")
+    def test_generate_index_resolves_executable(self, mock_version, fake_export, site, export_site, tmp_path):
+        """Test that generate_index without a session's executable resolves the version with uvx in bin_path."""
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+
+        export_site(bin_path=bin_dir, incremental=True)
+
+        mock_version.assert_called_once_with(str(bin_dir / "uvx"))
+
+    def test_missing_executable_fails_exports(self, fake_export, site, tmp_path):
+        """Test that every export of a session without an executable in bin_path fails."""
+        folder, _, _ = site
+        for name in ("alpha", "beta"):
+            (folder / f"{name}.py").write_text(f"import marimo\n\napp = marimo.App()  # {name}\n")
+        results = []
+
+        with BuildSession(
+            self._deps(tmp_path, notebooks=str(folder), apps="", notebooks_wasm=""), bin_path=tmp_path
+        ) as session:
+            session.build(on_complete=results.append)
+
+        assert session.executable is None
+        assert results[0].failed == 2
+        assert all(isinstance(r.error, ExportExecutableNotFoundError) for r in results[0].results)
+        fake_export.assert_not_called()
+
+    @patch("marimushka.export.folder2notebooks")
+    @patch("marimushka.export.generate_index", return_value="")
+    def test_on_progress_per_build(self, mock_generate_index, mock_folder2notebooks, tmp_path):
+        """Test that a progress callback passed to build() only applies to that build."""
+        mock_folder2notebooks.side_effect = lambda folder, kind, **options: [MagicMock()] if kind == Kind.NB else []
+        session_progress, build_progress = MagicMock(), MagicMock()
+
+        with BuildSession(self._deps(tmp_path), on_progress=session_progress) as session:
+            session.build(on_progress=build_progress)
+            session.build()
+
+        first, second = (call.kwargs["on_progress"] for call in mock_generate_index.call_args_list)
+        assert (first, second) == (build_progress, session_progress)
+        assert session.on_progress is session_progress
+
+    @patch("marimushka.export.folder2notebooks", return_value=[])
+    @patch("marimushka.export.generate_index")
+    def test_no_notebooks(self, mock_generate_index, mock_folder2notebooks, tmp_path):
+        """Test that a build without notebooks renders nothing."""
+        with BuildSession(self._deps(tmp_path)) as session:
+            assert session.build() == ""
+
+        mock_generate_index.assert_not_called()
+
+    @patch("marimushka.export.folder2notebooks")
+    @patch("marimushka.export.generate_index")
+    def test_rebuild_exports_changed_notebooks(self, mock_generate_index, mock_folder2notebooks, tmp_path):
+        """Test that rebuild passes the notebooks the paths affect and records the result."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        batch = BatchExportResult()
+
+        def fake_generate_index(**kwargs):
+            kwargs["on_complete"](batch)
+            return "<html></html>"
+
+        mock_folder2notebooks.side_effect = lambda folder, kind, **options: [MagicMock()] if kind == Kind.NB else []
+        mock_generate_index.side_effect = fake_generate_index
+        on_complete = MagicMock()
+
+        with BuildSession(self._deps(tmp_path, notebooks=str(folder), parallel=False)) as session:
+            session.rebuild([folder / "alpha.py", tmp_path / "_site" / "index.html"], on_complete=on_complete)
+
+        kwargs = mock_generate_index.call_args.kwargs
+        assert kwargs["changes"] == ChangeSet(frozenset({(folder / "alpha.py").resolve()}))
+        assert kwargs["executor"] is None
+        assert session.last_result is batch
+        on_complete.assert_called_once_with(batch)
+
+    def test_unknown_engine(self, tmp_path):
+        """Test that an unknown engine is rejected before any build."""
+        with pytest.raises(ValueError, match="Unknown export engine"):
+            BuildSession(self._deps(tmp_path), engine="processes")
+
+
+class TestMainWithDeps:
+    """Tests for main_with_deps."""
+
+    @patch("marimushka.export.BuildSession")
+    def test_options_override_config(self, mock_session):
+        """Test that settings override a copy of the config and session options reach the session."""
+        deps = Dependencies(config=MarimushkaConfig(notebooks="nbs"))
+        changes = ChangeSet(template=True)
+        mock_session.return_value.__enter__.return_value.build.return_value = "<html></html>"
+
+        html = main_with_deps(deps, notebooks="notebooks", max_workers=2, incremental=True, changes=changes)
+
+        assert html == "<html></html>"
+        session_deps = mock_session.call_args.args[0]
+        assert session_deps.audit_logger is deps.audit_logger
+        assert (session_deps.config.notebooks, session_deps.config.max_workers) == ("notebooks", 2)
+        assert deps.config.notebooks == "nbs"
+        assert mock_session.call_args.kwargs == {"incremental": True}
+        mock_session.return_value.__enter__.return_value.build.assert_called_once_with(changes=changes)
+
+    def test_unknown_option(self):
+        """Test that options that are neither settings nor session options are rejected."""
+        with pytest.raises(TypeError, match="colour"):
+            main_with_deps(Dependencies(), colour="blue")
+
+
 class TestCallback:
     """Tests for the callback function."""
 
@@ -664,6 +1557,25 @@ class TestMainTyper:
             parallel=True,
             max_workers=4,
             timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
+            since=None,
         )
 
         # Assert - verify that main was called with the same values
@@ -678,6 +1590,26 @@ class TestMainTyper:
             parallel=True,
             max_workers=4,
             timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
+            since=None,
+            return_html=False,
         )
 
     @patch("marimushka.export.main")
@@ -697,6 +1629,25 @@ class TestMainTyper:
             parallel=False,
             max_workers=2,
             timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
+            since=None,
         )
 
         # Assert - verify that main was called with the same values
@@ -711,6 +1662,26 @@ class TestMainTyper:
             parallel=False,
             max_workers=2,
             timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
+            since=None,
+            return_html=False,
         )
 
 
@@ -725,8 +1696,8 @@ class TestWatchCommand:
         # uninstalling watchfiles, so we just verify the function exists
         assert callable(watch_command)
 
-    @patch("marimushka.export.main")
-    def test_watch_command_exists(self, mock_main):
+    @patch("marimushka.export.open_session")
+    def test_watch_command_exists(self, mock_open_session):
         """Test that watch command is registered."""
         from marimushka.cli import app
 
@@ -756,14 +1727,33 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
         assert exc_info.value.exit_code == 1
         # Verify warning was printed
         mock_print.assert_any_call("[bold yellow]Warning:[/bold yellow] No directories to watch!")
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_initial_export_called(self, mock_print, mock_main, tmp_path):
+    def test_watch_initial_export_called(self, mock_print, mock_open_session, tmp_path):
         """Test watch command calls initial export before watching."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -792,10 +1782,29 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
-        # Verify initial export was called with correct parameters
-        mock_main.assert_called_once_with(
+        # Verify the session was opened with the options and ran the initial export
+        mock_open_session.assert_called_once_with(
             output=str(tmp_path / "_site"),
             template=str(template_file),
             notebooks=str(notebooks_dir),
@@ -806,11 +1815,30 @@ class TestWatchCommand:
             parallel=True,
             max_workers=4,
             timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
         )
+        mock_open_session.return_value.__enter__.return_value.build.assert_called_once_with(return_html=False)
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_keyboard_interrupt_handled(self, mock_print, mock_main, tmp_path):
+    def test_watch_keyboard_interrupt_handled(self, mock_print, mock_open_session, tmp_path):
         """Test watch command handles KeyboardInterrupt gracefully."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -840,14 +1868,33 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
         # Verify the "stopped" message was printed
         mock_print.assert_any_call("\n[bold green]Watch mode stopped.[/bold green]")
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_reexports_on_change(self, mock_print, mock_main, tmp_path):
+    def test_watch_reexports_on_change(self, mock_print, mock_open_session, tmp_path):
         """Test watch command re-exports when files change."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -881,14 +1928,33 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
-        # Verify main was called twice: once for initial export, once for re-export
-        assert mock_main.call_count == 2
+        # Verify the session built twice: once for initial export, once for re-export
+        assert mock_open_session.return_value.__enter__.return_value.build.call_count == 2
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_shows_changed_files(self, mock_print, mock_main, tmp_path):
+    def test_watch_shows_changed_files(self, mock_print, mock_open_session, tmp_path):
         """Test watch command displays changed files."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -922,15 +1988,34 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
         # Verify changed files were printed
         mock_print.assert_any_call("\n[bold yellow]Detected changes:[/bold yellow]")
         mock_print.assert_any_call("  [dim]/path/to/file1.py[/dim]")
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_truncates_long_change_list(self, mock_print, mock_main, tmp_path):
+    def test_watch_truncates_long_change_list(self, mock_print, mock_open_session, tmp_path):
         """Test watch command truncates list when more than 5 files change."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -960,14 +2045,33 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
         # Verify truncation message was printed (10 files - 5 shown = 5 more)
         mock_print.assert_any_call("  [dim]... and 5 more[/dim]")
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_with_custom_parameters(self, mock_print, mock_main, tmp_path):
+    def test_watch_with_custom_parameters(self, mock_print, mock_open_session, tmp_path):
         """Test watch command passes all parameters correctly."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -998,10 +2102,29 @@ class TestWatchCommand:
                 parallel=False,
                 max_workers=8,
                 timeout=600,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
-        # Verify main was called with correct custom parameters
-        mock_main.assert_called_once_with(
+        # Verify the session was opened with the custom parameters
+        mock_open_session.assert_called_once_with(
             output=str(tmp_path / "custom_output"),
             template=str(template_file),
             notebooks=str(notebooks_dir),
@@ -1012,11 +2135,30 @@ class TestWatchCommand:
             parallel=False,
             max_workers=8,
             timeout=600,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            page_size=0,
+            search=False,
+            recursive=False,
+            include=None,
+            exclude=None,
         )
+        mock_open_session.return_value.__enter__.return_value.build.assert_called_once_with(return_html=False)
 
-    @patch("marimushka.export.main")
+    @patch("marimushka.export.open_session")
     @patch("marimushka.cli.rich_print")
-    def test_watch_template_parent_added_to_watch_paths(self, mock_print, mock_main, tmp_path):
+    def test_watch_template_parent_added_to_watch_paths(self, mock_print, mock_open_session, tmp_path):
         """Test watch command adds template parent directory to watch paths."""
         # Setup directories
         notebooks_dir = tmp_path / "notebooks"
@@ -1048,6 +2190,25 @@ class TestWatchCommand:
                 parallel=True,
                 max_workers=4,
                 timeout=300,
+                cache_dir=None,
+                incremental=False,
+                estimated_duration=30.0,
+                engine="threads",
+                worker_max_jobs=50,
+                worker_max_memory=1024,
+                shared_envs=False,
+                env_cache_size=5120,
+                prefetch=False,
+                index_url=None,
+                find_links=None,
+                offline=False,
+                marimo_version=None,
+                page_size=0,
+                search=False,
+                recursive=False,
+                include=None,
+                exclude=None,
+                debounce=1600,
             )
 
         # Verify template parent directory was included
@@ -1156,6 +2317,7 @@ class TestExportNotebooksParallelHypothesis:
             nb = MagicMock()
             mock_path = MagicMock()
             mock_path.name = f"success{i}.py"
+            mock_path.read_text.return_value = ""
             nb.path = mock_path
             nb.export.return_value = NotebookExportResult.succeeded(
                 Path(f"/success{i}.py"), Path(f"/output/success{i}.html")
@@ -1167,6 +2329,7 @@ class TestExportNotebooksParallelHypothesis:
             nb = MagicMock()
             mock_path = MagicMock()
             mock_path.name = f"failure{i}.py"
+            mock_path.read_text.return_value = ""
             nb.path = mock_path
             nb.export.return_value = NotebookExportResult.failed(
                 Path(f"/failure{i}.py"),
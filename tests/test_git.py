@@ -0,0 +1,169 @@
+"""Tests for the git.py module.
+
+This module contains tests for finding the files changed since a git revision
+and for exporting only the notebooks they affect.
+"""
+
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from marimushka.exceptions import GitDiffError
+from marimushka.export import main
+from marimushka.git import changed_files, changes_since
+from marimushka.notebook import Kind
+
+NOTEBOOK = "import marimo\n\napp = marimo.App()\n"
+
+
+def git(repo, *args):
+    """Run a git command in a repository."""
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    """Create a repository with notebooks on main and a feature branch checked out."""
+    git(tmp_path, "init", "-q", "-b", "main")
+    git(tmp_path, "config", "user.email", "dev@example.com")
+    git(tmp_path, "config", "user.name", "Dev")
+    git(tmp_path, "config", "commit.gpgsign", "false")
+    notebooks = tmp_path / "notebooks"
+    (notebooks / "public").mkdir(parents=True)
+    (notebooks / "plain.py").write_text(NOTEBOOK)
+    (notebooks / "charts.py").write_text(NOTEBOOK + "import helpers\n")
+    (notebooks / "penguins.py").write_text(NOTEBOOK + 'DATA = "public/penguins.csv"\n')
+    (notebooks / "helpers.py").write_text("VALUE = 1\n")
+    (notebooks / "public" / "penguins.csv").write_text("species\n")
+    (tmp_path / ".gitignore").write_text("_site/\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "Initial")
+    git(tmp_path, "checkout", "-q", "-b", "feature")
+    return tmp_path.resolve()
+
+
+class TestChangedFiles:
+    """Tests for changed_files."""
+
+    def test_commits_working_tree_and_untracked(self, repo):
+        """Test that committed, uncommitted and untracked changes count, ignored files do not."""
+        (repo / "notebooks" / "helpers.py").write_text("VALUE = 2\n")
+        git(repo, "commit", "-q", "-am", "Change helpers")
+        (repo / "notebooks" / "plain.py").write_text(NOTEBOOK + "# edited\n")
+        (repo / "notebooks" / "new.py").write_text(NOTEBOOK)
+        (repo / "_site").mkdir()
+        (repo / "_site" / "index.html").write_text("")
+
+        files = changed_files("main", repo / "notebooks")
+
+        assert files == [
+            repo / "notebooks" / "helpers.py",
+            repo / "notebooks" / "new.py",
+            repo / "notebooks" / "plain.py",
+        ]
+
+    def test_changes_on_base_branch_after_merge_base(self, repo):
+        """Test that commits that only landed on the revision's branch do not count."""
+        git(repo, "checkout", "-q", "main")
+        (repo / "notebooks" / "charts.py").write_text(NOTEBOOK + "# on main\n")
+        git(repo, "commit", "-q", "-am", "Change charts on main")
+        git(repo, "checkout", "-q", "feature")
+        (repo / "notebooks" / "penguins.py").write_text(NOTEBOOK + "# on feature\n")
+
+        assert changed_files("main", repo) == [repo / "notebooks" / "penguins.py"]
+
+    def test_deleted_files(self, repo):
+        """Test that deleted files count as changed."""
+        git(repo, "rm", "-q", "notebooks/plain.py")
+
+        assert changed_files("main", repo) == [repo / "notebooks" / "plain.py"]
+
+    def test_no_merge_base(self, repo):
+        """Test that a branch without a merge base is compared against the revision itself."""
+        git(repo, "checkout", "-q", "--orphan", "unrelated")
+        (repo / "notebooks" / "plain.py").write_text(NOTEBOOK + "# unrelated\n")
+        git(repo, "commit", "-q", "-am", "Unrelated history")
+
+        assert changed_files("main", repo) == [repo / "notebooks" / "plain.py"]
+
+    @pytest.mark.parametrize("since", ["no-such-branch", "--output=x", ""])
+    def test_invalid_revision(self, repo, since):
+        """Test that unknown revisions and options are rejected."""
+        with pytest.raises(GitDiffError) as exc_info:
+            changed_files(since, repo)
+
+        assert exc_info.value.revision == since
+
+    def test_not_a_repository(self, tmp_path):
+        """Test that a directory outside of a repository fails with the git error."""
+        with pytest.raises(GitDiffError, match="git rev-parse failed"):
+            changed_files("main", tmp_path)
+
+    def test_git_missing(self, repo):
+        """Test that a missing git executable fails clearly."""
+        with (
+            patch("marimushka.git.shutil.which", return_value=None),
+            pytest.raises(GitDiffError, match="not installed"),
+        ):
+            changed_files("main", repo)
+
+    def test_git_timeout(self, repo):
+        """Test that a git command that times out fails with a GitDiffError."""
+        with (
+            patch("marimushka.git.subprocess.run", side_effect=subprocess.TimeoutExpired("git", 60)),
+            pytest.raises(GitDiffError, match="git rev-parse failed"),
+        ):
+            changed_files("main", repo)
+
+
+class TestChangesSince:
+    """Tests for changes_since and main(since=...)."""
+
+    def test_dependents(self, repo):
+        """Test that changed helpers and data files are mapped to the notebooks depending on them."""
+        (repo / "notebooks" / "helpers.py").write_text("VALUE = 2\n")
+        (repo / "notebooks" / "public" / "penguins.csv").write_text("species,island\n")
+        folders = {Kind.NB: repo / "notebooks"}
+
+        changes = changes_since("main", folders, repo / "templates" / "index.html.j2", repo / "_site", repo)
+
+        assert (repo / "notebooks" / "penguins.py").resolve() in changes.notebooks
+        assert (repo / "notebooks" / "helpers.py").resolve() in changes.notebooks
+        assert not changes.template
+
+    @patch("marimushka.export.generate_index")
+    def test_main_exports_changed_and_missing(self, mock_generate_index, repo):
+        """Test that main only marks changed notebooks and those without a previous export as affected."""
+        output = repo / "_site"
+        (output / "notebooks").mkdir(parents=True)
+        for name in ("plain", "charts"):
+            (output / "notebooks" / f"{name}.html").write_text("")
+        (repo / "notebooks" / "helpers.py").write_text("VALUE = 2\n")
+        template = repo / "templates" / "index.html.j2"
+        template.parent.mkdir()
+        template.write_text("")
+
+        main(output=output, template=template, notebooks=repo / "notebooks", apps="", notebooks_wasm="", since="main")
+
+        changes = mock_generate_index.call_args.kwargs["changes"]
+        affected = {nb.path.name for nb in mock_generate_index.call_args.kwargs["notebooks"] if changes.affects(nb)}
+        assert affected == {"charts.py", "penguins.py"}
+
+    @patch("marimushka.export.generate_index")
+    def test_main_with_complete_output(self, mock_generate_index, repo):
+        """Test that main only marks changed notebooks as affected if every notebook has an export."""
+        output = repo / "_site"
+        (output / "notebooks").mkdir(parents=True)
+        for name in ("plain", "charts", "penguins"):
+            (output / "notebooks" / f"{name}.html").write_text("")
+        (repo / "notebooks" / "helpers.py").write_text("VALUE = 2\n")
+        template = repo / "templates" / "index.html.j2"
+        template.parent.mkdir()
+        template.write_text("")
+
+        main(output=output, template=template, notebooks=repo / "notebooks", apps="", notebooks_wasm="", since="main")
+
+        changes = mock_generate_index.call_args.kwargs["changes"]
+        affected = {nb.path.name for nb in mock_generate_index.call_args.kwargs["notebooks"] if changes.affects(nb)}
+        assert affected == {"charts.py"}
@@ -0,0 +1,201 @@
+"""Tests for the history.py module.
+
+This module contains tests for the export duration history and its use for
+longest-job-first scheduling in the orchestrator.
+"""
+
+import dataclasses
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka.exceptions import NotebookExportResult
+from marimushka.export import main
+from marimushka.history import HISTORY_FILENAME, HISTORY_VERSION, ExportHistory
+from marimushka.notebook import Kind, Notebook
+from marimushka.orchestrator import ExportJob, _format_eta, export_all_notebooks, export_jobs
+
+
+def _mock_notebook(name, duration=None, cached=False):
+    """Create a mock notebook whose export succeeds after the given duration."""
+    nb = MagicMock()
+    nb.path = Path(f"/{name}.py")
+    nb.kind = Kind.NB
+    result = NotebookExportResult.succeeded(nb.path, Path(f"/output/{name}.html"), cached=cached)
+    nb.export.return_value = dataclasses.replace(result, duration=duration)
+    return nb
+
+
+def _record_order(notebooks, order):
+    """Make each mock notebook append its name to order when exported."""
+    for nb in notebooks:
+        nb.export.side_effect = lambda nb=nb, **kwargs: order.append(nb.path.stem) or nb.export.return_value
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    """Create a notebook on disk."""
+    path = tmp_path / "demo.py"
+    path.write_text("import marimo\n")
+    return Notebook(path)
+
+
+class TestExportHistory:
+    """Tests for the ExportHistory class."""
+
+    def test_estimate_without_history(self, tmp_path, notebook):
+        """Test that unknown notebooks get the default estimate."""
+        history = ExportHistory(tmp_path / HISTORY_FILENAME)
+        assert history.estimate(notebook) == 30.0
+        assert history.estimate(notebook, default=5.0) == 5.0
+
+    def test_record_smooths_durations(self, tmp_path, notebook):
+        """Test that repeated measurements are blended."""
+        history = ExportHistory(tmp_path / HISTORY_FILENAME)
+        history.record(notebook, 10.0)
+        assert history.estimate(notebook) == 10.0
+        history.record(notebook, 20.0)
+        assert history.estimate(notebook) == 15.0
+
+    def test_kinds_are_recorded_separately(self, tmp_path, notebook):
+        """Test that the same file exported as another Kind has its own history."""
+        history = ExportHistory(tmp_path / HISTORY_FILENAME)
+        history.record(notebook, 10.0)
+        assert history.estimate(Notebook(notebook.path, kind=Kind.APP), default=1.0) == 1.0
+
+    def test_roundtrip(self, tmp_path, notebook):
+        """Test that a saved history loads back identically."""
+        path = tmp_path / "cache" / HISTORY_FILENAME
+        history = ExportHistory(path)
+        history.record(notebook, 12.5)
+        history.save()
+
+        assert ExportHistory.load(path).estimate(notebook) == 12.5
+        assert json.loads(path.read_text())["version"] == HISTORY_VERSION
+
+    def test_load_corrupt(self, tmp_path):
+        """Test that an unreadable history loads as empty."""
+        path = tmp_path / HISTORY_FILENAME
+        path.write_text("{not json")
+        assert ExportHistory.load(path).durations == {}
+
+    def test_load_other_version(self, tmp_path):
+        """Test that histories of another version are ignored."""
+        path = tmp_path / HISTORY_FILENAME
+        path.write_text(json.dumps({"version": HISTORY_VERSION + 1, "durations": {"notebook:a.py": 1.0}}))
+        assert ExportHistory.load(path).durations == {}
+
+    def test_save_failure_is_not_fatal(self, tmp_path, notebook):
+        """Test that a history that cannot be written only logs a warning."""
+        (tmp_path / "cache").write_text("")
+        history = ExportHistory(tmp_path / "cache" / HISTORY_FILENAME)
+        history.record(notebook, 12.5)
+
+        history.save()
+
+        assert (tmp_path / "cache").read_text() == ""
+
+
+class TestLongestJobFirst:
+    """Tests for longest-job-first scheduling in export_jobs."""
+
+    def test_jobs_dispatched_by_descending_estimate(self):
+        """Test that the slowest jobs are exported first and ties keep their order."""
+        order = []
+        notebooks = {name: _mock_notebook(name) for name in ("a", "b", "c", "d")}
+        _record_order(notebooks.values(), order)
+        jobs = [
+            ExportJob(notebooks["a"], Path("/out"), estimate=1.0),
+            ExportJob(notebooks["b"], Path("/out"), estimate=None),
+            ExportJob(notebooks["c"], Path("/out"), estimate=50.0),
+            ExportJob(notebooks["d"], Path("/out"), estimate=1.0),
+        ]
+
+        export_jobs(jobs, sandbox=True, bin_path=None, parallel=False)
+
+        assert order == ["c", "a", "d", "b"]
+
+    def test_durations_recorded_except_cache_hits(self, tmp_path):
+        """Test that measured durations are recorded, but cache hits are not."""
+        history = ExportHistory(tmp_path / HISTORY_FILENAME)
+        slow = _mock_notebook("slow", duration=42.0)
+        cached = _mock_notebook("cached", duration=0.1, cached=True)
+
+        export_jobs(
+            [ExportJob(slow, Path("/out")), ExportJob(cached, Path("/out"))],
+            sandbox=True,
+            bin_path=None,
+            parallel=False,
+            history=history,
+        )
+
+        assert history.estimate(slow) == 42.0
+        assert history.estimate(cached, default=-1.0) == -1.0
+
+    def test_eta_shown_on_progress_tasks(self):
+        """Test that each progress task shows the remaining estimated time."""
+        progress = MagicMock()
+        jobs = [
+            ExportJob(_mock_notebook("a"), Path("/out"), 1, estimate=60.0),
+            ExportJob(_mock_notebook("b"), Path("/out"), 2, estimate=30.0),
+        ]
+
+        export_jobs(jobs, sandbox=True, bin_path=None, parallel=False, progress=progress)
+
+        etas = [c.kwargs["eta"] for c in progress.update.call_args_list]
+        assert etas[:2] == ["ETA 1:30", "ETA 1:30"]
+        assert "ETA 0:30" in etas
+        assert etas[-2:] == ["", ""]
+
+    def test_no_eta_without_estimates(self):
+        """Test that builds without history do not show an ETA."""
+        progress = MagicMock()
+        export_jobs([ExportJob(_mock_notebook("a"), Path("/out"), 1)], True, None, parallel=False, progress=progress)
+        progress.update.assert_not_called()
+
+    def test_format_eta(self):
+        """Test the ETA label format."""
+        assert _format_eta(0) == "ETA 0:00"
+        assert _format_eta(125.4) == "ETA 2:05"
+
+    def test_export_all_notebooks_uses_history_estimates(self, tmp_path):
+        """Test that notebooks without history use the configured estimate."""
+        history = ExportHistory(tmp_path / HISTORY_FILENAME)
+        known = _mock_notebook("known")
+        unknown = _mock_notebook("unknown")
+        history.record(known, 5.0)
+        order = []
+        _record_order([known, unknown], order)
+
+        export_all_notebooks(
+            tmp_path,
+            [known, unknown],
+            [],
+            [],
+            sandbox=True,
+            bin_path=None,
+            parallel=False,
+            max_workers=1,
+            history=history,
+            estimated_duration=10.0,
+        )
+
+        assert order == ["unknown", "known"]
+
+
+class TestMainHistory:
+    """Tests for the history handling of export.main."""
+
+    @patch("marimushka.orchestrator.resolve_marimo_version", return_value="0.18.4")
+    def test_history_written_to_cache_dir(self, mock_version, tmp_path, fake_export):
+        """Test that a build with a cache directory records export durations."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        (folder / "demo.py").write_text("import marimo\n\napp = marimo.App()\n")
+
+        main(output=tmp_path / "_site", notebooks=folder, apps="", notebooks_wasm="", cache_dir=tmp_path / "cache")
+
+        history = ExportHistory.load(tmp_path / "cache" / HISTORY_FILENAME)
+        assert history.estimate(Notebook(folder / "demo.py"), default=-1.0) >= 0.0
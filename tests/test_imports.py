@@ -0,0 +1,123 @@
+"""Tests for the imports.py module.
+
+This module contains tests for finding the import statements of a source,
+resolving them to local modules and the import graph of notebooks.
+"""
+
+import json
+from unittest.mock import patch
+
+from marimushka.imports import IMPORTS_VERSION, ImportGraph, parse_imports, resolve_import
+
+
+class TestParseImports:
+    """Tests for parse_imports."""
+
+    def test_imports_in_cells(self):
+        """Test that imports at module level and inside cell functions are found in source order."""
+        source = b"import marimo\n\n\n@app.cell\ndef _():\n    import numpy as np, helpers\n    from .lib import *\n"
+
+        assert parse_imports(source) == (("marimo", 0, ()), ("numpy", 0, ()), ("helpers", 0, ()), ("lib", 1, ()))
+
+    def test_syntax_error(self):
+        """Test that a source that does not parse has no imports."""
+        assert parse_imports(b"def (:") == ()
+
+
+class TestResolveImport:
+    """Tests for resolve_import."""
+
+    def test_modules_and_packages(self, tmp_path):
+        """Test that modules, packages with their __init__ and submodules imported by name resolve."""
+        (tmp_path / "lib" / "sub").mkdir(parents=True)
+        (tmp_path / "helpers.py").write_text("")
+        (tmp_path / "lib" / "__init__.py").write_text("")
+        (tmp_path / "lib" / "sub" / "plots.py").write_text("")
+        notebook = tmp_path / "demo.py"
+
+        assert resolve_import(("helpers", 0, ()), notebook, tmp_path) == [tmp_path / "helpers.py"]
+        assert resolve_import(("lib.sub", 0, ("plots", "draw")), notebook, tmp_path) == [
+            tmp_path / "lib" / "__init__.py",
+            tmp_path / "lib" / "sub" / "plots.py",
+        ]
+        assert resolve_import(("numpy", 0, ()), notebook, tmp_path) == []
+
+    def test_relative(self, tmp_path):
+        """Test that relative imports resolve against the package of the importing module."""
+        (tmp_path / "lib").mkdir()
+        (tmp_path / "lib" / "a.py").write_text("")
+        (tmp_path / "shared.py").write_text("")
+
+        assert resolve_import(("", 1, ("a",)), tmp_path / "lib" / "b.py", tmp_path) == [tmp_path / "lib" / "a.py"]
+        assert resolve_import(("shared", 2, ()), tmp_path / "lib" / "b.py", tmp_path) == [tmp_path / "shared.py"]
+
+
+class TestImportGraph:
+    """Tests for ImportGraph."""
+
+    def test_transitive_modules(self, tmp_path):
+        """Test that modules imported by modules count, cycles end and unrelated files do not."""
+        (tmp_path / "demo.py").write_text("import marimo\nimport helpers\n")
+        (tmp_path / "helpers.py").write_text("from lib import plots\n")
+        (tmp_path / "lib").mkdir()
+        (tmp_path / "lib" / "plots.py").write_text("import helpers\n")
+        (tmp_path / "unused.py").write_text("")
+
+        modules = ImportGraph().modules(tmp_path / "demo.py")
+
+        assert modules == {(tmp_path / "helpers.py").resolve(), (tmp_path / "lib" / "plots.py").resolve()}
+
+    def test_modules_hash(self, tmp_path):
+        """Test that the digest is None without local modules and follows their contents."""
+        graph = ImportGraph()
+        (tmp_path / "demo.py").write_text("import helpers\n")
+        assert graph.modules_hash(tmp_path / "demo.py") is None
+
+        (tmp_path / "helpers.py").write_text("VALUE = 1\n")
+        first = graph.modules_hash(tmp_path / "demo.py")
+        (tmp_path / "helpers.py").write_text("VALUE = 2\n")
+
+        assert first is not None
+        assert graph.modules_hash(tmp_path / "demo.py") != first
+
+    def test_sources_parsed_once_per_digest(self, tmp_path):
+        """Test that unchanged sources are not parsed again, also when loaded from a file."""
+        (tmp_path / "demo.py").write_text("import helpers\n")
+        (tmp_path / "helpers.py").write_text("")
+        graph = ImportGraph()
+        graph.modules(tmp_path / "demo.py")
+        graph.modules(tmp_path / "demo.py")
+        graph.save(tmp_path / "cache" / "imports.json")
+
+        loaded = ImportGraph()
+        loaded.load(tmp_path / "cache" / "imports.json")
+        with patch("marimushka.imports.parse_imports") as mock_parse:
+            loaded.modules(tmp_path / "demo.py")
+
+        assert graph.parsed == 2
+        mock_parse.assert_not_called()
+
+    def test_load_unreadable_and_save_failure(self, tmp_path):
+        """Test that unreadable imports load as nothing and failed writes only log a warning."""
+        path = tmp_path / "imports.json"
+        path.write_text(json.dumps({"version": IMPORTS_VERSION, "entries": {"ab": [["helpers"]]}}))
+        graph = ImportGraph()
+
+        graph.load(path)
+        graph.save(path / "imports.json")
+
+        assert graph.entries == {}
+        assert json.loads(path.read_text())["entries"] == {"ab": [["helpers"]]}
+
+    def test_depends_on_deleted_module(self, tmp_path):
+        """Test that deleting a module still affects the notebooks that imported it."""
+        (tmp_path / "demo.py").write_text("import helpers\n")
+        helpers = tmp_path / "helpers.py"
+        helpers.write_text("")
+        graph = ImportGraph()
+        graph.modules(tmp_path / "demo.py")
+
+        helpers.unlink()
+
+        assert graph.depends_on(tmp_path / "demo.py", {helpers.resolve()})
+        assert not graph.depends_on(tmp_path / "demo.py", set())
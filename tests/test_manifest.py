@@ -0,0 +1,235 @@
+"""Tests for the manifest.py module.
+
+This module contains tests for the build manifest and its use by
+generate_index for incremental builds and orphan removal.
+"""
+
+import json
+from unittest.mock import patch
+
+from marimushka.cache import ExportCache
+from marimushka.exceptions import ExportSubprocessError, NotebookExportResult
+from marimushka.manifest import (
+    MANIFEST_FILENAME,
+    MANIFEST_VERSION,
+    BuildManifest,
+    ManifestEntry,
+    remove_orphans,
+    update_manifest,
+)
+from marimushka.notebook import Kind, Notebook
+
+
+class TestBuildManifest:
+    """Tests for loading and saving manifests."""
+
+    def test_roundtrip(self, tmp_path):
+        """Test that a saved manifest loads back identically."""
+        entry = ManifestEntry("nb.py", "notebook", "abc", True, 1.5, "0.18.4")
+        BuildManifest(entries={"notebooks/nb.html": entry}).save(tmp_path)
+
+        loaded = BuildManifest.load(tmp_path)
+        assert loaded.entries == {"notebooks/nb.html": entry}
+        assert json.loads((tmp_path / MANIFEST_FILENAME).read_text())["version"] == MANIFEST_VERSION
+
+    def test_load_missing(self, tmp_path):
+        """Test that a missing manifest loads as empty."""
+        assert BuildManifest.load(tmp_path).entries == {}
+
+    def test_load_corrupt(self, tmp_path):
+        """Test that an unreadable manifest loads as empty."""
+        (tmp_path / MANIFEST_FILENAME).write_text("{not json")
+        assert BuildManifest.load(tmp_path).entries == {}
+
+    def test_load_other_version(self, tmp_path):
+        """Test that manifests of another version are ignored."""
+        (tmp_path / MANIFEST_FILENAME).write_text(json.dumps({"version": MANIFEST_VERSION + 1, "entries": {}}))
+        assert BuildManifest.load(tmp_path).entries == {}
+
+    def test_save_failure_is_not_fatal(self, tmp_path):
+        """Test that a manifest that cannot be written only logs a warning."""
+        output_dir = tmp_path / "file"
+        output_dir.write_text("")
+        BuildManifest().save(output_dir)
+        assert output_dir.read_text() == ""
+
+    def test_is_current_needs_exported_file(self, tmp_path):
+        """Test that a notebook whose exported file is missing is not current."""
+        nb_file = tmp_path / "nb.py"
+        nb_file.write_text("x")
+        nb = Notebook(nb_file)
+        entry = ManifestEntry(str(nb_file), "notebook", "h", True)
+        manifest = BuildManifest(entries={nb.html_path.as_posix(): entry})
+
+        assert not manifest.is_current(nb, tmp_path, True, None)
+
+    def test_is_current_unreadable_notebook(self, tmp_path):
+        """Test that a notebook that cannot be hashed is not current."""
+        nb_file = tmp_path / "nb.py"
+        nb_file.write_text("x")
+        nb = Notebook(nb_file)
+        (tmp_path / nb.html_path).parent.mkdir(parents=True)
+        (tmp_path / nb.html_path).write_text("")
+        entry = ManifestEntry(str(nb_file), "notebook", "h", True)
+        manifest = BuildManifest(entries={nb.html_path.as_posix(): entry})
+
+        with patch("marimushka.manifest.hash_file", side_effect=OSError("unreadable")):
+            assert not manifest.is_current(nb, tmp_path, True, None)
+
+
+class TestUpdateManifest:
+    """Tests for update_manifest and remove_orphans."""
+
+    def test_failed_export_keeps_previous_entry(self, tmp_path):
+        """Test that a failed export does not turn the previous file into an orphan."""
+        nb_file = tmp_path / "nb.py"
+        nb_file.write_text("x")
+        nb = Notebook(nb_file)
+        old_entry = ManifestEntry(str(nb_file), "notebook", "old", True)
+        previous = BuildManifest(entries={"notebooks/nb.html": old_entry})
+        failure = NotebookExportResult.failed(nb_file, ExportSubprocessError(nb_file, ["cmd"], 1))
+
+        manifest = update_manifest(previous, [nb], [failure], tmp_path, True, None)
+
+        assert manifest.entries == {"notebooks/nb.html": old_entry}
+        assert previous.orphans(manifest) == []
+
+    def test_unreadable_notebook_is_left_out(self, tmp_path):
+        """Test that a notebook that cannot be hashed gets no entry."""
+        nb_file = tmp_path / "nb.py"
+        nb_file.write_text("x")
+        nb = Notebook(nb_file)
+        html = tmp_path / nb.html_path
+        html.parent.mkdir(parents=True)
+        html.write_text("")
+        success = NotebookExportResult.succeeded(nb_file, html)
+
+        with patch("marimushka.manifest.hash_file", side_effect=OSError("unreadable")):
+            manifest = update_manifest(BuildManifest(), [nb], [success], tmp_path, True, None)
+
+        assert manifest.entries == {}
+
+    def test_remove_orphans_only_touches_recorded_files(self, tmp_path):
+        """Test that orphan removal never escapes the output directory."""
+        (tmp_path / "out").mkdir()
+        (tmp_path / "out" / "gone.html").write_text("x")
+        (tmp_path / "outside.html").write_text("x")
+        entry = ManifestEntry("src.py", "notebook", "h", True)
+        previous = BuildManifest(entries={"gone.html": entry, "../outside.html": entry})
+
+        removed = remove_orphans(previous, BuildManifest(), tmp_path / "out")
+
+        assert removed == [(tmp_path / "out" / "gone.html").resolve()]
+        assert (tmp_path / "outside.html").exists()
+
+    def test_remove_orphans_skips_undeletable_files(self, tmp_path):
+        """Test that an orphan that cannot be deleted is kept and not reported."""
+        (tmp_path / "stuck.html").mkdir()
+        entry = ManifestEntry("src.py", "notebook", "h", True)
+        previous = BuildManifest(entries={"stuck.html": entry})
+
+        assert remove_orphans(previous, BuildManifest(), tmp_path) == []
+        assert (tmp_path / "stuck.html").is_dir()
+
+
+class TestGenerateIndexManifest:
+    """Tests for the manifest handling of generate_index."""
+
+    def test_manifest_written(self, site, fake_export, export_site):
+        """Test that a build records every exported file."""
+        folder, output, _ = site
+        export_site()
+
+        manifest = BuildManifest.load(output)
+        assert sorted(manifest.entries) == ["notebooks/alpha.html", "notebooks/beta.html"]
+        entry = manifest.entries["notebooks/alpha.html"]
+        assert entry.source == str(folder / "alpha.py")
+        assert entry.kind == Kind.NB.value
+        assert entry.sandbox is True
+        assert entry.duration is not None
+
+    @patch("marimushka.orchestrator.resolve_marimo_version", return_value="0.18.4")
+    def test_incremental_skips_unchanged(self, mock_version, site, fake_export, export_site):
+        """Test that an incremental build only re-exports changed notebooks."""
+        folder, output, _ = site
+        export_site(incremental=True)
+        assert fake_export.call_count == 2
+
+        (folder / "beta.py").write_text("import marimo\napp = marimo.App()\n")
+        html = export_site(incremental=True)
+
+        assert fake_export.call_count == 3
+        assert str(folder / "beta.py") in fake_export.call_args[0][0]
+        assert html == "alpha;beta;"
+        assert BuildManifest.load(output).entries["notebooks/alpha.html"].marimo_version == "0.18.4"
+
+    @patch("marimushka.orchestrator.resolve_marimo_version", return_value="0.18.4")
+    def test_incremental_re_exports_module_dependents(self, mock_version, site, fake_export, export_site):
+        """Test that a changed local module re-exports exactly the notebooks importing it."""
+        folder, output, _ = site
+        (folder / "lib").mkdir()
+        (folder / "lib" / "__init__.py").write_text("")
+        (folder / "lib" / "plots.py").write_text("SIZE = 1\n")
+        (folder / "lib" / "helpers.py").write_text("from . import plots\n")
+        (folder / "alpha.py").write_text("import marimo\n\n\ndef _():\n    from lib import helpers\n")
+        export_site(incremental=True)
+        assert fake_export.call_count == 2
+
+        (folder / "lib" / "plots.py").write_text("SIZE = 2\n")
+        export_site(incremental=True)
+
+        assert fake_export.call_count == 3
+        assert str(folder / "alpha.py") in fake_export.call_args[0][0]
+        assert BuildManifest.load(output).entries["notebooks/beta.html"].modules_hash is None
+
+    @patch("marimushka.orchestrator.resolve_marimo_version", return_value="0.18.4")
+    def test_incremental_re_exports_data_dependents(self, mock_version, site, fake_export, export_site):
+        """Test that a changed data file re-exports exactly the notebooks referencing it."""
+        folder, output, _ = site
+        (folder / "public").mkdir()
+        (folder / "public" / "penguins.csv").write_text("species\n")
+        (folder / "beta.py").write_text('import marimo\n\nDATA = mo.notebook_location() / "public" / "penguins.csv"\n')
+        export_site(incremental=True)
+
+        (folder / "public" / "penguins.csv").write_text("species\nAdelie\n")
+        export_site(incremental=True)
+
+        assert fake_export.call_count == 3
+        assert str(folder / "beta.py") in fake_export.call_args[0][0]
+        assert BuildManifest.load(output).entries["notebooks/alpha.html"].assets_hash is None
+
+    @patch("marimushka.orchestrator.resolve_marimo_version")
+    def test_cache_version_recorded(self, mock_version, site, fake_export, export_site):
+        """Test that the marimo version pinned by the cache is recorded without resolving one."""
+        folder, output, _ = site
+
+        export_site(cache=ExportCache(folder.parent / "cache", marimo_version="0.18.4"))
+
+        mock_version.assert_not_called()
+        assert BuildManifest.load(output).entries["notebooks/alpha.html"].marimo_version == "0.18.4"
+
+    @patch("marimushka.orchestrator.resolve_marimo_version")
+    def test_incremental_re_exports_on_marimo_upgrade(self, mock_version, fake_export, export_site):
+        """Test that a new marimo version invalidates all previous exports."""
+        mock_version.return_value = "0.18.4"
+        export_site(incremental=True)
+
+        mock_version.return_value = "0.19.0"
+        export_site(incremental=True)
+
+        assert fake_export.call_count == 4
+
+    def test_removed_notebook_is_pruned(self, site, fake_export, export_site):
+        """Test that exports of deleted notebooks are removed from the site."""
+        folder, output, _ = site
+        (output / "notebooks").mkdir(parents=True)
+        (output / "notebooks" / "handwritten.html").write_text("keep me")
+        export_site()
+
+        (folder / "beta.py").unlink()
+        export_site()
+
+        assert (output / "notebooks" / "alpha.html").exists()
+        assert not (output / "notebooks" / "beta.html").exists()
+        assert (output / "notebooks" / "handwritten.html").exists()
+        assert sorted(BuildManifest.load(output).entries) == ["notebooks/alpha.html"]
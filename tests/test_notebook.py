@@ -3,8 +3,10 @@
 This module contains tests for the Notebook class and Kind enum in the notebook.py module.
 """
 
+import asyncio
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
@@ -13,12 +15,13 @@ from hypothesis import given
 from hypothesis import strategies as st
 
 from marimushka.exceptions import (
+    ExportCancelledError,
     ExportExecutableNotFoundError,
     ExportSubprocessError,
     NotebookInvalidError,
     NotebookNotFoundError,
 )
-from marimushka.notebook import Kind, Notebook
+from marimushka.notebook import Kind, Notebook, resolve_executable
 
 
 class TestKind:
@@ -147,7 +150,7 @@ class TestNotebook:
             Notebook(notebook_path)
         assert "Python file" in exc_info.value.reason
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_to_wasm_success(self, mock_run, resource_dir, tmp_path):
         """Test successful export of a notebook to WebAssembly."""
         # Setup
@@ -181,7 +184,7 @@ class TestNotebook:
             assert "--sandbox" in cmd_args
             assert "--no-show-code" not in cmd_args
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_to_wasm_as_app(self, mock_run, resource_dir, tmp_path):
         """Test export of a notebook as an app."""
         # Setup
@@ -213,7 +216,7 @@ class TestNotebook:
             assert "run" in cmd_args
             assert "--no-show-code" in cmd_args
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_to_wasm_subprocess_error(self, mock_run, resource_dir, tmp_path):
         """Test handling of subprocess error during export."""
         # Setup
@@ -239,7 +242,7 @@ class TestNotebook:
             assert result.error is not None
             assert isinstance(result.error, ExportSubprocessError)
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_to_wasm_file_not_found_error(self, mock_run, resource_dir, tmp_path):
         """Test handling of FileNotFoundError (executable not found) during export."""
         # Setup
@@ -265,7 +268,7 @@ class TestNotebook:
             assert result.error is not None
             assert isinstance(result.error, ExportExecutableNotFoundError)
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_no_sandbox(self, mock_run, resource_dir, tmp_path):
         """Test export of a notebook without sandbox."""
         # Setup
@@ -296,7 +299,7 @@ class TestNotebook:
 
     @patch("marimushka.notebook.validate_bin_path")
     @patch("shutil.which")
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_bin_path(self, mock_run, mock_which, mock_validate_bin_path, resource_dir, tmp_path):
         """Test export of a notebook with a bin path."""
         # Setup
@@ -335,7 +338,7 @@ class TestNotebook:
     @patch("marimushka.notebook.validate_bin_path")
     @patch("os.access")
     @patch("shutil.which")
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_bin_path_fallback_success(
         self, mock_run, mock_which, mock_access, mock_validate_bin_path, resource_dir, tmp_path
     ):
@@ -406,7 +409,7 @@ class TestNotebook:
         assert isinstance(result.error, ExportExecutableNotFoundError)
         assert result.error.search_path == bin_path
 
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_nonzero_returncode(self, mock_run, resource_dir, tmp_path):
         """Test export of a notebook when subprocess returns non-zero exit code."""
         # Setup
@@ -435,6 +438,20 @@ class TestNotebook:
             assert result.error.stderr == "Export failed"
             mock_run.assert_called_once()
 
+    @patch("marimushka.notebook.run_process_tree")
+    def test_export_syntax_error(self, mock_run, tmp_path):
+        """Test that a notebook with a syntax error fails without spawning a process."""
+        notebook_path = tmp_path / "broken.py"
+        notebook_path.write_text("import marimo\n\napp = marimo.App(\n")
+        notebook = Notebook(notebook_path)
+
+        result = notebook.export(tmp_path / "_site")
+
+        assert result.success is False
+        assert isinstance(result.error, NotebookInvalidError)
+        assert "syntax error in line" in str(result.error)
+        mock_run.assert_not_called()
+
     def test_display_name(self, resource_dir):
         """Test the display_name property of the Notebook class."""
         # Setup
@@ -612,8 +629,8 @@ class TestFolder2NotebooksHypothesis:
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)
             # Create some test files
-            (tmp_path / "test1.py").touch()
-            (tmp_path / "test2.py").touch()
+            (tmp_path / "test1.py").write_text("import marimo\n\napp = marimo.App()\n")
+            (tmp_path / "test2.py").write_text("import marimo\n\napp = marimo.App()\n")
             (tmp_path / "not_a_notebook.txt").touch()
 
             notebooks = folder2notebooks(tmp_path, kind=kind)
@@ -630,9 +647,8 @@ class TestFolder2NotebooksHypothesis:
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)
             # Create files in non-alphabetical order
-            (tmp_path / "zebra.py").touch()
-            (tmp_path / "alpha.py").touch()
-            (tmp_path / "middle.py").touch()
+            for name in ["zebra.py", "alpha.py", "middle.py"]:
+                (tmp_path / name).write_text("import marimo\n\napp = marimo.App()\n")
 
             notebooks = folder2notebooks(tmp_path, kind=kind)
 
@@ -643,7 +659,12 @@ class TestFolder2NotebooksHypothesis:
 class TestNotebookExportEdgeCases:
     """Tests for edge cases in Notebook.export method."""
 
-    @patch("subprocess.run")
+    def test_resolve_executable_in_bin_path(self, fake_uvx):
+        """Test that uvx is resolved to its full path inside bin_path with the default audit logger."""
+        assert resolve_executable(fake_uvx) == str(fake_uvx / "uvx")
+        assert resolve_executable(None) == "uvx"
+
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_timeout_expired(self, mock_run, resource_dir, tmp_path):
         """Test export handles TimeoutExpired exception."""
         # Setup
@@ -671,7 +692,7 @@ class TestNotebookExportEdgeCases:
             assert "timed out" in result.error.stderr
 
     @patch("marimushka.notebook.validate_path_traversal")
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_path_traversal_error(self, mock_run, mock_validate, resource_dir, tmp_path):
         """Test export handles path traversal validation error."""
         # Setup
@@ -700,7 +721,7 @@ class TestNotebookExportEdgeCases:
 
     @patch("marimushka.notebook.validate_bin_path")
     @patch("shutil.which")
-    @patch("subprocess.run")
+    @patch("marimushka.notebook.run_process_tree")
     def test_export_bin_path_validation_error(self, mock_run, mock_which, mock_validate, resource_dir, tmp_path):
         """Test export handles bin_path validation error."""
         # Setup
@@ -726,3 +747,116 @@ class TestNotebookExportEdgeCases:
             assert result.success is False
             assert result.error is not None
             assert isinstance(result.error, ExportExecutableNotFoundError)
+
+
+class TestNotebookExportAsync:
+    """Tests for Notebook.export_async with a real subprocess."""
+
+    @staticmethod
+    def _notebook(tmp_path, source="import marimo\n"):
+        """Create a notebook file with the given source."""
+        path = tmp_path / "demo.py"
+        path.write_text(source)
+        return Notebook(path)
+
+    def test_export_async_success(self, fake_uvx, tmp_path):
+        """Test that a successful asyncio export writes the output file."""
+        notebook = self._notebook(tmp_path)
+
+        result = asyncio.run(notebook.export_async(tmp_path / "out", bin_path=fake_uvx))
+
+        assert result.success is True
+        assert result.output_path == tmp_path / "out" / "demo.html"
+        assert result.output_path.read_text() == "<html></html>"
+        assert result.duration is not None
+
+    def test_export_async_failure(self, fake_uvx, tmp_path):
+        """Test that a failing asyncio export reports the exit code and stderr."""
+        notebook = self._notebook(tmp_path, "FAIL\n")
+
+        result = asyncio.run(notebook.export_async(tmp_path / "out", bin_path=fake_uvx))
+
+        assert result.success is False
+        assert isinstance(result.error, ExportSubprocessError)
+        assert result.error.return_code == 1
+        assert "export failed" in result.error.stderr
+
+    def test_export_async_timeout(self, fake_uvx, tmp_path):
+        """Test that an asyncio export exceeding its timeout is killed."""
+        notebook = self._notebook(tmp_path, "SLEEP\n")
+
+        result = asyncio.run(notebook.export_async(tmp_path / "out", bin_path=fake_uvx, timeout=1))
+
+        assert result.success is False
+        assert "timed out" in result.error.stderr
+        assert result.duration < 30
+
+    def test_export_async_cancelled(self, fake_uvx, tmp_path):
+        """Test that cancelling an asyncio export propagates the cancellation."""
+        notebook = self._notebook(tmp_path, "SLEEP\n")
+
+        async def cancel_export():
+            """Start an export and cancel it shortly after."""
+            task = asyncio.create_task(notebook.export_async(tmp_path / "out", bin_path=fake_uvx))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await task
+
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(cancel_export())
+
+    def test_export_async_missing_executable(self, tmp_path):
+        """Test that a missing executable is reported as ExportExecutableNotFoundError."""
+        notebook = self._notebook(tmp_path)
+
+        with patch("asyncio.create_subprocess_exec", side_effect=FileNotFoundError("uvx")):
+            result = asyncio.run(notebook.export_async(tmp_path / "out"))
+
+        assert result.success is False
+        assert isinstance(result.error, ExportExecutableNotFoundError)
+
+    def test_export_async_audit_logger(self, fake_uvx, tmp_path):
+        """Test that an asyncio export logs to the given audit logger."""
+        audit_logger = MagicMock()
+
+        result = asyncio.run(
+            self._notebook(tmp_path).export_async(tmp_path / "out", bin_path=fake_uvx, audit_logger=audit_logger)
+        )
+
+        assert result.success is True
+        audit_logger.log_export.assert_called_once_with(tmp_path / "demo.py", result.output_path, True)
+
+    def test_export_async_cancelled_before_start(self, tmp_path):
+        """Test that an export cancelled before it started fails without starting a process."""
+        notebook = self._notebook(tmp_path)
+        cancel = threading.Event()
+        cancel.set()
+
+        with patch("asyncio.create_subprocess_exec") as mock_exec:
+            result = asyncio.run(notebook.export_async(tmp_path / "out", cancel=cancel))
+
+        assert result.success is False
+        assert isinstance(result.error, ExportCancelledError)
+        mock_exec.assert_not_called()
+
+    def test_export_async_start_failure(self, tmp_path):
+        """Test that a process that cannot be started is reported as ExportSubprocessError."""
+        notebook = self._notebook(tmp_path)
+
+        with patch("asyncio.create_subprocess_exec", side_effect=PermissionError("denied")):
+            result = asyncio.run(notebook.export_async(tmp_path / "out"))
+
+        assert result.success is False
+        assert isinstance(result.error, ExportSubprocessError)
+
+    def test_export_async_invalid_notebook(self, tmp_path):
+        """Test that a notebook that does not compile fails without starting a process."""
+        notebook = self._notebook(tmp_path, "import marimo\n\napp = marimo.App(\n")
+
+        with patch("asyncio.create_subprocess_exec") as mock_exec:
+            result = asyncio.run(notebook.export_async(tmp_path / "out"))
+
+        assert result.success is False
+        assert isinstance(result.error, NotebookInvalidError)
+        assert result.duration is not None
+        mock_exec.assert_not_called()
@@ -0,0 +1,144 @@
+"""Tests for the pagination.py module.
+
+This module contains tests for splitting the index into a front page and
+per-kind pages, for the pages of nested directories, and for the pagination
+data passed to the template.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from marimushka.notebook import Kind, Notebook, folder2notebooks
+from marimushka.pagination import page_path, plan_directory_pages, plan_index_pages
+
+NOTEBOOK = "import marimo\n\napp = marimo.App()\n"
+
+
+def _notebooks(folder: Path, count: int, kind: Kind = Kind.NB) -> list[Notebook]:
+    """Create notebook files and return them as notebooks of a kind."""
+    folder.mkdir(exist_ok=True)
+    paths = [folder / f"nb_{i:02d}.py" for i in range(count)]
+    for path in paths:
+        path.write_text("import marimo")
+    return [Notebook(path, kind) for path in paths]
+
+
+class TestPagePath:
+    """Tests for page_path."""
+
+    def test_first_and_following_pages(self):
+        """Test that the first page is the kind's index and later pages are numbered."""
+        assert page_path(Kind.NB, 1) == Path("notebooks/index.html")
+        assert page_path(Kind.APP, 3) == Path("apps/page-3.html")
+
+
+class TestPlanIndexPages:
+    """Tests for plan_index_pages."""
+
+    def test_without_page_size(self, tmp_path):
+        """Test that a page size of 0 gives one unpaginated index page."""
+        notebooks = _notebooks(tmp_path / "notebooks", 3)
+
+        (page,) = plan_index_pages(notebooks, [], [], page_size=0)
+
+        assert page.path == Path("index.html")
+        assert page.notebooks == notebooks
+        assert page.pagination is None
+
+    def test_front_page_and_shards(self, tmp_path):
+        """Test that the front page lists the first page of each kind and every kind is sharded."""
+        notebooks = _notebooks(tmp_path / "notebooks", 5)
+        apps = _notebooks(tmp_path / "apps", 1, Kind.APP)
+
+        front, *shards = plan_index_pages(notebooks, apps, [], page_size=2)
+
+        assert front.path == Path("index.html")
+        assert front.notebooks == notebooks[:2]
+        assert front.apps == apps
+        assert front.pagination.kind is None
+        assert front.pagination.total == 6
+        assert front.pagination.shards["notebooks"].count == 3
+        assert front.pagination.shards["apps"].url == "apps/index.html"
+        assert "notebooks_wasm" not in front.pagination.shards
+        assert [page.path.as_posix() for page in shards] == [
+            "notebooks/index.html",
+            "notebooks/page-2.html",
+            "notebooks/page-3.html",
+            "apps/index.html",
+        ]
+
+    def test_page_navigation(self, tmp_path):
+        """Test the notebooks and links of a page in the middle of a kind."""
+        notebooks = _notebooks(tmp_path / "notebooks", 5)
+
+        page = plan_index_pages(notebooks, [], [], page_size=2)[2]
+
+        assert page.notebooks == notebooks[2:4]
+        assert page.apps == []
+        assert page.pagination.number == 2
+        assert page.pagination.root == "../"
+        assert page.pagination.url == "notebooks/page-2.html"
+        assert page.pagination.previous_url == "notebooks/index.html"
+        assert page.pagination.next_url == "notebooks/page-3.html"
+
+    def test_directory_pages_appended(self, tmp_path):
+        """Test that directory pages follow the pages of the kinds, also on a paginated index."""
+        for name in ["a.py", "b.py", "team/c.py"]:
+            (tmp_path / name).parent.mkdir(exist_ok=True)
+            (tmp_path / name).write_text(NOTEBOOK)
+        notebooks = folder2notebooks(tmp_path, recursive=True)
+
+        pages = plan_index_pages(notebooks, [], [], page_size=2)
+
+        assert [page.path.as_posix() for page in pages] == [
+            "index.html",
+            "notebooks/index.html",
+            "notebooks/page-2.html",
+            "notebooks/team/index.html",
+        ]
+        assert pages[0].directory.folders["notebooks"][0].url == "notebooks/team/index.html"
+
+    def test_negative_page_size(self):
+        """Test that a negative page size is rejected."""
+        with pytest.raises(ValueError, match="negative"):
+            plan_index_pages([], [], [], page_size=-1)
+
+
+class TestPlanDirectoryPages:
+    """Tests for plan_directory_pages."""
+
+    def test_flat_site(self, tmp_path):
+        """Test that a site without nested notebooks has no directory pages."""
+        notebooks = _notebooks(tmp_path / "notebooks", 2)
+
+        assert plan_directory_pages(notebooks, [], []) == (None, [])
+
+    def test_page_per_directory(self, tmp_path):
+        """Test that every directory lists its own notebooks and links to its subdirectories."""
+        for name in ["a.py", "team/b.py", "team/sub/c.py", "team/sub/d.py", "other/deep/e.py"]:
+            (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / name).write_text(NOTEBOOK)
+        apps = folder2notebooks(tmp_path, Kind.APP, recursive=True)
+
+        root, pages = plan_directory_pages([], apps, [])
+
+        assert root.url == "index.html"
+        assert [(folder.name, folder.total) for folder in root.folders["apps"]] == [("other", 1), ("team", 3)]
+        assert [page.path.as_posix() for page in pages] == [
+            "apps/other/index.html",
+            "apps/other/deep/index.html",
+            "apps/team/index.html",
+            "apps/team/sub/index.html",
+        ]
+        team, sub = pages[2], pages[3]
+        assert [nb.path.name for nb in team.apps] == ["b.py"]
+        assert team.notebooks == []
+        assert team.directory.parent_url == "index.html"
+        assert team.directory.folders["apps"][0].url == "apps/team/sub/index.html"
+        assert [nb.path.name for nb in sub.apps] == ["c.py", "d.py"]
+        assert sub.directory.root == "../../../"
+        assert sub.directory.parent_url == "apps/team/index.html"
+        assert sub.directory.url == "apps/team/sub/index.html"
+        # A directory with subdirectories only still gets a page
+        assert pages[0].apps == []
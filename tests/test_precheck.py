@@ -0,0 +1,137 @@
+"""Tests for the precheck.py module.
+
+This module contains tests for telling marimo notebooks from other Python
+files without running them, reporting syntax errors and reusing the checks
+of unchanged files.
+"""
+
+import json
+import os
+from unittest.mock import patch
+
+from marimushka.precheck import CHECK_VERSION, HEADER_BYTES, SourceCheck, SourceCheckCache, check_source
+
+NOTEBOOK = "import marimo\n\napp = marimo.App(width='medium')\n\n\n@app.cell\ndef _():\n    return\n"
+
+
+class TestCheckSource:
+    """Tests for check_source."""
+
+    def test_notebook(self, tmp_path):
+        """Test that a file creating a marimo app is a notebook without errors."""
+        path = tmp_path / "demo.py"
+        path.write_text(NOTEBOOK)
+
+        check = check_source(path)
+
+        assert check == SourceCheck(path.stat().st_mtime_ns, path.stat().st_size, notebook=True)
+
+    def test_only_header_read_without_marimo(self, tmp_path):
+        """Test that a file not mentioning marimo in its header is rejected after reading the header."""
+        path = tmp_path / "big.py"
+        path.write_text("x = 1\n" * HEADER_BYTES + "import marimo\napp = marimo.App()\n")
+
+        assert check_source(path).notebook is False
+
+    def test_tokenizer_finds_unusual_forms(self, tmp_path):
+        """Test that calls the line pattern misses are found by scanning tokens."""
+        path = tmp_path / "demo.py"
+        path.write_text("import marimo\n\napps = [\n    marimo.App (),\n]\n")
+
+        assert check_source(path).notebook is True
+
+    def test_untokenizable_source_judged_by_text(self, tmp_path):
+        """Test that a source the tokenizer rejects is a notebook if its text calls marimo.App."""
+        path = tmp_path / "demo.py"
+        path.write_text("import marimo\nif True:\n        a = 1\n    b = 2\napps = [marimo.App()]\n")
+
+        check = check_source(path)
+
+        assert check.notebook is True
+        assert check.error is not None
+
+    def test_strings_and_comments_ignored(self, tmp_path):
+        """Test that marimo.App( in strings and comments does not make a notebook."""
+        path = tmp_path / "helpers.py"
+        path.write_text('import marimo\n# marimo.App(\nDOC = "marimo.App("\n')
+
+        assert check_source(path).notebook is False
+
+    def test_syntax_error(self, tmp_path):
+        """Test that the syntax error of a notebook is reported with its line."""
+        path = tmp_path / "broken.py"
+        path.write_text("import marimo\n\napp = marimo.App()\n\ndef (:\n")
+
+        check = check_source(path)
+
+        assert check.notebook is True
+        assert check.error.startswith("syntax error in line 5")
+
+
+class TestSourceCheckCache:
+    """Tests for SourceCheckCache."""
+
+    def test_unchanged_files_not_checked_again(self, tmp_path):
+        """Test that a file is only checked again once its modification time or size changed."""
+        path = tmp_path / "demo.py"
+        path.write_text(NOTEBOOK)
+        cache = SourceCheckCache()
+
+        with patch("marimushka.precheck.check_source", wraps=check_source) as mock_check:
+            cache.get(path)
+            cache.get(path)
+            path.write_text("x = 1\n")
+            os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000_000))
+            changed = cache.get(path)
+
+        assert mock_check.call_count == 2
+        assert cache.checked == 2
+        assert changed.notebook is False
+
+    def test_save_and_load(self, tmp_path):
+        """Test that persisted checks are loaded and checks of removed files are dropped."""
+        checks_path = tmp_path / "cache" / "source-checks.json"
+        kept, removed = tmp_path / "kept.py", tmp_path / "removed.py"
+        kept.write_text(NOTEBOOK)
+        removed.write_text(NOTEBOOK)
+        cache = SourceCheckCache()
+        cache.get(kept)
+        cache.get(removed)
+        removed.unlink()
+
+        cache.save(checks_path)
+        loaded = SourceCheckCache()
+        loaded.load(checks_path)
+
+        assert set(loaded.entries) == {str(kept)}
+        assert loaded.get(kept).notebook is True
+        assert loaded.checked == 0
+
+    def test_load_ignores_other_versions(self, tmp_path):
+        """Test that checks written by another version of the check are not reused."""
+        checks_path = tmp_path / "source-checks.json"
+        entry = {"mtime_ns": 1, "size": 1, "notebook": True, "error": None}
+        checks_path.write_text(json.dumps({"version": CHECK_VERSION + 1, "entries": {"demo.py": entry}}))
+        cache = SourceCheckCache()
+
+        cache.load(checks_path)
+
+        assert cache.entries == {}
+
+    def test_load_ignores_unreadable_checks(self, tmp_path):
+        """Test that checks with unexpected fields are not loaded."""
+        checks_path = tmp_path / "source-checks.json"
+        checks_path.write_text(json.dumps({"version": CHECK_VERSION, "entries": {"demo.py": {"size": 1}}}))
+        cache = SourceCheckCache()
+
+        cache.load(checks_path)
+
+        assert cache.entries == {}
+
+    def test_save_failure_is_not_fatal(self, tmp_path):
+        """Test that checks that cannot be written only log a warning."""
+        (tmp_path / "cache").write_text("")
+
+        SourceCheckCache().save(tmp_path / "cache" / "source-checks.json")
+
+        assert (tmp_path / "cache").read_text() == ""
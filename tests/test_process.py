@@ -0,0 +1,327 @@
+"""Tests for the process.py module.
+
+This module contains tests that run real process trees and check that
+timeouts, cancellation and leftover processes terminate every descendant.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka.exceptions import ExportCancelledError
+from marimushka.notebook import Notebook
+from marimushka.process import (
+    ProcessTreeCancelled,
+    ProcessTreeTimeoutExpired,
+    _communicate,
+    _session_members,
+    _tree_alive,
+    communicate_async,
+    run_process_tree,
+    start_process_tree_async,
+    terminate_process_tree,
+    terminate_process_tree_async,
+)
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="process groups require POSIX")
+
+
+def _spawner(pid_file, ignore_term=False, wait=True):
+    """Return a command that starts a sleeping grandchild and records its pid.
+
+    Args:
+        pid_file: File the grandchild's pid is written to.
+        ignore_term: Whether the grandchild ignores SIGTERM.
+        wait: Whether the direct child waits for the grandchild or exits at once.
+
+    Returns:
+        The command to run.
+
+    """
+    grandchild = "import signal, time\n"
+    if ignore_term:
+        grandchild += "signal.signal(signal.SIGTERM, signal.SIG_IGN)\n"
+    grandchild += "time.sleep(60)\n"
+    script = (
+        "import subprocess, sys\n"
+        f"p = subprocess.Popen([sys.executable, '-c', {grandchild!r}], stdout=subprocess.DEVNULL, "
+        "stderr=subprocess.DEVNULL)\n"
+        f"open({str(pid_file)!r}, 'w').write(str(p.pid))\n"
+        "sys.stdout.flush()\n"
+    )
+    if wait:
+        script += "p.wait()\n"
+    return [sys.executable, "-c", script]
+
+
+def _alive(pid):
+    """Return True if a process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def _cmdline(pid):
+    """Return the command line of a process, or '' if it is gone."""
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return ""
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+class TestRunProcessTree:
+    """Tests for run_process_tree."""
+
+    def test_success(self):
+        """Test that output and exit code are captured."""
+        result = run_process_tree([sys.executable, "-c", "print('hi')"], timeout=30)
+        assert result.returncode == 0
+        assert result.stdout.strip() == "hi"
+        assert result.reaped == 0
+
+    def test_timeout_kills_grandchildren(self, tmp_path):
+        """Test that a timeout terminates the direct child and its descendants."""
+        pid_file = tmp_path / "pid"
+
+        with pytest.raises(ProcessTreeTimeoutExpired) as exc_info:
+            run_process_tree(_spawner(pid_file), timeout=2)
+
+        assert exc_info.value.reaped == 2
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_sigkill_after_grace_period(self, tmp_path):
+        """Test that processes ignoring SIGTERM are killed after the grace period."""
+        pid_file = tmp_path / "pid"
+
+        started = time.monotonic()
+        with pytest.raises(ProcessTreeTimeoutExpired):
+            run_process_tree(_spawner(pid_file, ignore_term=True), timeout=2, grace_period=0.5)
+
+        assert time.monotonic() - started < 30
+        deadline = time.monotonic() + 5
+        while _alive(int(pid_file.read_text())) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_leftover_processes_are_reaped(self, tmp_path):
+        """Test that processes left behind by a finished command are terminated."""
+        pid_file = tmp_path / "pid"
+
+        result = run_process_tree(_spawner(pid_file, wait=False), timeout=30)
+
+        assert result.returncode == 0
+        assert result.reaped == 1
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_cancel_kills_tree(self, tmp_path):
+        """Test that setting the cancel event terminates the running tree."""
+        pid_file = tmp_path / "pid"
+        cancel = threading.Event()
+        threading.Timer(1, cancel.set).start()
+
+        started = time.monotonic()
+        with pytest.raises(ProcessTreeCancelled) as exc_info:
+            run_process_tree(_spawner(pid_file), timeout=60, cancel=cancel)
+
+        assert time.monotonic() - started < 30
+        assert exc_info.value.reaped == 2
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_cancelled_before_start(self, tmp_path):
+        """Test that a command cancelled in advance is never started."""
+        pid_file = tmp_path / "pid"
+        cancel = threading.Event()
+        cancel.set()
+
+        with pytest.raises(ProcessTreeCancelled) as exc_info:
+            run_process_tree(_spawner(pid_file), timeout=60, cancel=cancel)
+
+        assert exc_info.value.reaped == 0
+        assert not pid_file.exists()
+
+    def test_interrupt_kills_tree(self, tmp_path):
+        """Test that an interrupt while waiting terminates the tree and propagates."""
+        pid_file = tmp_path / "pid"
+
+        def interrupt(process, timeout, cancel):
+            """Wait until the grandchild runs, then interrupt like Ctrl-C."""
+            while not pid_file.exists() or not pid_file.read_text():
+                time.sleep(0.05)
+            raise KeyboardInterrupt
+
+        with patch("marimushka.process._communicate", side_effect=interrupt), pytest.raises(KeyboardInterrupt):
+            run_process_tree(_spawner(pid_file), timeout=60)
+
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_without_process_table(self, tmp_path):
+        """Test that the process group is signalled and polled if /proc cannot be read."""
+        pid_file = tmp_path / "pid"
+
+        with (
+            patch("marimushka.process._PROC", tmp_path / "missing"),
+            pytest.raises(ProcessTreeTimeoutExpired) as exc_info,
+        ):
+            run_process_tree(_spawner(pid_file, ignore_term=True), timeout=2, grace_period=0.5)
+
+        assert exc_info.value.reaped == 1
+        deadline = time.monotonic() + 5
+        while _alive(int(pid_file.read_text())) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_session_members(self, tmp_path):
+        """Test that live processes of a session are read from the process table, skipping unreadable entries."""
+        for pid, stat in (
+            ("2", "2 (py thon) S 1 2 42 0"),
+            ("3", "3 (zombie) Z 1 3 42 0"),
+            ("4", "4 (other) S 1 4 7 0"),
+        ):
+            (tmp_path / pid).mkdir()
+            (tmp_path / pid / "stat").write_text(stat)
+        (tmp_path / "5").mkdir()
+        (tmp_path / "self").mkdir()
+
+        with patch("marimushka.process._PROC", tmp_path):
+            assert _session_members(42) == [2]
+
+    def test_tree_alive_without_process_table(self):
+        """Test that a process group is alive while it can be signalled."""
+        with patch("marimushka.process.os.killpg") as mock_killpg:
+            assert _tree_alive(123, None)
+            mock_killpg.side_effect = ProcessLookupError
+            assert not _tree_alive(123, None)
+
+    def test_without_sessions(self):
+        """Test that only the direct child is killed where process groups are unavailable."""
+        process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+
+        with patch("marimushka.process._HAS_SESSIONS", False):
+            assert terminate_process_tree(process) == 1
+            assert process.wait(10) != 0
+            assert terminate_process_tree(process) == 0
+
+    def test_communicate_timeout_with_cancel_event(self):
+        """Test that waiting with a cancel event still honours the timeout."""
+        process = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(60)"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        try:
+            with pytest.raises(subprocess.TimeoutExpired):
+                _communicate(process, 0.3, threading.Event())
+        finally:
+            process.kill()
+            process.communicate()
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+class TestAsyncProcessTree:
+    """Tests for the asyncio process-tree helpers."""
+
+    def test_cancellation_kills_tree(self, tmp_path):
+        """Test that terminating an asyncio process tree kills its descendants."""
+        pid_file = tmp_path / "pid"
+
+        async def start_and_terminate():
+            """Start a process tree and terminate it once the grandchild runs."""
+            process = await start_process_tree_async(_spawner(pid_file))
+            while not pid_file.exists() or not pid_file.read_text():
+                await asyncio.sleep(0.05)
+            return await terminate_process_tree_async(process)
+
+        assert asyncio.run(start_and_terminate()) == 2
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_sigkill_after_grace_period(self, tmp_path):
+        """Test that an asyncio process tree ignoring SIGTERM is killed after the grace period."""
+        pid_file = tmp_path / "pid"
+
+        async def start_and_terminate():
+            """Start a process tree ignoring SIGTERM and terminate it once the grandchild runs."""
+            process = await start_process_tree_async(_spawner(pid_file, ignore_term=True))
+            while not pid_file.exists() or not pid_file.read_text():
+                await asyncio.sleep(0.05)
+            # Give the grandchild time to ignore SIGTERM
+            await asyncio.sleep(1)
+            return await terminate_process_tree_async(process, grace_period=0.5)
+
+        assert asyncio.run(start_and_terminate()) == 2
+        deadline = time.monotonic() + 5
+        while _alive(int(pid_file.read_text())) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_finished_tree(self):
+        """Test that a finished asyncio process without descendants needs no termination."""
+
+        async def run_and_terminate():
+            """Run a process to completion, then terminate its tree."""
+            process = await start_process_tree_async([sys.executable, "-c", "print('hi')"])
+            output = await communicate_async(process, threading.Event())
+            return output, await terminate_process_tree_async(process)
+
+        (stdout, _), reaped = asyncio.run(run_and_terminate())
+        assert stdout.strip() == b"hi"
+        assert reaped == 0
+
+    def test_communicate_cancelled_in_advance(self):
+        """Test that a set cancel event stops the wait even if the output is already there."""
+        cancel = threading.Event()
+        cancel.set()
+
+        async def communicate():
+            """Wait for a process whose output is complete."""
+            output = asyncio.get_running_loop().create_future()
+            output.set_result((b"", b""))
+            return await communicate_async(MagicMock(communicate=MagicMock(return_value=output)), cancel)
+
+        assert asyncio.run(communicate()) is None
+
+    def test_notebook_timeout_reports_reaped_processes(self, fake_uvx, tmp_path):
+        """Test that a timed-out asyncio export reports the terminated processes."""
+        path = tmp_path / "demo.py"
+        path.write_text("SLEEP\n")
+
+        result = asyncio.run(Notebook(path).export_async(tmp_path / "out", bin_path=fake_uvx, timeout=1))
+
+        assert result.success is False
+        assert result.reaped_processes >= 1
+
+    def test_notebook_cancellation_kills_tree(self, fake_uvx, tmp_path):
+        """Test that cancelling an asyncio export leaves no export process behind."""
+        path = tmp_path / "demo.py"
+        path.write_text("SLEEP\n")
+
+        async def cancel_export():
+            """Start an export and cancel it while the fake export sleeps."""
+            task = asyncio.create_task(Notebook(path).export_async(tmp_path / "out", bin_path=fake_uvx))
+            await asyncio.sleep(1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_export())
+        assert not any(str(path) in _cmdline(pid) for pid in os.listdir("/proc") if pid.isdigit())
+
+    def test_notebook_cancel_event_kills_tree(self, fake_uvx, tmp_path):
+        """Test that an asyncio export stops when its cancel event is set."""
+        path = tmp_path / "demo.py"
+        path.write_text("SLEEP\n")
+        cancel = threading.Event()
+        threading.Timer(1, cancel.set).start()
+
+        result = asyncio.run(Notebook(path).export_async(tmp_path / "out", bin_path=fake_uvx, cancel=cancel))
+
+        assert result.success is False
+        assert isinstance(result.error, ExportCancelledError)
+        assert not any(str(path) in _cmdline(pid) for pid in os.listdir("/proc") if pid.isdigit())
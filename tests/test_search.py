@@ -0,0 +1,215 @@
+"""Tests for the search.py module.
+
+This module contains tests for extracting searchable text from notebook
+sources, building the inverted search index and reusing the metadata of
+unchanged notebooks across builds.
+"""
+
+import json
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from marimushka.exceptions import BatchExportResult, IndexWriteError
+from marimushka.notebook import Kind, Notebook
+from marimushka.orchestrator import BUILTIN_TEMPLATE_DIR, generate_index
+from marimushka.search import (
+    SEARCH_INDEX_FILENAME,
+    SEARCH_METADATA_FILENAME,
+    SEARCH_VERSION,
+    SearchMetadataCache,
+    build_search_index,
+    extract_metadata,
+    tokenize,
+    write_search_index,
+)
+
+NOTEBOOK = '''"""Compute Fibonacci numbers.
+
+Shows recursion and memoization.
+"""
+
+import marimo
+
+app = marimo.App()
+
+
+@app.cell
+def _(mo):
+    mo.md(r"""
+    # Fibonacci sequence
+
+    Some text, not a heading.
+
+    ## Closed form
+    """)
+    return
+
+
+@app.cell
+def _(mo, n):
+    mo.md(f"### Results for {n}")
+    return
+'''
+
+
+def _notebook(folder: Path, name: str, source: str = NOTEBOOK, kind: Kind = Kind.NB) -> Notebook:
+    """Write a notebook source and return it as a notebook."""
+    folder.mkdir(exist_ok=True)
+    path = folder / name
+    path.write_text(source)
+    return Notebook(path, kind)
+
+
+class TestTokenize:
+    """Tests for tokenize."""
+
+    def test_words_and_numbers(self):
+        """Test that text is lowercased and split into words, dropping single characters."""
+        assert tokenize("Plot a Sine_Wave in 2D, ünïcode!") == ["plot", "sine", "wave", "in", "2d", "ünïcode"]
+
+
+class TestExtractMetadata:
+    """Tests for extract_metadata."""
+
+    def test_docstring_and_headings(self, tmp_path):
+        """Test that the module docstring and the headings of markdown cells are extracted."""
+        nb = _notebook(tmp_path, "fibonacci.py")
+
+        metadata = extract_metadata(nb.path)
+
+        assert metadata.docstring.startswith("Compute Fibonacci numbers.")
+        assert metadata.headings == ("Fibonacci sequence", "Closed form", "Results for")
+        assert metadata.size == nb.path.stat().st_size
+
+    def test_syntax_error(self, tmp_path):
+        """Test that a source that does not parse yields no text."""
+        nb = _notebook(tmp_path, "broken.py", "def (:")
+
+        metadata = extract_metadata(nb.path)
+
+        assert metadata.docstring == ""
+        assert metadata.headings == ()
+
+    def test_only_literal_markdown(self, tmp_path):
+        """Test that other calls and markdown built from variables yield no headings."""
+        nb = _notebook(tmp_path, "widgets.py", 'mo.ui.text("# Not a heading")\nmo.md(TEXT)\nmo.md("# Heading")\n')
+
+        assert extract_metadata(nb.path).headings == ("Heading",)
+
+
+class TestSearchMetadataCache:
+    """Tests for SearchMetadataCache."""
+
+    def test_load_unreadable(self, tmp_path):
+        """Test that metadata without the expected fields loads as empty."""
+        (tmp_path / SEARCH_METADATA_FILENAME).write_text(json.dumps({"version": SEARCH_VERSION, "entries": {"a": {}}}))
+
+        assert SearchMetadataCache.load(tmp_path).entries == {}
+
+    def test_missing_source(self, tmp_path):
+        """Test that a notebook whose source is gone has no metadata."""
+        nb = _notebook(tmp_path, "gone.py")
+        nb.path.unlink()
+
+        assert SearchMetadataCache().get(nb) is None
+
+
+class TestBuildSearchIndex:
+    """Tests for build_search_index."""
+
+    def test_inverted_index(self, tmp_path):
+        """Test the documents, sorted terms and weighted postings of the index."""
+        fibonacci = _notebook(tmp_path / "notebooks", "fibonacci.py")
+        dashboard = _notebook(tmp_path / "apps", "sales_dashboard.py", "import marimo", Kind.APP)
+
+        index = build_search_index([fibonacci, dashboard], SearchMetadataCache())
+
+        assert index["documents"] == [
+            ["fibonacci", "notebooks/fibonacci.html", "notebook", "Compute Fibonacci numbers."],
+            ["sales dashboard", "apps/sales_dashboard.html", "app", ""],
+        ]
+        assert index["terms"] == sorted(index["terms"])
+        postings = dict(zip(index["terms"], index["postings"], strict=True))
+        # Display name (3) + heading (2) + docstring (1)
+        assert postings["fibonacci"] == [0, 6]
+        assert postings["closed"] == [0, 2]
+        assert postings["dashboard"] == [1, 3]
+
+
+class TestWriteSearchIndex:
+    """Tests for write_search_index."""
+
+    def test_unchanged_notebooks_not_parsed_again(self, tmp_path):
+        """Test that only notebooks changed since the previous build are parsed."""
+        output = tmp_path / "_site"
+        output.mkdir()
+        fibonacci = _notebook(tmp_path / "notebooks", "fibonacci.py")
+        other = _notebook(tmp_path / "notebooks", "other.py", '"""Other notebook."""')
+        write_search_index(output, [fibonacci, other])
+
+        other.path.write_text('"""Changed notebook."""')
+        os.utime(other.path, ns=(0, other.path.stat().st_mtime_ns + 1_000_000_000))
+        with patch("marimushka.search.extract_metadata", wraps=extract_metadata) as mock_extract:
+            write_search_index(output, [fibonacci, other])
+
+        mock_extract.assert_called_once_with(other.path)
+        index = json.loads((output / SEARCH_INDEX_FILENAME).read_text())
+        assert "changed" in index["terms"]
+        assert "other" in index["terms"]
+
+    def test_removed_notebooks_dropped(self, tmp_path):
+        """Test that metadata of notebooks no longer in the site is not kept."""
+        output = tmp_path / "_site"
+        output.mkdir()
+        fibonacci = _notebook(tmp_path / "notebooks", "fibonacci.py")
+        other = _notebook(tmp_path / "notebooks", "other.py", "import marimo")
+        write_search_index(output, [fibonacci, other])
+
+        write_search_index(output, [fibonacci])
+
+        assert set(SearchMetadataCache.load(output).entries) == {str(fibonacci.path)}
+
+    def test_metadata_write_failure_is_not_fatal(self, tmp_path):
+        """Test that metadata that cannot be written only logs a warning."""
+        output = tmp_path / "_site"
+        output.write_text("")
+
+        SearchMetadataCache().save(output, [])
+
+        assert output.read_text() == ""
+
+    def test_generate_index_with_search(self, tmp_path):
+        """Test that generate_index writes the search index and the built-in template links it."""
+        fibonacci = _notebook(tmp_path / "notebooks", "fibonacci.py")
+        output = tmp_path / "_site"
+
+        with patch("marimushka.orchestrator.export_all_notebooks", return_value=BatchExportResult()):
+            html = generate_index(
+                output=output,
+                template_file=BUILTIN_TEMPLATE_DIR / "tailwind.html.j2",
+                notebooks=[fibonacci],
+                search=True,
+            )
+
+        assert f'data-index="{SEARCH_INDEX_FILENAME}"' in html
+        assert (output / SEARCH_INDEX_FILENAME).is_file()
+        assert (output / SEARCH_METADATA_FILENAME).is_file()
+
+    def test_generate_index_search_write_failure(self, tmp_path):
+        """Test that a search index that cannot be written fails the build."""
+        fibonacci = _notebook(tmp_path / "notebooks", "fibonacci.py")
+
+        with (
+            patch("marimushka.orchestrator.export_all_notebooks", return_value=BatchExportResult()),
+            patch("marimushka.orchestrator.write_search_index", side_effect=OSError("disk full")),
+            pytest.raises(IndexWriteError),
+        ):
+            generate_index(
+                output=tmp_path / "_site",
+                template_file=BUILTIN_TEMPLATE_DIR / "tailwind.html.j2",
+                notebooks=[fibonacci],
+                search=True,
+            )
@@ -0,0 +1,253 @@
+"""Tests for the serve.py module.
+
+This module contains tests for the live reload development server: injecting
+the reload script, mapping rewritten files to page URLs, fanning out reload
+events and the serve command.
+"""
+
+import http.client
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import typer
+
+from marimushka.serve import (
+    EVENTS_PATH,
+    RELOAD_SCRIPT,
+    ReloadBroker,
+    create_server,
+    inject_reload_script,
+    page_urls,
+    watch_pages,
+)
+
+
+@pytest.fixture
+def served(tmp_path):
+    """Serve a small output directory on a free port."""
+    (tmp_path / "notebooks").mkdir()
+    (tmp_path / "index.html").write_text("<html><body>index</body></html>")
+    (tmp_path / "notebooks" / "alpha.html").write_text("<html><body>alpha</body></html>")
+    (tmp_path / "style.css").write_text("body {}")
+
+    broker = ReloadBroker()
+    server = create_server(tmp_path, broker, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1], broker
+    broker.close()
+    server.shutdown()
+    server.server_close()
+
+
+def _get(port, path):
+    """Return the body of a GET request to the test server."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=10) as response:
+        return response.read().decode()
+
+
+class TestInjectReloadScript:
+    """Tests for inject_reload_script."""
+
+    def test_before_body_end(self):
+        """Test that the script is placed before the closing body tag."""
+        html = inject_reload_script(b"<html><body>content</BODY></html>")
+
+        assert html == b"<html><body>content" + RELOAD_SCRIPT.encode() + b"</BODY></html>"
+
+    def test_without_body(self):
+        """Test that the script is appended to fragments without a body tag."""
+        assert inject_reload_script(b"<p>fragment</p>").endswith(RELOAD_SCRIPT.encode())
+
+
+class TestPageUrls:
+    """Tests for page_urls."""
+
+    def test_rewritten_pages(self, tmp_path):
+        """Test that existing HTML files map to their URL paths and others are ignored."""
+        (tmp_path / "notebooks").mkdir()
+        (tmp_path / "notebooks" / "alpha.html").write_text("")
+        (tmp_path / "index.html").write_text("")
+        (tmp_path / "data.json").write_text("")
+        changes = [
+            ("modified", str(tmp_path / "notebooks" / "alpha.html")),
+            ("added", str(tmp_path / "index.html")),
+            ("modified", str(tmp_path / "data.json")),
+            ("deleted", str(tmp_path / "notebooks" / "beta.html")),
+        ]
+
+        assert page_urls(changes, tmp_path) == {"/notebooks/alpha.html", "/index.html"}
+
+
+class TestReloadBroker:
+    """Tests for ReloadBroker."""
+
+    def test_publish_reaches_subscribers(self):
+        """Test that every subscriber receives each URL, and None once closed."""
+        broker = ReloadBroker()
+        first, second = broker.subscribe(), broker.subscribe()
+        broker.unsubscribe(second)
+
+        assert broker.publish({"/index.html"}) == 1
+        broker.close()
+
+        assert first.get_nowait() == "/index.html"
+        assert first.get_nowait() is None
+        assert second.empty()
+
+
+class TestLiveReloadServer:
+    """Tests for the live reload HTTP server."""
+
+    def test_pages_get_reload_script(self, served):
+        """Test that HTML pages, including directory indexes, carry the reload script."""
+        port, _ = served
+
+        assert _get(port, "/notebooks/alpha.html") == "<html><body>alpha" + RELOAD_SCRIPT + "</body></html>"
+        assert RELOAD_SCRIPT in _get(port, "/")
+
+    def test_other_files_are_unchanged(self, served):
+        """Test that non-HTML files are served as they are."""
+        port, _ = served
+
+        assert _get(port, "/style.css") == "body {}"
+
+    def test_events_stream_rewritten_pages(self, served):
+        """Test that published URLs arrive on the events stream."""
+        port, broker = served
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request("GET", EVENTS_PATH)
+        response = connection.getresponse()
+        assert response.getheader("Content-Type") == "text/event-stream"
+
+        # The handler subscribes right after sending its headers
+        while broker.publish({"/notebooks/alpha.html"}) == 0:
+            threading.Event().wait(0.01)
+
+        assert response.readline() == b"data: /notebooks/alpha.html\n"
+        connection.close()
+
+    def test_events_keep_alive_until_client_leaves(self, served):
+        """Test that idle streams get keep-alive comments and disconnected clients are unsubscribed."""
+        port, broker = served
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        with patch("marimushka.serve.KEEPALIVE_INTERVAL", 0.01):
+            connection.request("GET", EVENTS_PATH)
+            response = connection.getresponse()
+            assert response.readline() == b": keep-alive\n"
+            connection.close()
+            response.close()
+
+            deadline = time.monotonic() + 10
+            while broker._clients and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        assert not broker._clients
+
+
+class TestWatchPages:
+    """Tests for watch_pages."""
+
+    def test_announces_rewritten_pages(self, tmp_path):
+        """Test that rewritten pages are published and other changes are not."""
+        (tmp_path / "index.html").write_text("")
+        (tmp_path / "data.json").write_text("")
+        broker = ReloadBroker()
+        client = broker.subscribe()
+
+        def mock_watch_generator(path, debounce, stop_event):
+            yield [("modified", str(tmp_path / "data.json"))]
+            yield [("modified", str(tmp_path / "index.html"))]
+
+        with patch("watchfiles.watch", mock_watch_generator):
+            watch_pages(tmp_path, broker, threading.Event())
+
+        assert client.get_nowait() == "/index.html"
+        assert client.empty()
+
+
+def serve_arguments(tmp_path):
+    """Create the site folders and return the arguments of the serve command."""
+    folder = tmp_path / "notebooks"
+    folder.mkdir()
+    output = tmp_path / "_site"
+    output.mkdir()
+    template = tmp_path / "templates" / "index.html.j2"
+    template.parent.mkdir()
+    template.write_text("")
+    return {
+        "output": str(output),
+        "template": str(template),
+        "notebooks": str(folder),
+        "apps": str(tmp_path / "apps"),
+        "notebooks_wasm": str(tmp_path / "wasm"),
+        "sandbox": True,
+        "bin_path": None,
+        "parallel": True,
+        "max_workers": 4,
+        "timeout": 300,
+        "cache_dir": None,
+        "incremental": False,
+        "estimated_duration": 30.0,
+        "engine": "threads",
+        "worker_max_jobs": 50,
+        "worker_max_memory": 1024,
+        "shared_envs": False,
+        "env_cache_size": 5120,
+        "prefetch": False,
+        "index_url": None,
+        "find_links": None,
+        "offline": False,
+        "marimo_version": None,
+        "debounce": 1600,
+        "host": "127.0.0.1",
+        "port": 0,
+        "page_size": 0,
+        "search": False,
+    }
+
+
+class TestServeCommand:
+    """Tests for the serve command."""
+
+    @patch("marimushka.export.open_session")
+    @patch("marimushka.cli.rich_print")
+    def test_serves_and_rebuilds(self, mock_print, mock_open_session, tmp_path):
+        """Test that the server starts after the initial export and rebuilds still run."""
+        arguments = serve_arguments(tmp_path)
+        output = Path(arguments["output"])
+
+        def mock_watch_generator(*paths, **kwargs):
+            if Path(paths[0]) == output:
+                kwargs["stop_event"].wait()
+                return
+            yield [("modified", str(Path(arguments["notebooks"]) / "alpha.py"))]
+            raise KeyboardInterrupt
+
+        with patch("watchfiles.watch", mock_watch_generator):
+            from marimushka.cli import serve_command
+
+            serve_command(**arguments)
+
+        build = mock_open_session.return_value.__enter__.return_value.build
+        assert build.call_count == 2
+        assert any("Serving" in str(call.args[0]) for call in mock_print.call_args_list)
+        mock_print.assert_any_call("\n[bold green]Watch mode stopped.[/bold green]")
+
+    @patch("marimushka.export.open_session")
+    @patch("marimushka.cli.rich_print")
+    def test_cannot_listen(self, mock_print, mock_open_session, tmp_path):
+        """Test that the command exits with an error if the address is in use."""
+        from marimushka.cli import serve_command
+
+        with (
+            patch("marimushka.serve.create_server", side_effect=OSError("Address already in use")),
+            pytest.raises(typer.Exit) as exc_info,
+        ):
+            serve_command(**serve_arguments(tmp_path))
+
+        assert exc_info.value.exit_code == 1
+        assert any("Cannot listen" in str(call.args[0]) for call in mock_print.call_args_list)
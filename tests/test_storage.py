@@ -0,0 +1,96 @@
+"""Tests for the storage.py module.
+
+This module contains tests for atomic writes and versioned JSON files.
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from marimushka.storage import atomic_path, read_versioned_json, write_json_atomic
+
+
+class TestAtomicPath:
+    """Tests for atomic_path."""
+
+    def test_replaces_file(self, tmp_path):
+        """Test that the written temporary file replaces the target with the given mode."""
+        path = tmp_path / "nested" / "file.txt"
+
+        with atomic_path(path, mode=0o600) as tmp:
+            assert tmp.parent == path.parent
+            tmp.write_text("content")
+            assert not path.exists()
+
+        assert path.read_text() == "content"
+        assert path.stat().st_mode & 0o777 == 0o600
+        assert list(path.parent.iterdir()) == [path]
+
+    def test_failure_keeps_target(self, tmp_path):
+        """Test that a failing block removes the temporary file and keeps the old contents."""
+        path = tmp_path / "file.txt"
+        path.write_text("old")
+
+        def write():
+            with atomic_path(path) as tmp:
+                tmp.write_text("new")
+                raise RuntimeError
+
+        with pytest.raises(RuntimeError):
+            write()
+
+        assert path.read_text() == "old"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_replace_failure(self, tmp_path):
+        """Test that a failing rename raises and removes the temporary file."""
+        path = tmp_path / "file.txt"
+
+        with (
+            patch("marimushka.storage.os.replace", side_effect=OSError("disk full")),
+            pytest.raises(OSError, match="disk full"),
+            atomic_path(path) as tmp,
+        ):
+            tmp.write_text("content")
+
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestJson:
+    """Tests for write_json_atomic and read_versioned_json."""
+
+    def test_round_trip(self, tmp_path):
+        """Test that written data is read back and indented by default."""
+        path = tmp_path / "data.json"
+        data = {"version": 2, "entries": {"a": [1, 2]}}
+
+        write_json_atomic(path, data)
+
+        assert "\n  " in path.read_text()
+        assert read_versioned_json(path, 2) == data
+
+    def test_compact(self, tmp_path):
+        """Test that compact output has no whitespace and keeps non-ASCII characters."""
+        path = tmp_path / "data.json"
+
+        write_json_atomic(path, {"version": 1, "title": "Café"}, compact=True)
+
+        assert path.read_text(encoding="utf-8") == '{"version":1,"title":"Café"}'
+
+    def test_missing_or_other_version(self, tmp_path):
+        """Test that missing files and files of another version yield None."""
+        path = tmp_path / "data.json"
+        assert read_versioned_json(path, 1) is None
+
+        path.write_text(json.dumps({"version": 0}))
+        assert read_versioned_json(path, 1) is None
+
+    @pytest.mark.parametrize("content", ["not json", "[1, 2]"])
+    def test_unreadable(self, tmp_path, content):
+        """Test that invalid JSON and values other than objects raise ValueError."""
+        path = tmp_path / "data.json"
+        path.write_text(content)
+
+        with pytest.raises(ValueError):  # noqa: PT011
+            read_versioned_json(path, 1)
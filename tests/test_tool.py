@@ -0,0 +1,173 @@
+"""Tests for the tool.py module.
+
+This module contains tests for installing a pinned marimo version into a tool
+environment and for exporting with it. Environments are created by the fake
+``uv`` executable of the fake_uv fixture.
+"""
+
+import os
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka.exceptions import ExportEnvironmentError
+from marimushka.export import main, prefetch_environments
+from marimushka.manifest import BuildManifest
+from marimushka.notebook import Notebook
+from marimushka.process import ProcessResult
+from marimushka.tool import MarimoTool, install_marimo, validate_marimo_version
+from marimushka.worker import WORKER_SCRIPT, worker_command
+
+TOOL = MarimoTool("0.18.4", Path("/tools/abc/bin/python"))
+
+
+class TestValidateMarimoVersion:
+    """Tests for validate_marimo_version."""
+
+    @pytest.mark.parametrize("version", ["0.18.4", "1.0", "0.19.0rc1", "0.18.4.post1", "0.19.0.dev3"])
+    def test_valid(self, version):
+        """Test that exact release versions are accepted."""
+        assert validate_marimo_version(version) == version
+
+    @pytest.mark.parametrize("version", ["", "latest", ">=0.18", "0.18.*", "0.18.4; rm -rf /", "0.18 0.19"])
+    def test_invalid(self, version):
+        """Test that ranges, wildcards and other text are rejected."""
+        with pytest.raises(ValueError, match="Invalid marimo version"):
+            validate_marimo_version(version)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="the fake uv is a POSIX script")
+class TestInstallMarimo:
+    """Tests for installing marimo into a tool environment."""
+
+    def test_installs_pinned_version(self, tmp_path, fake_uv):
+        """Test that exactly the pinned marimo version is installed."""
+        tool = install_marimo("0.18.4", tmp_path / "tools", uv=fake_uv)
+
+        assert tool.version == "0.18.4"
+        assert tool.python.is_file()
+        assert tool.python.parent.parent.parent == tmp_path / "tools"
+        assert (tool.python.parent.parent / "installed.txt").read_text() == "marimo==0.18.4"
+
+    def test_reused_across_builds(self, tmp_path, fake_uv):
+        """Test that a second install of the same version reuses the environment."""
+        first = install_marimo("0.18.4", tmp_path / "tools", uv=fake_uv)
+        second = install_marimo("0.18.4", tmp_path / "tools", uv=fake_uv)
+        other = install_marimo("0.18.5", tmp_path / "tools", uv=fake_uv)
+
+        assert first == second
+        assert other.python != first.python
+        log = Path(fake_uv).with_name("calls.log").read_text().splitlines()
+        assert sum(line.startswith("venv") for line in log) == 2
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_installs_tool_in_cache_dir(self, mock_generate_index, tmp_path, fake_uv):
+        """Test that main installs the pinned version once and passes it to the export."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        (folder / "demo.py").write_text("import marimo\n\napp = marimo.App()\n")
+
+        main(
+            notebooks=folder,
+            apps="",
+            notebooks_wasm="",
+            cache_dir=tmp_path / "cache",
+            bin_path=Path(fake_uv).parent,
+            marimo_version="0.18.4",
+        )
+
+        tool = mock_generate_index.call_args.kwargs["marimo_tool"]
+        assert tool.version == "0.18.4"
+        assert tool.python.is_relative_to(tmp_path / "cache" / "tools")
+
+    @patch("marimushka.export.generate_index", return_value="<html></html>")
+    def test_main_without_cache_dir(self, mock_generate_index, tmp_path, fake_uv):
+        """Test that without a cache directory the tool environment is removed after the build."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        (folder / "demo.py").write_text("import marimo\n\napp = marimo.App()\n")
+
+        main(notebooks=folder, apps="", notebooks_wasm="", bin_path=Path(fake_uv).parent, marimo_version="0.18.4")
+
+        tool = mock_generate_index.call_args.kwargs["marimo_tool"]
+        assert not tool.python.exists()
+
+    def test_prefetch_installs_tool(self, tmp_path, fake_uv):
+        """Test that prefetch_environments installs the pinned version with the environments."""
+        result = prefetch_environments(
+            tmp_path / "cache",
+            notebooks="",
+            apps="",
+            notebooks_wasm="",
+            bin_path=Path(fake_uv).parent,
+            marimo_version="0.18.4",
+        )
+
+        assert (result.environments, result.failures) == (1, [])
+        assert len(list((tmp_path / "cache" / "tools").iterdir())) == 1
+
+    def test_prefetch_collects_tool_failure(self, tmp_path, fake_uv):
+        """Test that a pinned version that cannot be installed is reported as a failure."""
+        error = ExportEnvironmentError("marimo", "No solution found")
+
+        with patch("marimushka.export.install_marimo", side_effect=error):
+            result = prefetch_environments(
+                tmp_path / "cache",
+                notebooks="",
+                apps="",
+                notebooks_wasm="",
+                bin_path=Path(fake_uv).parent,
+                marimo_version="0.18.4",
+            )
+
+        assert (result.environments, result.failures) == (1, [error])
+
+
+class TestPinnedExport:
+    """Tests for exporting notebooks with a pinned marimo tool."""
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_export_runs_tool_interpreter(self, mock_run, tmp_path):
+        """Test that exports run marimo from the tool environment instead of uvx."""
+        path = tmp_path / "demo.py"
+        path.write_text("import marimo\n")
+        mock_run.return_value = ProcessResult([], 0, "", "")
+
+        assert Notebook(path).export(tmp_path / "out", marimo_tool=TOOL).success
+
+        cmd = mock_run.call_args.args[0]
+        assert cmd[:5] == ["/tools/abc/bin/python", "-m", "marimo", "export", "html"]
+        assert "--sandbox" in cmd
+
+    @patch("marimushka.notebook.run_process_tree")
+    def test_shared_environment_takes_precedence(self, mock_run, tmp_path):
+        """Test that a shared environment is still used for sandboxed notebooks."""
+        path = tmp_path / "demo.py"
+        path.write_text("import marimo\n")
+        mock_run.return_value = ProcessResult([], 0, "", "")
+        pool = MagicMock()
+        pool.ensure.return_value = Path("/envs/abc/bin/python")
+
+        Notebook(path).export(tmp_path / "out", environments=pool, marimo_tool=TOOL)
+
+        assert mock_run.call_args.args[0][:3] == ["/envs/abc/bin/python", "-m", "marimo"]
+
+    def test_build_records_tool_version(self, site, fake_export, export_site):
+        """Test that a build with a tool records its version without resolving one."""
+        _, output, _ = site
+
+        with patch("marimushka.orchestrator.resolve_marimo_version") as mock_resolve:
+            export_site(marimo_tool=TOOL, incremental=True)
+
+        mock_resolve.assert_not_called()
+        assert fake_export.call_args.args[0][0] == str(TOOL.python)
+        assert BuildManifest.load(output).entries["notebooks/alpha.html"].marimo_version == "0.18.4"
+
+    def test_worker_command_for_interpreter(self):
+        """Test that workers of a tool environment run the worker script with its interpreter."""
+        assert worker_command("/tools/abc/bin/python", interpreter=True) == [
+            "/tools/abc/bin/python",
+            "-u",
+            str(WORKER_SCRIPT),
+        ]
@@ -0,0 +1,393 @@
+"""Tests for the watch.py module.
+
+This module contains tests for mapping filesystem changes to the notebooks and
+template they affect, for the incremental rebuilds of generate_index and the
+watch command, and for coalescing and cancelling rebuilds.
+"""
+
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from marimushka.exceptions import ExportCancelledError
+from marimushka.notebook import Kind, Notebook
+from marimushka.process import ProcessTreeCancelled
+from marimushka.watch import Cancellation, ChangeSet, RebuildQueue, classify_changes
+
+
+def _classify(site, *paths):
+    """Classify modifications of the given paths for the site fixture."""
+    folder, output, template = site
+    return classify_changes([("modified", str(p)) for p in paths], {Kind.NB: folder, Kind.APP: ""}, template, output)
+
+
+class TestClassifyChanges:
+    """Tests for classify_changes."""
+
+    def test_notebook(self, site):
+        """Test that a modified notebook is the only affected one."""
+        folder, _, _ = site
+        changes = _classify(site, folder / "alpha.py")
+
+        assert changes == ChangeSet(frozenset({(folder / "alpha.py").resolve()}))
+        assert changes.affects(Notebook(folder / "alpha.py"))
+        assert not changes.affects(Notebook(folder / "beta.py"))
+
+    def test_template(self, site):
+        """Test that changes next to the template only affect the index."""
+        _, _, template = site
+        changes = _classify(site, template, template.parent / "partial.html.j2")
+
+        assert changes == ChangeSet(template=True)
+
+    def test_public_data_affects_referencing_notebooks(self, site, tmp_path):
+        """Test that a changed data file affects the notebooks referencing it, and every app of its folder."""
+        folder, output, template = site
+        (folder / "alpha.py").write_text('import marimo\n\ndata = mo.notebook_location() / "public" / "data.csv"\n')
+        apps = tmp_path / "apps"
+        apps.mkdir()
+        (apps / "dashboard.py").write_text("import marimo\n")
+        folders = {Kind.NB: folder, Kind.APP: apps}
+
+        changes = classify_changes(
+            [("modified", str(folder / "public" / "data.csv")), ("modified", str(apps / "public" / "logo.png"))],
+            folders,
+            template,
+            output,
+        )
+
+        assert changes.notebooks == {(folder / "alpha.py").resolve(), (apps / "dashboard.py").resolve()}
+
+    def test_nested_notebooks(self, site):
+        """Test that nested notebooks, their public data and ignore files are mapped to their directory."""
+        folder, _, _ = site
+        (folder / "team" / "sub").mkdir(parents=True)
+        member, deep = folder / "team" / "member.py", folder / "team" / "sub" / "deep.py"
+        member.write_text('import marimo\n\nDATA = "public/data.csv"\n')
+        deep.write_text("import marimo")
+
+        assert _classify(site, deep).notebooks == {deep.resolve()}
+        assert _classify(site, folder / "team" / "public" / "data.csv").notebooks == {member.resolve()}
+        assert _classify(site, folder / "team" / ".marimushkaignore").notebooks == {member.resolve(), deep.resolve()}
+
+    def test_unreadable_notebook_affected_by_public_data(self, site):
+        """Test that a notebook whose references cannot be read is assumed to use a changed data file."""
+        folder, _, _ = site
+
+        with patch("marimushka.assets.AssetReferences.references", side_effect=OSError("unreadable")):
+            changes = _classify(site, folder / "public" / "data.csv")
+
+        assert changes.notebooks == {(folder / "alpha.py").resolve(), (folder / "beta.py").resolve()}
+
+    def test_unrelated_files_are_ignored(self, site, tmp_path):
+        """Test that outputs, caches and files elsewhere affect nothing."""
+        folder, output, _ = site
+        changes = _classify(
+            site,
+            folder / "__marimo__" / "session.json",
+            folder / "notes.txt",
+            output / "index.html",
+            tmp_path / "README.md",
+        )
+
+        assert changes.empty
+
+
+class TestIncrementalRebuild:
+    """Tests for generate_index with a ChangeSet."""
+
+    def test_only_changed_notebook_exported(self, site, fake_export, export_site):
+        """Test that a rebuild exports only the changed notebook and keeps the index."""
+        folder, output, _ = site
+        export_site()
+        (output / "index.html").write_text("previous")
+
+        html = export_site(changes=_classify(site, folder / "beta.py"))
+
+        assert fake_export.call_count == 3
+        assert str(folder / "beta.py") in fake_export.call_args[0][0]
+        assert html == "previous"
+
+    def test_kept_index_not_read_without_html(self, site, fake_export, export_site):
+        """Test that a rebuild keeping the index returns nothing if no HTML is asked for."""
+        folder, output, _ = site
+        export_site()
+        (output / "index.html").write_text("previous")
+
+        html = export_site(changes=_classify(site, folder / "beta.py"), return_html=False)
+
+        assert html == ""
+        assert (output / "index.html").read_text() == "previous"
+
+    def test_missing_index_rendered(self, site, fake_export, export_site):
+        """Test that a rebuild renders the index again if it was deleted."""
+        folder, output, _ = site
+        export_site()
+        (output / "index.html").unlink()
+
+        html = export_site(changes=_classify(site, folder / "beta.py"))
+
+        assert html == "alpha;beta;"
+        assert (output / "index.html").read_text() == html
+
+    def test_changed_module_exports_dependents(self, site, fake_export, export_site):
+        """Test that a rebuild after a helper module changed exports only the notebooks importing it."""
+        folder, _, _ = site
+        (folder / "alpha.py").write_text("import marimo\nfrom helpers import VALUE\n")
+        export_site()
+        (folder / "helpers.py").write_text("VALUE = 1\n")
+
+        export_site(changes=_classify(site, folder / "helpers.py"))
+
+        exported = [call.args[0] for call in fake_export.call_args_list[2:]]
+        assert any(str(folder / "alpha.py") in cmd for cmd in exported)
+        assert not any(str(folder / "beta.py") in cmd for cmd in exported)
+
+    def test_template_change_skips_exports(self, site, fake_export, export_site):
+        """Test that a template edit re-renders the index without exporting."""
+        _, output, template = site
+        export_site()
+        template.write_text("{% for nb in notebooks %}[{{ nb.display_name }}]{% endfor %}")
+
+        html = export_site(changes=_classify(site, template))
+
+        assert fake_export.call_count == 2
+        assert html == "[alpha][beta]"
+        assert (output / "index.html").read_text() == "[alpha][beta]"
+
+    def test_added_and_removed_notebooks_update_index(self, site, fake_export, export_site):
+        """Test that adding and deleting notebooks re-renders the index."""
+        folder, output, _ = site
+        export_site()
+
+        (folder / "gamma.py").write_text("import marimo\n")
+        (folder / "alpha.py").unlink()
+        html = export_site(changes=_classify(site, folder / "gamma.py", folder / "alpha.py"))
+
+        assert fake_export.call_count == 3
+        assert html == "beta;gamma;"
+        assert not (output / "notebooks" / "alpha.html").exists()
+
+
+def _changed(*names):
+    """Return a ChangeSet of notebooks with the given names."""
+    return ChangeSet(frozenset(Path(f"/notebooks/{name}.py") for name in names))
+
+
+class TestRebuildQueue:
+    """Tests for coalescing and cancelling rebuilds."""
+
+    def test_bursts_are_coalesced(self):
+        """Test that changes submitted before a rebuild starts form one rebuild."""
+        rebuilds = RebuildQueue()
+        assert rebuilds.submit(_changed("alpha")) == 1
+        assert rebuilds.submit(ChangeSet(template=True)) == 2
+
+        rebuild = rebuilds.get()
+
+        assert (rebuild.first_generation, rebuild.generation) == (1, 2)
+        assert rebuild.changes == ChangeSet(_changed("alpha").notebooks, template=True)
+        assert rebuilds.get(timeout=0) is None
+
+    def test_changes_during_rebuild_cancel_stale_exports(self):
+        """Test that a notebook changing again cancels only its running export."""
+        rebuilds = RebuildQueue()
+        rebuilds.submit(_changed("alpha", "beta"))
+        running = rebuilds.get()
+        alpha = running.cancellation.event(Path("/notebooks/alpha.py"))
+        beta = running.cancellation.event(Path("/notebooks/beta.py"))
+
+        rebuilds.submit(_changed("alpha", "gamma"))
+        rebuilds.done(running)
+
+        assert alpha.is_set()
+        assert not beta.is_set()
+        following = rebuilds.get()
+        assert (following.first_generation, following.generation) == (2, 2)
+        assert following.changes == _changed("alpha", "gamma")
+
+    def test_changed_modules_cancel_dependent_exports(self, tmp_path):
+        """Test that a changed local module cancels the running exports of the notebooks importing it."""
+        (tmp_path / "helpers.py").write_text("VALUE = 1\n")
+        (tmp_path / "charts.py").write_text("import marimo\nimport helpers\n")
+        (tmp_path / "plain.py").write_text("import marimo\n")
+        rebuilds = RebuildQueue()
+        rebuilds.submit(ChangeSet(template=True))
+        running = rebuilds.get()
+        charts = running.cancellation.event(tmp_path / "charts.py")
+        plain = running.cancellation.event(tmp_path / "plain.py")
+
+        rebuilds.submit(ChangeSet(frozenset({(tmp_path / "helpers.py").resolve()})))
+
+        assert charts.is_set()
+        assert not plain.is_set()
+
+    def test_unrelated_changes_cancel_nothing(self):
+        """Test that changes to notebooks not being exported leave the running rebuild alone."""
+        rebuilds = RebuildQueue()
+        rebuilds.submit(_changed("alpha"))
+        running = rebuilds.get()
+        alpha = running.cancellation.event(Path("/notebooks/alpha.py"))
+
+        rebuilds.submit(_changed("beta"))
+
+        assert not alpha.is_set()
+
+    def test_cancel_drops_pending_and_cancels_running(self):
+        """Test that cancel() cancels the running rebuild and forgets pending changes."""
+        rebuilds = RebuildQueue()
+        rebuilds.submit(_changed("alpha"))
+        running = rebuilds.get()
+        alpha = running.cancellation.event(Path("/notebooks/alpha.py"))
+        rebuilds.submit(_changed("beta"))
+
+        rebuilds.cancel()
+
+        assert alpha.is_set()
+        assert rebuilds.get(timeout=0) is None
+
+    def test_done_ignores_finished_rebuilds(self):
+        """Test that marking an earlier rebuild as done keeps the running one."""
+        rebuilds = RebuildQueue()
+        rebuilds.submit(_changed("alpha"))
+        first = rebuilds.get()
+        rebuilds.submit(_changed("beta"))
+        second = rebuilds.get()
+        beta = second.cancellation.event(Path("/notebooks/beta.py"))
+
+        rebuilds.done(first)
+        rebuilds.submit(_changed("beta"))
+
+        assert beta.is_set()
+
+    def test_stop_builds_pending_changes_first(self):
+        """Test that a watcher error is raised only after the pending rebuild."""
+        rebuilds = RebuildQueue()
+        rebuilds.submit(_changed("alpha"))
+        rebuilds.stop(KeyboardInterrupt())
+
+        assert rebuilds.get().generation == 1
+        with pytest.raises(KeyboardInterrupt):
+            rebuilds.get()
+
+    def test_get_waits_for_submit(self):
+        """Test that get() returns changes submitted from another thread."""
+        rebuilds = RebuildQueue()
+        threading.Timer(0.1, rebuilds.submit, args=(_changed("alpha"),)).start()
+
+        assert rebuilds.get(timeout=10).changes == _changed("alpha")
+
+    def test_cancel_all_covers_later_exports(self):
+        """Test that exports started after cancel_all() are cancelled too."""
+        cancellation = Cancellation()
+        started = cancellation.event(Path("/notebooks/alpha.py"))
+
+        cancellation.cancel_all()
+
+        assert started.is_set()
+        assert cancellation.event(Path("/notebooks/beta.py")).is_set()
+
+    @patch("marimushka.notebook.run_process_tree", side_effect=ProcessTreeCancelled(["uvx"], 2))
+    def test_cancelled_export_is_not_a_failure(self, mock_run, site, export_site):
+        """Test that a cancelled export reports ExportCancelledError and keeps the index."""
+        folder, output, _ = site
+        cancellation = Cancellation()
+        cancellation.cancel_all()
+
+        result = Notebook(folder / "alpha.py").export(output, cancel=cancellation.event(folder / "alpha.py"))
+
+        assert isinstance(result.error, ExportCancelledError)
+        assert result.reaped_processes == 2
+        export_site(cancellation=cancellation)
+        assert (output / "index.html").exists()
+
+
+class TestWatchCommand:
+    """Tests for the incremental rebuilds of the watch command."""
+
+    @staticmethod
+    def _run(site, tmp_path):
+        """Run the watch command on the site fixture."""
+        from marimushka.cli import watch_command
+
+        folder, output, template = site
+        watch_command(
+            output=str(output),
+            template=str(template),
+            notebooks=str(folder),
+            apps=str(tmp_path / "apps"),
+            notebooks_wasm=str(tmp_path / "wasm"),
+            sandbox=True,
+            bin_path=None,
+            parallel=True,
+            max_workers=4,
+            timeout=300,
+            cache_dir=None,
+            incremental=False,
+            estimated_duration=30.0,
+            engine="threads",
+            worker_max_jobs=50,
+            worker_max_memory=1024,
+            shared_envs=False,
+            env_cache_size=5120,
+            prefetch=False,
+            index_url=None,
+            find_links=None,
+            offline=False,
+            marimo_version=None,
+            debounce=1600,
+            page_size=0,
+            search=False,
+        )
+
+    @patch("marimushka.export.open_session")
+    @patch("marimushka.cli.rich_print")
+    def test_rebuild_passes_changes(self, mock_print, mock_open_session, site, tmp_path):
+        """Test that only affecting changes trigger a rebuild, with their ChangeSet."""
+        folder, _, _ = site
+
+        def mock_watch_generator(*args, **kwargs):
+            yield [("modified", str(tmp_path / "README.md"))]
+            yield [("modified", str(folder / "alpha.py"))]
+            raise KeyboardInterrupt
+
+        with patch("watchfiles.watch", mock_watch_generator):
+            self._run(site, tmp_path)
+
+        build = mock_open_session.return_value.__enter__.return_value.build
+        assert build.call_count == 2
+        assert "changes" not in build.call_args_list[0].kwargs
+        assert build.call_args.kwargs["changes"] == ChangeSet(frozenset({(folder / "alpha.py").resolve()}))
+        mock_print.assert_any_call("[dim]No notebooks or templates affected[/dim]")
+
+    @patch("marimushka.export.open_session")
+    @patch("marimushka.cli.rich_print")
+    def test_changes_during_rebuild_are_coalesced(self, mock_print, mock_open_session, site, tmp_path):
+        """Test that changes arriving during a rebuild form one following rebuild and the watcher may end."""
+        folder, _, template = site
+        rebuilding, submitted = threading.Event(), threading.Event()
+
+        def mock_watch_generator(*args, **kwargs):
+            yield [("modified", str(template))]
+            rebuilding.wait(10)
+            yield [("modified", str(folder / "alpha.py"))]
+            yield [("modified", str(folder / "beta.py"))]
+            submitted.set()
+
+        def build(**kwargs):
+            if "changes" in kwargs and not rebuilding.is_set():
+                rebuilding.set()
+                submitted.wait(10)
+
+        mock_open_session.return_value.__enter__.return_value.build.side_effect = build
+        with patch("watchfiles.watch", mock_watch_generator):
+            self._run(site, tmp_path)
+
+        printed = [call.args[0] for call in mock_print.call_args_list]
+        assert "[bold blue]Rebuild #1: Re-rendering index...[/bold blue]" in printed
+        assert "[bold green]Rebuild #1 complete[/bold green] [dim](#3 pending)[/dim]" in printed
+        assert "[bold blue]Rebuild #2-3: Re-exporting 2 notebook(s)...[/bold blue]" in printed
+        assert "[bold green]Rebuild #3 complete![/bold green]" in printed
+        assert "\n[bold green]Watch mode stopped.[/bold green]" not in printed
@@ -0,0 +1,498 @@
+"""Tests for the worker.py module.
+
+This module contains tests for the pool of persistent export workers. The
+workers run the real worker script against the fake marimo package of the
+fake_uvx fixture; the worker script itself is also tested in process.
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from marimushka import _worker_main
+from marimushka.exceptions import NotebookExportResult, NotebookInvalidError
+from marimushka.export import main
+from marimushka.notebook import Notebook
+from marimushka.orchestrator import BUILTIN_TEMPLATE_DIR, ExportJob, export_jobs, generate_index
+from marimushka.process import ProcessTreeCancelled, ProcessTreeTimeoutExpired
+from marimushka.worker import WORKER_SCRIPT, ExportWorker, WorkerPool, WorkerUnavailableError, worker_command
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="the fake uvx is a POSIX script")
+
+
+def _notebook(folder, name, source="import marimo\n\napp = marimo.App()\n"):
+    """Write a notebook and return it."""
+    path = folder / f"{name}.py"
+    path.write_text(source)
+    return Notebook(path)
+
+
+def _export(pool, folder, name, fake_uvx, source="import marimo\n\napp = marimo.App()\n", **kwargs):
+    """Write a notebook and export it without a sandbox, the only exports that run in workers."""
+    return _notebook(folder, name, source).export_in_worker(
+        pool, folder / "out", bin_path=fake_uvx, sandbox=False, **kwargs
+    )
+
+
+class TestWorkerPool:
+    """Tests for WorkerPool and Notebook.export_in_worker."""
+
+    def test_worker_command(self):
+        """Test that workers run the worker script in marimo's uvx environment."""
+        assert worker_command("uvx") == ["uvx", "--from", "marimo", "python", "-u", str(WORKER_SCRIPT)]
+        assert WORKER_SCRIPT.is_file()
+
+    def test_invalid_limits(self):
+        """Test that non-positive limits are rejected."""
+        with pytest.raises(ValueError, match="must be positive"):
+            WorkerPool(size=0)
+        with pytest.raises(ValueError, match="must be positive"):
+            WorkerPool(max_jobs=0)
+
+    def test_worker_is_reused(self, fake_uvx, tmp_path):
+        """Test that consecutive exports run in the same warm worker."""
+        with WorkerPool(size=1) as pool:
+            results = [_export(pool, tmp_path, name, fake_uvx) for name in ("a", "b", "c")]
+
+        assert all(result.success for result in results)
+        assert (tmp_path / "out" / "c.html").read_text() == "<html></html>"
+        assert pool.started == 1
+        assert pool.recycled == 0
+
+    def test_recycled_after_max_jobs(self, fake_uvx, tmp_path):
+        """Test that a worker is replaced after max_jobs exports."""
+        with WorkerPool(size=1, max_jobs=2) as pool:
+            for name in ("a", "b", "c"):
+                assert _export(pool, tmp_path, name, fake_uvx).success
+
+        assert pool.started == 2
+        assert pool.recycled == 1
+
+    def test_recycled_above_max_memory(self, fake_uvx, tmp_path):
+        """Test that a worker exceeding the memory limit is replaced."""
+        with WorkerPool(size=1, max_memory_mb=1) as pool:
+            for name in ("a", "b"):
+                assert _export(pool, tmp_path, name, fake_uvx).success
+
+        assert pool.started == 2
+        assert pool.recycled == 2
+
+    def test_failed_export_keeps_worker(self, fake_uvx, tmp_path):
+        """Test that a failing notebook is reported and the worker stays in use."""
+        with WorkerPool(size=1) as pool:
+            failed = _export(pool, tmp_path, "bad", fake_uvx, "FAIL\n")
+            ok = _export(pool, tmp_path, "good", fake_uvx)
+
+        assert failed.success is False
+        assert failed.error.return_code == 1
+        assert "export failed" in failed.error.stderr
+        assert ok.success is True
+        assert pool.started == 1
+
+    def test_crashed_worker_is_replaced(self, fake_uvx, tmp_path):
+        """Test that a worker crash fails only its export."""
+        with WorkerPool(size=1) as pool:
+            crashed = _export(pool, tmp_path, "bad", fake_uvx, "CRASH\n")
+            ok = _export(pool, tmp_path, "good", fake_uvx)
+
+        assert crashed.success is False
+        assert "exited with status 3" in crashed.error.stderr
+        assert ok.success is True
+        assert pool.started == 2
+
+    def test_timeout_terminates_worker(self, fake_uvx, tmp_path):
+        """Test that a timed-out export terminates its worker."""
+        with WorkerPool(size=1) as pool:
+            result = _export(pool, tmp_path, "slow", fake_uvx, "SLEEP\n", timeout=3)
+
+        assert result.success is False
+        assert "timed out" in result.error.stderr
+        assert result.reaped_processes >= 1
+
+    def test_falls_back_to_subprocesses(self, fake_uvx, tmp_path):
+        """Test that exports run as subprocesses if marimo declares no console script to run in process."""
+        shutil.rmtree(fake_uvx / "site" / "marimo-0.0.0.dist-info")
+
+        with WorkerPool(size=1) as pool:
+            results = [_export(pool, tmp_path, name, fake_uvx) for name in ("a", "b")]
+
+        assert all(result.success for result in results)
+        assert (tmp_path / "out" / "b.html").read_text() == "<html></html>"
+        # Only the first export tried a worker
+        assert pool.started == 1
+
+    def test_sandboxed_exports_skip_workers(self, fake_uvx, tmp_path):
+        """Test that sandboxed exports run as subprocesses, as marimo restarts them in a new environment."""
+        with WorkerPool(size=1) as pool:
+            result = _notebook(tmp_path, "a").export_in_worker(pool, tmp_path / "out", bin_path=fake_uvx)
+
+        assert result.success is True
+        assert pool.started == 0
+
+    def test_invalid_notebook_skips_workers(self, fake_uvx, tmp_path):
+        """Test that a notebook that does not compile fails without starting a worker."""
+        audit_logger = MagicMock()
+
+        with WorkerPool(size=1) as pool:
+            result = _export(
+                pool, tmp_path, "a", fake_uvx, "import marimo\n\napp = marimo.App(\n", audit_logger=audit_logger
+            )
+
+        assert result.success is False
+        assert isinstance(result.error, NotebookInvalidError)
+        assert result.duration is not None
+        assert pool.started == 0
+        audit_logger.log_export.assert_called_once()
+
+    def test_missing_executable(self, tmp_path):
+        """Test that a missing uvx executable is raised like for export subprocesses."""
+        with WorkerPool() as pool, pytest.raises(FileNotFoundError):
+            pool.run([str(tmp_path / "uvx"), "marimo", "export", "html"], timeout=5)
+
+
+def _scripted_worker(script):
+    """Start an export worker running a Python script instead of the worker script."""
+    with patch("marimushka.worker.worker_command", return_value=[sys.executable, "-c", script]):
+        return ExportWorker("uvx")
+
+
+_READY = "import json, os, sys, time\nprint(json.dumps({'ready': True}), flush=True)\n"
+_CMD = ["uvx", "marimo", "export", "html", "demo.py"]
+
+
+class TestExportWorker:
+    """Tests for the protocol handling of a single worker."""
+
+    def test_exit_reports_output_tail(self):
+        """Test that a worker exiting without answering reports its stray output and stderr."""
+        worker = _scripted_worker("import sys\nprint('not json')\nsys.stderr.write('import failed\\n')\nsys.exit(4)")
+
+        with pytest.raises(ChildProcessError) as exc_info:
+            worker.run(_CMD, timeout=30)
+
+        message = str(exc_info.value)
+        assert message.startswith("Export worker exited with status 4")
+        assert "not json" in message
+        assert "import failed" in message
+
+    def test_closed_stdin(self):
+        """Test that a worker that stopped reading jobs is reported as exited."""
+        worker = _scripted_worker("import os\nos.close(0)\n" + _READY)
+
+        with pytest.raises(ChildProcessError, match="exited with status 0"):
+            worker.run(_CMD, timeout=30)
+
+    def test_cancel_terminates_worker(self):
+        """Test that setting the cancel event while an export runs terminates the worker."""
+        worker = _scripted_worker(_READY + "time.sleep(60)\n")
+        cancel = threading.Event()
+        threading.Timer(0.5, cancel.set).start()
+
+        with pytest.raises(ProcessTreeCancelled):
+            worker.run(_CMD, timeout=30, cancel=cancel)
+
+        assert not worker.alive
+
+    def test_timeout_with_cancel_event(self):
+        """Test that an export with a cancel event still times out."""
+        worker = _scripted_worker(_READY + "time.sleep(60)\n")
+
+        with pytest.raises(ProcessTreeTimeoutExpired):
+            worker.run(_CMD, timeout=0.5, cancel=threading.Event())
+
+        assert not worker.alive
+
+    def test_cancelled_before_start(self):
+        """Test that a pool does not start a worker for an export cancelled in advance."""
+        cancel = threading.Event()
+        cancel.set()
+
+        with WorkerPool() as pool, pytest.raises(ProcessTreeCancelled):
+            pool.run(_CMD, timeout=30, cancel=cancel)
+
+        assert pool.started == 0
+
+    def test_dead_idle_worker_is_replaced(self, fake_uvx, tmp_path):
+        """Test that an idle worker that died in the meantime is not handed out again."""
+        with WorkerPool(size=1) as pool:
+            assert _export(pool, tmp_path, "a", fake_uvx).success
+            pool._idle[0].terminate()
+            assert _export(pool, tmp_path, "b", fake_uvx).success
+
+        assert pool.started == 2
+        assert pool.recycled == 0
+
+    def test_full_pool_stops_worker(self):
+        """Test that a worker returned to a full pool is stopped without counting as recycled."""
+        pool = WorkerPool(size=1)
+        pool._idle.append(MagicMock())
+        worker = MagicMock(jobs=1, rss=0, alive=True)
+
+        pool._release(worker)
+
+        worker.close.assert_called_once()
+        assert pool.recycled == 0
+
+    def test_unavailable_warning_once(self):
+        """Test that exports falling back at the same time warn only once."""
+        pool = WorkerPool()
+
+        def unavailable(cmd, timeout, cancel):
+            """Fail like a worker without marimo after a concurrent export already did."""
+            pool._unavailable.add(cmd[0])
+            raise WorkerUnavailableError("no marimo")  # noqa: TRY003
+
+        worker = MagicMock()
+        worker.run.side_effect = unavailable
+        with (
+            patch.object(pool, "_acquire", return_value=worker),
+            patch("marimushka.worker.run_process_tree") as mock_run,
+            patch("marimushka.worker.logger") as mock_logger,
+        ):
+            assert pool.run(_CMD, timeout=30) is mock_run.return_value
+
+        mock_logger.warning.assert_not_called()
+
+
+class TestWorkersEngine:
+    """Tests for the workers export engine."""
+
+    def test_export_jobs_use_worker_pool(self):
+        """Test that jobs are exported in the worker pool when one is given."""
+        nb = MagicMock()
+        nb.path = Path("/nb.py")
+        nb.export_in_worker.return_value = NotebookExportResult.succeeded(nb.path, Path("/out/nb.html"))
+        pool = MagicMock()
+
+        result = export_jobs([ExportJob(nb, Path("/out"))], True, None, parallel=False, worker_pool=pool)
+
+        assert result.succeeded == 1
+        nb.export.assert_not_called()
+        nb.export_in_worker.assert_called_once_with(
+            pool,
+            output_dir=Path("/out"),
+            sandbox=True,
+            bin_path=None,
+            timeout=300,
+            cache=None,
+            environments=None,
+            marimo_tool=None,
+            cancel=None,
+            executable=None,
+        )
+
+    def test_main_with_workers_engine(self, fake_uvx, tmp_path):
+        """Test a full build with the workers engine."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        for name in ("a", "b", "c"):
+            _notebook(folder, name)
+
+        html = main(
+            output=tmp_path / "_site",
+            notebooks=folder,
+            apps="",
+            notebooks_wasm="",
+            sandbox=False,
+            bin_path=fake_uvx,
+            max_workers=2,
+            engine="workers",
+        )
+
+        assert "a.html" in html
+        assert sorted(p.name for p in (tmp_path / "_site" / "notebooks").glob("*.html")) == [
+            "a.html",
+            "b.html",
+            "c.html",
+        ]
+
+    def test_generate_index_starts_own_pool(self, fake_uvx, tmp_path):
+        """Test that generate_index without a worker pool exports in a pool of its own."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+
+        html = generate_index(
+            output=tmp_path / "_site",
+            template_file=BUILTIN_TEMPLATE_DIR / "tailwind.html.j2",
+            notebooks=[_notebook(folder, "a")],
+            sandbox=False,
+            bin_path=fake_uvx,
+            parallel=False,
+            engine="workers",
+        )
+
+        assert "a.html" in html
+        assert (tmp_path / "_site" / "notebooks" / "a.html").is_file()
+
+    def test_sandboxed_build_does_not_start_workers(self, fake_uvx, tmp_path):
+        """Test that a sandboxed build with the workers engine exports in subprocesses."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        _notebook(folder, "a")
+
+        with WorkerPool(1) as pool:
+            main(
+                output=tmp_path / "_site",
+                notebooks=folder,
+                apps="",
+                notebooks_wasm="",
+                bin_path=fake_uvx,
+                engine="workers",
+                worker_pool=pool,
+            )
+
+        assert (tmp_path / "_site" / "notebooks" / "a.html").is_file()
+        assert pool.started == 0
+
+    def test_caller_pool_stays_warm_across_builds(self, fake_uvx, tmp_path):
+        """Test that a worker pool passed to main is reused by later builds and left open."""
+        folder = tmp_path / "notebooks"
+        folder.mkdir()
+        _notebook(folder, "a")
+        results = []
+
+        with WorkerPool(1) as pool:
+            for _ in range(2):
+                main(
+                    output=tmp_path / "_site",
+                    notebooks=folder,
+                    apps="",
+                    notebooks_wasm="",
+                    sandbox=False,
+                    bin_path=fake_uvx,
+                    engine="workers",
+                    worker_pool=pool,
+                    on_complete=results.append,
+                )
+
+            assert pool.started == 1
+        assert [batch.succeeded for batch in results] == [1, 1]
+
+
+class _UsageError(Exception):
+    """Stand-in for a click usage error, which reports itself."""
+
+    exit_code = 2
+
+    def __init__(self):
+        super().__init__("bad usage")
+        self.shown = False
+
+    def show(self):
+        """Record that the error reported itself."""
+        self.shown = True
+
+
+def _write_output(args, prog_name=None, standalone_mode=True):
+    """Fake marimo command line writing to both output descriptors."""
+    os.write(1, b"exported\n")
+    os.write(2, f"{args}\n".encode())
+    return 0
+
+
+class TestWorkerMain:
+    """Tests for the worker script, run in this process."""
+
+    def test_resident_memory(self):
+        """Test that the resident memory comes from /proc, or from the peak usage without it."""
+        assert _worker_main._resident_memory() > 0
+
+        with patch("marimushka._worker_main.open", side_effect=OSError, create=True):
+            linux = _worker_main._resident_memory()
+            with patch("marimushka._worker_main.sys.platform", "darwin"):
+                darwin = _worker_main._resident_memory()
+        assert linux == darwin * 1024
+
+        with patch("marimushka._worker_main.open", return_value=io.StringIO("Name:\tpython\n"), create=True):
+            assert _worker_main._resident_memory() == linux
+
+    def test_load_cli(self):
+        """Test that marimo's console script must exist and be a click command."""
+        with patch("marimushka._worker_main.entry_points", return_value=[]), pytest.raises(RuntimeError):
+            _worker_main._load_cli()
+
+        script = MagicMock()
+        script.load.return_value = print
+        with patch("marimushka._worker_main.entry_points", return_value=[script]), pytest.raises(TypeError):
+            _worker_main._load_cli()
+
+        script.load.return_value = command = MagicMock()
+        with patch("marimushka._worker_main.entry_points", return_value=[script]):
+            assert _worker_main._load_cli() is command
+
+    @pytest.mark.parametrize(
+        ("effect", "returncode"),
+        [
+            (3, 3),
+            (None, 0),
+            (SystemExit(None), 0),
+            (SystemExit(2), 2),
+            (SystemExit("export failed"), 1),
+            (ValueError("broken"), 1),
+        ],
+    )
+    def test_invoke(self, monkeypatch, capsys, effect, returncode):
+        """Test that return values, exits and errors of marimo become exit codes."""
+        monkeypatch.setattr("sys.argv", ["pytest"])
+        main = MagicMock(side_effect=effect) if isinstance(effect, BaseException) else MagicMock(return_value=effect)
+
+        assert _worker_main._invoke(main, ["export", "html"]) == returncode
+
+        main.assert_called_once_with(["export", "html"], prog_name="marimo", standalone_mode=False)
+        assert sys.argv == ["marimo", "export", "html"]
+        if returncode == 1:
+            assert capsys.readouterr().err
+
+    def test_invoke_usage_error(self, monkeypatch):
+        """Test that errors reporting themselves, like click's usage errors, keep their exit code."""
+        monkeypatch.setattr("sys.argv", ["pytest"])
+        error = _UsageError()
+
+        assert _worker_main._invoke(MagicMock(side_effect=error), ["--bad"]) == 2
+        assert error.shown
+
+    def test_run_job_captures_descriptors(self, monkeypatch):
+        """Test that a job's output written to the file descriptors is returned, not printed."""
+        monkeypatch.setattr("sys.argv", ["pytest"])
+
+        answer = _worker_main._run_job(_write_output, ["export", "html"])
+
+        assert answer["returncode"] == 0
+        assert answer["stdout"] == "exported\n"
+        assert answer["stderr"] == "['export', 'html']\n"
+        assert answer["rss"] > 0
+
+    def test_serve(self, monkeypatch, capfd):
+        """Test that the worker announces itself and answers one line per job, skipping blank lines."""
+        monkeypatch.setattr("sys.argv", ["pytest"])
+        monkeypatch.setattr("sys.stdin", io.StringIO('{"args": ["export"]}\n\n{"args": ["again"]}\n'))
+        stdout = os.dup(1)
+        try:
+            with patch("marimushka._worker_main._load_cli", return_value=_write_output):
+                _worker_main.serve()
+        finally:
+            os.dup2(stdout, 1)
+            os.close(stdout)
+
+        ready, *answers = (json.loads(line) for line in capfd.readouterr().out.splitlines())
+        assert ready == {"ready": True, "pid": os.getpid()}
+        assert [answer["stderr"] for answer in answers] == ["['export']\n", "['again']\n"]
+
+    def test_serve_without_marimo(self, capfd):
+        """Test that a worker that cannot load marimo says so and exits."""
+        stdout = os.dup(1)
+        try:
+            with patch("marimushka._worker_main._load_cli", side_effect=RuntimeError("no marimo")):
+                _worker_main.serve()
+        finally:
+            os.dup2(stdout, 1)
+            os.close(stdout)
+
+        assert json.loads(capfd.readouterr().out) == {"ready": False, "error": "RuntimeError: no marimo"}